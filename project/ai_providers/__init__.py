@@ -28,7 +28,7 @@ try:
         sys.path.insert(0, str(enterprise_path))
     
     # 尝试导入企业级日志器（静默失败）
-    exec("from logs.ai_providers.ai_logger import get_ai_logger")
+    from logs.ai_providers.ai_logger import get_ai_logger  # type: ignore
     ENTERPRISE_FEATURES = True
     logger.info("🔧 Enterprise Logger - 企业级日志功能已启用")
 except:
@@ -3,9 +3,11 @@
 智能代理编排模块
 处理多步骤AI任务流程、工具选择和执行、代理链式调用等功能
 """
+import asyncio
+import hashlib
 import json
 import re
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Optional, Union, Callable, Awaitable
 
 from sqlalchemy.orm import Session
 
@@ -22,6 +24,24 @@ from .search_provider import create_search_provider
 from .embedding_provider import create_embedding_provider
 from .ai_config import DUMMY_API_KEY, get_user_model_for_provider
 
+# --- 工具并发执行配置 ---
+# 同一轮中并发执行的工具调用上限
+AGENT_TOOL_CONCURRENCY = int(os.getenv("AGENT_TOOL_CONCURRENCY", "4"))
+# 单个工具调用的默认超时（秒），TOOL_TIMEOUTS 中未列出的工具使用该值
+AGENT_TOOL_TIMEOUT_SECONDS = float(os.getenv("AGENT_TOOL_TIMEOUT_SECONDS", "30"))
+# 幂等工具（CACHEABLE_TOOLS）成功结果的跨请求共享缓存时间（秒），0 表示不缓存
+AGENT_TOOL_CACHE_TTL = int(os.getenv("AGENT_TOOL_CACHE_TTL", "300"))
+
+TOOL_TIMEOUTS = {
+    "web_search": 15.0,
+    "knowledge_search": AGENT_TOOL_TIMEOUT_SECONDS,
+    "mcp_tool_call": AGENT_TOOL_TIMEOUT_SECONDS,
+    "find_matching_projects": 20.0,
+}
+CACHEABLE_TOOLS = {"web_search"}
+# MCP 工具可能有副作用，工作流内的重复调用不合并
+NON_MEMOIZED_TOOLS = {"mcp_tool_call"}
+
 # --- 工具定义常量 ---
 WEB_SEARCH_TOOL_SCHEMA = {
     "name": "web_search",
@@ -168,20 +188,14 @@ async def execute_tool(
     执行指定的工具调用
     """
     try:
-        if tool_name == "web_search":
-            return await _execute_web_search_tool(tool_arguments, user_id, db)
-        elif tool_name == "knowledge_search":
-            return await _execute_rag_tool(tool_arguments, user_id, db, kb_ids)
-        elif tool_name == "mcp_tool_call":
-            return await _execute_mcp_tool(tool_arguments, user_id, db)
-        elif tool_name == "find_matching_projects":
-            return await _execute_project_match_tool(tool_arguments, user_id, db)
-        else:
+        executor = TOOL_EXECUTORS.get(tool_name)
+        if executor is None:
             return {
                 "success": False,
                 "error": f"未知的工具名称: {tool_name}",
                 "data": None
             }
+        return await executor(tool_arguments, user_id, db, kb_ids)
     except Exception as e:
         print(f"ERROR_TOOL_EXECUTION: 执行工具 {tool_name} 时发生错误: {e}")
         return {
@@ -640,6 +654,171 @@ async def _execute_project_match_tool(
         }
 
 
+# 工具名称 -> 执行函数 (arguments, user_id, db, kb_ids)
+ToolExecutor = Callable[[Dict[str, Any], int, Session, Optional[List[int]]], Awaitable[Dict[str, Any]]]
+
+TOOL_EXECUTORS: Dict[str, ToolExecutor] = {
+    "web_search": lambda arguments, user_id, db, kb_ids: _execute_web_search_tool(arguments, user_id, db),
+    "knowledge_search": _execute_rag_tool,
+    "mcp_tool_call": lambda arguments, user_id, db, kb_ids: _execute_mcp_tool(arguments, user_id, db),
+    "find_matching_projects": lambda arguments, user_id, db, kb_ids: _execute_project_match_tool(arguments, user_id, db),
+}
+
+
+def _canonical_arguments(value: Any) -> Any:
+    """参数规范化：字符串去首尾空白，列表/字典递归处理（字典键顺序由 json.dumps 排序）"""
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, dict):
+        return {key: _canonical_arguments(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical_arguments(item) for item in value]
+    return value
+
+
+def tool_call_key(
+    tool_name: str,
+    tool_arguments: Dict[str, Any],
+    user_id: int,
+    kb_ids: Optional[List[int]] = None
+) -> str:
+    """工具调用的去重键：(工具名, 规范化参数, 用户, 知识库范围)"""
+    return json.dumps(
+        [tool_name, _canonical_arguments(tool_arguments), user_id, sorted(kb_ids or [])],
+        sort_keys=True, ensure_ascii=False, default=str
+    )
+
+
+class ToolMemo:
+    """
+    工作流内的工具结果备忘录
+
+    以 tool_call_key 为键保存工具调用的 Task：同一工作流中重复的调用（包括同一轮中并发的相同调用）
+    只执行一次；失败或超时的结果不保留，后续相同调用会重新执行。NON_MEMOIZED_TOOLS 中的工具不经过备忘录
+    """
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        task = self._tasks.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(factory())
+            self._tasks[key] = task
+        else:
+            self.hits += 1
+        try:
+            # shield：一个等待方被取消时不影响共享同一调用的其他等待方
+            result = await asyncio.shield(task)
+        except BaseException:
+            self._forget(key, task)
+            raise
+        if not result.get("success"):
+            self._forget(key, task)
+        return result
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._tasks)}
+
+
+async def _execute_tool_with_timeout(
+    tool_name: str,
+    tool_arguments: Dict[str, Any],
+    user_id: int,
+    db: Optional[Session],
+    kb_ids: Optional[List[int]]
+) -> Dict[str, Any]:
+    """
+    带超时执行单个工具；db 为 None 时使用独立的数据库会话（并发执行的工具不能共享同步 Session），
+    幂等工具的成功结果写入共享缓存
+    """
+    shared_key = None
+    if tool_name in CACHEABLE_TOOLS and AGENT_TOOL_CACHE_TTL > 0:
+        from project.utils.optimization.production_utils import cache_manager
+        digest = hashlib.md5(tool_call_key(tool_name, tool_arguments, user_id, kb_ids).encode()).hexdigest()
+        shared_key = f"agent_tool:{tool_name}:{digest}"
+        cached = cache_manager.get(shared_key)
+        if cached:
+            return cached
+
+    session = db
+    if session is None:
+        from project.database import SessionLocal
+        session = SessionLocal()
+    timeout = TOOL_TIMEOUTS.get(tool_name, AGENT_TOOL_TIMEOUT_SECONDS)
+    try:
+        result = await asyncio.wait_for(
+            execute_tool(tool_name, tool_arguments, user_id, session, kb_ids=kb_ids), timeout
+        )
+    except asyncio.TimeoutError:
+        print(f"WARNING_TOOL_EXECUTION: 工具 {tool_name} 执行超时（{timeout}s）")
+        return {
+            "success": False,
+            "error": f"工具执行超时（{timeout:g}秒）",
+            "data": None
+        }
+    finally:
+        if db is None:
+            session.close()
+
+    if shared_key and result.get("success"):
+        cache_manager.set(shared_key, result, expire=AGENT_TOOL_CACHE_TTL)
+    return result
+
+
+async def execute_tools_concurrently(
+    tool_calls: List[Dict[str, Any]],
+    user_id: int,
+    db: Session,
+    kb_ids: Optional[List[int]] = None,
+    memo: Optional[ToolMemo] = None
+) -> List[Dict[str, Any]]:
+    """
+    并发执行一轮中的多个工具调用（最多 AGENT_TOOL_CONCURRENCY 个同时执行，每个工具单独超时）
+
+    返回与 tool_calls 顺序一致的 [{"tool_name", "result"}]，供 _format_tool_results 使用；
+    单个工具失败或超时只影响它自己的结果。只有一个调用时直接使用传入的 db，
+    多个调用时每个工具使用独立的数据库会话。
+    """
+    semaphore = asyncio.Semaphore(max(1, AGENT_TOOL_CONCURRENCY))
+    shared_db = db if len(tool_calls) == 1 else None
+
+    async def run_one(tool_call: Dict[str, Any]) -> Dict[str, Any]:
+        async def factory():
+            async with semaphore:
+                return await _execute_tool_with_timeout(
+                    tool_call["name"], tool_call["arguments"], user_id, shared_db, kb_ids
+                )
+
+        if memo is None or tool_call["name"] in NON_MEMOIZED_TOOLS:
+            return await factory()
+        key = tool_call_key(tool_call["name"], tool_call["arguments"], user_id, kb_ids)
+        return await memo.run(key, factory)
+
+    results = await asyncio.gather(*(run_one(tool_call) for tool_call in tool_calls), return_exceptions=True)
+    tool_results = []
+    for tool_call, result in zip(tool_calls, results):
+        if isinstance(result, BaseException):
+            print(f"ERROR_TOOL_EXECUTION: 执行工具 {tool_call['name']} 时发生错误: {result}")
+            result = {
+                "success": False,
+                "error": f"工具执行失败: {str(result)}",
+                "data": None
+            }
+        tool_results.append({
+            "tool_name": tool_call["name"],
+            "result": result
+        })
+    return tool_results
+
+
 def get_available_tools(user_id: int, db: Session) -> List[Dict[str, Any]]:
     """
     获取用户可用的工具列表
@@ -693,7 +872,9 @@ async def invoke_agent(
     llm_api_type: Optional[str] = None,
     past_messages: Optional[List[Dict[str, Any]]] = None,
     conversation_id_for_temp_files: Optional[int] = None,
-    enable_tool_use: Optional[bool] = None
+    enable_tool_use: Optional[bool] = None,
+    # 多步骤工作流共享的工具结果备忘录
+    tool_memo: Optional[ToolMemo] = None
 ) -> Dict[str, Any]:
     """
     调用智能代理处理用户请求
@@ -811,24 +992,15 @@ async def invoke_agent(
             tool_calls = _extract_tool_calls(assistant_message)
             
             if tool_calls:
-                # 执行工具调用
-                tool_results = []
+                # 为RAG工具传递rag_sources参数
                 for tool_call in tool_calls:
-                    # 为RAG工具传递rag_sources参数
                     if tool_call["name"] == "knowledge_search" and rag_sources:
                         tool_call["arguments"]["content_types"] = rag_sources
-                    
-                    result = await execute_tool(
-                        tool_call["name"],
-                        tool_call["arguments"],
-                        user_id,
-                        db,
-                        kb_ids=kb_ids
-                    )
-                    tool_results.append({
-                        "tool_name": tool_call["name"],
-                        "result": result
-                    })
+                
+                # 并发执行工具调用，结果保持调用顺序
+                tool_results = await execute_tools_concurrently(
+                    tool_calls, user_id, db, kb_ids=kb_ids, memo=tool_memo
+                )
                 
                 # 将工具结果添加到对话中
                 full_messages.append({"role": "assistant", "content": assistant_message})
@@ -897,7 +1069,7 @@ def _build_system_prompt(available_tools: List[Dict[str, Any]]) -> str:
 {{"name": "工具名称", "arguments": {{"参数": "值"}}}}
 </tool_call>
 
-每次只能调用一个工具。在使用工具之前，请先分析用户的需求，判断是否真的需要使用工具。"""
+多个相互独立的工具可以在同一条回复中分别用 <tool_call> 调用，它们会并发执行。在使用工具之前，请先分析用户的需求，判断是否真的需要使用工具。"""
     
     return base_prompt
 
@@ -948,6 +1120,8 @@ async def multi_step_agent_workflow(
     """
     workflow_history = []
     current_query = initial_query
+    # 各步骤中重复的工具调用只执行一次
+    tool_memo = ToolMemo()
     
     for step in range(max_steps):
         print(f"INFO_AGENT_WORKFLOW: 执行第 {step + 1} 步")
@@ -956,7 +1130,9 @@ async def multi_step_agent_workflow(
         messages = [{"role": "user", "content": current_query}]
         
         # 调用代理
-        result = await invoke_agent(messages, user_id, db, use_tools=True)
+        result = await invoke_agent(
+            messages=messages, db=db, user_id=user_id, use_tools=True, tool_memo=tool_memo
+        )
         
         workflow_history.append({
             "step": step + 1,
@@ -37,11 +37,10 @@ try:
     if str(enterprise_path) not in sys.path:
         sys.path.insert(0, str(enterprise_path))
     
-    # 尝试导入企业级日志器（使用exec避免静态检查）
-    exec("from logs.ai_providers.ai_logger import get_ai_logger as enterprise_get_ai_logger")
-    exec("get_ai_logger = enterprise_get_ai_logger")  # 替换为企业级版本
+    # 尝试导入企业级日志器，替换为企业级版本
+    from logs.ai_providers.ai_logger import get_ai_logger  # type: ignore
     ENTERPRISE_LOGGING = True
-except:
+except Exception:
     # 使用基础日志器
     ENTERPRISE_LOGGING = False
 
@@ -430,13 +429,40 @@ class RetryHandler:
         return wrapper
 
 # 装饰器工厂函数
+def _record_llm_request(provider: str, model: Optional[str], response_time: float,
+                        success: bool, result: Any = None):
+    """把一次聊天补全请求按提供者/模型记入AI监控服务的延迟与token分位数草图"""
+    try:
+        from project.services.ai_monitoring_service import ai_monitoring_service
+        usage = result.get("usage") if isinstance(result, dict) else None
+        ai_monitoring_service.record_request(
+            response_time, success,
+            provider=provider or "unknown",
+            model=model or (result.get("model") if isinstance(result, dict) else None) or "unknown",
+            tokens=(usage or {}).get("total_tokens")
+        )
+    except Exception as e:
+        logging.getLogger(__name__).debug(f"记录LLM请求指标失败: {e}")
+
+
 def with_monitoring(operation_name: str):
-    """性能监控装饰器"""
+    """性能监控装饰器；chat_completion 同时按提供者/模型记录延迟和token数"""
     def decorator(func):
         @wraps(func)
         async def wrapper(self, *args, **kwargs):
             monitor = PerformanceMonitor(self.logger, operation_name)
-            return await monitor(func)(self, *args, **kwargs)
+            if operation_name != "chat_completion":
+                return await monitor(func)(self, *args, **kwargs)
+            
+            model = kwargs.get("model") or getattr(self, "model", None)
+            start = time.time()
+            try:
+                result = await monitor(func)(self, *args, **kwargs)
+            except Exception:
+                _record_llm_request(self.provider_name, model, time.time() - start, False)
+                raise
+            _record_llm_request(self.provider_name, model, time.time() - start, True, result)
+            return result
         
         return wrapper
     return decorator
@@ -6,8 +6,6 @@
 import io
 import re
 from typing import List, Optional, Dict, Any
-import PyPDF2
-from docx import Document as DocxDocument
 
 from .embedding_provider import create_embedding_provider
 
@@ -121,6 +119,8 @@ def extract_text_from_document(file_content_bytes: bytes, file_type: str) -> str
 def _extract_text_from_pdf(file_content_bytes: bytes) -> str:
     """从PDF文件中提取文本"""
     try:
+        import PyPDF2
+        
         pdf_file = io.BytesIO(file_content_bytes)
         reader = PyPDF2.PdfReader(pdf_file)
         
@@ -143,6 +143,8 @@ def _extract_text_from_pdf(file_content_bytes: bytes) -> str:
 def _extract_text_from_docx(file_content_bytes: bytes) -> str:
     """从DOCX文件中提取文本"""
     try:
+        from docx import Document as DocxDocument
+        
         docx_file = io.BytesIO(file_content_bytes)
         doc = DocxDocument(docx_file)
         
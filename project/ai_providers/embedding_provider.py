@@ -257,7 +257,7 @@ async def get_embeddings_from_api(
     Args:
         texts: 要嵌入的文本列表
         user_id: 用户ID（可选）
-        provider: 提供者名称（可选）
+        provider: 提供者名称（可选，"local" 使用本地模型；未指定且开启 LOCAL_EMBEDDING_ENABLED 时默认本地）
         api_key: API密钥（可选）
         **kwargs: 其他参数
         
@@ -265,6 +265,12 @@ async def get_embeddings_from_api(
         嵌入向量列表
     """
     try:
+        from .local_provider import LOCAL_EMBEDDING_ENABLED, get_local_embedding_provider
+        if provider == "local" or (provider is None and LOCAL_EMBEDDING_ENABLED):
+            # 本地模型：进程内共享实例，并发调用合并成批
+            result = await get_local_embedding_provider().create_embedding(texts)
+            return result.embeddings
+        
         # 创建嵌入提供者
         embedding_provider = create_enterprise_embedding_provider(
             provider_name=provider or "openai",
@@ -0,0 +1,452 @@
+"""
+本地嵌入与重排序提供者
+在 CPU 上运行 sentence-transformers 双编码器（嵌入）与交叉编码器（重排序），不经过远程API
+
+- 动态批处理：并发协程的请求进入同一队列，由专用推理线程按 max_batch_size / max_wait_ms 窗口
+  合并成一次前向计算，事件循环只等待 Future，不会被推理阻塞
+- 可选 int8 动态量化（torch.quantization.quantize_dynamic，只量化 Linear 层）
+- 输出维度对齐到 LOCAL_EMBEDDING_DIM（默认 1024，与数据库 Vector(1024) 列一致）：
+  模型维度较小时补零（内积、余弦相似度不变），较大时乘固定种子的正交投影矩阵后重新归一化；
+  修改该值需要同步修改模型中的 Vector 列维度
+
+模型在推理线程中首次使用时才加载，导入本模块不会加载 torch。
+LOCAL_EMBEDDING_ENABLED=true 时工厂才把 "local" 列为可用的嵌入/重排序提供者。
+"""
+
+import os
+import time
+import queue
+import asyncio
+import logging
+import threading
+import importlib.util
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .ai_base import BaseEmbeddingProvider, BaseRerankProvider
+from .embedding_provider import EmbeddingResult
+
+logger = logging.getLogger(__name__)
+
+# 只检查是否安装，真正导入推迟到加载模型时（导入 torch 需要数秒）
+SENTENCE_TRANSFORMERS_AVAILABLE = importlib.util.find_spec("sentence_transformers") is not None
+
+LOCAL_EMBEDDING_ENABLED = os.getenv("LOCAL_EMBEDDING_ENABLED", "false").lower() == "true"
+LOCAL_EMBEDDING_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", "BAAI/bge-small-zh-v1.5")
+LOCAL_RERANK_MODEL = os.getenv("LOCAL_RERANK_MODEL", "BAAI/bge-reranker-base")
+LOCAL_EMBEDDING_DIM = int(os.getenv("LOCAL_EMBEDDING_DIM", "1024"))
+LOCAL_MODEL_DEVICE = os.getenv("LOCAL_MODEL_DEVICE", "cpu")
+LOCAL_MODEL_QUANTIZE = os.getenv("LOCAL_MODEL_QUANTIZE", "false").lower() == "true"
+LOCAL_MODEL_MAX_LENGTH = int(os.getenv("LOCAL_MODEL_MAX_LENGTH", "512"))
+LOCAL_BATCH_MAX_SIZE = int(os.getenv("LOCAL_BATCH_MAX_SIZE", "64"))
+LOCAL_BATCH_MAX_WAIT_MS = float(os.getenv("LOCAL_BATCH_MAX_WAIT_MS", "5"))
+
+# 投影矩阵的随机种子固定，保证重启后同一文本得到同一向量
+_PROJECTION_SEED = 20240601
+
+
+class DynamicBatcher:
+    """
+    跨协程的动态批处理器
+
+    submit() 把一组输入和一个 Future 放入线程安全队列；推理线程取到第一个请求后最多再等待
+    max_wait_ms 收集后续请求（凑满 max_batch_size 条输入立即开始），合并后调用 infer，
+    再按原顺序把结果切片回各自的 Future。推理进行期间到达的请求会在下一批中一起处理。
+    """
+
+    def __init__(
+        self,
+        infer: Callable[[List[Any]], Sequence[Any]],
+        max_batch_size: int = LOCAL_BATCH_MAX_SIZE,
+        max_wait_ms: float = LOCAL_BATCH_MAX_WAIT_MS,
+        name: str = "local-inference"
+    ):
+        self.infer = infer
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.name = name
+        self._queue: "queue.Queue[Optional[Tuple[List[Any], asyncio.AbstractEventLoop, asyncio.Future]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._thread.start()
+
+    async def submit(self, items: List[Any]) -> List[Any]:
+        """提交一组输入，返回与输入一一对应的结果"""
+        if not items:
+            return []
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._ensure_thread()
+        self._queue.put((list(items), loop, future))
+        return await future
+
+    def close(self, timeout: Optional[float] = None):
+        """处理完已入队的请求后停止推理线程"""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+        self._thread = None
+
+    def _collect(self, first) -> Tuple[list, bool]:
+        pending, size = [first], len(first[0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                return pending, True
+            pending.append(request)
+            size += len(request[0])
+        return pending, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            pending, stopping = self._collect(first)
+            inputs = [item for items, _, _ in pending for item in items]
+            try:
+                outputs: List[Any] = []
+                for start in range(0, len(inputs), self.max_batch_size):
+                    outputs.extend(self.infer(inputs[start:start + self.max_batch_size]))
+                    self._batches += 1
+                self._items += len(inputs)
+            except Exception as e:
+                logger.error(f"{self.name} 批量推理失败（{len(inputs)} 条）: {e}")
+                for _, loop, future in pending:
+                    loop.call_soon_threadsafe(_set_exception, future, e)
+                continue
+            offset = 0
+            for items, loop, future in pending:
+                loop.call_soon_threadsafe(_set_result, future, outputs[offset:offset + len(items)])
+                offset += len(items)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self._batches,
+            "items": self._items,
+            "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0,
+            "queued": self._queue.qsize(),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+
+def _set_result(future: asyncio.Future, result):
+    if not future.done():
+        future.set_result(result)
+
+
+def _set_exception(future: asyncio.Future, exc: BaseException):
+    if not future.done():
+        future.set_exception(exc)
+
+
+def _require_sentence_transformers():
+    if not SENTENCE_TRANSFORMERS_AVAILABLE:
+        raise ImportError("本地模型需要安装 sentence-transformers 与 torch")
+
+
+def _quantize(model):
+    """int8 动态量化 Linear 层，只适用于 CPU 推理"""
+    import torch
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class _LocalModelMixin:
+    """本地模型的加载、批处理器与统计"""
+
+    def _init_local(self, quantize: Optional[bool], device: Optional[str],
+                    max_batch_size: Optional[int], max_wait_ms: Optional[float], name: str):
+        _require_sentence_transformers()
+        self.quantize = LOCAL_MODEL_QUANTIZE if quantize is None else quantize
+        self.device = device or LOCAL_MODEL_DEVICE
+        self._model = None
+        self._model_lock = threading.Lock()
+        self.batcher = DynamicBatcher(
+            self._infer,
+            max_batch_size=LOCAL_BATCH_MAX_SIZE if max_batch_size is None else max_batch_size,
+            max_wait_ms=LOCAL_BATCH_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms,
+            name=name
+        )
+        self._total_requests = 0
+        self._successful_requests = 0
+        self._failed_requests = 0
+
+    def _get_model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    start = time.perf_counter()
+                    model = self._load_model()
+                    if self.quantize and self.device == "cpu":
+                        model = self._apply_quantization(model)
+                    self._model = model
+                    logger.info(f"本地模型 {self.model} 加载完成（量化: {self.quantize}），"
+                                f"耗时 {time.perf_counter() - start:.2f}s")
+        return self._model
+
+    async def _submit(self, items: List[Any]) -> List[Any]:
+        self._total_requests += 1
+        try:
+            results = await self.batcher.submit(items)
+            self._successful_requests += 1
+            return results
+        except Exception:
+            self._failed_requests += 1
+            raise
+
+    async def warmup(self):
+        """在推理线程中加载模型，避免第一个请求承担加载耗时"""
+        await asyncio.get_running_loop().run_in_executor(None, self._get_model)
+
+    def close(self):
+        self.batcher.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "provider_name": self.provider_name,
+            "model": self.model,
+            "device": self.device,
+            "quantized": self.quantize,
+            "loaded": self._model is not None,
+            "total_requests": self._total_requests,
+            "successful_requests": self._successful_requests,
+            "failed_requests": self._failed_requests,
+            "success_rate": (
+                self._successful_requests / self._total_requests
+                if self._total_requests > 0 else 0
+            ),
+            "batching": self.batcher.get_stats(),
+        }
+
+
+class LocalEmbeddingProvider(_LocalModelMixin, BaseEmbeddingProvider):
+    """本地 sentence-transformers 嵌入提供者"""
+
+    def __init__(
+        self,
+        provider_name: str = "local",
+        model: Optional[str] = None,
+        dimension: Optional[int] = None,
+        quantize: Optional[bool] = None,
+        device: Optional[str] = None,
+        max_batch_size: Optional[int] = None,
+        max_wait_ms: Optional[float] = None,
+        **kwargs
+    ):
+        super().__init__(
+            provider_name=provider_name,
+            api_key="",
+            api_base="",
+            model=model or LOCAL_EMBEDDING_MODEL
+        )
+        self.dimension = dimension or LOCAL_EMBEDDING_DIM
+        self._projection: Optional[np.ndarray] = None
+        self._init_local(quantize, device, max_batch_size, max_wait_ms, name="local-embedding")
+
+    def _load_model(self):
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(self.model, device=self.device)
+        model.max_seq_length = min(model.max_seq_length or LOCAL_MODEL_MAX_LENGTH, LOCAL_MODEL_MAX_LENGTH)
+        return model
+
+    def _apply_quantization(self, model):
+        return _quantize(model)
+
+    def _fit_dimension(self, vectors: np.ndarray) -> np.ndarray:
+        """补零或正交投影到 self.dimension 维"""
+        size = vectors.shape[1]
+        if size == self.dimension:
+            return vectors
+        if size < self.dimension:
+            return np.pad(vectors, ((0, 0), (0, self.dimension - size)))
+        if self._projection is None or self._projection.shape[0] != size:
+            rng = np.random.default_rng(_PROJECTION_SEED)
+            # QR 分解得到列正交的 size x dimension 矩阵
+            self._projection, _ = np.linalg.qr(rng.standard_normal((size, self.dimension)))
+        projected = vectors @ self._projection
+        norms = np.linalg.norm(projected, axis=1, keepdims=True)
+        return projected / np.maximum(norms, 1e-12)
+
+    def _infer(self, texts: List[str]) -> List[List[float]]:
+        """推理线程中执行：一次前向计算整批文本"""
+        vectors = self._get_model().encode(
+            texts,
+            batch_size=len(texts),
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+        return self._fit_dimension(np.asarray(vectors, dtype=np.float32)).tolist()
+
+    async def create_embedding(
+        self,
+        input_text: Union[str, List[str]],
+        model: Optional[str] = None,
+        **kwargs
+    ) -> EmbeddingResult:
+        """创建嵌入向量（model 参数被忽略，使用加载的本地模型）"""
+        start_time = time.time()
+        texts = [input_text] if isinstance(input_text, str) else list(input_text)
+        embeddings = await self._submit(texts)
+        return EmbeddingResult(
+            embeddings=embeddings,
+            # 本地推理不按 token 计费
+            usage={"prompt_tokens": 0, "total_tokens": 0},
+            model=self.model,
+            response_time=time.time() - start_time
+        )
+
+    async def batch_create_embedding(
+        self,
+        input_texts: List[str],
+        model: Optional[str] = None,
+        batch_size: int = 100,
+        **kwargs
+    ) -> List[EmbeddingResult]:
+        """批量创建嵌入向量"""
+        return [
+            await self.create_embedding(input_texts[i:i + batch_size])
+            for i in range(0, len(input_texts), batch_size)
+        ]
+
+    async def _make_request(self, **kwargs) -> Any:
+        """实现基类抽象方法"""
+        return await self.create_embedding(**kwargs)
+
+    async def health_check(self) -> Dict[str, Any]:
+        """健康检查"""
+        try:
+            test_result = await self.create_embedding("test")
+            return {
+                "status": "healthy",
+                "model": self.model,
+                "embedding_dim": len(test_result.embeddings[0]) if test_result.embeddings else 0,
+                "response_time": test_result.response_time
+            }
+        except Exception as e:
+            return {
+                "status": "unhealthy",
+                "error": str(e)
+            }
+
+
+class LocalRerankProvider(_LocalModelMixin, BaseRerankProvider):
+    """本地 sentence-transformers 交叉编码器重排序提供者"""
+
+    def __init__(
+        self,
+        provider_name: str = "local",
+        model: Optional[str] = None,
+        quantize: Optional[bool] = None,
+        device: Optional[str] = None,
+        max_batch_size: Optional[int] = None,
+        max_wait_ms: Optional[float] = None,
+        **kwargs
+    ):
+        super().__init__(
+            provider_name=provider_name,
+            api_key="",
+            api_base="",
+            model=model or LOCAL_RERANK_MODEL
+        )
+        self._init_local(quantize, device, max_batch_size, max_wait_ms, name="local-rerank")
+
+    def _load_model(self):
+        from sentence_transformers import CrossEncoder
+        return CrossEncoder(self.model, max_length=LOCAL_MODEL_MAX_LENGTH, device=self.device)
+
+    def _apply_quantization(self, model):
+        model.model = _quantize(model.model)
+        return model
+
+    def _infer(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        """推理线程中执行：一次前向计算整批 (查询, 文档) 对"""
+        scores = self._get_model().predict(
+            pairs,
+            batch_size=len(pairs),
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return np.asarray(scores, dtype=np.float32).reshape(len(pairs), -1)[:, 0].tolist()
+
+    async def rerank_scores(self, query: str, documents: List[str]) -> List[float]:
+        """按文档原顺序返回相关性分数"""
+        return await self._submit([(query, document) for document in documents])
+
+    async def rerank(
+        self,
+        query: str,
+        documents: List[str],
+        **kwargs
+    ) -> Dict[str, Any]:
+        """重排序文档，结果格式与 EnterpriseRerankProvider 一致（按相关性降序）"""
+        scores = await self.rerank_scores(query, documents)
+        order = sorted(range(len(documents)), key=lambda index: scores[index], reverse=True)
+        top_k = kwargs.get("top_k") or len(documents)
+        return_documents = kwargs.get("return_documents", True)
+        results = []
+        for index in order[:top_k]:
+            result = {"index": index, "relevance_score": scores[index]}
+            if return_documents:
+                result["document"] = {"text": documents[index]}
+            results.append(result)
+        return {
+            "results": results,
+            "model": self.model,
+            "usage": {"search_units": len(documents)},
+            "request_id": None
+        }
+
+    async def _make_request(self, **kwargs) -> Any:
+        """实现基础请求方法"""
+        if kwargs.get("test"):
+            return {"status": "ok", "model": self.model}
+        return await self.rerank(**kwargs)
+
+
+# 进程内共享实例：同一进程的所有调用共用模型与批处理队列
+_local_embedding_provider: Optional[LocalEmbeddingProvider] = None
+_local_rerank_provider: Optional[LocalRerankProvider] = None
+
+
+def get_local_embedding_provider() -> LocalEmbeddingProvider:
+    """获取进程内共享的本地嵌入提供者"""
+    global _local_embedding_provider
+    if _local_embedding_provider is None:
+        _local_embedding_provider = LocalEmbeddingProvider()
+    return _local_embedding_provider
+
+
+def get_local_rerank_provider() -> LocalRerankProvider:
+    """获取进程内共享的本地重排序提供者"""
+    global _local_rerank_provider
+    if _local_rerank_provider is None:
+        _local_rerank_provider = LocalRerankProvider()
+    return _local_rerank_provider
+
+
+__all__ = [
+    "SENTENCE_TRANSFORMERS_AVAILABLE",
+    "LOCAL_EMBEDDING_ENABLED",
+    "DynamicBatcher",
+    "LocalEmbeddingProvider",
+    "LocalRerankProvider",
+    "get_local_embedding_provider",
+    "get_local_rerank_provider",
+]
@@ -9,7 +9,6 @@ import re
 from typing import List, Dict, Any, Optional, Literal, Union
 
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
 
@@ -33,6 +32,12 @@ SKILL_MATCH_OVERALL_WEIGHT = 5.0
 OVERALL_TIME_MATCH_WEIGHT = 3.0
 
 
+def _cosine_similarity(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """sklearn 的 cosine_similarity，首次调用时才导入 sklearn（导入耗时约 1.5 秒）"""
+    from sklearn.metrics.pairwise import cosine_similarity
+    return cosine_similarity(x, y)
+
+
 def _get_safe_embedding_np(raw_embedding: Any, entity_type: str, entity_id: Any) -> Optional[np.ndarray]:
     """
     尝试将各种原始嵌入格式转换为一个干净的np.ndarray (float32) 尺寸为 1024
@@ -531,7 +536,7 @@ async def find_matching_projects_for_student(
 
     # 计算余弦相似度
     try:
-        cosine_sims = cosine_similarity(student_embedding, project_embeddings_array)[0]
+        cosine_sims = _cosine_similarity(student_embedding, project_embeddings_array)[0]
     except Exception as e:
         print(f"ERROR_AI_MATCHING: 计算余弦相似度失败: {e}")
         return []
@@ -696,7 +701,7 @@ async def find_matching_courses_for_student(
 
     # 计算余弦相似度
     try:
-        cosine_sims = cosine_similarity(student_embedding, course_embeddings_array)[0]
+        cosine_sims = _cosine_similarity(student_embedding, course_embeddings_array)[0]
     except Exception as e:
         print(f"ERROR_AI_MATCHING: 计算余弦相似度失败: {e}")
         return []
@@ -837,7 +842,7 @@ async def find_matching_students_for_project(
 
     # 计算余弦相似度
     try:
-        cosine_sims = cosine_similarity(project_embedding, student_embeddings_array)[0]
+        cosine_sims = _cosine_similarity(project_embedding, student_embeddings_array)[0]
     except Exception as e:
         print(f"ERROR_AI_MATCHING: 计算余弦相似度失败: {e}")
         return []
@@ -7,6 +7,10 @@ from typing import Dict, Any, Optional, Type, List
 from .llm_provider import OpenAIProvider, CustomOpenAIProvider, HttpxLLMProvider
 from .embedding_provider import EnterpriseEmbeddingProvider
 from .rerank_provider import EnterpriseRerankProvider
+from .local_provider import (
+    LocalEmbeddingProvider, LocalRerankProvider,
+    LOCAL_EMBEDDING_ENABLED, SENTENCE_TRANSFORMERS_AVAILABLE
+)
 from .ai_config import get_enterprise_config
 from .ai_base import LLMProvider
 
@@ -28,12 +32,14 @@ class AIProviderFactory:
         # 注册嵌入提供者
         self._embedding_providers = {
             "openai": EnterpriseEmbeddingProvider,
-            "zhipu": EnterpriseEmbeddingProvider
+            "zhipu": EnterpriseEmbeddingProvider,
+            "local": LocalEmbeddingProvider
         }
         
         # 注册重排序提供者
         self._rerank_providers = {
-            "cohere": EnterpriseRerankProvider
+            "cohere": EnterpriseRerankProvider,
+            "local": LocalRerankProvider
         }
     
     def create_llm_provider(self, provider_name: str, **kwargs) -> LLMProvider:
@@ -68,17 +74,23 @@ class AIProviderFactory:
         """获取可用的LLM提供者列表"""
         return self.config.get_available_providers()
     
+    def _local_available(self, name: str) -> bool:
+        """本地模型不需要API密钥，由 LOCAL_EMBEDDING_ENABLED 开启"""
+        return name == "local" and LOCAL_EMBEDDING_ENABLED and SENTENCE_TRANSFORMERS_AVAILABLE
+    
     def get_available_embedding_providers(self) -> List[str]:
         """获取可用的嵌入提供者列表"""
         return [name for name in self._embedding_providers.keys() 
-                if self.config.get_embedding_config(name) and 
-                self.config.get_embedding_config(name).api_key]
+                if self._local_available(name) or (
+                    self.config.get_embedding_config(name) and 
+                    self.config.get_embedding_config(name).api_key)]
     
     def get_available_rerank_providers(self) -> List[str]:
         """获取可用的重排序提供者列表"""
         return [name for name in self._rerank_providers.keys() 
-                if self.config.get_rerank_config(name) and 
-                self.config.get_rerank_config(name).api_key]
+                if self._local_available(name) or (
+                    self.config.get_rerank_config(name) and 
+                    self.config.get_rerank_config(name).api_key)]
     
     def register_llm_provider(self, name: str, provider_class: Type[LLMProvider]):
         """注册新的LLM提供者"""
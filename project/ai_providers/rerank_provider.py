@@ -108,6 +108,7 @@ async def get_rerank_scores_from_api(
     llm_type: str = None,
     llm_base_url: str = None,
     fallback_to_similarity: bool = True,
+    provider: str = None,
     **kwargs
 ) -> List[float]:
     """
@@ -120,17 +121,23 @@ async def get_rerank_scores_from_api(
         llm_type: LLM类型
         llm_base_url: LLM基础URL
         fallback_to_similarity: 是否回退到相似度计算
+        provider: 提供者名称（"local" 使用本地交叉编码器；未指定且开启 LOCAL_EMBEDDING_ENABLED 时默认本地）
         **kwargs: 其他参数
         
     Returns:
         重排序分数列表
     """
     try:
+        from .local_provider import LOCAL_EMBEDDING_ENABLED, get_local_rerank_provider
+        if provider == "local" or (provider is None and LOCAL_EMBEDDING_ENABLED):
+            # 本地模型按文档原顺序返回分数
+            return await get_local_rerank_provider().rerank_scores(query, documents)
+        
         # 创建重排序提供者
-        provider = EnterpriseRerankProvider("cohere")
+        rerank_provider = EnterpriseRerankProvider("cohere")
         
         # 执行重排序
-        result = await provider.rerank(query, documents, **kwargs)
+        result = await rerank_provider.rerank(query, documents, **kwargs)
         
         if result and 'results' in result:
             # 提取分数
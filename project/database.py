@@ -1,13 +1,8 @@
 # project/database.py
 import os
-<<<<<<< HEAD
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
-from dotenv import load_dotenv
-from base import Base
-import models
-=======
 import sys
+import asyncio
+import importlib.util
 from pathlib import Path
 
 # 添加项目根目录到 Python 路径
@@ -18,13 +13,12 @@ from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 from project.base import Base
-import project.models  # 这个导入会加载 models/__init__.py，进而导入所有模型
+from project.database_monitoring import engine_pool_options, instrument_engine, get_pool_metrics
 from project.models.achievement_points import Achievement, DEFAULT_ACHIEVEMENTS
 import logging
 
 # 设置日志
 logger = logging.getLogger(__name__)
->>>>>>> origin/Cosbrainplus
 
 load_dotenv()
 # PostgreSQL 数据库连接字符串（优先读取环境变量，未提供则回退到原默认值）
@@ -42,19 +36,128 @@ engine = create_engine(
     max_overflow=int(os.getenv("SQL_MAX_OVERFLOW", "20")),
     pool_timeout=int(os.getenv("SQL_POOL_TIMEOUT", "30")),
     pool_recycle=int(os.getenv("SQL_POOL_RECYCLE", "3600")),
-    pool_pre_ping=True
+    **engine_pool_options()
 )
+instrument_engine(engine, "sync")
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
-<<<<<<< HEAD
-def init_db():
-    print("DEBUG_DB: 正在尝试初始化数据库结构...")
+# ================== 异步数据库层（可选） ==================
+# ASYNC_DB_ENABLED=true 时创建基于 asyncpg 的异步引擎，与同步引擎并存：
+# - get_async_db: FastAPI 依赖，提供 AsyncSession
+# - run_db: 在不阻塞事件循环的前提下执行同步数据库代码，已迁移的热点只读路径使用它；
+#   异步模式下在 AsyncSession.run_sync 中执行（asyncpg，不占用线程），
+#   未开启时在线程池中使用请求的同步会话执行
+ASYNC_DB_ENABLED = os.getenv("ASYNC_DB_ENABLED", "false").lower() == "true"
+
+try:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+    # 只检查驱动是否安装，真正的导入由 create_async_engine 按 URL 完成
+    ASYNC_DB_AVAILABLE = importlib.util.find_spec("asyncpg") is not None
+except ImportError:
+    AsyncSession = None
+    ASYNC_DB_AVAILABLE = False
+
+if ASYNC_DB_ENABLED and not ASYNC_DB_AVAILABLE:
+    logger.warning("ASYNC_DB_ENABLED=true，但未安装 asyncpg，继续使用同步数据库会话")
+
+
+def _to_async_url(url: str) -> str:
+    """postgresql[+psycopg2]://... -> postgresql+asyncpg://..."""
+    from sqlalchemy.engine import make_url
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "postgresql":
+        return url
+    return parsed.set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+
+
+def _is_asyncpg_url(url: str) -> bool:
+    """异步层只支持 postgresql+asyncpg"""
+    from sqlalchemy.engine import make_url
+    try:
+        parsed = make_url(url)
+    except Exception:
+        return False
+    return parsed.get_backend_name() == "postgresql" and parsed.get_driver_name() == "asyncpg"
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _to_async_url(DATABASE_URL)
+ASYNC_DB_URL_SUPPORTED = _is_asyncpg_url(ASYNC_DATABASE_URL)
+
+if ASYNC_DB_ENABLED and ASYNC_DB_AVAILABLE and not ASYNC_DB_URL_SUPPORTED:
+    logger.warning("ASYNC_DB_ENABLED=true，但数据库不是 PostgreSQL（asyncpg），继续使用同步数据库会话")
+
+_async_engine = None
+_AsyncSessionLocal = None
+
+
+def async_db_active() -> bool:
+    """异步数据库层是否启用（需要开启、安装 asyncpg 且数据库为 PostgreSQL）"""
+    return ASYNC_DB_ENABLED and ASYNC_DB_AVAILABLE and ASYNC_DB_URL_SUPPORTED
+
+
+def get_async_engine():
+    """延迟创建异步引擎（连接池参数与同步引擎相同）"""
+    global _async_engine, _AsyncSessionLocal
+    if not async_db_active():
+        raise RuntimeError("异步数据库层未启用（需要 ASYNC_DB_ENABLED=true、安装 asyncpg 且使用 PostgreSQL）")
+    if _async_engine is None:
+        _async_engine = create_async_engine(
+            ASYNC_DATABASE_URL,
+            echo=(os.getenv("SQL_ECHO", "false").lower() == "true"),
+            pool_size=int(os.getenv("SQL_ASYNC_POOL_SIZE", os.getenv("SQL_POOL_SIZE", "10"))),
+            max_overflow=int(os.getenv("SQL_ASYNC_MAX_OVERFLOW", os.getenv("SQL_MAX_OVERFLOW", "20"))),
+            pool_timeout=int(os.getenv("SQL_POOL_TIMEOUT", "30")),
+            pool_recycle=int(os.getenv("SQL_POOL_RECYCLE", "3600")),
+            **engine_pool_options(async_engine=True)
+        )
+        instrument_engine(_async_engine.sync_engine, "async")
+        _AsyncSessionLocal = async_sessionmaker(
+            _async_engine, autoflush=False, expire_on_commit=False
+        )
+        logger.info("异步数据库引擎已创建")
+    return _async_engine
+
+
+async def get_async_db():
+    """FastAPI 依赖：提供 AsyncSession"""
+    get_async_engine()
+    async with _AsyncSessionLocal() as session:
+        yield session
+
+
+async def run_db(db, fn, *args, **kwargs):
+    """
+    执行同步数据库函数 fn(session, *args, **kwargs)，不阻塞事件循环
+
+    异步模式下 fn 在独立的 AsyncSession.run_sync 中执行，看不到 db 中未提交的修改，
+    只应用于只读路径；fn 需在内部完成所有需要懒加载的属性访问（如格式化响应），
+    返回普通数据而非ORM实例。
+    """
+    if async_db_active():
+        get_async_engine()
+        async with _AsyncSessionLocal() as session:
+            return await session.run_sync(lambda sync_session: fn(sync_session, *args, **kwargs))
+    return await asyncio.to_thread(fn, db, *args, **kwargs)
+
+
+def get_pool_stats() -> dict:
+    """同步/异步引擎的连接池状态（使用中/空闲/溢出连接数、获取等待时间等，见 database_monitoring）"""
+    stats = get_pool_metrics()
+    stats["async_enabled"] = async_db_active()
+    return stats
+
+
+async def dispose_async_engine():
+    """关闭异步引擎的连接池（应用关闭时调用）"""
+    global _async_engine, _AsyncSessionLocal
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+        _AsyncSessionLocal = None
+
 
-    Base.metadata.drop_all(bind=engine)
-    print("DEBUG_DB: 数据库中所有旧表已删除。")
-=======
 def initialize_default_achievements():
     """
     初始化默认成就到数据库中
@@ -184,39 +287,26 @@ def init_db():
         except Exception as cascade_error:
             print(f"ERROR_DB: CASCADE 删除也失败：{cascade_error}")
             raise
->>>>>>> origin/Cosbrainplus
 
     with engine.connect() as connection:
         connection.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
         connection.commit()
         print("DEBUG_DB: pgvector 扩展已确保创建或已存在。")
-<<<<<<< HEAD
-    models.Base.metadata.create_all(bind=engine)
-    print("DEBUG_DB: 数据库表已根据模型重新创建。")
-=======
     
     Base.metadata.create_all(bind=engine)
     print("DEBUG_DB: 数据库表已根据模型重新创建。")
     
     # 初始化默认成就
     initialize_default_achievements()
->>>>>>> origin/Cosbrainplus
 
 
 def get_db():
     db = SessionLocal()
     try:
-        print("DEBUG_DB: 尝试从连接池获取数据库会话...")
-        print("DEBUG_DB: 成功获取数据库会话。")
-
-        print("DEBUG_DB: 验证数据库连接活跃性...")
-        db.execute(text("SELECT 1")).scalar()
-        print("DEBUG_DB: 数据库连接活跃性验证通过。")
-
+        # 连接活跃性由连接池检查（DB_PRE_PING_MODE），这里不再每个请求额外执行 SELECT 1
         yield db
     finally:
         if db:
-            print("DEBUG_DB: 关闭数据库会话。")
             db.close()
 
 
@@ -234,8 +324,6 @@ def test_db_connection():
 
 
 if __name__ == "__main__":
-<<<<<<< HEAD
-=======
     import sys
     
     # 解析命令行参数
@@ -265,13 +353,9 @@ if __name__ == "__main__":
             sys.exit(1)
     
     # 默认完整初始化
->>>>>>> origin/Cosbrainplus
     print("DEBUG_DB: 正在测试数据库连接...")
     test_db_connection()
     print("DEBUG_DB: 启动数据库初始化流程...")
     init_db()
     print("DEBUG_DB: 数据库初始化流程完成。")
-<<<<<<< HEAD
-=======
     print("💡 注意：默认成就已自动创建完成！")
->>>>>>> origin/Cosbrainplus
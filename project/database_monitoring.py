@@ -0,0 +1,511 @@
+# project/database_monitoring.py
+"""
+数据库连接池监控
+
+- 连接获取等待时间（直方图分桶 + 分位数），记录连接池耗尽（获取超时）次数
+- 使用中/空闲/溢出连接数，以及按使用中连接数采样得到的建议池大小
+- 连接被持有超过 DB_POOL_HELD_WARN_SECONDS 秒时告警，并给出持有连接的路由
+- DB_PRE_PING_MODE 控制连接检查：
+    always  每次获取连接都 ping（SQLAlchemy pool_pre_ping，默认）
+    idle    只对空闲超过 DB_PRE_PING_IDLE_SECONDS 秒的连接 ping，热连接不再多一次往返
+    off     不检查
+
+SQL语句监控（按请求统计）：
+- 记录每个请求执行的语句数、数据库总耗时，以及按指纹（去掉参数后的语句）归并的重复执行次数
+- 同一条 SELECT 在一个请求中执行 SQL_N_PLUS_ONE_THRESHOLD 次及以上视为 N+1 查询并告警
+- 单条语句超过 SQL_SLOW_QUERY_MS 毫秒记为慢查询
+- 按接口汇总（get_sql_stats），管理员接口 /admin/system/sql-stats 和 Prometheus 使用
+- 测试中可用 assert_max_queries 限定代码块的查询预算:
+      with assert_max_queries(3):
+          service.get_leaderboard(db, ...)
+
+指标由 llm_prometheus_monitor 和 enhanced_monitoring_service 定期采集；连接获取等待时间和累计事件
+另外通过 add_pool_listener 实时推送给 Prometheus 的直方图和计数器。
+本模块只依赖 SQLAlchemy 和标准库，供 database.py 在创建引擎时使用。
+"""
+import os
+import re
+import time
+import math
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.exc import DisconnectionError, TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+logger = logging.getLogger(__name__)
+
+DB_POOL_HELD_WARN_SECONDS = float(os.getenv("DB_POOL_HELD_WARN_SECONDS", "10"))
+DB_PRE_PING_MODE = os.getenv("DB_PRE_PING_MODE", "always").lower()
+DB_PRE_PING_IDLE_SECONDS = float(os.getenv("DB_PRE_PING_IDLE_SECONDS", "30"))
+
+# 连接获取等待时间直方图的分桶上界（秒）
+CHECKOUT_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float("inf"))
+
+_SAMPLE_SIZE = 1000
+
+SQL_TRACKING_ENABLED = os.getenv("SQL_TRACKING_ENABLED", "true").lower() == "true"
+SQL_SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", "200"))
+SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "10"))
+# 按接口汇总时最多保留的接口数，避免未匹配路由的路径撑大统计
+_MAX_TRACKED_ENDPOINTS = 500
+
+# 当前请求的路由，由 main.py 中的中间件设置，用于定位长时间持有连接的代码
+current_route: ContextVar[str] = ContextVar("db_current_route", default="-")
+
+# 连接池事件监听器（Prometheus 直方图/计数器在此注册，本模块不依赖 prometheus_client）：
+# wait 监听器参数为 (连接池名, 等待秒数)，event 监听器参数为 (连接池名, 事件名)
+_wait_listeners: List[Callable[[str, float], None]] = []
+_event_listeners: List[Callable[[str, str], None]] = []
+# N+1 查询监听器，参数为接口名
+_n_plus_one_listeners: List[Callable[[str], None]] = []
+
+# 累计事件名，与 PoolStats 的同名计数属性一致
+POOL_EVENTS = ("checkouts", "timeouts", "long_held", "pings", "ping_failures", "invalidations")
+
+
+def add_pool_listener(on_wait: Optional[Callable[[str, float], None]] = None,
+                      on_event: Optional[Callable[[str, str], None]] = None):
+    """注册连接池事件监听器：每次获取连接的等待时间、每个累计事件"""
+    if on_wait is not None:
+        _wait_listeners.append(on_wait)
+    if on_event is not None:
+        _event_listeners.append(on_event)
+
+
+def add_n_plus_one_listener(listener: Callable[[str], None]):
+    """注册 N+1 查询监听器：已纳入接口汇总的请求每出现一次 N+1 查询调用一次"""
+    _n_plus_one_listeners.append(listener)
+
+
+def _notify(listeners, *args):
+    for listener in listeners:
+        try:
+            listener(*args)
+        except Exception as e:
+            logger.debug(f"数据库监控监听器执行失败: {e}")
+
+
+class PoolStats:
+    """单个连接池的统计"""
+
+    def __init__(self, name: str, pool):
+        self.name = name
+        self.pool = pool
+        self._lock = threading.Lock()
+        self.checkout_waits: deque = deque(maxlen=_SAMPLE_SIZE)
+        self.in_use_samples: deque = deque(maxlen=_SAMPLE_SIZE)
+        self.bucket_counts = [0] * len(CHECKOUT_WAIT_BUCKETS)
+        self.max_wait = 0.0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.long_held = 0
+        self.pings = 0
+        self.ping_failures = 0
+        self.invalidations = 0
+        # id(连接记录) -> (获取时间, 路由)
+        self.held: Dict[int, tuple] = {}
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.checkout_waits.append(seconds)
+            self.max_wait = max(self.max_wait, seconds)
+            for index, upper in enumerate(CHECKOUT_WAIT_BUCKETS):
+                if seconds <= upper:
+                    self.bucket_counts[index] += 1
+                    break
+        _notify(_wait_listeners, self.name, seconds)
+        if timed_out:
+            self.record_event("timeouts")
+
+    def record_event(self, event_name: str):
+        """累计事件计数（POOL_EVENTS 之一）并通知监听器"""
+        with self._lock:
+            setattr(self, event_name, getattr(self, event_name) + 1)
+        _notify(_event_listeners, self.name, event_name)
+
+    def in_use(self) -> int:
+        checkedout = getattr(self.pool, "checkedout", None)
+        return checkedout() if callable(checkedout) else len(self.held)
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            waits = sorted(self.checkout_waits)
+            in_use_samples = sorted(self.in_use_samples)
+            held = [
+                {"route": route, "held_seconds": round(now - started, 2)}
+                for started, route in self.held.values()
+                if now - started > DB_POOL_HELD_WARN_SECONDS
+            ]
+            buckets, cumulative = {}, 0
+            for upper, count in zip(CHECKOUT_WAIT_BUCKETS, self.bucket_counts):
+                cumulative += count
+                buckets["+Inf" if math.isinf(upper) else str(upper)] = cumulative
+            counters = {event_name: getattr(self, event_name) for event_name in POOL_EVENTS}
+
+        def quantile(values, q):
+            return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+        size = self.pool.size() if hasattr(self.pool, "size") else 0
+        overflow = self.pool.overflow() if hasattr(self.pool, "overflow") else 0
+        max_overflow = getattr(self.pool, "_max_overflow", 0)
+        in_use = self.in_use()
+        p95_in_use = quantile(in_use_samples, 0.95)
+        return {
+            "size": size,
+            "max_overflow": max_overflow,
+            "in_use": in_use,
+            "idle": self.pool.checkedin() if hasattr(self.pool, "checkedin") else 0,
+            "overflow": max(0, overflow),
+            "checkout_wait_seconds": {
+                "p50": quantile(waits, 0.5),
+                "p95": quantile(waits, 0.95),
+                "p99": quantile(waits, 0.99),
+                "max": self.max_wait,
+            },
+            "checkout_wait_buckets": buckets,
+            "peak_in_use": in_use_samples[-1] if in_use_samples else 0,
+            # 覆盖95%时刻的使用中连接数再留20%余量；长期低于 size 说明池可以调小
+            "suggested_pool_size": max(1, math.ceil(p95_in_use * 1.2)) if in_use_samples else size,
+            "long_held_now": held,
+            "pre_ping_mode": DB_PRE_PING_MODE,
+            **counters,
+        }
+
+
+_pool_stats: Dict[str, PoolStats] = {}
+
+
+class _InstrumentedPoolMixin:
+    """为连接获取计时；等待超时（连接池耗尽）单独计数"""
+
+    _monitor_stats: Optional[PoolStats] = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            timed_out = True
+            raise
+        finally:
+            stats = self._monitor_stats
+            if stats is not None:
+                stats.record_wait(time.perf_counter() - start, timed_out)
+                if timed_out:
+                    logger.warning(
+                        f"数据库连接池 {stats.name} 已耗尽（获取连接超时），路由: {current_route.get()}"
+                    )
+
+    def recreate(self):
+        new_pool = super().recreate()
+        new_pool._monitor_stats = self._monitor_stats
+        if self._monitor_stats is not None:
+            self._monitor_stats.pool = new_pool
+        return new_pool
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncAdaptedQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_pool_options(async_engine: bool = False) -> Dict[str, Any]:
+    """create_engine / create_async_engine 的连接池参数"""
+    return {
+        "poolclass": InstrumentedAsyncAdaptedQueuePool if async_engine else InstrumentedQueuePool,
+        "pool_pre_ping": DB_PRE_PING_MODE == "always",
+    }
+
+
+def _ping(dbapi_connection):
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("SELECT 1")
+    finally:
+        cursor.close()
+
+
+def instrument_engine(engine, name: str) -> PoolStats:
+    """为引擎的连接池注册监控事件（异步引擎传入 AsyncEngine.sync_engine）"""
+    pool = engine.pool
+    stats = PoolStats(name, pool)
+    if isinstance(pool, _InstrumentedPoolMixin):
+        pool._monitor_stats = stats
+    _pool_stats[name] = stats
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        now = time.monotonic()
+        if DB_PRE_PING_MODE == "idle":
+            checked_in_at = connection_record.info.get("checked_in_at")
+            if checked_in_at is not None and now - checked_in_at > DB_PRE_PING_IDLE_SECONDS:
+                stats.record_event("pings")
+                try:
+                    _ping(dbapi_connection)
+                except Exception as e:
+                    stats.record_event("ping_failures")
+                    # 抛出 DisconnectionError 后连接池会丢弃该连接并重新获取
+                    raise DisconnectionError(f"空闲连接检查失败: {e}")
+        route = current_route.get()
+        connection_record.info["checked_out_at"] = now
+        connection_record.info["checked_out_route"] = route
+        stats.record_event("checkouts")
+        stats.held[id(connection_record)] = (now, route)
+        stats.in_use_samples.append(stats.in_use())
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        now = time.monotonic()
+        connection_record.info["checked_in_at"] = now
+        stats.held.pop(id(connection_record), None)
+        checked_out_at = connection_record.info.pop("checked_out_at", None)
+        route = connection_record.info.pop("checked_out_route", "-")
+        if checked_out_at is not None and now - checked_out_at > DB_POOL_HELD_WARN_SECONDS:
+            stats.record_event("long_held")
+            logger.warning(
+                f"数据库连接被持有 {now - checked_out_at:.1f}s（阈值 {DB_POOL_HELD_WARN_SECONDS}s），"
+                f"连接池 {name}，路由: {route}"
+            )
+
+    @event.listens_for(engine, "invalidate")
+    def _on_invalidate(dbapi_connection, connection_record, exception):
+        stats.record_event("invalidations")
+        stats.held.pop(id(connection_record), None)
+
+    if SQL_TRACKING_ENABLED:
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+    return stats
+
+
+def get_pool_metrics() -> Dict[str, Dict[str, Any]]:
+    """全部已监控连接池的统计快照"""
+    return {name: stats.snapshot() for name, stats in _pool_stats.items()}
+
+
+# ===== SQL语句监控 =====
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\$\d+|(?<![:\w]):\w+|\?")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=4096)
+def fingerprint_statement(statement: str) -> str:
+    """语句指纹：参数、字面量替换为 ?，IN 列表合并为 IN (?)，空白归一"""
+    normalized = _STRING_LITERAL.sub("?", statement)
+    normalized = _PLACEHOLDER.sub("?", normalized)
+    normalized = _NUMBER_LITERAL.sub("?", normalized)
+    normalized = _IN_LIST.sub("IN (?)", normalized)
+    return _WHITESPACE.sub(" ", normalized).strip()
+
+
+class QueryTracker:
+    """一个请求（或一个代码块）内执行的SQL语句统计"""
+
+    def __init__(self, route: str = "-"):
+        self.route = route
+        self.count = 0
+        self.total_ms = 0.0
+        # 指纹 -> [执行次数, 总耗时ms]
+        self.statements: Dict[str, List[float]] = {}
+        self.slow: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, elapsed_ms: float):
+        fingerprint = fingerprint_statement(statement)
+        with self._lock:
+            self.count += 1
+            self.total_ms += elapsed_ms
+            entry = self.statements.setdefault(fingerprint, [0, 0.0])
+            entry[0] += 1
+            entry[1] += elapsed_ms
+            if elapsed_ms > SQL_SLOW_QUERY_MS:
+                self.slow.append({"statement": fingerprint, "elapsed_ms": round(elapsed_ms, 2)})
+
+    def repeated(self, threshold: Optional[int] = None) -> List[Dict[str, Any]]:
+        """重复执行次数达到阈值的 SELECT 语句（N+1 嫌疑），按次数降序"""
+        threshold = SQL_N_PLUS_ONE_THRESHOLD if threshold is None else threshold
+        with self._lock:
+            items = [
+                {"statement": fingerprint, "count": int(count), "total_ms": round(total, 2)}
+                for fingerprint, (count, total) in self.statements.items()
+                if count >= threshold and fingerprint.upper().startswith("SELECT")
+            ]
+        return sorted(items, key=lambda item: item["count"], reverse=True)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "route": self.route,
+            "queries": self.count,
+            "db_ms": round(self.total_ms, 2),
+            "distinct_statements": len(self.statements),
+            "n_plus_one": self.repeated(),
+            "slow_queries": list(self.slow),
+        }
+
+
+_query_tracker: ContextVar[Optional[QueryTracker]] = ContextVar("db_query_tracker", default=None)
+
+_endpoint_sql_stats: Dict[str, Dict[str, Any]] = {}
+_recent_slow_queries: deque = deque(maxlen=100)
+_sql_stats_lock = threading.Lock()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start_time")
+    if not starts:
+        return
+    elapsed_ms = (time.perf_counter() - starts.pop()) * 1000
+    tracker = _query_tracker.get()
+    if tracker is not None:
+        tracker.record(statement, elapsed_ms)
+    if elapsed_ms > SQL_SLOW_QUERY_MS:
+        route = current_route.get()
+        fingerprint = fingerprint_statement(statement)
+        _recent_slow_queries.append({
+            "route": route,
+            "statement": fingerprint,
+            "elapsed_ms": round(elapsed_ms, 2),
+            "timestamp": time.time(),
+        })
+        logger.warning(f"慢查询 {elapsed_ms:.1f}ms（阈值 {SQL_SLOW_QUERY_MS}ms），路由: {route}，语句: {fingerprint[:300]}")
+
+
+@contextmanager
+def track_queries(route: str = "-"):
+    """统计代码块内执行的SQL语句，返回 QueryTracker（嵌套使用时内外层分别统计）"""
+    tracker = QueryTracker(route)
+    token = _query_tracker.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _query_tracker.reset(token)
+
+
+@contextmanager
+def assert_max_queries(max_queries: int, allow_n_plus_one: bool = False):
+    """
+    测试用查询预算：代码块执行的语句数超过 max_queries，
+    或出现 N+1 查询（allow_n_plus_one=False 时）则抛出 AssertionError
+    """
+    with track_queries("assert_max_queries") as tracker:
+        yield tracker
+    problems = []
+    if tracker.count > max_queries:
+        problems.append(f"执行了 {tracker.count} 条语句，预算 {max_queries} 条")
+    repeated = tracker.repeated()
+    if repeated and not allow_n_plus_one:
+        problems.append("检测到 N+1 查询")
+    if problems:
+        details = "\n".join(
+            f"  {int(count)}x {fingerprint[:200]}"
+            for fingerprint, (count, _) in sorted(tracker.statements.items(), key=lambda item: -item[1][0])
+        )
+        raise AssertionError("；".join(problems) + "\n" + details)
+
+
+def record_request_queries(endpoint: str, tracker: QueryTracker):
+    """把一个请求的语句统计合并到接口汇总中，出现 N+1 查询时告警"""
+    repeated = tracker.repeated()
+    if repeated:
+        worst = repeated[0]
+        logger.warning(
+            f"N+1 查询: {endpoint} 同一语句执行 {worst['count']} 次"
+            f"（本请求共 {tracker.count} 条，{tracker.total_ms:.1f}ms），语句: {worst['statement'][:300]}"
+        )
+    with _sql_stats_lock:
+        stats = _endpoint_sql_stats.get(endpoint)
+        if stats is None:
+            if len(_endpoint_sql_stats) >= _MAX_TRACKED_ENDPOINTS:
+                return
+            stats = _endpoint_sql_stats[endpoint] = {
+                "requests": 0,
+                "queries_total": 0,
+                "queries_max": 0,
+                "db_ms_total": 0.0,
+                "db_ms_max": 0.0,
+                "n_plus_one_requests": 0,
+                "repeated_statements": {},
+            }
+        stats["requests"] += 1
+        stats["queries_total"] += tracker.count
+        stats["queries_max"] = max(stats["queries_max"], tracker.count)
+        stats["db_ms_total"] += tracker.total_ms
+        stats["db_ms_max"] = max(stats["db_ms_max"], tracker.total_ms)
+        if repeated:
+            stats["n_plus_one_requests"] += 1
+            for item in repeated:
+                previous = stats["repeated_statements"].get(item["statement"], 0)
+                stats["repeated_statements"][item["statement"]] = max(previous, item["count"])
+    if repeated:
+        _notify(_n_plus_one_listeners, endpoint)
+
+
+def get_sql_stats(limit: int = 20, sort_by: str = "queries_avg") -> Dict[str, Any]:
+    """
+    按接口汇总的SQL统计，按 sort_by（queries_avg / queries_max / db_ms_avg / n_plus_one_requests）
+    降序返回最差的 limit 个接口，以及最近的慢查询
+    """
+    with _sql_stats_lock:
+        endpoints = []
+        for endpoint, stats in _endpoint_sql_stats.items():
+            requests = stats["requests"] or 1
+            endpoints.append({
+                "endpoint": endpoint,
+                "requests": stats["requests"],
+                "queries_avg": round(stats["queries_total"] / requests, 2),
+                "queries_max": stats["queries_max"],
+                "db_ms_avg": round(stats["db_ms_total"] / requests, 2),
+                "db_ms_max": round(stats["db_ms_max"], 2),
+                "n_plus_one_requests": stats["n_plus_one_requests"],
+                "repeated_statements": [
+                    {"statement": statement, "max_count": count}
+                    for statement, count in sorted(
+                        stats["repeated_statements"].items(), key=lambda item: -item[1]
+                    )[:5]
+                ],
+            })
+        slow_queries = list(_recent_slow_queries)
+    endpoints.sort(key=lambda item: item.get(sort_by, 0), reverse=True)
+    return {
+        "slow_query_threshold_ms": SQL_SLOW_QUERY_MS,
+        "n_plus_one_threshold": SQL_N_PLUS_ONE_THRESHOLD,
+        "endpoints": endpoints[:limit],
+        "recent_slow_queries": slow_queries[-limit:][::-1],
+    }
+
+
+def get_n_plus_one_counts() -> Dict[str, int]:
+    """各接口累计出现 N+1 查询的请求数（只含出现过的接口）"""
+    with _sql_stats_lock:
+        return {
+            endpoint: stats["n_plus_one_requests"]
+            for endpoint, stats in _endpoint_sql_stats.items() if stats["n_plus_one_requests"]
+        }
+
+
+def reset_sql_stats():
+    """清空接口SQL统计和慢查询记录"""
+    with _sql_stats_lock:
+        _endpoint_sql_stats.clear()
+        _recent_slow_queries.clear()
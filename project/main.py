@@ -1,6 +1,7 @@
 # project/main.py
 
 # === 标准库导入 ===
+import asyncio
 from datetime import datetime, timedelta, timezone
 from typing import Any, Dict, List, Literal, Optional
 
@@ -32,6 +33,7 @@ print_component_loading_header()
 
 # 核心模块
 from project.database import get_db
+from project.database_monitoring import current_route, track_queries, record_request_queries
 from project.utils import (
     SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES,
     create_access_token, get_current_user_id, verify_password, get_password_hash, is_admin_user,
@@ -54,16 +56,8 @@ from project.models import (
 # 加载环境变量
 load_dotenv()
 
-# 路由模块
-from project.routers import (
-    admin, projects, dashboard, course_notes, quick_notes, auth, achievement_points, 
-    tts, llm, mcp, search_engine, courses, knowledge, forum, chatrooms, sharing, ai, recommend,
-    ai_admin_router
-)
-from project.routers.ai.ai_monitoring import router as ai_monitoring_router
-# 导入收藏系统模块
-from project.routers.collections import router as collections_router
-from project.routers.collections.program_collections import router as program_collections_router
+# 路由模块（按 ENABLED_ROUTERS / DISABLED_ROUTERS 配置挂载，未启用的路由器不会被导入）
+from project.routers import enabled_routers, load_router
 
 # === FastAPI 应用实例 ===
 app = FastAPI(
@@ -89,30 +83,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# === 数据库路由追踪中间件 ===
+@app.middleware("http")
+async def track_database_route(request, call_next):
+    """
+    记录当前请求的路由，连接池监控据此定位长时间持有连接的接口；
+    同时统计本请求执行的SQL语句，按路由模板（而非实际路径）汇总
+    """
+    path = f"{request.method} {request.url.path}"
+    token = current_route.set(path)
+    try:
+        with track_queries(path) as tracker:
+            response = await call_next(request)
+        route = request.scope.get("route")
+        if route is not None and tracker.count:
+            record_request_queries(f"{request.method} {route.path}", tracker)
+        return response
+    finally:
+        current_route.reset(token)
+
 # === 路由器注册 ===
-app.include_router(auth)
-app.include_router(admin)
-app.include_router(projects)
-app.include_router(course_notes)
-app.include_router(dashboard)
-app.include_router(quick_notes)
-app.include_router(achievement_points)
-app.include_router(tts)
-app.include_router(llm)
-app.include_router(mcp)
-app.include_router(search_engine)
-app.include_router(courses)
-app.include_router(knowledge)
-app.include_router(forum)
-app.include_router(chatrooms)
-app.include_router(sharing)  # 新增分享功能路由
-# 收藏系统 - 基于文件夹的新架构（统一路由）
-app.include_router(collections_router)  # 新一代收藏管理系统
-app.include_router(program_collections_router)  # 统一收藏功能
-app.include_router(ai)
-app.include_router(ai_admin_router)  # AI管理路由
-app.include_router(ai_monitoring_router)  # AI监控路由
-app.include_router(recommend)
+for router_name in enabled_routers():
+    app.include_router(load_router(router_name))
 
 # === 认证配置 ===
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")  # 指向登录接口的URL
@@ -123,6 +115,34 @@ bearer_scheme = HTTPBearer(auto_error=False)
 @app.on_event("startup")
 async def startup_event():
     """应用启动事件"""
+    # 旧库补齐 folders.path/depth 列并回填物化路径（create_all 不会修改已存在的表）
+    from project.database import engine
+    from project.utils.core.folder_hierarchy import migrate_folder_hierarchy
+    try:
+        await asyncio.to_thread(migrate_folder_hierarchy, engine)
+    except Exception as e:
+        print(f"⚠️ 文件夹物化路径迁移失败: {e}")
+    
+    # 启动后台任务队列，恢复上次未完成的任务
+    from project.utils.async_cache.async_tasks import initialize_task_system
+    await initialize_task_system()
+    
+    # 定时重建推荐系统的物品相似度模型
+    from project.utils.recommendation.item_similarity import (
+        ITEM_SIMILARITY_REBUILD_HOURS, run_item_similarity_scheduler
+    )
+    if ITEM_SIMILARITY_REBUILD_HOURS > 0:
+        app.state.item_similarity_scheduler = asyncio.create_task(run_item_similarity_scheduler())
+    
+    # 定时把本进程的AI请求延迟草图推送到 Redis，供集群分位数汇总
+    from project.services.ai_monitoring_service import AI_SKETCH_PUSH_INTERVAL, ai_monitoring_service
+    if AI_SKETCH_PUSH_INTERVAL > 0:
+        app.state.sketch_publisher = asyncio.create_task(ai_monitoring_service.run_sketch_publisher())
+    
+    # 服务器开始监听后在后台预热 jieba 词典、sklearn 和内容索引
+    from project.utils.optimization.startup_warmup import start_warmup
+    app.state.startup_warmup = start_warmup()
+    
     # 打印启动完成信息
     print_startup_summary()
 
@@ -130,6 +150,23 @@ async def startup_event():
 @app.on_event("shutdown") 
 async def shutdown_event():
     """应用关闭事件"""
+    scheduler = getattr(app.state, "item_similarity_scheduler", None)
+    if scheduler is not None:
+        scheduler.cancel()
+    warmup = getattr(app.state, "startup_warmup", None)
+    if warmup is not None:
+        warmup.cancel()
+    publisher = getattr(app.state, "sketch_publisher", None)
+    if publisher is not None:
+        publisher.cancel()
+    from project.utils.async_cache.async_tasks import shutdown_task_system
+    await shutdown_task_system()
+    from project.utils.async_cache.redis_backend import close_async_redis_backends
+    await close_async_redis_backends()
+    from project.utils.optimization.query_fanout import shutdown_query_fanout
+    shutdown_query_fanout()
+    from project.database import dispose_async_engine
+    await dispose_async_engine()
     from project.utils.logging.startup_logger import restore_logging
     restore_logging()
     print("\n👋 应用已安全关闭")
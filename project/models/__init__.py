@@ -52,9 +52,12 @@ from .llm import (
 
 # ===== 成就和积分相关模型 =====
 from .achievement_points import (
-    Achievement, UserAchievement, PointTransaction
+    Achievement, UserAchievement, PointTransaction, UserActivityCounter
 )
 
+# ===== 仪表板相关模型 =====
+from .dashboard import UserDashboardSummary
+
 # ===== MCP配置相关模型 =====
 from .mcp import UserMcpConfig
 
@@ -111,7 +114,10 @@ __all__ = [
     'AIConversationTemporaryFile',
     
     # 成就和积分
-    'Achievement', 'UserAchievement', 'PointTransaction',
+    'Achievement', 'UserAchievement', 'PointTransaction', 'UserActivityCounter',
+    
+    # 仪表板
+    'UserDashboardSummary',
     
     # 配置
     'UserMcpConfig', 'UserSearchEngineConfig', 'UserTTSConfig',
@@ -169,3 +169,26 @@ class PointTransaction(Base):
 
     def __repr__(self):
         return f"<PointTransaction(user_id={self.user_id}, amount={self.amount}, type='{self.transaction_type}')>"
+
+
+class UserActivityCounter(Base):
+    """
+    用户活动计数器，按成就条件类型（criteria_type）存储累计值
+
+    由领域事件（发帖、被点赞、发消息、完成课程等）增量维护，
+    成就检查直接读取计数器，不再对业务表做聚合统计。
+    """
+    __tablename__ = "user_activity_counters"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    counter_type = Column(String, nullable=False, comment="计数类型，与 Achievement.criteria_type 对应")
+    value = Column(Integer, default=0, nullable=False, comment="累计值")
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        UniqueConstraint('user_id', 'counter_type', name='_user_activity_counter_uc'),
+    )
+
+    def __repr__(self):
+        return f"<UserActivityCounter(user_id={self.user_id}, type='{self.counter_type}', value={self.value})>"
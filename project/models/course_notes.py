@@ -1,6 +1,7 @@
 # project/models/course_notes.py
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, UniqueConstraint, BigInteger
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, UniqueConstraint, BigInteger, Index, event, select, update, literal, func as sa_func
+from sqlalchemy.orm import relationship, object_session
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.sql import func
 from pgvector.sqlalchemy import Vector
 from project.base import Base
@@ -54,6 +55,16 @@ class Folder(Base, TimestampMixin, OwnerMixin):
     order = Column(Integer, default=0, comment="排序")
     is_public = Column(Boolean, default=False, nullable=False, comment="是否公开: True(公开到全平台), False(私密)")
 
+    # 物化路径：根到自身的ID序列，如 "/1/5/9/"；由下方事件监听器在创建/移动时维护
+    # 深度、面包屑、子树和循环检查都可以基于 path 前缀单次索引查询完成
+    path = Column(String(1024), nullable=True, comment="物化路径，如 /1/5/9/")
+    depth = Column(Integer, default=0, server_default="0", nullable=False, comment="层级深度，根文件夹为0")
+
+    __table_args__ = (
+        # text_pattern_ops 使 PostgreSQL 在非C排序规则下也能用索引处理 LIKE 'prefix%'
+        Index("idx_folders_path", "path", postgresql_ops={"path": "text_pattern_ops"}),
+    )
+
     # START MODIFICATION FOR Folder relationships
     children = relationship(
         "Folder",
@@ -73,3 +84,82 @@ class Folder(Base, TimestampMixin, OwnerMixin):
     notes = relationship("Note", back_populates="folder", cascade="all, delete-orphan")
 
     owner = relationship("User", back_populates="folders")
+
+
+# --- 事件监听器：维护 Folder 的物化路径 ---
+def folder_path_ancestor_ids(path: str) -> list:
+    """从物化路径解析祖先ID列表（含自身，根在前）"""
+    return [int(part) for part in path.strip("/").split("/") if part] if path else []
+
+
+def _load_parent_path(connection, parent_id):
+    """读取父文件夹的 (path, depth)；父文件夹路径缺失时沿 parent_id 回溯补算"""
+    if parent_id is None:
+        return "/", -1
+    folders = Folder.__table__
+    row = connection.execute(
+        select(folders.c.path, folders.c.depth).where(folders.c.id == parent_id)
+    ).first()
+    if row is None:
+        return "/", -1
+    if row.path:
+        return row.path, row.depth
+
+    # 旧数据尚未回填 path，逐级回溯（仅在 rebuild 之前出现）
+    ids, current_id, visited = [], parent_id, set()
+    while current_id is not None and current_id not in visited:
+        visited.add(current_id)
+        ids.insert(0, current_id)
+        current_id = connection.execute(
+            select(folders.c.parent_id).where(folders.c.id == current_id)
+        ).scalar()
+    return "/" + "".join(f"{i}/" for i in ids), len(ids) - 1
+
+
+@event.listens_for(Folder, 'after_insert')
+def receive_after_insert_folder(mapper, connection, target: Folder):
+    """新建文件夹后根据父路径写入 path/depth（ID在插入后才可知）"""
+    parent_path, parent_depth = _load_parent_path(connection, target.parent_id)
+    path = f"{parent_path}{target.id}/"
+    depth = parent_depth + 1
+    folders = Folder.__table__
+    connection.execute(update(folders).where(folders.c.id == target.id).values(path=path, depth=depth))
+    set_committed_value(target, "path", path)
+    set_committed_value(target, "depth", depth)
+
+
+@event.listens_for(Folder, 'after_update')
+def receive_after_update_folder(mapper, connection, target: Folder):
+    """
+    parent_id 变化（移动文件夹）时用一条 UPDATE 重写整棵子树的 path 前缀和 depth
+    """
+    old_path = target.path
+    if not old_path:
+        return
+    ancestor_ids = folder_path_ancestor_ids(old_path)
+    old_parent_id = ancestor_ids[-2] if len(ancestor_ids) > 1 else None
+    if old_parent_id == target.parent_id:
+        return
+
+    parent_path, parent_depth = _load_parent_path(connection, target.parent_id)
+    new_path = f"{parent_path}{target.id}/"
+    if parent_path.startswith(old_path):
+        raise ValueError(f"不能将文件夹 {target.id} 移动到其子文件夹下")
+    depth_delta = (parent_depth + 1) - target.depth
+
+    folders = Folder.__table__
+    connection.execute(
+        update(folders)
+        .where(folders.c.path.like(f"{old_path}%"))
+        .values(
+            path=literal(new_path) + sa_func.substr(folders.c.path, len(old_path) + 1),
+            depth=folders.c.depth + depth_delta,
+        )
+    )
+
+    # 同步会话中已加载的子树对象，避免读到旧路径
+    session = object_session(target)
+    for obj in list(session.identity_map.values()) if session is not None else ():
+        if isinstance(obj, Folder) and obj.path and obj.path.startswith(old_path):
+            set_committed_value(obj, "path", new_path + obj.path[len(old_path):])
+            set_committed_value(obj, "depth", obj.depth + depth_delta)
@@ -0,0 +1,92 @@
+# project/models/dashboard.py
+from sqlalchemy import Column, Integer, String, Text, DateTime, Date, Float, ForeignKey, event, update
+from sqlalchemy.orm import attributes
+from sqlalchemy.sql import func
+from project.base import Base
+from project.models.collections import CollectedContent
+
+
+class UserDashboardSummary(Base):
+    """
+    用户仪表板概览（预聚合）
+
+    每个用户一行，各项统计由写入路径增量维护，仪表板接口按主键一次读取；
+    refreshed_at 为空或超过时效时由服务层全量重算。
+    """
+    __tablename__ = "user_dashboard_summaries"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+
+    # 项目
+    total_projects = Column(Integer, default=0, nullable=False, comment="参与的项目总数（创建或加入）")
+    created_projects = Column(Integer, default=0, nullable=False, comment="创建的项目数")
+    active_projects = Column(Integer, default=0, nullable=False, comment="进行中的项目数")
+    completed_projects = Column(Integer, default=0, nullable=False, comment="已完成的项目数")
+
+    # 课程
+    total_courses = Column(Integer, default=0, nullable=False, comment="选修课程总数")
+    learning_courses = Column(Integer, default=0, nullable=False, comment="学习中的课程数")
+    completed_courses = Column(Integer, default=0, nullable=False, comment="已完成的课程数")
+    course_progress_sum = Column(Float, default=0.0, nullable=False, comment="课程进度之和，用于计算平均进度")
+
+    # AI对话
+    total_ai_conversations = Column(Integer, default=0, nullable=False, comment="AI对话总数")
+    ai_conversations_today = Column(Integer, default=0, nullable=False, comment="ai_conversations_day 当天新建的对话数")
+    ai_conversations_day = Column(Date, nullable=True, comment="ai_conversations_today 对应的日期")
+
+    # 论坛与收藏
+    forum_topics_created = Column(Integer, default=0, nullable=False, comment="发布的话题数")
+    total_forum_likes = Column(Integer, default=0, nullable=False, comment="话题获得的点赞数")
+    collected_items = Column(Integer, default=0, nullable=False, comment="收藏内容数")
+
+    # 用户信息
+    resume_completion_percentage = Column(Float, default=0.0, nullable=False, comment="简历完成度")
+    user_level = Column(String, nullable=True, comment="用户等级")
+
+    # 最近活动（JSON），单独的刷新时间，过期后只重查活动列表
+    recent_activities = Column(Text, nullable=True, comment="最近活动JSON")
+    activities_refreshed_at = Column(DateTime, nullable=True, comment="最近活动刷新时间")
+
+    refreshed_at = Column(DateTime, nullable=True, comment="全量重算时间，为空表示需要重算")
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<UserDashboardSummary(user_id={self.user_id}, refreshed_at={self.refreshed_at})>"
+
+
+# ================== 收藏数的增量维护 ==================
+# 收藏内容的创建入口较多（单个收藏、星标、分享转存等），在ORM层统一维护 collected_items；
+# status 置为 "deleted" 即软删除。绕过ORM的批量语句由调用方自行调用 DashboardSummaryService。
+
+def _adjust_collected_items(connection, owner_id, delta: int):
+    if owner_id is None or not delta:
+        return
+    summaries = UserDashboardSummary.__table__
+    connection.execute(
+        update(summaries)
+        .where(summaries.c.user_id == owner_id)
+        .values(collected_items=summaries.c.collected_items + delta)
+    )
+
+
+@event.listens_for(CollectedContent, "after_insert")
+def _collected_content_inserted(mapper, connection, target):
+    if target.status != "deleted":
+        _adjust_collected_items(connection, target.owner_id, 1)
+
+
+@event.listens_for(CollectedContent, "after_update")
+def _collected_content_updated(mapper, connection, target):
+    history = attributes.get_history(target, "status")
+    if not history.has_changes():
+        return
+    was_deleted = bool(history.deleted) and history.deleted[0] == "deleted"
+    is_deleted = target.status == "deleted"
+    if was_deleted != is_deleted:
+        _adjust_collected_items(connection, target.owner_id, -1 if is_deleted else 1)
+
+
+@event.listens_for(CollectedContent, "after_delete")
+def _collected_content_deleted(mapper, connection, target):
+    if target.status != "deleted":
+        _adjust_collected_items(connection, target.owner_id, -1)
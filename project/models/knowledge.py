@@ -155,6 +155,16 @@ class KnowledgeDocument(Base, TimestampMixin, OwnerMixin):
 
 class KnowledgeDocumentChunk(Base):
     __tablename__ = "knowledge_document_chunks"
+    __table_args__ = (
+        Index('idx_kb_chunk_kb', 'kb_id'),
+        # 混合检索的向量近似检索（余弦距离）
+        Index(
+            'idx_kb_chunk_embedding_hnsw', 'embedding',
+            postgresql_using='hnsw',
+            postgresql_with={'m': 16, 'ef_construction': 64},
+            postgresql_ops={'embedding': 'vector_cosine_ops'}
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     document_id = Column(Integer, ForeignKey("knowledge_documents.id"), nullable=False)
@@ -2,7 +2,6 @@
 import os, io, asyncio
 from typing import Optional
 from fastapi import HTTPException
-import boto3
 from botocore.exceptions import ClientError, NoCredentialsError
 from dotenv import load_dotenv
 from functools import partial
@@ -31,6 +30,7 @@ def get_s3_client():
     """
     global _s3_client
     if _s3_client is None:
+        import boto3  # 首次使用时才导入（导入耗时约 0.2 秒）
         try:
             _s3_client = boto3.client(
                 's3',
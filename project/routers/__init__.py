@@ -1,34 +1,72 @@
 # project/routers/__init__.py
 """
 路由模块总导入
-这个文件负责从各个子包导入路由器，以便在main.py中统一导入
+这个文件负责登记各个子包的路由器，main.py 按 ROUTERS 的顺序挂载已启用的路由器
+
+路由器通过 load_router(名称) 导入，本模块不再预先导入任何子包；
+通过环境变量 ENABLED_ROUTERS / DISABLED_ROUTERS（逗号分隔的名称）关闭的路由器不会被导入
 """
 
-# 从各个子包导入路由器
-from .admin import router as admin
-from .ai import ai_router as ai  # 使用新的企业级AI路由作为主路由
-from .ai import ai_admin_router, ai_monitoring  # 导入AI管理和监控路由
-from .achievement_points import router as achievement_points
-from .auth import router as auth
-from .chatrooms import router as chatrooms
-from .course_notes import router as course_notes
-from .courses import router as courses
-from .dashboard import router as dashboard
-from .forum import router as forum
-from .knowledge import router as knowledge
-from .llm import router as llm
-from .mcp import router as mcp
-from .projects import router as projects
-from .quick_notes import router as quick_notes
-from .sharing import router as sharing
-from .recommend import router as recommend
-from .search_engine import router as search_engine
-from .tts import router as tts
-
-# 导出所有路由器
-__all__ = [
-    "admin", "ai", "ai_admin_router", "ai_monitoring", "achievement_points", "auth", "chatrooms", 
-    "course_notes", "courses", "dashboard", "forum", "knowledge",
-    "llm", "mcp", "projects", "quick_notes", "sharing", "recommend", 
-    "search_engine", "tts"
+import importlib
+import os
+from typing import List
+
+# 已启用的路由器名称，为空表示全部启用
+ENABLED_ROUTERS = os.getenv("ENABLED_ROUTERS", "")
+# 在启用列表基础上排除的路由器名称
+DISABLED_ROUTERS = os.getenv("DISABLED_ROUTERS", "")
+
+# (名称, 模块, 属性)，顺序即挂载顺序
+ROUTERS = [
+    ("auth", ".auth", "router"),
+    ("admin", ".admin", "router"),
+    ("projects", ".projects", "router"),
+    ("course_notes", ".course_notes", "router"),
+    ("dashboard", ".dashboard", "router"),
+    ("quick_notes", ".quick_notes", "router"),
+    ("achievement_points", ".achievement_points", "router"),
+    ("tts", ".tts", "router"),
+    ("llm", ".llm", "router"),
+    ("mcp", ".mcp", "router"),
+    ("search_engine", ".search_engine", "router"),
+    ("courses", ".courses", "router"),
+    ("knowledge", ".knowledge", "router"),
+    ("forum", ".forum", "router"),
+    ("chatrooms", ".chatrooms", "router"),
+    ("sharing", ".sharing", "router"),  # 分享功能
+    # 收藏系统 - 基于文件夹的新架构（统一路由）
+    ("collections", ".collections", "router"),  # 新一代收藏管理系统
+    ("program_collections", ".collections.program_collections", "router"),  # 统一收藏功能
+    ("ai", ".ai", "ai_router"),  # 使用新的企业级AI路由作为主路由
+    ("ai_admin_router", ".ai", "ai_admin_router"),  # AI管理路由
+    ("ai_monitoring_router", ".ai.ai_monitoring", "router"),  # AI监控路由
+    ("recommend", ".recommend", "router"),
 ]
+
+_LOCATIONS = {name: (module, attribute) for name, module, attribute in ROUTERS}
+
+
+def _names(value: str) -> List[str]:
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+def enabled_routers() -> List[str]:
+    """按挂载顺序返回已启用的路由器名称；未知名称会报错，避免配置拼写错误被静默忽略"""
+    enabled = _names(ENABLED_ROUTERS)
+    disabled = set(_names(DISABLED_ROUTERS))
+    unknown = (set(enabled) | disabled) - _LOCATIONS.keys()
+    if unknown:
+        raise ValueError(f"未知的路由器名称: {', '.join(sorted(unknown))}")
+    return [
+        name for name, _, _ in ROUTERS
+        if (not enabled or name in enabled) and name not in disabled
+    ]
+
+
+def load_router(name: str):
+    """导入并返回指定名称的路由器"""
+    module, attribute = _LOCATIONS[name]
+    return getattr(importlib.import_module(module, __name__), attribute)
+
+
+__all__ = ["ROUTERS", "enabled_routers", "load_router"]
@@ -118,6 +118,7 @@ async def initialize_achievements(
 @router.post("/users/{user_id}/check-achievements", summary="检查用户成就")
 async def check_user_achievements(
     user_id: int,
+    recount: bool = Query(False, description="是否重新统计活动计数器"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -128,14 +129,14 @@ async def check_user_achievements(
 
     with database_transaction(db):
         # 触发成就检查
-        await AchievementPointsUtils.trigger_achievement_check(db, user_id)
+        await AchievementPointsUtils.trigger_achievement_check(db, user_id, recount=recount)
         return {"message": "成就检查已完成"}
 
 
 @router.get("/leaderboard", summary="获取积分排行榜")
 async def get_points_leaderboard(
     limit: int = Query(10, ge=1, le=100, description="排行榜数量"),
-    period: str = Query("all_time", description="时间段 (all_time, monthly, weekly)"),
+    period: str = Query("all_time", regex="^(all_time|monthly|weekly)$", description="时间段 (all_time, monthly, weekly)"),
     db: Session = Depends(get_db)
 ):
     """获取积分排行榜"""
@@ -145,3 +146,26 @@ async def get_points_leaderboard(
             limit=limit,
             period=period
         )
+
+
+@router.get("/leaderboard/me", summary="获取我的排名")
+async def get_my_leaderboard_rank(
+    period: str = Query("all_time", regex="^(all_time|monthly|weekly)$", description="时间段 (all_time, monthly, weekly)"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """获取当前用户在积分排行榜中的名次"""
+    return AchievementPointsUtils.get_user_rank(db, current_user.id, period)
+
+
+@router.post("/leaderboard/rebuild", summary="重建积分排行榜")
+async def rebuild_points_leaderboard(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """根据积分交易历史重建总榜、月榜和周榜"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="需要管理员权限")
+
+    counts = AchievementPointsUtils.rebuild_points_leaderboard(db)
+    return {"message": "积分排行榜已重建", "ranked_users": counts}
@@ -13,6 +13,7 @@ import logging
 
 # 核心依赖
 from project.database import get_db
+from project.database_monitoring import get_sql_stats, reset_sql_stats
 from project.models import User
 from project.utils import is_admin_user
 import project.schemas as schemas
@@ -395,6 +396,25 @@ async def get_system_status(
     logger.info(f"管理员 {current_admin.id} 查看系统状态")
     return system_status
 
+@router.get("/system/sql-stats", summary="SQL查询统计")
+@optimized_route("SQL查询统计")
+async def get_system_sql_stats(
+    limit: int = Query(20, ge=1, le=200),
+    sort_by: str = Query("queries_avg", regex="^(queries_avg|queries_max|db_ms_avg|db_ms_max|n_plus_one_requests)$"),
+    current_admin: User = Depends(is_admin_user)
+):
+    """按接口汇总的SQL语句数、数据库耗时和 N+1 查询，以及最近的慢查询"""
+    return get_sql_stats(limit=limit, sort_by=sort_by)
+
+@router.delete("/system/sql-stats", status_code=status.HTTP_204_NO_CONTENT, summary="清空SQL查询统计")
+@optimized_route("清空SQL查询统计")
+async def clear_system_sql_stats(
+    current_admin: User = Depends(is_admin_user)
+):
+    """清空SQL查询统计（例如修复 N+1 查询后重新观察）"""
+    reset_sql_stats()
+    logger.info(f"管理员 {current_admin.id} 清空SQL查询统计")
+
 @router.get("/rag/status", summary="RAG功能状态检查")
 @optimized_route("RAG状态检查")
 async def get_rag_status(
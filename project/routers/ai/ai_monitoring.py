@@ -4,7 +4,7 @@ AI监控路由
 """
 
 import asyncio
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
 
 from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect, Query, HTTPException
@@ -181,14 +181,42 @@ async def get_error_stats():
         raise HTTPException(status_code=500, detail="获取错误统计失败")
 
 
+@router.get("/metrics/percentiles", summary="获取AI请求延迟分位数")
+async def get_latency_percentiles(
+    window: str = Query("5m", regex="^(1m|5m|1h)$"),
+    scope: str = Query("cluster", regex="^(cluster|local)$")
+):
+    """按 provider|model|metric 返回 count/mean/p50/p90/p95/p99；cluster 合并所有工作进程推送到 Redis 的草图"""
+    try:
+        if scope == "cluster":
+            from project.utils.async_cache.redis_backend import get_async_redis_client
+            redis_client = get_async_redis_client(decode_responses=False)
+            if redis_client is not None:
+                # 先推送本进程的最新草图，汇总结果不落后一个推送周期
+                await ai_monitoring_service.publish_sketches(redis_client)
+                percentiles = await ai_monitoring_service.get_cluster_percentiles(redis_client, window)
+                return {"scope": "cluster", "window": window, "percentiles": percentiles}
+        return {
+            "scope": "local",
+            "window": window,
+            "percentiles": ai_monitoring_service.get_local_percentiles(window)
+        }
+    except Exception as e:
+        logger.error(f"Failed to get latency percentiles: {e}")
+        raise HTTPException(status_code=500, detail="获取延迟分位数失败")
+
+
 @router.post("/metrics/record", summary="记录请求指标")
 async def record_request_metrics(
     response_time: float,
-    success: bool = True
+    success: bool = True,
+    provider: str = "unknown",
+    model: str = "unknown",
+    tokens: Optional[int] = None
 ):
     """记录请求指标（供内部调用）"""
     try:
-        ai_monitoring_service.record_request(response_time, success)
+        ai_monitoring_service.record_request(response_time, success, provider=provider, model=model, tokens=tokens)
         return {"success": True, "message": "指标记录成功"}
     except Exception as e:
         logger.error(f"Failed to record metrics: {e}")
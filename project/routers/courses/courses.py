@@ -14,10 +14,11 @@ import logging
 from project.database import get_db
 from project.models import Course, UserCourse, User, CourseLike, CourseMaterial
 import project.schemas as schemas, project.oss_utils as oss_utils
-from project.utils import (get_resource_or_404, debug_operation, _award_points, _check_and_award_achievements)
+from project.utils import (get_resource_or_404, debug_operation, _award_points, record_achievement_event)
 
 # 导入新的服务层和错误处理
 from project.services.course_service import CourseService, CourseUtils, MaterialUtils
+from project.services.dashboard_summary_service import DashboardSummaryService
 from project.utils.core.error_decorators import handle_database_errors, database_transaction, safe_db_operation
 
 # 导入优化装饰器
@@ -174,6 +175,12 @@ def enroll_course(
             db.add(enrollment)
             db.flush()
             db.refresh(enrollment)
+            DashboardSummaryService.apply_delta(
+                db, current_user_id,
+                **DashboardSummaryService.course_deltas(
+                    None, enrollment.status, new_progress=enrollment.progress, enrolled=True
+                )
+            )
 
     logger.info(f"用户 {current_user_id} 成功报名课程 {course_id}")
     return enrollment
@@ -480,6 +487,7 @@ async def update_user_course_progress(
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="用户未注册该课程")
 
         old_status = user_course.status
+        old_progress = user_course.progress
         new_status = update_data.get("status")
 
         # 更新进度和状态
@@ -490,6 +498,12 @@ async def update_user_course_progress(
 
         user_course.last_accessed = func.now()
         db.add(user_course)
+        DashboardSummaryService.apply_delta(
+            db, current_user_id,
+            **DashboardSummaryService.course_deltas(
+                old_status, user_course.status, old_progress, user_course.progress
+            )
+        )
 
         # 处理课程完成奖励
         if new_status == "completed" and old_status != "completed":
@@ -506,7 +520,7 @@ async def update_user_course_progress(
                     related_entity_type="course",
                     related_entity_id=course_id
                 )
-                await _check_and_award_achievements(db, current_user_id)
+                await record_achievement_event(db, current_user_id, "course_completed")
                 print(f"DEBUG: 用户完成课程，获得30积分并检查成就")
 
         db.commit()
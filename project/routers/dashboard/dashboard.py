@@ -18,6 +18,7 @@ import logging
 
 # 核心依赖
 from project.database import get_db
+from project.models import User
 from project.utils import get_current_user_id
 import project.schemas as schemas
 
@@ -29,6 +30,7 @@ from project.utils.core.error_decorators import handle_database_errors, database
 from project.utils.optimization.router_optimization import optimized_route, router_optimizer
 from project.utils.async_cache.async_tasks import submit_background_task, TaskPriority
 from project.utils.optimization.production_utils import cache_manager
+from project.utils.optimization.query_fanout import get_query_timing_stats
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/dashboard", tags=["智能仪表板"])
@@ -113,7 +115,7 @@ async def get_user_analytics(
     days = time_map[time_range]
     
     # 获取分析数据
-    analytics_data = DashboardAnalyticsService.get_user_analytics_optimized(
+    analytics_data = await DashboardAnalyticsService.get_user_analytics_optimized(
         db, current_user_id, days
     )
     
@@ -128,13 +130,25 @@ async def get_productivity_metrics(
 ):
     """获取生产力指标 - 优化版本"""
     
-    productivity_data = DashboardAnalyticsService.get_productivity_metrics_optimized(
+    productivity_data = await DashboardAnalyticsService.get_productivity_metrics_optimized(
         db, current_user_id
     )
     
     logger.info(f"用户 {current_user_id} 查看生产力指标")
     return productivity_data
 
+@router.get("/query-timings", response_model=Dict[str, Any], summary="获取仪表板查询耗时统计")
+async def get_dashboard_query_timings(
+    current_user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db)
+):
+    """按接口汇总的查询耗时：wall 为接口实际等待时间，sum 为各查询耗时之和（串行执行时的延迟）"""
+    user = db.get(User, current_user_id)
+    if not user or not user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="需要管理员权限")
+    
+    return get_query_timing_stats()
+
 # ===== 项目仪表板路由 =====
 
 @router.get("/projects", response_model=List[schemas.DashboardProjectCard], summary="获取项目仪表板")
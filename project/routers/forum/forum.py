@@ -3,7 +3,6 @@
 论坛模块优化版本 - 应用统一优化模式
 基于courses模块的成功优化经验
 """
-import asyncio
 from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Form, Query, BackgroundTasks
 from sqlalchemy.orm import Session
 from sqlalchemy import desc
@@ -12,9 +11,9 @@ from datetime import datetime
 import logging
 
 # 核心依赖
-from project.database import get_db
+from project.database import get_db, run_db
 from project.models import User, ForumTopic, ForumLike, ForumComment, UserFollow
-from project.utils import get_current_user_id
+from project.utils import get_current_user_id, record_achievement_event
 import project.schemas as schemas
 
 # 优化工具导入
@@ -25,6 +24,7 @@ from project.utils.core.error_decorators import database_transaction
 from project.utils.optimization.router_optimization import optimized_route, router_optimizer
 from project.utils.async_cache.async_tasks import submit_background_task, TaskPriority
 from project.utils.optimization.production_utils import cache_manager
+from project.services.dashboard_summary_service import DashboardSummaryService
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/forum", tags=["forum"])
@@ -54,6 +54,10 @@ async def create_topic(
     # 使用事务创建话题
     with database_transaction(db):
         topic = ForumService.create_topic_optimized(db, topic_data, current_user_id)
+        await record_achievement_event(db, current_user_id, "forum_topic_created")
+        DashboardSummaryService.apply_delta(
+            db, current_user_id, refresh_activities=True, forum_topics_created=1
+        )
         
         # 处理文件上传（异步）
         if files and files[0].filename:
@@ -87,12 +91,17 @@ async def get_topics(
 ):
     """获取话题列表 - 优化版本"""
     
-    topics, total = ForumService.get_topics_list_optimized(
-        db, skip, limit, category, search, sort_by
-    )
+    def list_topics(session: Session):
+        topics, total = ForumService.get_topics_list_optimized(
+            session, skip, limit, category, search, sort_by
+        )
+        return [ForumUtils.format_topic_response(topic, include_content=False) for topic in topics], total
+    
+    # 查询和格式化在事件循环之外执行
+    items, total = await run_db(db, list_topics)
     
     return {
-        "items": [ForumUtils.format_topic_response(topic, include_content=False) for topic in topics],
+        "items": items,
         "total": total,
         "skip": skip,
         "limit": limit
@@ -266,7 +275,7 @@ async def update_comment(
         db.refresh(comment)
         
         # 清除相关缓存
-        asyncio.create_task(cache_manager.delete_pattern(f"topic:{comment.topic_id}:comments:*"))
+        cache_manager.delete_pattern(f"topic:{comment.topic_id}:comments:*")
     
     logger.info(f"用户 {current_user_id} 更新评论 {comment_id} 成功")
     return ForumUtils.format_comment_response(comment)
@@ -308,8 +317,8 @@ async def delete_comment(
             db.flush()
         
         # 清除相关缓存
-        asyncio.create_task(cache_manager.delete_pattern(f"topic:{comment.topic_id}:comments:*"))
-        asyncio.create_task(cache_manager.delete_pattern(f"topic:{comment.topic_id}:detail"))
+        cache_manager.delete_pattern(f"topic:{comment.topic_id}:comments:*")
+        cache_manager.delete_pattern(f"topic:{comment.topic_id}:detail")
     
     logger.info(f"用户 {current_user_id} 删除评论 {comment_id} 成功")
 
@@ -329,6 +338,17 @@ async def toggle_like(
         result = ForumLikeService.toggle_like_optimized(
             db, target_type, target_id, current_user_id
         )
+        if result.get("target_owner_id"):
+            await record_achievement_event(
+                db,
+                result["target_owner_id"],
+                "forum_like_received" if result["action"] == "liked" else "forum_like_removed"
+            )
+            if target_type == "topic":
+                DashboardSummaryService.apply_delta(
+                    db, result["target_owner_id"],
+                    total_forum_likes=1 if result["action"] == "liked" else -1
+                )
     
     logger.info(f"用户 {current_user_id} {result['action']} {target_type} {target_id}")
     return result
@@ -380,8 +400,8 @@ async def toggle_follow(
         db.flush()
         
         # 清除相关缓存
-        asyncio.create_task(cache_manager.delete_pattern(f"user:{current_user_id}:follows:*"))
-        asyncio.create_task(cache_manager.delete_pattern(f"user:{target_user_id}:followers:*"))
+        cache_manager.delete_pattern(f"user:{current_user_id}:follows:*")
+        cache_manager.delete_pattern(f"user:{target_user_id}:followers:*")
     
     logger.info(f"用户 {current_user_id} {action} 用户 {target_user_id}")
     return {"action": action, "target_user_id": target_user_id}
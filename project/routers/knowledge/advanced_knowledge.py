@@ -246,12 +246,13 @@ async def initialize_monitoring(
 @router.get("/monitoring/metrics/{metric_name}/history", summary="获取指标历史")
 async def get_metric_history(
     metric_name: str,
-    hours: int = Query(default=1, ge=1, le=168, description="时间范围(小时)")
+    hours: int = Query(default=1, ge=1, le=720, description="时间范围(小时)"),
+    step: Optional[int] = Query(default=None, ge=1, description="数据点间隔(秒)，默认按时间范围自动选择")
 ):
     """获取指标历史数据"""
     try:
         time_range = timedelta(hours=hours)
-        history = await enhanced_monitoring_service.get_metric_history(metric_name, time_range)
+        history = await enhanced_monitoring_service.get_metric_history(metric_name, time_range, step=step)
         
         return {
             "success": True,
@@ -12,6 +12,8 @@
 
 import asyncio
 import logging
+import os
+import uuid
 from datetime import datetime
 from typing import List, Optional, Dict, Any
 
@@ -36,7 +38,7 @@ from project.services.knowledge_service import (
 # 优化工具
 from project.utils.core.error_decorators import handle_database_errors, database_transaction
 from project.utils.optimization.router_optimization import optimized_route
-from project.utils.async_cache.async_tasks import submit_background_task, TaskPriority
+from project.utils.async_cache.async_tasks import submit_background_task, offload_task_payload, TaskPriority
 from project.utils.optimization.production_utils import cache_manager, validate_file_upload
 
 # 配置日志和路由器
@@ -183,7 +185,7 @@ async def get_knowledge_base_stats(
 ):
     """获取知识库统计信息 - 优化版本"""
     
-    stats = KnowledgeBaseService.get_knowledge_base_stats_optimized(db, kb_id, current_user_id)
+    stats = await KnowledgeBaseService.get_knowledge_base_stats_optimized(db, kb_id, current_user_id)
     return stats
 
 # ==================== 文档管理功能 ====================
@@ -210,6 +212,7 @@ async def upload_document(
     
     doc_data = KnowledgeUtils.validate_document_data({
         "title": title or file.filename,
+        "file_name": file.filename,
         "content_type": content_type,
         "file_size": len(file_content),
         "mime_type": file.content_type
@@ -218,20 +221,33 @@ async def upload_document(
     # 使用事务创建文档
     with database_transaction(db):
         doc = KnowledgeDocumentService.create_document_optimized(db, kb_id, doc_data, current_user_id)
-        
-        # 异步处理文件上传和内容提取
-        submit_background_task(
-            background_tasks,
-            "process_document_upload",
-            {
-                "doc_id": doc.id,
-                "kb_id": kb_id,
-                "file_content": file_content,
-                "filename": file.filename,
-                "content_type": content_type
-            },
-            priority=TaskPriority.HIGH
-        )
+    
+    # 文档记录提交后再暂存文件内容，任务负载只携带引用；对象存储故障只把文档标记为失败
+    try:
+        file_ref = await offload_task_payload(file_content, file.filename, file.content_type)
+    except Exception as e:
+        logger.error(f"文档 {doc.id} 文件暂存失败: {e}")
+        with database_transaction(db):
+            doc.status = "failed"
+            doc.processing_message = "文件暂存失败，请重新上传"
+        return KnowledgeUtils.format_document_response(doc)
+    
+    # 异步处理文件上传和内容提取
+    submit_background_task(
+        background_tasks,
+        "process_document_upload",
+        {
+            "doc_id": doc.id,
+            "kb_id": kb_id,
+            "owner_id": current_user_id,
+            "file_ref": file_ref,
+            "filename": file.filename,
+            "mime_type": file.content_type,
+            # 固定对象键，任务重试时覆盖同一对象
+            "object_key": f"knowledge/{kb_id}/{doc.id}/{uuid.uuid4().hex}{os.path.splitext(file.filename)[1].lower()}"
+        },
+        priority=TaskPriority.HIGH
+    )
     
     logger.info(f"用户 {current_user_id} 在知识库 {kb_id} 上传文档 {doc.id}")
     return KnowledgeUtils.format_document_response(doc)
@@ -274,6 +290,7 @@ async def add_url_content(
             {
                 "doc_id": doc.id,
                 "kb_id": kb_id,
+                "owner_id": current_user_id,
                 "url": url
             },
             priority=TaskPriority.MEDIUM
@@ -387,15 +404,16 @@ async def search_knowledge(
     q: str = Query(..., min_length=2, description="搜索关键词"),
     content_types: Optional[List[str]] = Query(None, description="内容类型过滤"),
     limit: int = Query(20, ge=1, le=100),
-    use_ai: bool = Query(True, description="是否使用AI搜索"),
+    use_ai: bool = Query(True, description="是否使用AI搜索（关键词与向量混合检索）"),
+    rerank: bool = Query(False, description="是否使用重排模型对结果重新排序"),
     current_user_id: int = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
-    """智能搜索 - 优化版本"""
+    """智能搜索 - 返回文档块级别的命中与高亮片段"""
     
-    # 执行搜索
-    search_result = KnowledgeSearchService.search_knowledge_optimized(
-        db, kb_id, q, current_user_id, content_types, limit, use_ai
+    # 执行搜索（数据库访问在事件循环之外执行）
+    search_result = await KnowledgeSearchService.search_knowledge_optimized(
+        db, kb_id, q, current_user_id, content_types, limit, use_ai, rerank
     )
     
     # 异步记录搜索日志
@@ -406,7 +424,7 @@ async def search_knowledge(
             "user_id": current_user_id,
             "kb_id": kb_id,
             "query": q,
-            "result_count": search_result["total_results"],
+            "result_count": search_result["total"],
             "from_cache": search_result.get("from_cache", False)
         },
         priority=TaskPriority.LOW
@@ -440,7 +458,7 @@ async def get_knowledge_analytics(
     analytics = {
         "kb_id": kb_id,
         "period_days": days,
-        "basic_stats": KnowledgeBaseService.get_knowledge_base_stats_optimized(db, kb_id, current_user_id),
+        "basic_stats": await KnowledgeBaseService.get_knowledge_base_stats_optimized(db, kb_id, current_user_id),
         "growth_trend": [],  # 可以扩展添加增长趋势分析
         "popular_content_types": [],  # 可以扩展添加热门内容类型
         "search_trends": [],  # 可以扩展添加搜索趋势
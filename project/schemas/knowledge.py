@@ -5,7 +5,7 @@
 """
 
 from pydantic import BaseModel, Field, model_validator
-from typing import Optional, List, Literal, Any
+from typing import Optional, List, Literal, Any, Dict
 from datetime import datetime
 
 # ===== 知识库基础Schema =====
@@ -140,6 +140,11 @@ class KnowledgeSearchResult(BaseModel):
     url: Optional[str] = Field(None, description="URL地址")
     thumbnail_path: Optional[str] = Field(None, description="缩略图路径")
     file_size: Optional[int] = Field(None, description="文件大小")
+    chunk_id: Optional[int] = Field(None, description="命中的文档块ID")
+    chunk_index: Optional[int] = Field(None, description="文档块在文档中的序号")
+    highlights: List[str] = Field([], description="包含查询词的高亮片段，查询词以<em></em>标记")
+    score: Optional[float] = Field(None, description="融合（或重排）后的相关度分数")
+    ranks: Optional[Dict[str, Optional[int]]] = Field(None, description="各检索器中的排名（keyword/vector）")
     created_at: datetime
     updated_at: Optional[datetime] = None
 
@@ -153,6 +158,8 @@ class KnowledgeSearchResponse(BaseModel):
     search_mode: Optional[str] = Field("basic", description="搜索模式")
     content_type_filter: Optional[str] = Field(None, description="内容类型筛选")
     status_filter: Optional[str] = Field(None, description="状态筛选")
+    timings_ms: Optional[Dict[str, float]] = Field(None, description="各检索步骤耗时（毫秒）")
+    from_cache: Optional[bool] = Field(False, description="是否来自缓存")
 
     class Config:
         from_attributes = True
@@ -1,6 +1,6 @@
 # project/services/achievement_points_service.py
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, func, and_
+from sqlalchemy import func, and_, case
 from typing import List, Optional, Dict, Any, Tuple
 import logging
 from datetime import datetime, timezone
@@ -10,15 +10,17 @@ from project.models.achievement_points import (
     Achievement, UserAchievement, PointTransaction, DEFAULT_ACHIEVEMENTS
 )
 from project.models.auth import User
-from project.utils.core.common_utils import _check_and_award_achievements
+from project.utils.core.common_utils import _check_and_award_achievements, _award_points
 from project.utils.async_cache.cache_manager import get_cache_manager_instance
+from project.utils.async_cache.leaderboard import (
+    points_leaderboard, period_start, PERIODS, PERIOD_ALL_TIME, PERIOD_MONTHLY, PERIOD_WEEKLY
+)
 
 # 获取缓存管理器实例
 cache_manager = get_cache_manager_instance()
 
 logger = logging.getLogger(__name__)
 
-
 class AchievementPointsService:
     """成就积分综合服务类"""
 
@@ -245,7 +247,7 @@ class AchievementPointsService:
         cache_key = f"achievement_definitions:{page}:{page_size}:{active_only}"
         
         # 尝试从缓存获取
-        cached_result = await cache_manager.get(cache_key)
+        cached_result = await cache_manager.aget(cache_key)
         if cached_result:
             logger.debug(f"从缓存获取成就定义: page={page}")
             return cached_result
@@ -287,7 +289,7 @@ class AchievementPointsService:
         }
         
         # 缓存结果
-        await cache_manager.set(cache_key, result, ttl=300)  # 5分钟缓存
+        await cache_manager.aset(cache_key, result, expire=300)  # 5分钟缓存
         
         logger.info(f"获取成就定义列表: page={page}, total={total}")
         return result
@@ -313,7 +315,7 @@ class AchievementPointsService:
         cache_key = f"user_points:{user_id}:{include_history}"
         
         # 尝试从缓存获取
-        cached_result = await cache_manager.get(cache_key)
+        cached_result = await cache_manager.aget(cache_key)
         if cached_result:
             logger.debug(f"从缓存获取用户积分: user_id={user_id}")
             return cached_result
@@ -366,7 +368,7 @@ class AchievementPointsService:
                 result["last_updated"] = history[0].created_at.isoformat()
         
         # 缓存结果
-        await cache_manager.set(cache_key, result, ttl=60)  # 1分钟缓存
+        await cache_manager.aset(cache_key, result, expire=60)  # 1分钟缓存
         
         logger.info(f"获取用户积分信息: user_id={user_id}, points={user.total_points}")
         return result
@@ -396,7 +398,7 @@ class AchievementPointsService:
         cache_key = f"points_history:{user_id}:{page}:{page_size}:{action_filter}"
         
         # 尝试从缓存获取
-        cached_result = await cache_manager.get(cache_key)
+        cached_result = await cache_manager.aget(cache_key)
         if cached_result:
             logger.debug(f"从缓存获取积分历史: user_id={user_id}, page={page}")
             return cached_result
@@ -443,7 +445,7 @@ class AchievementPointsService:
         }
         
         # 缓存结果
-        await cache_manager.set(cache_key, result, ttl=180)  # 3分钟缓存
+        await cache_manager.aset(cache_key, result, expire=180)  # 3分钟缓存
         
         logger.info(f"获取积分历史: user_id={user_id}, page={page}, total={total}")
         return result
@@ -469,7 +471,7 @@ class AchievementPointsService:
         cache_key = f"user_achievements:{user_id}:{include_locked}"
         
         # 尝试从缓存获取
-        cached_result = await cache_manager.get(cache_key)
+        cached_result = await cache_manager.aget(cache_key)
         if cached_result:
             logger.debug(f"从缓存获取用户成就: user_id={user_id}")
             return cached_result
@@ -532,7 +534,7 @@ class AchievementPointsService:
             result["locked_achievements"] = locked_achievements
         
         # 缓存结果
-        await cache_manager.set(cache_key, result, ttl=120)  # 2分钟缓存
+        await cache_manager.aset(cache_key, result, expire=120)  # 2分钟缓存
         
         logger.info(f"获取用户成就: user_id={user_id}, achieved={achieved_count}/{total_achievements}")
         return result
@@ -566,12 +568,14 @@ class PointsService:
         Returns:
             User: 更新后的用户对象
         """
-        from project.utils.core.common_utils import _award_points_to_user
-        
-        # 使用现有的积分奖励功能
-        transaction = _award_points_to_user(
+        user = db.query(User).filter(User.id == user_id).first()
+        if not user:
+            raise ValueError(f"用户 {user_id} 不存在")
+
+        # 使用现有的积分奖励功能（提交后同步到排行榜）
+        transaction = await _award_points(
             db=db,
-            user_id=user_id,
+            user=user,
             amount=points,
             reason=reason,
             transaction_type="EARN",
@@ -585,8 +589,8 @@ class PointsService:
         user = db.query(User).filter(User.id == user_id).first()
         
         # 清除相关缓存
-        await cache_manager.delete(f"user_points:{user_id}:*")
-        await cache_manager.delete(f"points_history:{user_id}:*")
+        await cache_manager.adelete_pattern(f"user_points:{user_id}:*")
+        await cache_manager.adelete_pattern(f"points_history:{user_id}:*")
 
         logger.info(f"用户 {user_id} 获得 {points} 积分, 原因: {reason}")
         return user
@@ -616,8 +620,6 @@ class PointsService:
         Returns:
             User: 更新后的用户对象
         """
-        from project.utils.core.common_utils import _award_points_to_user
-        
         # 检查用户是否存在以及积分是否足够
         user = db.query(User).filter(User.id == user_id).first()
         if not user:
@@ -627,9 +629,9 @@ class PointsService:
             raise ValueError(f"用户 {user_id} 积分不足")
 
         # 使用现有的积分系统扣除积分（负数）
-        transaction = _award_points_to_user(
+        transaction = await _award_points(
             db=db,
-            user_id=user_id,
+            user=user,
             amount=-points,
             reason=reason,
             transaction_type="SPEND",
@@ -643,8 +645,8 @@ class PointsService:
         user = db.query(User).filter(User.id == user_id).first()
 
         # 清除相关缓存
-        await cache_manager.delete(f"user_points:{user_id}:*")
-        await cache_manager.delete(f"points_history:{user_id}:*")
+        await cache_manager.adelete_pattern(f"user_points:{user_id}:*")
+        await cache_manager.adelete_pattern(f"points_history:{user_id}:*")
 
         logger.info(f"用户 {user_id} 消耗 {points} 积分, 原因: {reason}")
         return user
@@ -654,19 +656,20 @@ class AchievementPointsUtils:
     """成就积分工具类"""
 
     @staticmethod
-    async def trigger_achievement_check(db: Session, user_id: int):
+    async def trigger_achievement_check(db: Session, user_id: int, recount: bool = False):
         """
         触发成就检查
         
         Args:
             db: 数据库会话
             user_id: 用户ID
+            recount: 是否先用业务表全量统计校正活动计数器
         """
         try:
-            await _check_and_award_achievements(db, user_id)
+            await _check_and_award_achievements(db, user_id, recount=recount)
             
             # 清除用户成就缓存
-            await cache_manager.delete(f"user_achievements:{user_id}:*")
+            await cache_manager.adelete_pattern(f"user_achievements:{user_id}:*")
             
             logger.info(f"为用户 {user_id} 触发成就检查")
         except Exception as e:
@@ -706,11 +709,62 @@ class AchievementPointsUtils:
             "completed": current >= target
         }
 
+    @staticmethod
+    def rebuild_points_leaderboard(db: Session) -> Dict[str, int]:
+        """
+        从积分数据一次性重建总榜、月榜和周榜
+        
+        总榜取 User.total_points；月榜/周榜用一条带条件求和的分组查询统计当前周期内获得的积分。
+        
+        Args:
+            db: 数据库会话
+            
+        Returns:
+            Dict[str, int]: 各周期上榜人数
+        """
+        all_time = {
+            user_id: total_points
+            for user_id, total_points in db.query(User.id, User.total_points).filter(User.total_points > 0)
+        }
+
+        month_start = period_start(PERIOD_MONTHLY)
+        week_start = period_start(PERIOD_WEEKLY)
+        rows = db.query(
+            PointTransaction.user_id,
+            func.sum(case((PointTransaction.created_at >= month_start, PointTransaction.amount), else_=0)),
+            func.sum(case((PointTransaction.created_at >= week_start, PointTransaction.amount), else_=0))
+        ).filter(
+            PointTransaction.amount > 0,
+            PointTransaction.created_at >= min(month_start, week_start)
+        ).group_by(PointTransaction.user_id).all()
+
+        scores = {
+            PERIOD_ALL_TIME: all_time,
+            PERIOD_MONTHLY: {user_id: monthly for user_id, monthly, _ in rows if monthly},
+            PERIOD_WEEKLY: {user_id: weekly for user_id, _, weekly in rows if weekly},
+        }
+        for period, period_scores in scores.items():
+            points_leaderboard.replace(period, period_scores)
+
+        result = {period: len(period_scores) for period, period_scores in scores.items()}
+        logger.info(f"重建积分排行榜完成: {result}")
+        return result
+
+    @staticmethod
+    def _ensure_points_leaderboard(db: Session, period: str):
+        """
+        当前周期的排行榜未经全量重建时（冷启动、Redis清空或进入新周期）重建一次
+        
+        不能以键是否存在判断：重建前的积分变动会用 ZADD/ZINCRBY 建出只含少数成员的键
+        """
+        if not points_leaderboard.is_built(period):
+            AchievementPointsUtils.rebuild_points_leaderboard(db)
+
     @staticmethod
     async def get_leaderboard(
         db: Session,
         limit: int = 10,
-        period: str = "all_time"
+        period: str = PERIOD_ALL_TIME
     ) -> List[Dict[str, Any]]:
         """
         获取积分排行榜
@@ -723,44 +777,64 @@ class AchievementPointsUtils:
         Returns:
             List[Dict[str, Any]]: 排行榜数据
         """
-        # 构建缓存键
-        cache_key = f"points_leaderboard:{limit}:{period}"
-        
-        # 尝试从缓存获取
-        cached_result = await cache_manager.get(cache_key)
-        if cached_result:
-            logger.debug(f"从缓存获取积分排行榜: period={period}")
-            return cached_result
+        if period not in PERIODS:
+            raise ValueError(f"不支持的排行榜周期: {period}")
 
-        # 查询用户积分信息，按总积分排序
-        query = db.query(User).filter(
-            User.total_points > 0
-        ).order_by(
-            desc(User.total_points)
-        ).limit(limit)
+        AchievementPointsUtils._ensure_points_leaderboard(db, period)
+        ranking = points_leaderboard.top(period, limit)
+        if not ranking:
+            return []
 
-        users = query.all()
-        
-        # 构建排行榜数据
-        leaderboard = []
-        for rank, user in enumerate(users, 1):
-            # 计算用户的总获得积分
-            lifetime_earned = db.query(func.sum(PointTransaction.amount)).filter(
-                PointTransaction.user_id == user.id,
+        # 用户信息和累计获得积分各一次批量查询
+        user_ids = [user_id for user_id, _ in ranking]
+        users = {user.id: user for user in db.query(User).filter(User.id.in_(user_ids))}
+        lifetime_earned = dict(
+            db.query(PointTransaction.user_id, func.sum(PointTransaction.amount)).filter(
+                PointTransaction.user_id.in_(user_ids),
                 PointTransaction.amount > 0
-            ).scalar() or 0
-            
+            ).group_by(PointTransaction.user_id).all()
+        )
+
+        leaderboard = []
+        for rank, (user_id, score) in enumerate(ranking, 1):
+            user = users.get(user_id)
+            if user is None:
+                continue
             leaderboard.append({
                 "rank": rank,
                 "user_id": user.id,
                 "username": user.username,
                 "avatar_url": user.avatar_url,
                 "total_points": user.total_points,
-                "lifetime_earned": lifetime_earned
+                "period_points": int(score),
+                "lifetime_earned": lifetime_earned.get(user_id) or 0
             })
-        
-        # 缓存结果
-        await cache_manager.set(cache_key, leaderboard, ttl=600)  # 10分钟缓存
-        
+
         logger.info(f"获取积分排行榜: period={period}, count={len(leaderboard)}")
         return leaderboard
+
+    @staticmethod
+    def get_user_rank(db: Session, user_id: int, period: str = PERIOD_ALL_TIME) -> Dict[str, Any]:
+        """
+        获取用户在排行榜中的名次
+        
+        Args:
+            db: 数据库会话
+            user_id: 用户ID
+            period: 时间段 (all_time, monthly, weekly)
+            
+        Returns:
+            Dict[str, Any]: 名次信息，未上榜时 rank 为 None
+        """
+        if period not in PERIODS:
+            raise ValueError(f"不支持的排行榜周期: {period}")
+
+        AchievementPointsUtils._ensure_points_leaderboard(db, period)
+        ranked = points_leaderboard.rank(period, user_id)
+        return {
+            "user_id": user_id,
+            "period": period,
+            "rank": ranked[0] if ranked else None,
+            "points": int(ranked[1]) if ranked else 0,
+            "total_ranked": points_leaderboard.size(period)
+        }
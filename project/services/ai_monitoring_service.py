@@ -4,8 +4,10 @@ AI监控服务
 """
 
 import asyncio
+import os
 import time
 import json
+import socket
 from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
 from collections import defaultdict
@@ -21,6 +23,9 @@ from project.models import User, AIConversation, AIConversationMessage
 # AI提供者集成
 from project.ai_providers.provider_manager import AIProviderManager
 
+# 可合并的分位数草图
+from project.utils.monitoring.quantile_sketch import SketchRegistry
+
 # 企业级日志和监控
 try:
     from logs.ai_providers.ai_logger import get_ai_logger
@@ -35,6 +40,10 @@ except ImportError:
     ENTERPRISE_MONITORING = False
 
 
+# 本进程分位数草图推送到 Redis 的间隔（秒），需小于 SKETCH_PUSH_TTL；<=0 时不推送
+AI_SKETCH_PUSH_INTERVAL = float(os.getenv("AI_SKETCH_PUSH_INTERVAL", "15"))
+
+
 # === 监控数据模型 ===
 
 class RealTimeMetrics(BaseModel):
@@ -164,7 +173,8 @@ class AIMonitoringService:
         self.active_alerts: Dict[str, SystemAlert] = {}
         self.request_counter = 0
         self.error_counter = 0
-        self.response_times: List[float] = []
+        # 按 (provider, model, metric) 的滑动窗口分位数草图，内存与请求量无关
+        self.sketches = SketchRegistry()
         self.last_cleanup = datetime.utcnow()
     
     async def get_real_time_metrics(self) -> RealTimeMetrics:
@@ -176,7 +186,7 @@ class AIMonitoringService:
         requests_per_second = recent_requests / 60.0
         
         # 计算平均响应时间
-        avg_response_time = sum(self.response_times[-100:]) / len(self.response_times[-100:]) if self.response_times else 0
+        avg_response_time = self.sketches.sketch("1m", metric="response_time").mean
         
         # 计算错误率
         total_requests = self.request_counter
@@ -341,17 +351,49 @@ class AIMonitoringService:
         
         await self.connection_manager.broadcast(json.dumps(notification))
     
-    def record_request(self, response_time: float, success: bool = True):
+    def record_request(self, response_time: float, success: bool = True,
+                       provider: str = "unknown", model: str = "unknown", tokens: Optional[int] = None):
         """记录请求"""
         self.request_counter += 1
-        self.response_times.append(response_time)
+        self.sketches.record(provider, model, "response_time", response_time)
+        if tokens is not None:
+            self.sketches.record(provider, model, "tokens", tokens)
         
         if not success:
             self.error_counter += 1
-        
-        # 清理旧的响应时间数据
-        if len(self.response_times) > 10000:
-            self.response_times = self.response_times[-5000:]
+    
+    def get_latency_percentiles(self, window: str = "5m", provider: str = None,
+                                model: str = None, metric: str = "response_time") -> Dict[str, float]:
+        """本进程指定窗口内的 count/mean/p50/p90/p95/p99"""
+        return self.sketches.sketch(window, provider, model, metric).summary()
+    
+    async def publish_sketches(self, redis_client, worker_id: str = None):
+        """把本进程的草图推送到 Redis，供 get_cluster_percentiles 汇总（redis_client 需 decode_responses=False）"""
+        await self.sketches.push(redis_client, worker_id or f"{socket.gethostname()}:{os.getpid()}")
+    
+    async def get_cluster_percentiles(self, redis_client, window: str = "5m") -> Dict[str, Dict[str, float]]:
+        """合并所有工作进程推送的草图，返回 {"provider|model|metric": 分位数摘要}"""
+        merged = await SketchRegistry.aggregate(redis_client, window)
+        return {"|".join(key): sketch.summary() for key, sketch in merged.items()}
+    
+    def get_local_percentiles(self, window: str = "5m") -> Dict[str, Dict[str, float]]:
+        """本进程的分位数摘要，格式同 get_cluster_percentiles"""
+        return {"|".join(key): sketch.summary()
+                for key, sketch in self.sketches.snapshot(window).items() if sketch.count}
+    
+    async def run_sketch_publisher(self, interval: float = AI_SKETCH_PUSH_INTERVAL):
+        """定时推送本进程的草图；Redis 未启用时退出，单次推送失败只记录日志"""
+        from project.utils.async_cache.redis_backend import get_async_redis_client
+        redis_client = get_async_redis_client(decode_responses=False)
+        if redis_client is None:
+            logger.info("Redis未启用，AI延迟分位数只在本进程统计")
+            return
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.publish_sketches(redis_client)
+            except Exception as e:
+                logger.warning(f"Failed to publish latency sketches: {e}")
     
     def _count_recent_requests(self, minutes: int) -> int:
         """计算最近几分钟的请求数"""
@@ -403,7 +445,6 @@ class AIMonitoringService:
                         'total_requests': 0,
                         'successful_requests': 0,
                         'failed_requests': 0,
-                        'response_times': [],
                         'tokens_used': 0
                     }
                 
@@ -423,9 +464,10 @@ class AIMonitoringService:
             for provider, data in stats.items():
                 total = data['total_requests']
                 if total > 0:
-                    data['avg_response_time'] = sum(data['response_times']) / len(data['response_times']) if data['response_times'] else 0
-                    data['p95_response_time'] = self._calculate_percentile(data['response_times'], 95)
-                    data['p99_response_time'] = self._calculate_percentile(data['response_times'], 99)
+                    latency = self.sketches.sketch("1h", provider=provider, metric="response_time").summary()
+                    data['avg_response_time'] = latency['mean']
+                    data['p95_response_time'] = latency['p95']
+                    data['p99_response_time'] = latency['p99']
                     data['tokens_per_second'] = data['tokens_used'] / total if total > 0 else 0
                     data['cost_estimate'] = self._estimate_cost(provider, data['tokens_used'])
             
@@ -435,16 +477,6 @@ class AIMonitoringService:
             logger.error(f"Failed to calculate provider stats: {e}")
             return {}
     
-    def _calculate_percentile(self, values: List[float], percentile: int) -> float:
-        """计算百分位数"""
-        if not values:
-            return 0.0
-        
-        sorted_values = sorted(values)
-        index = int((percentile / 100.0) * len(sorted_values))
-        index = min(index, len(sorted_values) - 1)
-        return sorted_values[index]
-    
     def _estimate_cost(self, provider: str, tokens: int) -> float:
         """估算成本"""
         # 简化的成本估算
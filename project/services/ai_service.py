@@ -24,6 +24,7 @@ from project.utils.core.error_decorators import handle_database_errors, database
 from project.utils.async_cache.cache_manager import cache_result, invalidate_cache_pattern
 from project.utils.async_cache.async_tasks import submit_background_task, TaskPriority
 from project.utils.optimization.production_utils import get_cache_key, monitor_performance
+from project.services.dashboard_summary_service import DashboardSummaryService
 
 logger = logging.getLogger(__name__)
 
@@ -124,6 +125,7 @@ class AIConversationService:
         
         db.add(conversation)
         db.flush()  # 获取ID
+        DashboardSummaryService.record_ai_conversation(db, user_id)
         
         # 如果有初始消息，添加到对话中
         if initial_message:
@@ -186,6 +188,7 @@ class AIConversationService:
         
         # 删除对话
         db.delete(conversation)
+        DashboardSummaryService.record_ai_conversation(db, user_id, -1, created_at=conversation.created_at)
         
         logger.info(f"用户 {user_id} 删除对话 {conversation_id}")
 
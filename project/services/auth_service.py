@@ -19,6 +19,7 @@ from project.utils.auth.auth_utils import (
     find_user_by_credential, normalize_skills_data, build_combined_text
 )
 from project.services.embedding_service import EmbeddingService
+from project.services.dashboard_summary_service import DashboardSummaryService
 
 logger = logging.getLogger(__name__)
 
@@ -186,6 +187,8 @@ class AuthService:
         
         user.updated_at = datetime.utcnow()
         db.flush()
+        # 简历完成度和用户等级依赖资料字段，标记仪表板概览重算
+        DashboardSummaryService.mark_stale(db, [user_id])
         
         # 重新生成AI嵌入向量（如果相关字段发生变化）
         profile_fields = ["name", "major", "skills", "self_introduction"]  # 修正：使用name而不是real_name
@@ -11,7 +11,7 @@ from sqlalchemy.orm import Session
 
 from project.utils.security.permissions import check_room_access
 from project.utils.async_cache.cache import cache
-from project.utils import _award_points
+from project.utils import _award_points, record_achievement_event
 from project.utils.optimization.performance_monitor import monitor_performance
 from project.config.chatroom_config import CACHE_CONFIG, POINTS_CONFIG
 
@@ -117,6 +117,10 @@ class ChatRoomBaseService:
             file_info=file_info
         )
         
+        # 更新发送者的成就计数
+        await record_achievement_event(db, sender_id, "chat_message_sent")
+        db.commit()
+        
         # 添加到缓存
         await cache.add_recent_message(room_id, db_message.__dict__)
         
@@ -15,6 +15,7 @@ from datetime import datetime, timezone, timedelta
 import json
 
 from project.models import Folder, CollectedContent, Project, Course
+from project.services.dashboard_summary_service import DashboardSummaryService
 
 logger = logging.getLogger(__name__)
 
@@ -289,6 +290,7 @@ class OptimizedBatchOperations:
             # 批量插入
             stmt = insert(CollectedContent).values(insert_data)
             result = self.db.execute(stmt)
+            DashboardSummaryService.apply_delta(self.db, user_id, collected_items=len(insert_data))
             self.db.commit()
             
             # 获取插入的ID（这里需要根据数据库类型调整）
@@ -367,6 +369,8 @@ class OptimizedBatchOperations:
                 )
             
             result = self.db.execute(stmt)
+            # 批量语句无法区分已软删除的记录，标记重算而不做增量
+            DashboardSummaryService.mark_stale(self.db, [user_id])
             self.db.commit()
             
             deleted_count = result.rowcount
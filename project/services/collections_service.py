@@ -17,6 +17,7 @@ from project.models import (
     ChatMessage, ForumTopic, User, ChatRoomMember
 )
 from project.utils.optimization.production_utils import cache_manager
+from project.utils.core import folder_hierarchy
 
 logger = logging.getLogger(__name__)
 
@@ -225,16 +226,7 @@ class CollectionsFolderService:
     @staticmethod
     def _would_create_cycle(db: Session, folder_id: int, new_parent_id: int) -> bool:
         """检查移动文件夹是否会创建循环引用"""
-        current_id = new_parent_id
-        
-        while current_id is not None:
-            if current_id == folder_id:
-                return True
-            
-            parent = db.query(Folder).filter(Folder.id == current_id).first()
-            current_id = parent.parent_id if parent else None
-        
-        return False
+        return folder_hierarchy.would_create_cycle(db, folder_id, new_parent_id)
     
     @staticmethod
     def get_folder_stats_optimized(db: Session, user_id: int) -> Dict[str, Any]:
@@ -17,6 +17,7 @@ import logging
 from project.models import Note, Folder, Course, User
 from project.utils.optimization.production_utils import cache_manager
 from project.utils import get_user_resource_or_404
+from project.utils.core import folder_hierarchy
 from project.ai_providers.embedding_provider import get_embeddings_from_api
 from project.ai_providers.ai_config import GLOBAL_PLACEHOLDER_ZERO_VECTOR
 import project.oss_utils as oss_utils
@@ -114,6 +115,18 @@ class CourseNotesFolderService:
         """优化的文件夹更新"""
         folder = CourseNotesFolderService.get_folder_optimized(db, folder_id, user_id)
         
+        # 验证父文件夹移动（避免循环引用）
+        if "parent_id" in update_data and update_data["parent_id"] != folder.parent_id:
+            if update_data["parent_id"] is not None:
+                CourseNotesFolderService.get_folder_optimized(db, update_data["parent_id"], user_id)
+                
+                if folder_hierarchy.would_create_cycle(db, folder_id, update_data["parent_id"]):
+                    from fastapi import HTTPException, status
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail="不能将文件夹移动到其子文件夹中"
+                    )
+        
         # 更新字段
         for key, value in update_data.items():
             if hasattr(folder, key):
@@ -6,6 +6,7 @@
 from typing import List, Optional, Dict, Any, Tuple
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy import or_, select
 from sqlalchemy.sql import func
 from datetime import datetime, timedelta
 import logging
@@ -14,15 +15,19 @@ import json
 # 模型导入
 from project.models import (
     User, Project, Course, UserCourse, ChatRoom, ProjectMember,
-    AIConversation, ForumTopic, CollectedContent, ProjectApplication
+    AIConversation, ForumTopic, ProjectApplication
 )
 import project.schemas as schemas
 
 # 工具导入
 from project.utils.core.error_decorators import handle_database_errors, database_transaction
-from project.utils.async_cache.cache_manager import cache_result, invalidate_cache_pattern
+from project.utils.async_cache.cache_manager import (
+    cache_result, invalidate_cache_pattern, get_cache_manager_instance
+)
 from project.utils.async_cache.async_tasks import submit_background_task, TaskPriority
 from project.utils.optimization.production_utils import get_cache_key, monitor_performance
+from project.utils.optimization.query_fanout import QueryFanout
+from project.services.dashboard_summary_service import DashboardSummaryService
 
 logger = logging.getLogger(__name__)
 
@@ -31,112 +36,17 @@ class DashboardDataService:
     
     @staticmethod
     @handle_database_errors
-    @cache_result(expire=300, key_prefix="dashboard_summary")
     def get_dashboard_summary_optimized(
         db: Session, 
         user_id: int
     ) -> Dict[str, Any]:
-        """获取仪表板概览数据 - 优化版本"""
-        
-        # 一次性查询获取所有项目统计
-        project_stats = db.query(
-            func.count(Project.id).label('total_projects'),
-            func.sum(func.case(
-                (Project.creator_id == user_id, 1), 
-                else_=0
-            )).label('created_projects'),
-            func.sum(func.case(
-                (Project.project_status == "进行中", 1), 
-                else_=0
-            )).label('active_projects'),
-            func.sum(func.case(
-                (Project.project_status == "已完成", 1), 
-                else_=0
-            )).label('completed_projects')
-        ).filter(
-            func.or_(
-                Project.creator_id == user_id,
-                Project.id.in_(
-                    db.query(ProjectMember.project_id).filter(
-                        ProjectMember.user_id == user_id
-                    )
-                )
-            )
-        ).first()
-        
-        # 一次性查询获取所有课程统计
-        course_stats = db.query(
-            func.count(UserCourse.id).label('total_courses'),
-            func.sum(func.case(
-                (UserCourse.status == "in_progress", 1), 
-                else_=0
-            )).label('learning_courses'),
-            func.sum(func.case(
-                (UserCourse.status == "completed", 1), 
-                else_=0
-            )).label('completed_courses'),
-            func.avg(UserCourse.progress).label('avg_progress')
-        ).filter(UserCourse.student_id == user_id).first()
-        
-        # 获取AI对话统计
-        ai_stats = db.query(
-            func.count(AIConversation.id).label('total_conversations'),
-            func.sum(func.case(
-                (func.date(AIConversation.updated_at) == datetime.now().date(), 1),
-                else_=0
-            )).label('today_conversations')
-        ).filter(AIConversation.user_id == user_id).first()
-        
-        # 获取论坛活动统计
-        forum_stats = db.query(
-            func.count(ForumTopic.id).label('forum_topics'),
-            func.sum(ForumTopic.likes_count).label('total_likes')
-        ).filter(ForumTopic.author_id == user_id).first()
-        
-        # 获取收藏统计
-        collection_stats = db.query(
-            func.count(CollectedContent.id).label('collected_items')
-        ).join(CollectedContent.folder).filter(
-            CollectedContent.folder.has(creator_id=user_id)
-        ).first()
-        
-        # 获取用户信息和简历完成度
-        user = db.query(User).filter(User.id == user_id).first()
-        resume_completion = DashboardUtilities.calculate_resume_completion(user)
-        
-        # 获取最近活动
-        recent_activities = DashboardDataService._get_recent_activities_optimized(db, user_id)
-        
-        summary_data = {
-            # 项目相关
-            "total_projects": project_stats.total_projects or 0,
-            "created_projects": project_stats.created_projects or 0,
-            "active_projects": project_stats.active_projects or 0,
-            "completed_projects": project_stats.completed_projects or 0,
-            
-            # 课程相关
-            "total_courses": course_stats.total_courses or 0,
-            "learning_courses": course_stats.learning_courses or 0,
-            "completed_courses": course_stats.completed_courses or 0,
-            "avg_course_progress": float(course_stats.avg_progress or 0),
-            
-            # AI对话相关
-            "total_ai_conversations": ai_stats.total_conversations or 0,
-            "today_ai_conversations": ai_stats.today_conversations or 0,
-            
-            # 论坛相关
-            "forum_topics_created": forum_stats.forum_topics or 0,
-            "total_forum_likes": forum_stats.total_likes or 0,
-            
-            # 收藏相关
-            "collected_items": collection_stats.collected_items or 0,
-            
-            # 用户信息
-            "resume_completion_percentage": resume_completion,
-            "user_level": DashboardUtilities.calculate_user_level(user),
-            "recent_activities": recent_activities
-        }
-        
+        """
+        获取仪表板概览数据 - 优化版本
+
+        读取预聚合的 user_dashboard_summaries 行（一次主键查询），
+        统计由各写入路径增量维护，缺失或过期时自动全量重算，见 DashboardSummaryService。
+        """
+        summary_data = DashboardSummaryService.get_summary(db, user_id)
         logger.info(f"获取用户 {user_id} 的仪表板概览数据")
         return summary_data
     
@@ -148,61 +58,7 @@ class DashboardDataService:
         limit: int = 10
     ) -> List[Dict[str, Any]]:
         """获取最近活动 - 优化版本"""
-        
-        activities = []
-        
-        # 最近的项目活动
-        recent_projects = db.query(Project).filter(
-            func.or_(
-                Project.creator_id == user_id,
-                Project.id.in_(
-                    db.query(ProjectMember.project_id).filter(
-                        ProjectMember.user_id == user_id
-                    )
-                )
-            )
-        ).order_by(Project.updated_at.desc()).limit(3).all()
-        
-        for project in recent_projects:
-            activities.append({
-                "type": "project",
-                "title": f"项目: {project.title}",
-                "description": f"状态: {project.project_status}",
-                "timestamp": project.updated_at,
-                "link": f"/projects/{project.id}"
-            })
-        
-        # 最近的AI对话
-        recent_conversations = db.query(AIConversation).filter(
-            AIConversation.user_id == user_id
-        ).order_by(AIConversation.updated_at.desc()).limit(3).all()
-        
-        for conv in recent_conversations:
-            activities.append({
-                "type": "ai_conversation",
-                "title": f"AI对话: {conv.title or '未命名对话'}",
-                "description": "AI智能助手对话",
-                "timestamp": conv.updated_at,
-                "link": f"/ai/conversations/{conv.id}"
-            })
-        
-        # 最近的论坛话题
-        recent_topics = db.query(ForumTopic).filter(
-            ForumTopic.author_id == user_id
-        ).order_by(ForumTopic.created_at.desc()).limit(3).all()
-        
-        for topic in recent_topics:
-            activities.append({
-                "type": "forum_topic",
-                "title": f"论坛话题: {topic.title}",
-                "description": f"分类: {topic.category}",
-                "timestamp": topic.created_at,
-                "link": f"/forum/topics/{topic.id}"
-            })
-        
-        # 按时间排序并限制数量
-        activities.sort(key=lambda x: x["timestamp"], reverse=True)
-        return activities[:limit]
+        return DashboardSummaryService._compute_recent_activities(db, user_id, limit)
     
     @staticmethod
     @handle_database_errors
@@ -307,53 +163,71 @@ class DashboardDataService:
 class DashboardAnalyticsService:
     """仪表板分析服务类"""
     
+    @staticmethod
+    def _user_project_condition(user_id: int):
+        """用户创建或参与的项目"""
+        member_project_ids = select(ProjectMember.project_id).where(ProjectMember.student_id == user_id)
+        return or_(Project.creator_id == user_id, Project.id.in_(member_project_ids))
+    
     @staticmethod
     @handle_database_errors
-    @cache_result(expire=600, key_prefix="dashboard_analytics")
-    def get_user_analytics_optimized(
+    async def get_user_analytics_optimized(
         db: Session,
         user_id: int,
         days: int = 30
     ) -> Dict[str, Any]:
-        """获取用户分析数据 - 优化版本"""
-        
+        """
+        获取用户分析数据 - 优化版本（各聚合查询并发执行）
+        
+        按 (user_id, days) 缓存10分钟；query_timings_ms 只反映本次请求，命中缓存时为空
+        """
+        manager = get_cache_manager_instance()
+        cache_key = f"dashboard_analytics:{user_id}:{days}"
+        analytics_data = await manager.aget(cache_key)
+        timings: Dict[str, float] = {}
+        if analytics_data is None:
+            analytics_data, timings = await DashboardAnalyticsService._compute_user_analytics(db, user_id, days)
+            await manager.aset(cache_key, analytics_data, 600)
+        return {**analytics_data, "query_timings_ms": timings}
+    
+    @staticmethod
+    async def _compute_user_analytics(
+        db: Session,
+        user_id: int,
+        days: int
+    ) -> Tuple[Dict[str, Any], Dict[str, float]]:
+        """执行分析查询，返回 (分析数据, 各查询耗时ms)"""
         start_date = datetime.now() - timedelta(days=days)
+        project_condition = DashboardAnalyticsService._user_project_condition(user_id)
         
+        fanout = QueryFanout(db, "dashboard.analytics")
         # 活动趋势分析
-        daily_activities = db.query(
+        fanout.add("activity_trend", lambda session: session.query(
             func.date(Project.updated_at).label('date'),
             func.count(Project.id).label('project_activities')
         ).filter(
             Project.updated_at >= start_date,
-            func.or_(
-                Project.creator_id == user_id,
-                Project.id.in_(
-                    db.query(ProjectMember.project_id).filter(
-                        ProjectMember.user_id == user_id
-                    )
-                )
-            )
-        ).group_by(func.date(Project.updated_at)).all()
-        
+            project_condition
+        ).group_by(func.date(Project.updated_at)).all())
         # 学习进度分析
-        learning_progress = db.query(
+        fanout.add("learning_progress", lambda session: session.query(
             func.avg(UserCourse.progress).label('avg_progress'),
-            func.count(UserCourse.id).label('course_count'),
-            func.sum(UserCourse.study_time).label('total_study_time')
+            func.count(UserCourse.course_id).label('course_count')
         ).filter(
             UserCourse.student_id == user_id,
             UserCourse.last_accessed >= start_date
-        ).first()
-        
+        ).first())
         # AI使用分析
-        ai_usage = db.query(
+        fanout.add("ai_usage", lambda session: session.query(
             func.count(AIConversation.id).label('conversation_count'),
             func.date(AIConversation.created_at).label('date')
         ).filter(
             AIConversation.user_id == user_id,
             AIConversation.created_at >= start_date
-        ).group_by(func.date(AIConversation.created_at)).all()
+        ).group_by(func.date(AIConversation.created_at)).all())
+        results = await fanout.run()
         
+        learning_progress = results["learning_progress"]
         analytics_data = {
             "period_days": days,
             "activity_trend": [
@@ -361,92 +235,80 @@ class DashboardAnalyticsService:
                     "date": str(activity.date),
                     "project_activities": activity.project_activities
                 }
-                for activity in daily_activities
+                for activity in results["activity_trend"]
             ],
             "learning_metrics": {
                 "avg_progress": float(learning_progress.avg_progress or 0),
                 "active_courses": learning_progress.course_count or 0,
-                "total_study_hours": (learning_progress.total_study_time or 0) / 3600  # 转换为小时
+                # UserCourse 暂无学习时长字段
+                "total_study_hours": 0.0
             },
             "ai_usage_trend": [
                 {
                     "date": str(usage.date),
                     "conversations": usage.conversation_count
                 }
-                for usage in ai_usage
+                for usage in results["ai_usage"]
             ]
         }
         
-        logger.info(f"获取用户 {user_id} 的分析数据（{days}天）")
-        return analytics_data
+        logger.info(f"获取用户 {user_id} 的分析数据（{days}天），查询耗时 {fanout.wall_ms:.1f}ms")
+        return analytics_data, {name: round(ms, 2) for name, ms in fanout.timings.items()}
     
     @staticmethod
     @handle_database_errors
-    def get_productivity_metrics_optimized(
+    async def get_productivity_metrics_optimized(
         db: Session,
         user_id: int
     ) -> Dict[str, Any]:
-        """获取生产力指标 - 优化版本"""
+        """获取生产力指标 - 优化版本（各计数查询并发执行）"""
         
         today = datetime.now().date()
         week_ago = today - timedelta(days=7)
-        month_ago = today - timedelta(days=30)
+        project_condition = DashboardAnalyticsService._user_project_condition(user_id)
         
+        fanout = QueryFanout(db, "dashboard.productivity")
         # 今日活动
-        today_activities = {
-            "projects_updated": db.query(Project).filter(
-                func.date(Project.updated_at) == today,
-                func.or_(
-                    Project.creator_id == user_id,
-                    Project.id.in_(
-                        db.query(ProjectMember.project_id).filter(
-                            ProjectMember.user_id == user_id
-                        )
-                    )
-                )
-            ).count(),
-            "ai_conversations": db.query(AIConversation).filter(
-                AIConversation.user_id == user_id,
-                func.date(AIConversation.created_at) == today
-            ).count(),
-            "forum_posts": db.query(ForumTopic).filter(
-                ForumTopic.author_id == user_id,
-                func.date(ForumTopic.created_at) == today
-            ).count()
-        }
-        
+        fanout.add("projects_updated", lambda session: session.query(func.count(Project.id)).filter(
+            func.date(Project.updated_at) == today,
+            project_condition
+        ).scalar())
+        fanout.add("ai_conversations", lambda session: session.query(func.count(AIConversation.id)).filter(
+            AIConversation.user_id == user_id,
+            func.date(AIConversation.created_at) == today
+        ).scalar())
+        fanout.add("forum_posts", lambda session: session.query(func.count(ForumTopic.id)).filter(
+            ForumTopic.owner_id == user_id,
+            func.date(ForumTopic.created_at) == today
+        ).scalar())
         # 本周完成项目
-        week_completed = db.query(Project).filter(
+        fanout.add("week_completed", lambda session: session.query(func.count(Project.id)).filter(
             Project.project_status == "已完成",
             Project.updated_at >= week_ago,
-            func.or_(
-                Project.creator_id == user_id,
-                Project.id.in_(
-                    db.query(ProjectMember.project_id).filter(
-                        ProjectMember.user_id == user_id
-                    )
-                )
-            )
-        ).count()
+            project_condition
+        ).scalar())
+        results = await fanout.run()
         
-        # 本月学习时长
-        month_study_time = db.query(
-            func.sum(UserCourse.study_time).label('total_time')
-        ).filter(
-            UserCourse.student_id == user_id,
-            UserCourse.last_accessed >= month_ago
-        ).first()
+        today_activities = {
+            "projects_updated": results["projects_updated"] or 0,
+            "ai_conversations": results["ai_conversations"] or 0,
+            "forum_posts": results["forum_posts"] or 0
+        }
+        week_completed = results["week_completed"] or 0
+        # UserCourse 暂无学习时长字段
+        month_study_time = 0
         
         productivity_data = {
             "today_activities": today_activities,
             "week_completed_projects": week_completed,
-            "month_study_hours": (month_study_time.total_time or 0) / 3600,
+            "month_study_hours": month_study_time / 3600,
             "productivity_score": DashboardUtilities.calculate_productivity_score(
-                today_activities, week_completed, month_study_time.total_time or 0
-            )
+                today_activities, week_completed, month_study_time
+            ),
+            "query_timings_ms": {name: round(ms, 2) for name, ms in fanout.timings.items()}
         }
         
-        logger.info(f"获取用户 {user_id} 的生产力指标")
+        logger.info(f"获取用户 {user_id} 的生产力指标，查询耗时 {fanout.wall_ms:.1f}ms")
         return productivity_data
 
 class DashboardUtilities:
@@ -0,0 +1,335 @@
+# project/services/dashboard_summary_service.py
+"""
+仪表板概览预聚合服务
+
+概览统计存放在 user_dashboard_summaries（每用户一行）：
+- 写入路径（建项目、加入项目、选课、更新课程进度、新建AI对话、发帖、话题被点赞、收藏）
+  在同一事务内对相应列做原子增量更新
+- 难以表达为增量的变化（项目状态变更、资料修改等）调用 mark_stale 标记重算
+- 读取时按主键取一行；行不存在、被标记或超过 DASHBOARD_SUMMARY_MAX_AGE 时全量重算一次，
+  以此兜底没有接入增量维护的写入路径
+"""
+import os
+import json
+import logging
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import case, func, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from project.models import (
+    User, Project, UserCourse, ProjectMember, AIConversation,
+    ForumTopic, CollectedContent, UserDashboardSummary
+)
+
+logger = logging.getLogger(__name__)
+
+# 全量重算的最长间隔（秒），限制增量统计的最大漂移时间
+DASHBOARD_SUMMARY_MAX_AGE = int(os.getenv("DASHBOARD_SUMMARY_MAX_AGE", "3600"))
+# 最近活动列表的最长缓存时间（秒）
+DASHBOARD_ACTIVITIES_MAX_AGE = int(os.getenv("DASHBOARD_ACTIVITIES_MAX_AGE", "300"))
+
+# 可增量更新的计数列
+COUNTER_FIELDS = (
+    "total_projects", "created_projects", "active_projects", "completed_projects",
+    "total_courses", "learning_courses", "completed_courses", "course_progress_sum",
+    "total_ai_conversations", "forum_topics_created", "total_forum_likes", "collected_items",
+)
+
+# 项目状态 -> 对应的计数列
+_PROJECT_STATUS_FIELDS = {"进行中": "active_projects", "已完成": "completed_projects"}
+# 课程状态 -> 对应的计数列
+_COURSE_STATUS_FIELDS = {"in_progress": "learning_courses", "completed": "completed_courses"}
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+class DashboardSummaryService:
+    """仪表板概览预聚合服务"""
+
+    # ---------- 增量维护（由写入路径调用，不提交事务） ----------
+
+    @staticmethod
+    def apply_delta(db: Session, user_id: int, refresh_activities: bool = False, **deltas: float) -> None:
+        """
+        对用户概览的计数列做原子增量
+
+        行尚不存在时不做任何事，首次读取会全量计算。
+        refresh_activities=True 时同时让最近活动列表失效。
+        """
+        unknown = set(deltas) - set(COUNTER_FIELDS)
+        if unknown:
+            raise ValueError(f"未知的仪表板统计字段: {', '.join(sorted(unknown))}")
+
+        values = {
+            getattr(UserDashboardSummary, field): getattr(UserDashboardSummary, field) + delta
+            for field, delta in deltas.items() if delta
+        }
+        if refresh_activities:
+            values[UserDashboardSummary.activities_refreshed_at] = None
+        if not values:
+            return
+        db.query(UserDashboardSummary).filter(
+            UserDashboardSummary.user_id == user_id
+        ).update(values, synchronize_session=False)
+
+    @staticmethod
+    def record_ai_conversation(db: Session, user_id: int, delta: int = 1,
+                               created_at: Optional[datetime] = None) -> None:
+        """
+        新建(+1)/删除(-1) AI对话
+
+        新建时同时累加当天计数，跨天自动归零；删除当天创建的对话时（传入 created_at）同步扣减当天计数。
+        """
+        today = date.today()
+        values = {
+            UserDashboardSummary.total_ai_conversations: UserDashboardSummary.total_ai_conversations + delta,
+            UserDashboardSummary.activities_refreshed_at: None,
+        }
+        if delta < 0 and created_at is not None and created_at.date() == today:
+            values[UserDashboardSummary.ai_conversations_today] = case(
+                ((UserDashboardSummary.ai_conversations_day == today)
+                 & (UserDashboardSummary.ai_conversations_today + delta > 0),
+                 UserDashboardSummary.ai_conversations_today + delta),
+                else_=0
+            )
+        elif delta > 0:
+            values[UserDashboardSummary.ai_conversations_today] = case(
+                (UserDashboardSummary.ai_conversations_day == today,
+                 UserDashboardSummary.ai_conversations_today + delta),
+                else_=delta
+            )
+            values[UserDashboardSummary.ai_conversations_day] = today
+        db.query(UserDashboardSummary).filter(
+            UserDashboardSummary.user_id == user_id
+        ).update(values, synchronize_session=False)
+
+    @staticmethod
+    def project_deltas(status: Optional[str], created: bool = False, sign: int = 1) -> Dict[str, int]:
+        """用户加入(sign=1)/离开(sign=-1)某个项目时各计数列的增量"""
+        deltas = {"total_projects": sign}
+        if created:
+            deltas["created_projects"] = sign
+        status_field = _PROJECT_STATUS_FIELDS.get(status)
+        if status_field:
+            deltas[status_field] = sign
+        return deltas
+
+    @staticmethod
+    def course_deltas(old_status: Optional[str], new_status: Optional[str],
+                      old_progress: float = 0.0, new_progress: float = 0.0,
+                      enrolled: bool = False) -> Dict[str, float]:
+        """选课或课程状态/进度变化时各计数列的增量"""
+        deltas: Dict[str, float] = {}
+        if enrolled:
+            deltas["total_courses"] = 1
+        old_field = _COURSE_STATUS_FIELDS.get(old_status) if not enrolled else None
+        new_field = _COURSE_STATUS_FIELDS.get(new_status)
+        if old_field != new_field:
+            if old_field:
+                deltas[old_field] = deltas.get(old_field, 0) - 1
+            if new_field:
+                deltas[new_field] = deltas.get(new_field, 0) + 1
+        progress_delta = (new_progress or 0.0) - (0.0 if enrolled else (old_progress or 0.0))
+        if progress_delta:
+            deltas["course_progress_sum"] = progress_delta
+        return deltas
+
+    @staticmethod
+    def mark_stale(db: Session, user_ids: Iterable[int]) -> None:
+        """标记概览需要全量重算（用于无法增量表达的变化）"""
+        user_ids = [user_id for user_id in set(user_ids) if user_id is not None]
+        if not user_ids:
+            return
+        db.query(UserDashboardSummary).filter(
+            UserDashboardSummary.user_id.in_(user_ids)
+        ).update({UserDashboardSummary.refreshed_at: None}, synchronize_session=False)
+
+    @staticmethod
+    def mark_project_stale(db: Session, project_id: int) -> None:
+        """项目状态变更或删除时，标记创建者和全部成员的概览需要重算"""
+        creator_ids = db.query(Project.creator_id).filter(Project.id == project_id)
+        member_ids = db.query(ProjectMember.student_id).filter(ProjectMember.project_id == project_id)
+        DashboardSummaryService.mark_stale(
+            db, [row[0] for row in creator_ids.union(member_ids).all()]
+        )
+
+    # ---------- 全量计算 ----------
+
+    @staticmethod
+    def _compute_figures(db: Session, user_id: int) -> Dict[str, Any]:
+        member_project_ids = db.query(ProjectMember.project_id).filter(ProjectMember.student_id == user_id)
+        project_stats = db.query(
+            func.count(Project.id).label("total_projects"),
+            func.sum(case((Project.creator_id == user_id, 1), else_=0)).label("created_projects"),
+            func.sum(case((Project.project_status == "进行中", 1), else_=0)).label("active_projects"),
+            func.sum(case((Project.project_status == "已完成", 1), else_=0)).label("completed_projects")
+        ).filter(
+            or_(Project.creator_id == user_id, Project.id.in_(member_project_ids))
+        ).first()
+
+        course_stats = db.query(
+            func.count(UserCourse.course_id).label("total_courses"),
+            func.sum(case((UserCourse.status == "in_progress", 1), else_=0)).label("learning_courses"),
+            func.sum(case((UserCourse.status == "completed", 1), else_=0)).label("completed_courses"),
+            func.sum(UserCourse.progress).label("progress_sum")
+        ).filter(UserCourse.student_id == user_id).first()
+
+        today = date.today()
+        ai_stats = db.query(
+            func.count(AIConversation.id).label("total_conversations"),
+            func.sum(case((func.date(AIConversation.created_at) == today, 1), else_=0)).label("today_conversations")
+        ).filter(AIConversation.user_id == user_id).first()
+
+        forum_stats = db.query(
+            func.count(ForumTopic.id).label("forum_topics"),
+            func.sum(ForumTopic.like_count).label("total_likes")
+        ).filter(ForumTopic.owner_id == user_id).first()
+
+        collected_items = db.query(func.count(CollectedContent.id)).filter(
+            CollectedContent.owner_id == user_id,
+            CollectedContent.status != "deleted"
+        ).scalar()
+
+        # 延迟导入，避免与 dashboard_service 循环引用
+        from project.services.dashboard_service import DashboardUtilities
+        user = db.query(User).filter(User.id == user_id).first()
+
+        return {
+            "total_projects": project_stats.total_projects or 0,
+            "created_projects": project_stats.created_projects or 0,
+            "active_projects": project_stats.active_projects or 0,
+            "completed_projects": project_stats.completed_projects or 0,
+            "total_courses": course_stats.total_courses or 0,
+            "learning_courses": course_stats.learning_courses or 0,
+            "completed_courses": course_stats.completed_courses or 0,
+            "course_progress_sum": float(course_stats.progress_sum or 0),
+            "total_ai_conversations": ai_stats.total_conversations or 0,
+            "ai_conversations_today": ai_stats.today_conversations or 0,
+            "ai_conversations_day": today,
+            "forum_topics_created": forum_stats.forum_topics or 0,
+            "total_forum_likes": forum_stats.total_likes or 0,
+            "collected_items": collected_items or 0,
+            "resume_completion_percentage": DashboardUtilities.calculate_resume_completion(user),
+            "user_level": DashboardUtilities.calculate_user_level(user),
+        }
+
+    @staticmethod
+    def _compute_recent_activities(db: Session, user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+        activities = []
+
+        member_project_ids = db.query(ProjectMember.project_id).filter(ProjectMember.student_id == user_id)
+        recent_projects = db.query(Project.id, Project.title, Project.project_status, Project.updated_at).filter(
+            or_(Project.creator_id == user_id, Project.id.in_(member_project_ids))
+        ).order_by(Project.updated_at.desc()).limit(3).all()
+        for project in recent_projects:
+            activities.append({
+                "type": "project",
+                "title": f"项目: {project.title}",
+                "description": f"状态: {project.project_status}",
+                "timestamp": project.updated_at,
+                "link": f"/projects/{project.id}"
+            })
+
+        recent_conversations = db.query(AIConversation.id, AIConversation.title, AIConversation.last_updated).filter(
+            AIConversation.user_id == user_id
+        ).order_by(AIConversation.last_updated.desc()).limit(3).all()
+        for conv in recent_conversations:
+            activities.append({
+                "type": "ai_conversation",
+                "title": f"AI对话: {conv.title or '未命名对话'}",
+                "description": "AI智能助手对话",
+                "timestamp": conv.last_updated,
+                "link": f"/ai/conversations/{conv.id}"
+            })
+
+        recent_topics = db.query(ForumTopic.id, ForumTopic.title, ForumTopic.tags, ForumTopic.created_at).filter(
+            ForumTopic.owner_id == user_id
+        ).order_by(ForumTopic.created_at.desc()).limit(3).all()
+        for topic in recent_topics:
+            activities.append({
+                "type": "forum_topic",
+                "title": f"论坛话题: {topic.title}",
+                "description": f"标签: {topic.tags or '无'}",
+                "timestamp": topic.created_at,
+                "link": f"/forum/topics/{topic.id}"
+            })
+
+        activities.sort(key=lambda x: x["timestamp"] or datetime.min, reverse=True)
+        return activities[:limit]
+
+    @staticmethod
+    def recompute(db: Session, user_id: int) -> UserDashboardSummary:
+        """全量重算并写入概览行（提交事务）"""
+        figures = DashboardSummaryService._compute_figures(db, user_id)
+        activities = DashboardSummaryService._compute_recent_activities(db, user_id)
+        now = datetime.utcnow()
+
+        summary = db.get(UserDashboardSummary, user_id)
+        if summary is None:
+            summary = UserDashboardSummary(user_id=user_id)
+            try:
+                with db.begin_nested():
+                    db.add(summary)
+            except IntegrityError:
+                # 并发请求已创建该行，改为更新
+                summary = db.get(UserDashboardSummary, user_id)
+
+        for field, value in figures.items():
+            setattr(summary, field, value)
+        summary.recent_activities = json.dumps(activities, default=_json_default, ensure_ascii=False)
+        summary.activities_refreshed_at = now
+        summary.refreshed_at = now
+        db.commit()
+        logger.debug(f"重算用户 {user_id} 的仪表板概览")
+        return summary
+
+    # ---------- 读取 ----------
+
+    @staticmethod
+    def get_summary(db: Session, user_id: int) -> Dict[str, Any]:
+        """按主键读取概览；缺失、被标记或过期时全量重算，最近活动单独按较短时效刷新"""
+        now = datetime.utcnow()
+        summary = db.get(UserDashboardSummary, user_id)
+
+        if (summary is None or summary.refreshed_at is None
+                or (now - summary.refreshed_at).total_seconds() > DASHBOARD_SUMMARY_MAX_AGE):
+            summary = DashboardSummaryService.recompute(db, user_id)
+        elif (summary.activities_refreshed_at is None
+              or (now - summary.activities_refreshed_at).total_seconds() > DASHBOARD_ACTIVITIES_MAX_AGE):
+            activities = DashboardSummaryService._compute_recent_activities(db, user_id)
+            summary.recent_activities = json.dumps(activities, default=_json_default, ensure_ascii=False)
+            summary.activities_refreshed_at = now
+            db.commit()
+
+        return DashboardSummaryService.to_dict(summary)
+
+    @staticmethod
+    def to_dict(summary: UserDashboardSummary) -> Dict[str, Any]:
+        """转换为仪表板概览响应所需的字典"""
+        today_conversations = summary.ai_conversations_today if summary.ai_conversations_day == date.today() else 0
+        return {
+            "total_projects": summary.total_projects,
+            "created_projects": summary.created_projects,
+            "active_projects": summary.active_projects,
+            "completed_projects": summary.completed_projects,
+            "total_courses": summary.total_courses,
+            "learning_courses": summary.learning_courses,
+            "completed_courses": summary.completed_courses,
+            "avg_course_progress": (summary.course_progress_sum / summary.total_courses
+                                    if summary.total_courses else 0.0),
+            "total_ai_conversations": summary.total_ai_conversations,
+            "today_ai_conversations": today_conversations,
+            "forum_topics_created": summary.forum_topics_created,
+            "total_forum_likes": summary.total_forum_likes,
+            "collected_items": summary.collected_items,
+            "resume_completion_percentage": summary.resume_completion_percentage,
+            "user_level": summary.user_level,
+            "recent_activities": json.loads(summary.recent_activities) if summary.recent_activities else [],
+        }
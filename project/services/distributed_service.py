@@ -3,6 +3,21 @@
 分布式处理服务 - 支持水平扩展和负载均衡
 从 routers/knowledge/distributed_processing.py 重构而来
 实现多节点协同处理大型文件和批量任务
+
+调度模型（全部状态在 Redis 中，所有多键操作由 Lua 脚本原子完成）：
+- pending_tasks：未分配的任务，node_tasks:{节点ID}：已分派给某个节点的任务；
+  两者都是按 (优先级, 提交时间) 排序的有序集合，分数越小越先执行
+- 工作者领取任务时把任务从队列移入 inflight_tasks（分数为租约到期时间），并写入租约令牌；
+  心跳延长租约，完成/失败时必须出示令牌，租约被回收后旧令牌作废
+- 回收器把租约过期的任务放回 pending_tasks（至少一次语义），重试次数超限则标记失败
+- 自己的队列和全局队列都为空时，工作者从积压最多的节点队列尾部窃取任务
+- 节点注册表是按最后心跳时间排序的 nodes 有序集合，不使用 KEYS；节点负载在本地缓存
+  DISTRIBUTED_LOAD_CACHE_SECONDS 秒
+
+部署要求：单实例 Redis（可带主从/哨兵），不支持 Redis Cluster。
+领取、完成、回收、分派、释放节点和取消脚本会在脚本内部按任务ID/节点ID拼接 task:{任务ID} 和
+node_tasks:{节点ID} 键。这些ID是脚本执行时从有序集合里读出的，无法事先通过 KEYS 声明，
+因此脚本访问了未声明的键，只有在所有键位于同一实例时才是原子且正确的。
 """
 
 import asyncio
@@ -11,20 +26,236 @@ import uuid
 import time
 import hashlib
 import os
-from typing import Dict, List, Optional, Any, Union
+from typing import Dict, List, Optional, Any, Union, Callable, Tuple
 from datetime import datetime, timedelta
 from enum import Enum
 import logging
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, fields
 from concurrent.futures import ThreadPoolExecutor, as_completed
-import redis
+import redis.asyncio as aioredis
 from sqlalchemy.orm import Session
 import httpx
 import psutil
-import os
 
 logger = logging.getLogger(__name__)
 
+# 调度参数
+DISTRIBUTED_LEASE_SECONDS = float(os.getenv("DISTRIBUTED_LEASE_SECONDS", "30"))
+DISTRIBUTED_HEARTBEAT_SECONDS = float(os.getenv("DISTRIBUTED_HEARTBEAT_SECONDS", "10"))
+DISTRIBUTED_NODE_TIMEOUT_SECONDS = float(os.getenv("DISTRIBUTED_NODE_TIMEOUT_SECONDS", "300"))
+DISTRIBUTED_LOAD_CACHE_SECONDS = float(os.getenv("DISTRIBUTED_LOAD_CACHE_SECONDS", "2"))
+DISTRIBUTED_WORKER_CONCURRENCY = int(os.getenv("DISTRIBUTED_WORKER_CONCURRENCY", "10"))
+DISTRIBUTED_POLL_SECONDS = float(os.getenv("DISTRIBUTED_POLL_SECONDS", "0.5"))
+DISTRIBUTED_STEAL_THRESHOLD = int(os.getenv("DISTRIBUTED_STEAL_THRESHOLD", "2"))
+DISTRIBUTED_FINISHED_TTL_SECONDS = int(os.getenv("DISTRIBUTED_FINISHED_TTL_SECONDS", "86400"))
+
+# Redis 键
+PENDING_TASKS_KEY = "pending_tasks"
+INFLIGHT_TASKS_KEY = "inflight_tasks"
+NODES_KEY = "nodes"
+TOTAL_PROCESSED_KEY = "total_processed"
+
+
+def _task_key(task_id: str) -> str:
+    return f"task:{task_id}"
+
+
+def _node_key(node_id: str) -> str:
+    return f"node:{node_id}"
+
+
+def _node_queue_key(node_id: str) -> str:
+    return f"node_tasks:{node_id}"
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+# 以下脚本都会访问未在 KEYS 中声明的 task:* / node_tasks:* 键（见模块说明），只能用于单实例 Redis。
+
+# 领取任务：按 KEYS[2..] 的顺序从各队列取分数最小的任务，移入 inflight 并写入租约令牌。
+# ARGV[6] 为被窃取队列在 KEYS 中的下标（0 表示不窃取），窃取时只取超过阈值的部分，且从队尾取。
+# 返回扁平列表 [task_id, 令牌, task_type, data, timeout, ...]
+_CLAIM_LUA = """
+local inflight = KEYS[1]
+local worker, node = ARGV[1], ARGV[2]
+local now, lease, want = tonumber(ARGV[3]), tonumber(ARGV[4]), tonumber(ARGV[5])
+local steal_from, threshold = tonumber(ARGV[6]), tonumber(ARGV[7])
+local claimed, count = {}, 0
+for i = 2, #KEYS do
+    if count >= want then break end
+    local queue = KEYS[i]
+    local ids
+    if i == steal_from then
+        local available = math.min(redis.call('ZCARD', queue) - threshold, want - count)
+        ids = {}
+        if available > 0 then ids = redis.call('ZRANGE', queue, -available, -1) end
+    else
+        ids = redis.call('ZRANGE', queue, 0, want - count - 1)
+    end
+    for _, id in ipairs(ids) do
+        redis.call('ZREM', queue, id)
+        local key = 'task:' .. id
+        local status = redis.call('HGET', key, 'status')
+        if status == 'pending' or status == 'assigned' then
+            local token = worker .. ':' .. redis.call('HINCRBY', key, 'attempt', 1)
+            redis.call('HSET', key, 'status', 'processing', 'assigned_node', node,
+                       'lease_token', token, 'started_at', ARGV[8])
+            redis.call('ZADD', inflight, now + lease, id)
+            local fields = redis.call('HMGET', key, 'task_type', 'data', 'timeout')
+            table.insert(claimed, id)
+            table.insert(claimed, token)
+            table.insert(claimed, fields[1] or '')
+            table.insert(claimed, fields[2] or '')
+            table.insert(claimed, fields[3] or '')
+            count = count + 1
+        end
+    end
+end
+return claimed
+"""
+
+# 延长租约：ARGV = [新的到期时间, task_id, 令牌, ...]；返回已失去租约的 task_id
+_EXTEND_LUA = """
+local expires = tonumber(ARGV[1])
+local lost = {}
+for i = 2, #ARGV, 2 do
+    local id, token = ARGV[i], ARGV[i + 1]
+    if redis.call('HGET', 'task:' .. id, 'lease_token') == token
+            and redis.call('ZSCORE', KEYS[1], id) then
+        redis.call('ZADD', KEYS[1], 'XX', expires, id)
+    else
+        table.insert(lost, id)
+    end
+end
+return lost
+"""
+
+# 结束任务：ARGV = [完成时间, 保留秒数, task_id, 令牌, 结果('completed'|'failed'), 结果或错误信息, ...]
+# 令牌不匹配（租约已被回收或任务已取消）的结果被丢弃；失败且未超过重试次数的任务放回 pending_tasks。
+# 返回 [接受的完成数, 重新排队数, 最终失败数, 丢弃数]
+_FINISH_LUA = """
+local inflight, pending, counter = KEYS[1], KEYS[2], KEYS[3]
+local finished_at, ttl = ARGV[1], tonumber(ARGV[2])
+local completed, requeued, failed, stale = 0, 0, 0, 0
+for i = 3, #ARGV, 4 do
+    local id, token, outcome, payload = ARGV[i], ARGV[i + 1], ARGV[i + 2], ARGV[i + 3]
+    local key = 'task:' .. id
+    if redis.call('HGET', key, 'lease_token') ~= token then
+        stale = stale + 1
+    else
+        redis.call('ZREM', inflight, id)
+        redis.call('HDEL', key, 'lease_token')
+        if outcome == 'completed' then
+            redis.call('HSET', key, 'status', 'completed', 'completed_at', finished_at, 'result', payload)
+            redis.call('EXPIRE', key, ttl)
+            redis.call('INCR', counter)
+            completed = completed + 1
+        else
+            local retry = redis.call('HINCRBY', key, 'current_retry', 1)
+            if retry > tonumber(redis.call('HGET', key, 'max_retries') or '0') then
+                redis.call('HSET', key, 'status', 'failed', 'completed_at', finished_at, 'error_message', payload)
+                redis.call('EXPIRE', key, ttl)
+                failed = failed + 1
+            else
+                redis.call('HSET', key, 'status', 'pending', 'error_message', payload)
+                redis.call('ZADD', pending, redis.call('HGET', key, 'queue_score'), id)
+                requeued = requeued + 1
+            end
+        end
+    end
+end
+return {completed, requeued, failed, stale}
+"""
+
+# 回收租约过期的任务：ARGV = [当前时间, 上限, 保留秒数]；返回 [重新排队数, 最终失败数]
+_REAP_LUA = """
+local inflight, pending = KEYS[1], KEYS[2]
+local ids = redis.call('ZRANGEBYSCORE', inflight, '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+local requeued, failed = 0, 0
+for _, id in ipairs(ids) do
+    redis.call('ZREM', inflight, id)
+    local key = 'task:' .. id
+    if redis.call('HGET', key, 'status') == 'processing' then
+        redis.call('HDEL', key, 'lease_token')
+        local retry = redis.call('HINCRBY', key, 'current_retry', 1)
+        if retry > tonumber(redis.call('HGET', key, 'max_retries') or '0') then
+            redis.call('HSET', key, 'status', 'failed', 'error_message', 'lease expired')
+            redis.call('EXPIRE', key, tonumber(ARGV[3]))
+            failed = failed + 1
+        else
+            redis.call('HSET', key, 'status', 'pending')
+            redis.call('ZADD', pending, redis.call('HGET', key, 'queue_score'), id)
+            requeued = requeued + 1
+        end
+    end
+end
+return {requeued, failed}
+"""
+
+# 把 pending_tasks 中最靠前的任务分派到节点队列：ARGV = [节点ID, 数量, ...]；返回分派总数
+_DISPATCH_LUA = """
+local dispatched = 0
+for i = 1, #ARGV, 2 do
+    local node, want = ARGV[i], tonumber(ARGV[i + 1])
+    local entries = redis.call('ZRANGE', KEYS[1], 0, want - 1, 'WITHSCORES')
+    for j = 1, #entries, 2 do
+        local id = entries[j]
+        redis.call('ZREM', KEYS[1], id)
+        redis.call('ZADD', 'node_tasks:' .. node, entries[j + 1], id)
+        redis.call('HSET', 'task:' .. id, 'status', 'assigned', 'assigned_node', node)
+        dispatched = dispatched + 1
+    end
+end
+return dispatched
+"""
+
+# 移除心跳超时的节点：节点队列中的任务放回 pending_tasks。ARGV = [节点ID, 超时界限]
+# 节点在检查与移除之间恢复了心跳时不做任何事；返回放回的任务数，未移除返回 -1
+_RELEASE_NODE_LUA = """
+local nodes, pending, queue, node_hash = KEYS[1], KEYS[2], KEYS[3], KEYS[4]
+local heartbeat = redis.call('ZSCORE', nodes, ARGV[1])
+if heartbeat and tonumber(heartbeat) >= tonumber(ARGV[2]) then return -1 end
+local entries = redis.call('ZRANGE', queue, 0, -1, 'WITHSCORES')
+for j = 1, #entries, 2 do
+    redis.call('ZADD', pending, entries[j + 1], entries[j])
+    redis.call('HSET', 'task:' .. entries[j], 'status', 'pending')
+    redis.call('HDEL', 'task:' .. entries[j], 'assigned_node')
+end
+redis.call('DEL', queue, node_hash)
+redis.call('ZREM', nodes, ARGV[1])
+return #entries / 2
+"""
+
+# 取消任务：从所有队列移除并作废租约；返回 1 表示已取消，0 表示不存在或已结束
+_CANCEL_LUA = """
+local key = 'task:' .. ARGV[1]
+local status = redis.call('HGET', key, 'status')
+if not status or status == 'completed' or status == 'failed' or status == 'cancelled' then return 0 end
+local node = redis.call('HGET', key, 'assigned_node')
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('ZREM', KEYS[2], ARGV[1])
+if node then redis.call('ZREM', 'node_tasks:' .. node, ARGV[1]) end
+redis.call('HSET', key, 'status', 'cancelled')
+redis.call('HDEL', key, 'lease_token')
+redis.call('EXPIRE', key, tonumber(ARGV[2]))
+return 1
+"""
+
+
+def _redis_value(value: Any) -> str:
+    """把字段值转换为可写入 Redis 哈希的字符串"""
+    if value is None:
+        return ""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    return str(value)
+
 class NodeRole(str, Enum):
     """节点角色"""
     COORDINATOR = "coordinator"  # 协调者节点
@@ -47,6 +278,13 @@ class DistributedTaskStatus(str, Enum):
     FAILED = "failed"
     CANCELLED = "cancelled"
 
+_PRIORITY_RANK = {
+    TaskPriority.URGENT: 0,
+    TaskPriority.HIGH: 1,
+    TaskPriority.NORMAL: 2,
+    TaskPriority.LOW: 3
+}
+
 @dataclass
 class NodeInfo:
     """节点信息"""
@@ -60,6 +298,35 @@ class NodeInfo:
     active_tasks: int = 0
     max_tasks: int = 10
     last_heartbeat: Optional[datetime] = None
+    queued_tasks: int = 0  # 节点队列中等待的任务数（读取时从 node_tasks 统计，不写入哈希）
+
+    def to_redis(self) -> Dict[str, str]:
+        """转换为 Redis 哈希字段"""
+        data = asdict(self)
+        data.pop('queued_tasks')
+        return {key: _redis_value(value) for key, value in data.items()}
+
+    @classmethod
+    def from_redis(cls, data: Dict[str, str], queued_tasks: int = 0) -> 'NodeInfo':
+        """从 Redis 哈希字段创建实例"""
+        return cls(
+            node_id=data['node_id'],
+            host=data.get('host', ''),
+            port=int(data.get('port') or 0),
+            role=NodeRole(data.get('role') or NodeRole.HYBRID),
+            capabilities=json.loads(data.get('capabilities') or '[]'),
+            cpu_usage=float(data.get('cpu_usage') or 0.0),
+            memory_usage=float(data.get('memory_usage') or 0.0),
+            active_tasks=int(data.get('active_tasks') or 0),
+            max_tasks=int(data.get('max_tasks') or 10),
+            last_heartbeat=datetime.fromisoformat(data['last_heartbeat']) if data.get('last_heartbeat') else None,
+            queued_tasks=queued_tasks
+        )
+
+    @property
+    def load(self) -> float:
+        """负载：(执行中 + 排队) / 容量"""
+        return (self.active_tasks + self.queued_tasks) / max(self.max_tasks, 1)
 
 @dataclass
 class DistributedTask:
@@ -104,6 +371,49 @@ class DistributedTask:
                 data[key] = datetime.fromisoformat(data[key])
         return cls(**data)
 
+    @property
+    def queue_score(self) -> int:
+        """队列分数：优先级高的在前，同优先级按提交时间先后"""
+        return _PRIORITY_RANK.get(self.priority, 2) * 10 ** 13 + int(self.created_at.timestamp() * 1000)
+
+    def to_redis(self) -> Dict[str, str]:
+        """转换为 Redis 哈希字段（附带调度用的 queue_score）"""
+        mapping = {key: _redis_value(value) for key, value in asdict(self).items()}
+        mapping['queue_score'] = str(self.queue_score)
+        return mapping
+
+    @classmethod
+    def from_redis(cls, data: Dict[str, str]) -> 'DistributedTask':
+        """从 Redis 哈希字段创建实例，忽略 lease_token 等调度字段"""
+        values: Dict[str, Any] = {}
+        for field in fields(cls):
+            raw = data.get(field.name)
+            if raw is None or raw == "":
+                continue
+            if field.name in ('data', 'dependencies', 'result'):
+                values[field.name] = json.loads(raw)
+            elif field.name in ('created_at', 'started_at', 'completed_at'):
+                values[field.name] = datetime.fromisoformat(raw)
+            elif field.name in ('max_retries', 'current_retry', 'timeout'):
+                values[field.name] = int(raw)
+            elif field.name == 'priority':
+                values[field.name] = TaskPriority(raw)
+            elif field.name == 'status':
+                values[field.name] = DistributedTaskStatus(raw)
+            else:
+                values[field.name] = raw
+        values.setdefault('data', {})
+        return cls(**values)
+
+@dataclass
+class ClaimedTask:
+    """工作者领取到的任务"""
+    task_id: str
+    lease_token: str
+    task_type: str
+    data: Dict[str, Any]
+    timeout: float
+
 class DistributedService:
     """分布式处理服务"""
     
@@ -113,6 +423,10 @@ class DistributedService:
         self.task_queue = None
         self.node_manager = None
         self.load_balancer = None
+        self.worker = None
+        self.node = None
+        self.handlers: Dict[str, Callable] = {}
+        self._background = []
         self.is_initialized = False
 
     async def initialize(self, node_role: NodeRole = NodeRole.HYBRID, 
@@ -121,12 +435,14 @@ class DistributedService:
         """初始化分布式系统"""
         try:
             # 连接Redis
-            self.redis_client = redis.from_url(self.redis_url, decode_responses=True)
+            self.redis_client = aioredis.from_url(self.redis_url, decode_responses=True)
             
             # 初始化组件
             self.task_queue = DistributedTaskQueue(self.redis_client)
             self.node_manager = NodeManager(self.redis_client)
-            self.load_balancer = LoadBalancer()
+            self.load_balancer = LoadBalancer(self.node_manager)
+            self.task_queue.node_manager = self.node_manager
+            self.task_queue.load_balancer = self.load_balancer
             
             # 注册当前节点
             current_node = NodeInfo(
@@ -134,13 +450,22 @@ class DistributedService:
                 host=host,
                 port=port,
                 role=node_role,
-                capabilities=capabilities or ["general"]
+                capabilities=capabilities or ["general"],
+                max_tasks=DISTRIBUTED_WORKER_CONCURRENCY
             )
             
             await self.node_manager.register_node(current_node)
+            self.node = current_node
             
-            # 启动后台任务
-            asyncio.create_task(self._background_tasks())
+            # 启动后台任务：工作节点领取并执行任务，协调节点分派任务、回收租约、清理节点
+            if node_role in (NodeRole.WORKER, NodeRole.HYBRID):
+                self.worker = DistributedWorker(
+                    self.redis_client, current_node.node_id, self.handlers,
+                    concurrency=current_node.max_tasks, load_balancer=self.load_balancer
+                )
+                self._background.append(asyncio.create_task(self.worker.run()))
+            if node_role in (NodeRole.COORDINATOR, NodeRole.HYBRID):
+                self._background.append(asyncio.create_task(self._background_tasks()))
             
             self.is_initialized = True
             logger.info(f"分布式系统初始化完成，节点ID: {current_node.node_id}")
@@ -151,6 +476,20 @@ class DistributedService:
             logger.error(f"初始化分布式系统失败: {e}")
             raise
 
+    def register_handler(self, task_type: str, handler: Callable):
+        """注册任务处理函数（同步函数在线程中执行），参数为任务的 data 字典"""
+        self.handlers[task_type] = handler
+
+    async def shutdown(self):
+        """停止工作者和后台任务"""
+        if self.worker:
+            self.worker.stop()
+        for task in self._background:
+            task.cancel()
+        await asyncio.gather(*self._background, return_exceptions=True)
+        self._background = []
+        self.is_initialized = False
+
     async def submit_task(self, task_type: str, data: Dict[str, Any],
                          priority: TaskPriority = TaskPriority.NORMAL,
                          max_retries: int = 3, timeout: int = 3600,
@@ -189,13 +528,19 @@ class DistributedService:
             return {}
             
         try:
-            active_nodes = await self.node_manager.get_active_nodes()
-            pending_tasks = await self.redis_client.zcard("pending_tasks")
+            active_nodes = await self.load_balancer.get_node_loads()
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.zcard(PENDING_TASKS_KEY)
+            pipe.zcard(INFLIGHT_TASKS_KEY)
+            pipe.get(TOTAL_PROCESSED_KEY)
+            pending_tasks, inflight_tasks, total_processed = await pipe.execute()
             
             return {
                 "active_nodes": len(active_nodes),
                 "pending_tasks": pending_tasks,
-                "total_processed": await self.redis_client.get("total_processed") or 0,
+                "queued_on_nodes": sum(node.queued_tasks for node in active_nodes),
+                "inflight_tasks": inflight_tasks,
+                "total_processed": total_processed or 0,
                 "system_load": await self._get_system_load()
             }
         except Exception as e:
@@ -209,13 +554,16 @@ class DistributedService:
                 if self.task_queue:
                     await self.task_queue._process_pending_tasks()
                     await self.task_queue._check_timeout_tasks()
-                    await self.task_queue._cleanup_completed_tasks()
                 
                 if self.node_manager:
+                    if self.worker is None:
+                        await self.node_manager.heartbeat(self.node.node_id)
                     await self.node_manager._cleanup_inactive_nodes()
                     
                 await asyncio.sleep(10)  # 每10秒执行一次
                 
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 logger.error(f"后台任务执行失败: {e}")
                 await asyncio.sleep(30)
@@ -235,80 +583,179 @@ class DistributedTaskQueue:
         self.redis_client = redis_client
         self.node_manager = None
         self.load_balancer = None
+        self._scripts: Dict[str, Any] = {}
 
-    async def submit_task(self, task: DistributedTask) -> str:
-        """提交任务到分布式队列"""
-        # 保存任务到Redis
-        await self.redis_client.hset(
-            f"task:{task.task_id}",
-            mapping=task.to_dict()
-        )
-        
-        # 添加到待处理队列
-        priority_score = {
-            TaskPriority.LOW: 1,
-            TaskPriority.NORMAL: 2,
-            TaskPriority.HIGH: 3,
-            TaskPriority.URGENT: 4
-        }.get(task.priority, 2)
-        
-        await self.redis_client.zadd("pending_tasks", {task.task_id: priority_score})
+    def _script(self, name: str, source: str):
+        if name not in self._scripts:
+            self._scripts[name] = self.redis_client.register_script(source)
+        return self._scripts[name]
         
+    async def submit_task(self, task: DistributedTask, node_id: Optional[str] = None) -> str:
+        """提交任务到分布式队列；指定 node_id 时直接放入该节点队列"""
+        await self.submit_tasks([task], node_id)
         logger.info(f"任务 {task.task_id} ({task.task_type}) 已提交到分布式队列")
         return task.task_id
 
+    async def submit_tasks(self, tasks: List[DistributedTask], node_id: Optional[str] = None) -> List[str]:
+        """批量提交任务（一次往返）"""
+        queue = _node_queue_key(node_id) if node_id else PENDING_TASKS_KEY
+        pipe = self.redis_client.pipeline(transaction=False)
+        for task in tasks:
+            if node_id:
+                task.status = DistributedTaskStatus.ASSIGNED
+                task.assigned_node = node_id
+            # 保存任务到Redis，然后加入队列
+            pipe.hset(_task_key(task.task_id), mapping=task.to_redis())
+            pipe.zadd(queue, {task.task_id: task.queue_score})
+        await pipe.execute()
+        return [task.task_id for task in tasks]
+
     async def get_task_status(self, task_id: str) -> Optional[Dict[str, Any]]:
         """获取任务状态"""
-        task_data = await self.redis_client.hgetall(f"task:{task_id}")
-        return task_data if task_data else None
+        task_data = await self.redis_client.hgetall(_task_key(task_id))
+        return DistributedTask.from_redis(task_data).to_dict() if task_data else None
 
     async def cancel_task(self, task_id: str) -> bool:
         """取消任务"""
-        task_data = await self.redis_client.hgetall(f"task:{task_id}")
-        if not task_data:
-            return False
+        cancelled = await self._script("cancel", _CANCEL_LUA)(
+            keys=[PENDING_TASKS_KEY, INFLIGHT_TASKS_KEY],
+            args=[task_id, DISTRIBUTED_FINISHED_TTL_SECONDS]
+        )
+        return bool(cancelled)
             
-        # 更新状态
-        await self.redis_client.hset(
-            f"task:{task_id}",
-            "status", DistributedTaskStatus.CANCELLED
+    async def claim(self, worker_id: str, node_id: str, count: int,
+                    lease_seconds: float = DISTRIBUTED_LEASE_SECONDS,
+                    steal_from: Optional[str] = None) -> List[ClaimedTask]:
+        """
+        原子领取最多 count 个任务：依次从本节点队列、全局队列取，不够时从 steal_from 节点队尾窃取
+        """
+        keys = [INFLIGHT_TASKS_KEY, _node_queue_key(node_id), PENDING_TASKS_KEY]
+        if steal_from and steal_from != node_id:
+            keys.append(_node_queue_key(steal_from))
+        reply = await self._script("claim", _CLAIM_LUA)(
+            keys=keys,
+            args=[
+                worker_id, node_id, _now_ms(), int(lease_seconds * 1000), count,
+                4 if len(keys) == 4 else 0, DISTRIBUTED_STEAL_THRESHOLD, datetime.now().isoformat()
+            ]
         )
+        return [
+            ClaimedTask(
+                task_id=reply[i],
+                lease_token=reply[i + 1],
+                task_type=reply[i + 2],
+                data=json.loads(reply[i + 3]) if reply[i + 3] else {},
+                timeout=float(reply[i + 4] or 3600)
+            )
+            for i in range(0, len(reply), 5)
+        ]
         
-        # 从待处理队列移除
-        await self.redis_client.zrem("pending_tasks", task_id)
+    async def extend_leases(self, leases: Dict[str, str],
+                            lease_seconds: float = DISTRIBUTED_LEASE_SECONDS) -> List[str]:
+        """延长持有任务的租约，返回已失去租约（被回收或取消）的 task_id"""
+        if not leases:
+            return []
+        args = [_now_ms() + int(lease_seconds * 1000)]
+        for task_id, token in leases.items():
+            args.extend((task_id, token))
+        return await self._script("extend", _EXTEND_LUA)(keys=[INFLIGHT_TASKS_KEY], args=args)
         
-        return True
-
-    # 其他方法省略以保持文件简洁...
+    async def finish(self, outcomes: List[Tuple[str, str, bool, Any]]) -> Dict[str, int]:
+        """
+        提交一批执行结果：[(task_id, 令牌, 是否成功, 结果字典或错误信息)]
+        返回 {"completed", "requeued", "failed", "stale"}
+        """
+        if not outcomes:
+            return {"completed": 0, "requeued": 0, "failed": 0, "stale": 0}
+        args = [datetime.now().isoformat(), DISTRIBUTED_FINISHED_TTL_SECONDS]
+        for task_id, token, succeeded, payload in outcomes:
+            args.extend((
+                task_id, token, 'completed' if succeeded else 'failed',
+                json.dumps(payload, ensure_ascii=False, default=str) if succeeded else str(payload)
+            ))
+        completed, requeued, failed, stale = await self._script("finish", _FINISH_LUA)(
+            keys=[INFLIGHT_TASKS_KEY, PENDING_TASKS_KEY, TOTAL_PROCESSED_KEY], args=args
+        )
+        if stale:
+            logger.warning(f"{stale} 个任务的租约已失效，结果被丢弃")
+        return {"completed": completed, "requeued": requeued, "failed": failed, "stale": stale}
+
+    async def _check_timeout_tasks(self, limit: int = 1000) -> Dict[str, int]:
+        """回收租约过期的任务（持有者崩溃或失联），重新放回全局队列"""
+        requeued, failed = await self._script("reap", _REAP_LUA)(
+            keys=[INFLIGHT_TASKS_KEY, PENDING_TASKS_KEY],
+            args=[_now_ms(), limit, DISTRIBUTED_FINISHED_TTL_SECONDS]
+        )
+        if requeued or failed:
+            logger.info(f"回收过期租约: 重新排队 {requeued} 个，失败 {failed} 个")
+        return {"requeued": requeued, "failed": failed}
+
+    async def _process_pending_tasks(self) -> int:
+        """按各节点的空闲容量把全局队列中的任务分派到节点队列"""
+        if self.load_balancer is None:
+            return 0
+        nodes = await self.load_balancer.get_node_loads(refresh=True)
+        args = []
+        for node in nodes:
+            if node.role == NodeRole.COORDINATOR:
+                continue
+            free = node.max_tasks - node.active_tasks - node.queued_tasks
+            if free > 0:
+                args.extend((node.node_id, free))
+        if not args:
+            return 0
+        return await self._script("dispatch", _DISPATCH_LUA)(keys=[PENDING_TASKS_KEY], args=args)
 
 # 节点管理器
 class NodeManager:
     """节点管理器"""
     
-    def __init__(self, redis_client):
+    def __init__(self, redis_client, node_timeout: float = DISTRIBUTED_NODE_TIMEOUT_SECONDS):
         self.redis_client = redis_client
+        self.node_timeout = node_timeout
+        self._release_script = None
 
     async def register_node(self, node: NodeInfo):
         """注册节点"""
         node.last_heartbeat = datetime.now()
-        await self.redis_client.hset(
-            f"node:{node.node_id}",
-            mapping=asdict(node)
-        )
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.hset(_node_key(node.node_id), mapping=node.to_redis())
+        pipe.zadd(NODES_KEY, {node.node_id: _now_ms()})
+        await pipe.execute()
         logger.info(f"节点 {node.node_id} 已注册")
 
+    async def heartbeat(self, node_id: str, active_tasks: Optional[int] = None):
+        """节点心跳：刷新 nodes 中的时间戳和节点负载"""
+        fields = {
+            'last_heartbeat': datetime.now().isoformat(),
+            'cpu_usage': psutil.cpu_percent(),
+            'memory_usage': psutil.virtual_memory().percent
+        }
+        if active_tasks is not None:
+            fields['active_tasks'] = active_tasks
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.hset(_node_key(node_id), mapping=fields)
+        pipe.zadd(NODES_KEY, {node_id: _now_ms()})
+        await pipe.execute()
+
     async def get_active_nodes(self) -> List[NodeInfo]:
         """获取活跃节点"""
-        node_keys = await self.redis_client.keys("node:*")
+        cutoff = _now_ms() - int(self.node_timeout * 1000)
+        node_ids = await self.redis_client.zrangebyscore(NODES_KEY, cutoff, "+inf")
+        if not node_ids:
+            return []
+
+        pipe = self.redis_client.pipeline(transaction=False)
+        for node_id in node_ids:
+            pipe.hgetall(_node_key(node_id))
+            pipe.zcard(_node_queue_key(node_id))
+        replies = await pipe.execute()
+
         active_nodes = []
-        
-        for key in node_keys:
-            node_data = await self.redis_client.hgetall(key)
+        for node_data, queued in zip(replies[0::2], replies[1::2]):
             if node_data:
                 try:
-                    node = NodeInfo(**node_data)
-                    if self._is_node_active(node):
-                        active_nodes.append(node)
+                    active_nodes.append(NodeInfo.from_redis(node_data, queued))
                 except Exception as e:
                     logger.error(f"解析节点数据失败: {e}")
                     
@@ -318,35 +765,186 @@ class NodeManager:
         """检查节点是否活跃"""
         if not node.last_heartbeat:
             return False
-        return (datetime.now() - node.last_heartbeat).total_seconds() < 300
+        return (datetime.now() - node.last_heartbeat).total_seconds() < self.node_timeout
 
     async def _cleanup_inactive_nodes(self):
-        """清理非活跃节点"""
-        node_keys = await self.redis_client.keys("node:*")
+        """清理非活跃节点，节点队列中尚未执行的任务放回全局队列"""
+        cutoff = _now_ms() - int(self.node_timeout * 1000)
+        node_ids = await self.redis_client.zrangebyscore(NODES_KEY, "-inf", f"({cutoff}")
+        if not node_ids:
+            return
+        if self._release_script is None:
+            self._release_script = self.redis_client.register_script(_RELEASE_NODE_LUA)
         
-        for key in node_keys:
-            node_data = await self.redis_client.hgetall(key)
-            if node_data:
-                try:
-                    node = NodeInfo(**node_data)
-                    if not self._is_node_active(node):
-                        await self.redis_client.delete(key)
-                        logger.info(f"清理非活跃节点: {node.node_id}")
-                except Exception as e:
-                    logger.error(f"清理节点失败: {e}")
+        for node_id in node_ids:
+            try:
+                released = await self._release_script(
+                    keys=[NODES_KEY, PENDING_TASKS_KEY, _node_queue_key(node_id), _node_key(node_id)],
+                    args=[node_id, cutoff]
+                )
+                if released >= 0:
+                    logger.info(f"清理非活跃节点: {node_id}，{released} 个排队任务放回全局队列")
+            except Exception as e:
+                logger.error(f"清理节点失败: {e}")
 
 # 负载均衡器
 class LoadBalancer:
-    """负载均衡器"""
+    """负载均衡器（节点负载在本地缓存 cache_ttl 秒，避免每次选择都读取所有节点）"""
+
+    def __init__(self, node_manager: Optional[NodeManager] = None,
+                 cache_ttl: float = DISTRIBUTED_LOAD_CACHE_SECONDS):
+        self.node_manager = node_manager
+        self.cache_ttl = cache_ttl
+        self._nodes: List[NodeInfo] = []
+        self._loaded_at = float("-inf")
+        self._lock = asyncio.Lock()
+
+    async def get_node_loads(self, refresh: bool = False) -> List[NodeInfo]:
+        """活跃节点及其负载（带本地缓存）"""
+        if self.node_manager is None:
+            return []
+        if not refresh and time.monotonic() - self._loaded_at < self.cache_ttl:
+            return self._nodes
+        async with self._lock:
+            if refresh or time.monotonic() - self._loaded_at >= self.cache_ttl:
+                self._nodes = await self.node_manager.get_active_nodes()
+                self._loaded_at = time.monotonic()
+        return self._nodes
     
     async def select_optimal_node(self, task: DistributedTask, 
-                                 available_nodes: List[NodeInfo]) -> Optional[NodeInfo]:
+                                 available_nodes: Optional[List[NodeInfo]] = None) -> Optional[NodeInfo]:
         """选择最优节点"""
+        if available_nodes is None:
+            available_nodes = await self.get_node_loads()
         if not available_nodes:
             return None
             
-        # 简单的负载均衡策略：选择活跃任务最少的节点
-        return min(available_nodes, key=lambda node: node.active_tasks)
+        # 选择负载（执行中 + 排队 / 容量）最低的节点
+        return min(available_nodes, key=lambda node: node.load)
+
+    async def select_steal_victim(self, node_id: str) -> Optional[str]:
+        """空闲节点窃取任务的来源：排队任务最多且超过窃取阈值的其他节点"""
+        candidates = [
+            node for node in await self.get_node_loads()
+            if node.node_id != node_id and node.queued_tasks > DISTRIBUTED_STEAL_THRESHOLD
+        ]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda node: node.queued_tasks).node_id
+
+# 工作者
+class DistributedWorker:
+    """
+    领取并执行任务的工作者，每个节点运行一个（节点内并发度为 concurrency）
+
+    循环：领取一批任务 → 并发执行 → 一次性提交结果；后台心跳延长租约、刷新节点负载、回收过期租约
+    """
+
+    def __init__(self, redis_client, node_id: str, handlers: Dict[str, Callable],
+                 concurrency: int = DISTRIBUTED_WORKER_CONCURRENCY,
+                 lease_seconds: float = DISTRIBUTED_LEASE_SECONDS,
+                 heartbeat_seconds: float = DISTRIBUTED_HEARTBEAT_SECONDS,
+                 poll_seconds: float = DISTRIBUTED_POLL_SECONDS,
+                 load_balancer: Optional[LoadBalancer] = None):
+        self.node_id = node_id
+        self.worker_id = f"{node_id}/{uuid.uuid4().hex[:8]}"
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.poll_seconds = poll_seconds
+        self.task_queue = DistributedTaskQueue(redis_client)
+        self.node_manager = NodeManager(redis_client)
+        self.load_balancer = load_balancer or LoadBalancer(self.node_manager)
+        self.leases: Dict[str, str] = {}
+        self.stats = {"completed": 0, "requeued": 0, "failed": 0, "stale": 0, "stolen_batches": 0}
+        self._stopping = asyncio.Event()
+
+    def stop(self):
+        self._stopping.set()
+
+    async def run(self):
+        """运行直到 stop() 被调用"""
+        heartbeat = asyncio.create_task(self._heartbeat_loop())
+        try:
+            idle = 0
+            while not self._stopping.is_set():
+                if await self.run_once():
+                    idle = 0
+                    continue
+                # 无任务时退避轮询
+                idle = min(idle + 1, 4)
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), self.poll_seconds * idle)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+
+    async def run_once(self) -> int:
+        """领取并执行一批任务，返回领取到的任务数"""
+        tasks = await self.task_queue.claim(self.worker_id, self.node_id, self.concurrency, self.lease_seconds)
+        if not tasks:
+            victim = await self.load_balancer.select_steal_victim(self.node_id)
+            if victim:
+                tasks = await self.task_queue.claim(
+                    self.worker_id, self.node_id, self.concurrency, self.lease_seconds, steal_from=victim
+                )
+                if tasks:
+                    self.stats["stolen_batches"] += 1
+        if not tasks:
+            return 0
+
+        for task in tasks:
+            self.leases[task.task_id] = task.lease_token
+        try:
+            results = await asyncio.gather(*(self._execute(task) for task in tasks))
+        finally:
+            # 提交结果前就不再续租，避免心跳把刚结束的任务误报为失去租约
+            for task in tasks:
+                self.leases.pop(task.task_id, None)
+        summary = await self.task_queue.finish([
+            (task.task_id, task.lease_token, succeeded, payload)
+            for task, (succeeded, payload) in zip(tasks, results)
+        ])
+        for key, value in summary.items():
+            self.stats[key] += value
+        return len(tasks)
+
+    async def _execute(self, task: ClaimedTask) -> Tuple[bool, Any]:
+        handler = self.handlers.get(task.task_type)
+        if handler is None:
+            return False, f"未注册的任务类型: {task.task_type}"
+        try:
+            if asyncio.iscoroutinefunction(handler):
+                result = await asyncio.wait_for(handler(task.data), task.timeout)
+            else:
+                result = await asyncio.wait_for(asyncio.to_thread(handler, task.data), task.timeout)
+            return True, result if result is not None else {}
+        except asyncio.TimeoutError:
+            return False, f"任务执行超时（{task.timeout:g}秒）"
+        except Exception as e:
+            logger.error(f"任务 {task.task_id} ({task.task_type}) 执行失败: {e}")
+            return False, str(e) or type(e).__name__
+
+    async def _heartbeat_loop(self):
+        while True:
+            try:
+                held = dict(self.leases)
+                lost = [
+                    task_id for task_id in await self.task_queue.extend_leases(held, self.lease_seconds)
+                    if self.leases.get(task_id) == held[task_id]
+                ]
+                if lost:
+                    logger.warning(f"工作者 {self.worker_id} 失去 {len(lost)} 个任务的租约")
+                await self.node_manager.heartbeat(self.node_id, len(self.leases))
+                await self.task_queue._check_timeout_tasks()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"工作者心跳失败: {e}")
+            await asyncio.sleep(self.heartbeat_seconds)
 
 # 创建全局实例
 distributed_service = DistributedService()
@@ -362,6 +960,10 @@ async def init_distributed_system(redis_url: str = None,
     return await distributed_service.initialize(node_role, host, port, capabilities)
 
 # 便捷函数
+def register_distributed_handler(task_type: str, handler: Callable):
+    """注册分布式任务处理函数"""
+    distributed_service.register_handler(task_type, handler)
+
 async def submit_distributed_task(task_type: str, data: Dict[str, Any],
                                  priority: TaskPriority = TaskPriority.NORMAL,
                                  max_retries: int = 3, timeout: int = 3600,
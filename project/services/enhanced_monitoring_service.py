@@ -10,7 +10,7 @@ import json
 import time
 import logging
 import psutil
-import redis
+import redis.asyncio as aioredis
 from typing import Dict, List, Optional, Any, Callable, Union
 from datetime import datetime, timedelta
 from enum import Enum
@@ -29,6 +29,8 @@ import schedule
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 
+from project.utils.monitoring.timeseries_store import TimeSeriesStore
+
 logger = logging.getLogger(__name__)
 
 class AlertLevel(str, Enum):
@@ -93,6 +95,7 @@ class EnhancedMonitoringService:
     def __init__(self, redis_url: str = None, config_file: str = None):
         self.redis_url = redis_url or "redis://localhost:6379/0"
         self.redis_client = None
+        self.timeseries: Optional[TimeSeriesStore] = None
         self.config = self._load_config(config_file)
         self.thresholds = {}
         self.active_alerts = {}
@@ -104,7 +107,9 @@ class EnhancedMonitoringService:
         """初始化监控系统"""
         try:
             # 连接Redis
-            self.redis_client = redis.from_url(self.redis_url, decode_responses=True)
+            self.redis_client = aioredis.from_url(self.redis_url, decode_responses=True)
+            # 时间序列读写二进制记录，需要单独的不解码连接
+            self.timeseries = TimeSeriesStore(aioredis.from_url(self.redis_url))
             
             # 加载阈值配置
             await self._load_thresholds()
@@ -132,6 +137,7 @@ class EnhancedMonitoringService:
         asyncio.create_task(self._monitor_system_metrics())
         asyncio.create_task(self._check_alert_conditions())
         asyncio.create_task(self._cleanup_old_data())
+        asyncio.create_task(self._rollup_metrics())
         
         logger.info("系统监控已启动")
 
@@ -155,46 +161,59 @@ class EnhancedMonitoringService:
 
     async def record_metric(self, metric: SystemMetric):
         """记录指标"""
-        # 存储到Redis
-        await self.redis_client.lpush(
-            f"metrics:{metric.name}",
-            json.dumps({
-                "value": metric.value,
-                "timestamp": metric.timestamp.isoformat(),
-                "tags": metric.tags or {}
-            })
+        await self.record_metrics([metric])
+
+    async def record_metrics(self, metrics: List[SystemMetric]):
+        """批量记录指标（整批一次管道写入时间序列存储）"""
+        if not metrics:
+            return
+        await self.timeseries.write(
+            (metric.name, metric.timestamp.timestamp(), float(metric.value)) for metric in metrics
         )
         
-        # 保留最近1000条记录
-        await self.redis_client.ltrim(f"metrics:{metric.name}", 0, 999)
-        
         # 添加到内存历史
-        self.metrics_history.append(metric)
+        self.metrics_history.extend(metrics)
 
     async def get_metric_history(self, metric_name: str, 
-                                time_range: timedelta = None) -> List[Dict[str, Any]]:
-        """获取指标历史"""
-        if not time_range:
-            time_range = timedelta(hours=1)
+                                time_range: timedelta = None,
+                                start: datetime = None,
+                                end: datetime = None,
+                                step: Union[int, float, timedelta] = None) -> List[Dict[str, Any]]:
+        """
+        获取指标历史（按时间倒序）
+
+        自动选择满足 step（秒）的最粗分辨率；原始采样返回 value，聚合桶额外返回 min/max/sum/count，value 为均值
+        """
+        end = end or datetime.now()
+        if not start:
+            start = end - (time_range or timedelta(hours=1))
+        if isinstance(step, timedelta):
+            step = step.total_seconds()
             
-        cutoff_time = datetime.now() - time_range
-        
-        # 从Redis获取
-        raw_data = await self.redis_client.lrange(f"metrics:{metric_name}", 0, -1)
+        resolution, records = await self.timeseries.query(
+            metric_name, start.timestamp(), end.timestamp(), step
+        )
         
         history = []
-        for data in raw_data:
-            try:
-                metric_data = json.loads(data)
-                timestamp = datetime.fromisoformat(metric_data["timestamp"])
-                
-                if timestamp >= cutoff_time:
-                    history.append(metric_data)
-                    
-            except Exception as e:
-                logger.error(f"解析指标数据失败: {e}")
-                
-        return sorted(history, key=lambda x: x["timestamp"], reverse=True)
+        if resolution is self.timeseries.raw:
+            for record in records[::-1]:
+                history.append({
+                    "value": float(record["value"]),
+                    "timestamp": datetime.fromtimestamp(int(record["ts"])).isoformat()
+                })
+        else:
+            for record in records[::-1]:
+                count = int(record["count"])
+                history.append({
+                    "value": float(record["sum"]) / count,
+                    "timestamp": datetime.fromtimestamp(int(record["ts"])).isoformat(),
+                    "resolution": resolution.name,
+                    "min": float(record["min"]),
+                    "max": float(record["max"]),
+                    "sum": float(record["sum"]),
+                    "count": count
+                })
+        return history
 
     async def get_active_alerts(self) -> List[Alert]:
         """获取活跃告警"""
@@ -239,16 +258,16 @@ class EnhancedMonitoringService:
             try:
                 # CPU使用率
                 cpu_usage = psutil.cpu_percent(interval=1)
-                await self.record_metric(SystemMetric(
+                batch = [SystemMetric(
                     name="system.cpu.usage",
                     value=cpu_usage,
                     timestamp=datetime.now(),
                     metric_type=MetricType.GAUGE
-                ))
+                )]
                 
                 # 内存使用率
                 memory = psutil.virtual_memory()
-                await self.record_metric(SystemMetric(
+                batch.append(SystemMetric(
                     name="system.memory.usage",
                     value=memory.percent,
                     timestamp=datetime.now(),
@@ -257,7 +276,7 @@ class EnhancedMonitoringService:
                 
                 # 磁盘使用率
                 disk = psutil.disk_usage('/')
-                await self.record_metric(SystemMetric(
+                batch.append(SystemMetric(
                     name="system.disk.usage",
                     value=(disk.used / disk.total) * 100,
                     timestamp=datetime.now(),
@@ -265,7 +284,10 @@ class EnhancedMonitoringService:
                 ))
                 
                 # 应用指标
-                await self._collect_application_metrics()
+                await self._collect_application_metrics(batch)
+                
+                # 本轮采集的指标一次写入
+                await self.record_metrics(batch)
                 
                 await asyncio.sleep(30)  # 每30秒采集一次
                 
@@ -273,20 +295,21 @@ class EnhancedMonitoringService:
                 logger.error(f"采集系统指标失败: {e}")
                 await asyncio.sleep(60)
 
-    async def _collect_application_metrics(self):
-        """采集应用指标"""
+    async def _collect_application_metrics(self, batch: List[SystemMetric]):
+        """采集应用指标（追加到 batch）"""
+        self._collect_db_pool_metrics(batch)
         try:
             # Redis连接数
             if self.redis_client:
-                redis_info = self.redis_client.info()
-                await self.record_metric(SystemMetric(
+                redis_info = await self.redis_client.info()
+                batch.append(SystemMetric(
                     name="app.redis.connected_clients",
                     value=redis_info.get('connected_clients', 0),
                     timestamp=datetime.now(),
                     metric_type=MetricType.GAUGE
                 ))
                 
-                await self.record_metric(SystemMetric(
+                batch.append(SystemMetric(
                     name="app.redis.used_memory",
                     value=redis_info.get('used_memory', 0) / (1024**2),  # MB
                     timestamp=datetime.now(),
@@ -294,8 +317,8 @@ class EnhancedMonitoringService:
                 ))
             
             # 任务队列长度
-            queue_length = await self.redis_client.llen("pending_tasks") or 0
-            await self.record_metric(SystemMetric(
+            queue_length = await self.redis_client.zcard("pending_tasks") or 0
+            batch.append(SystemMetric(
                 name="app.queue.pending_tasks",
                 value=queue_length,
                 timestamp=datetime.now(),
@@ -307,7 +330,7 @@ class EnhancedMonitoringService:
             cache_misses = int(await self.redis_client.get("cache:misses") or 0)
             if cache_hits + cache_misses > 0:
                 hit_rate = (cache_hits / (cache_hits + cache_misses)) * 100
-                await self.record_metric(SystemMetric(
+                batch.append(SystemMetric(
                     name="app.cache.hit_rate",
                     value=hit_rate,
                     timestamp=datetime.now(),
@@ -317,6 +340,31 @@ class EnhancedMonitoringService:
         except Exception as e:
             logger.error(f"采集应用指标失败: {e}")
 
+    def _collect_db_pool_metrics(self, batch: List[SystemMetric]):
+        """采集数据库连接池指标（追加到 batch）"""
+        try:
+            from project.database_monitoring import get_pool_metrics
+            
+            for engine_name, stats in get_pool_metrics().items():
+                capacity = stats["size"] + stats["max_overflow"]
+                values = {
+                    "in_use": stats["in_use"],
+                    "utilization": (stats["in_use"] / capacity * 100) if capacity else 0,
+                    "checkout_wait_p95_ms": stats["checkout_wait_seconds"]["p95"] * 1000,
+                    "timeouts": stats["timeouts"],
+                    "long_held": len(stats["long_held_now"]),
+                }
+                for name, value in values.items():
+                    batch.append(SystemMetric(
+                        name=f"app.db.pool.{engine_name}.{name}",
+                        value=value,
+                        timestamp=datetime.now(),
+                        metric_type=MetricType.GAUGE,
+                        tags={"engine": engine_name}
+                    ))
+        except Exception as e:
+            logger.error(f"采集数据库连接池指标失败: {e}")
+
     async def _check_alert_conditions(self):
         """检查告警条件"""
         while self.is_monitoring:
@@ -442,12 +490,24 @@ class EnhancedMonitoringService:
                 logger.error(f"清理旧数据失败: {e}")
                 await asyncio.sleep(7200)
 
+    async def _rollup_metrics(self):
+        """定期把原始采样逐级汇总为 10秒/1分钟/1小时/1天 分辨率"""
+        interval = self.config.get("monitoring", {}).get("rollup_interval", 10)
+        while self.is_monitoring:
+            try:
+                # 多实例部署时由锁保证每轮只有一个实例汇总
+                await self.timeseries.rollup(lock_seconds=max(int(interval), 1))
+            except Exception as e:
+                logger.error(f"汇总指标时间序列失败: {e}")
+            await asyncio.sleep(interval)
+
     def _load_config(self, config_file: str = None) -> Dict[str, Any]:
         """加载配置"""
         default_config = {
             "monitoring": {
                 "enabled": True,
                 "collection_interval": 30,
+                "rollup_interval": 10,
                 "retention_days": 7
             },
             "alerts": {
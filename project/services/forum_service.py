@@ -3,7 +3,6 @@
 论坛服务层 - 统一业务逻辑处理
 应用courses模块的成功优化模式到论坛模块
 """
-import asyncio
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any, Tuple
 from sqlalchemy.orm import Session, joinedload
@@ -20,16 +19,19 @@ logger = logging.getLogger(__name__)
 class ForumService:
     """论坛核心业务逻辑服务"""
     
+    @staticmethod
+    def _load_ordered(query, model, ids: List[int]) -> List[Any]:
+        """按缓存中的ID顺序回表加载ORM对象（已删除的记录会被跳过）"""
+        if not ids:
+            return []
+        rows = query.filter(model.id.in_(ids)).all()
+        by_id = {row.id: row for row in rows}
+        return [by_id[i] for i in ids if i in by_id]
+    
     @staticmethod
     def get_topic_by_id_optimized(db: Session, topic_id: int, current_user_id: Optional[int] = None) -> ForumTopic:
         """优化的话题查询 - 使用预加载避免N+1查询"""
-        cache_key = f"topic:{topic_id}:detail"
-        
-        # 尝试从缓存获取
-        cached_topic = cache_manager.get(cache_key)
-        if cached_topic:
-            return cached_topic
-            
+        # 返回值是带关联关系的ORM实例，不进入缓存（缓存只存DTO）
         # 使用joinedload预加载相关数据
         topic = db.query(ForumTopic).options(
             joinedload(ForumTopic.author),
@@ -47,8 +49,6 @@ class ForumService:
                 detail="话题不存在"
             )
         
-        # 缓存结果
-        cache_manager.set(cache_key, topic, expire_time=300)  # 5分钟缓存
         return topic
     
     @staticmethod
@@ -63,9 +63,6 @@ class ForumService:
         """优化的话题列表查询"""
         
         cache_key = f"topics:list:{skip}:{limit}:{category}:{search}:{sort_by}"
-        cached_result = cache_manager.get(cache_key)
-        if cached_result:
-            return cached_result
         
         # 构建基础查询
         query = db.query(ForumTopic).options(
@@ -74,6 +71,12 @@ class ForumService:
             joinedload(ForumTopic.comments)
         ).filter(ForumTopic.is_deleted == False)
         
+        # 缓存中只保存ID列表和总数，命中时按ID回表加载
+        cached_result = cache_manager.get(cache_key)
+        if cached_result:
+            topics = ForumService._load_ordered(query, ForumTopic, cached_result["ids"])
+            return topics, cached_result["total"]
+        
         # 应用过滤条件
         if category:
             query = query.filter(ForumTopic.category == category)
@@ -98,9 +101,8 @@ class ForumService:
         total = query.count()
         topics = query.offset(skip).limit(limit).all()
         
-        result = (topics, total)
-        cache_manager.set(cache_key, result, expire_time=180)  # 3分钟缓存
-        return result
+        cache_manager.set(cache_key, {"ids": [t.id for t in topics], "total": total}, expire=180)  # 3分钟缓存
+        return topics, total
     
     @staticmethod
     def create_topic_optimized(db: Session, topic_data: dict, current_user_id: int) -> ForumTopic:
@@ -110,19 +112,15 @@ class ForumService:
         topic = ForumTopic(
             title=topic_data["title"],
             content=topic_data["content"],
-            category=topic_data.get("category"),
-            author_id=current_user_id,
-            created_at=datetime.utcnow()
+            owner_id=current_user_id
         )
         
         db.add(topic)
         db.flush()
         db.refresh(topic)
         
-        # 异步清除相关缓存
-        asyncio.create_task(
-            cache_manager.delete_pattern("topics:list:*")
-        )
+        # 清除相关缓存
+        cache_manager.delete_pattern("topics:list:*")
         
         return topic
     
@@ -138,7 +136,7 @@ class ForumService:
         topic = ForumService.get_topic_by_id_optimized(db, topic_id)
         
         # 权限检查
-        if topic.author_id != current_user_id:
+        if topic.owner_id != current_user_id:
             from fastapi import HTTPException, status
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -155,8 +153,8 @@ class ForumService:
         db.refresh(topic)
         
         # 清除相关缓存
-        asyncio.create_task(cache_manager.delete_pattern(f"topic:{topic_id}:*"))
-        asyncio.create_task(cache_manager.delete_pattern("topics:list:*"))
+        cache_manager.delete_pattern(f"topic:{topic_id}:*")
+        cache_manager.delete_pattern("topics:list:*")
         
         return topic
     
@@ -167,7 +165,7 @@ class ForumService:
         topic = ForumService.get_topic_by_id_optimized(db, topic_id)
         
         # 权限检查
-        if topic.author_id != current_user_id:
+        if topic.owner_id != current_user_id:
             from fastapi import HTTPException, status
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -179,8 +177,8 @@ class ForumService:
         db.flush()
         
         # 清除相关缓存
-        asyncio.create_task(cache_manager.delete_pattern(f"topic:{topic_id}:*"))
-        asyncio.create_task(cache_manager.delete_pattern("topics:list:*"))
+        cache_manager.delete_pattern(f"topic:{topic_id}:*")
+        cache_manager.delete_pattern("topics:list:*")
         
         return True
 
@@ -197,9 +195,6 @@ class ForumCommentService:
         """优化的评论查询"""
         
         cache_key = f"topic:{topic_id}:comments:{skip}:{limit}"
-        cached_result = cache_manager.get(cache_key)
-        if cached_result:
-            return cached_result
         
         query = db.query(ForumComment).options(
             joinedload(ForumComment.author),
@@ -208,14 +203,19 @@ class ForumCommentService:
             ForumComment.topic_id == topic_id,
             ForumComment.is_deleted == False,
             ForumComment.parent_id.is_(None)  # 只获取顶级评论
-        ).order_by(desc(ForumComment.created_at))
+        )
+        
+        cached_result = cache_manager.get(cache_key)
+        if cached_result:
+            comments = ForumService._load_ordered(query, ForumComment, cached_result["ids"])
+            return comments, cached_result["total"]
         
+        query = query.order_by(desc(ForumComment.created_at))
         total = query.count()
         comments = query.offset(skip).limit(limit).all()
         
-        result = (comments, total)
-        cache_manager.set(cache_key, result, expire_time=300)
-        return result
+        cache_manager.set(cache_key, {"ids": [c.id for c in comments], "total": total}, expire=300)
+        return comments, total
     
     @staticmethod
     def create_comment_optimized(
@@ -229,7 +229,7 @@ class ForumCommentService:
             content=comment_data["content"],
             topic_id=comment_data["topic_id"],
             parent_id=comment_data.get("parent_id"),
-            author_id=current_user_id,
+            owner_id=current_user_id,
             created_at=datetime.utcnow()
         )
         
@@ -244,8 +244,8 @@ class ForumCommentService:
             db.flush()
         
         # 清除相关缓存
-        asyncio.create_task(cache_manager.delete_pattern(f"topic:{comment.topic_id}:comments:*"))
-        asyncio.create_task(cache_manager.delete_pattern(f"topic:{comment.topic_id}:detail"))
+        cache_manager.delete_pattern(f"topic:{comment.topic_id}:comments:*")
+        cache_manager.delete_pattern(f"topic:{comment.topic_id}:detail")
         
         return comment
 
@@ -261,47 +261,44 @@ class ForumLikeService:
     ) -> Dict[str, Any]:
         """优化的点赞/取消点赞"""
         
+        target_model = ForumTopic if target_type == "topic" else ForumComment
+        target_column = ForumLike.topic_id if target_type == "topic" else ForumLike.comment_id
+        target = db.query(target_model).filter(target_model.id == target_id).first()
+        if not target:
+            from fastapi import HTTPException, status
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="点赞对象不存在"
+            )
+        
         # 检查是否已点赞
         existing_like = db.query(ForumLike).filter(
-            ForumLike.user_id == current_user_id,
-            ForumLike.target_type == target_type,
-            ForumLike.target_id == target_id
+            ForumLike.owner_id == current_user_id,
+            target_column == target_id
         ).first()
         
         if existing_like:
             # 取消点赞
             db.delete(existing_like)
             action = "unliked"
-            
-            # 更新计数
-            if target_type == "topic":
-                topic = db.query(ForumTopic).filter(ForumTopic.id == target_id).first()
-                if topic:
-                    topic.likes_count = max(0, topic.likes_count - 1)
-            
+            target.like_count = max(0, (target.like_count or 0) - 1)
         else:
             # 添加点赞
-            new_like = ForumLike(
-                user_id=current_user_id,
-                target_type=target_type,
-                target_id=target_id,
-                created_at=datetime.utcnow()
-            )
-            db.add(new_like)
+            db.add(ForumLike(owner_id=current_user_id, **{target_column.key: target_id}))
             action = "liked"
-            
-            # 更新计数
-            if target_type == "topic":
-                topic = db.query(ForumTopic).filter(ForumTopic.id == target_id).first()
-                if topic:
-                    topic.likes_count = topic.likes_count + 1
+            target.like_count = (target.like_count or 0) + 1
         
         db.flush()
         
         # 清除相关缓存
-        asyncio.create_task(cache_manager.delete_pattern(f"topic:{target_id}:*"))
+        cache_manager.delete_pattern(f"topic:{target_id}:*")
         
-        return {"action": action, "target_type": target_type, "target_id": target_id}
+        return {
+            "action": action,
+            "target_type": target_type,
+            "target_id": target_id,
+            "target_owner_id": target.owner_id
+        }
 
 class ForumUtils:
     """论坛工具类"""
@@ -355,15 +352,15 @@ class ForumUtils:
         result = {
             "id": topic.id,
             "title": topic.title,
-            "category": topic.category,
+            "tags": topic.tags,
             "author": {
-                "id": topic.author.id,
-                "username": topic.author.username,
-                "avatar": topic.author.avatar
-            } if topic.author else None,
-            "likes_count": topic.likes_count,
-            "comments_count": topic.comments_count,
-            "views_count": getattr(topic, 'views_count', 0),
+                "id": topic.owner.id,
+                "username": topic.owner.username,
+                "avatar": topic.owner.avatar_url
+            } if topic.owner else None,
+            "likes_count": topic.like_count or 0,
+            "comments_count": topic.comment_count or 0,
+            "views_count": topic.view_count or 0,
             "created_at": topic.created_at,
             "updated_at": topic.updated_at
         }
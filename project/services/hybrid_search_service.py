@@ -0,0 +1,425 @@
+# project/services/hybrid_search_service.py
+"""
+知识库混合检索服务
+
+关键词检索（BM25，jieba 分词）与向量检索（文档块 embedding）并发执行，
+用倒数排名融合（RRF）合并两路排名，可选再经 rerank 模型重排，返回文档块级别的命中和高亮片段。
+
+- BM25 倒排索引按知识库在进程内构建并缓存，以 (块数, 最大块ID) 作为版本号，文档增删后下次查询自动重建
+- 向量检索在 PostgreSQL 上使用 pgvector 的余弦距离排序（有 HNSW 索引时为近似检索），
+  其他数据库回退为 numpy 暴力计算
+- 无法得到查询向量（未配置API密钥、调用失败）时退化为纯关键词检索
+"""
+import os
+import re
+import math
+import time
+import heapq
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import Counter, OrderedDict, defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from project.database import run_db
+from project.models import KnowledgeDocument, KnowledgeDocumentChunk, UserSettings
+from project.ai_providers.ai_config import DUMMY_API_KEY
+from project.ai_providers.embedding_provider import get_embeddings_from_api
+from project.ai_providers.rerank_provider import get_rerank_scores_from_api
+from project.ai_providers.security_utils import decrypt_key
+from project.utils.optimization.production_utils import cache_manager
+
+logger = logging.getLogger(__name__)
+
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+# 融合时关键词一路的权重（向量一路为1.0），精确词查询较多的知识库可以调高
+HYBRID_KEYWORD_WEIGHT = float(os.getenv("HYBRID_KEYWORD_WEIGHT", "1.0"))
+# 每一路检索取回的候选块数
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "50"))
+# 送入 rerank 模型的候选块数
+HYBRID_RERANK_CANDIDATES = int(os.getenv("HYBRID_RERANK_CANDIDATES", "30"))
+# 进程内最多缓存的知识库 BM25 索引数
+HYBRID_INDEX_CACHE_SIZE = int(os.getenv("HYBRID_INDEX_CACHE_SIZE", "32"))
+
+_SNIPPET_CHARS = 160
+_TOKEN_PATTERN = re.compile(r"[0-9a-z\u4e00-\u9fff]")
+
+
+def tokenize(text: str) -> List[str]:
+    """分词：jieba 搜索引擎模式，转小写，丢弃纯标点/空白"""
+    if not text:
+        return []
+    import jieba  # 首次分词时才导入
+    return [token for token in jieba.lcut_for_search(text.lower()) if _TOKEN_PATTERN.search(token)]
+
+
+class BM25Index:
+    """文档块的 BM25 倒排索引（Okapi BM25，k1=1.5，b=0.75）"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # 词 -> {块ID: 词频}
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self.lengths: Dict[int, int] = {}
+        # 块ID -> 文档ID，用于按文档过滤
+        self.documents: Dict[int, int] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def add(self, chunk_id: int, document_id: int, text: str):
+        tokens = tokenize(text)
+        for term, frequency in Counter(tokens).items():
+            self.postings[term][chunk_id] = frequency
+        self.lengths[chunk_id] = len(tokens)
+        self.documents[chunk_id] = document_id
+        self._total_length += len(tokens)
+
+    def search(self, query: str, top_k: int, document_ids: Optional[Set[int]] = None) -> List[Tuple[int, float]]:
+        """返回 [(块ID, BM25分数)]，按分数降序；document_ids 不为空时只在这些文档的块中检索"""
+        count = len(self.lengths)
+        if not count:
+            return []
+        average_length = self._total_length / count or 1.0
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (count - len(posting) + 0.5) / (len(posting) + 0.5))
+            for chunk_id, frequency in posting.items():
+                if document_ids is not None and self.documents[chunk_id] not in document_ids:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[chunk_id] / average_length)
+                scores[chunk_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+
+def reciprocal_rank_fusion(rankings: Dict[str, Sequence[int]], k: int = HYBRID_RRF_K,
+                           weights: Optional[Dict[str, float]] = None) -> List[Tuple[int, float]]:
+    """
+    倒数排名融合：score(d) = Σ w_r / (k + rank_r(d))，rank 从1开始，w_r 默认为1
+
+    rankings 为 {检索器名: 按相关度降序的ID列表}；只用排名不用原始分数，
+    因此 BM25 分数与余弦相似度无需归一化即可合并。
+    """
+    fused: Dict[int, float] = defaultdict(float)
+    for name, ranking in rankings.items():
+        weight = (weights or {}).get(name, 1.0)
+        for rank, item_id in enumerate(ranking, start=1):
+            fused[item_id] += weight / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+def vector_top_k(matrix: np.ndarray, ids: Sequence[int], query_vector: Sequence[float],
+                 top_k: int) -> List[Tuple[int, float]]:
+    """numpy 余弦相似度 top-k（非 PostgreSQL 环境和基准测试使用），零向量不参与排序"""
+    if not len(ids):
+        return []
+    query = np.asarray(query_vector, dtype=np.float32)
+    query_norm = np.linalg.norm(query)
+    norms = np.linalg.norm(matrix, axis=1)
+    valid = norms > 0
+    if not query_norm or not valid.any():
+        return []
+    similarities = np.full(len(ids), -np.inf, dtype=np.float32)
+    similarities[valid] = matrix[valid] @ query / (norms[valid] * query_norm)
+    top_k = min(top_k, int(valid.sum()))
+    candidates = np.argpartition(-similarities, top_k - 1)[:top_k]
+    ordered = candidates[np.argsort(-similarities[candidates])]
+    return [(ids[index], float(similarities[index])) for index in ordered]
+
+
+def highlight(text: str, terms: Iterable[str], max_chars: int = _SNIPPET_CHARS) -> List[str]:
+    """截取包含查询词的片段（最多2段），查询词用 <em></em> 标记；没有命中时返回开头片段"""
+    terms = sorted({term for term in terms if term}, key=len, reverse=True)
+    if not text:
+        return []
+    if not terms:
+        return [text[:max_chars]]
+    pattern = re.compile("|".join(re.escape(term) for term in terms), re.IGNORECASE)
+    snippets, covered_until = [], -1
+    for match in pattern.finditer(text):
+        if match.start() < covered_until:
+            continue
+        start = max(0, match.start() - max_chars // 3)
+        end = min(len(text), start + max_chars)
+        snippet = pattern.sub(lambda m: f"<em>{m.group(0)}</em>", text[start:end])
+        snippets.append(("…" if start > 0 else "") + snippet + ("…" if end < len(text) else ""))
+        covered_until = end
+        if len(snippets) == 2:
+            break
+    return snippets or [text[:max_chars]]
+
+
+_index_cache: "OrderedDict[int, Tuple[Tuple[int, int], BM25Index]]" = OrderedDict()
+_index_lock = threading.Lock()
+
+
+def get_bm25_index(session: Session, kb_id: int) -> BM25Index:
+    """获取知识库的 BM25 索引，文档块有增删时重建"""
+    count, max_id = session.query(
+        func.count(KnowledgeDocumentChunk.id), func.max(KnowledgeDocumentChunk.id)
+    ).filter(KnowledgeDocumentChunk.kb_id == kb_id).one()
+    version = (count or 0, max_id or 0)
+
+    with _index_lock:
+        cached = _index_cache.get(kb_id)
+        if cached and cached[0] == version:
+            _index_cache.move_to_end(kb_id)
+            return cached[1]
+
+    start = time.perf_counter()
+    index = BM25Index()
+    rows = session.query(
+        KnowledgeDocumentChunk.id, KnowledgeDocumentChunk.document_id, KnowledgeDocumentChunk.content
+    ).filter(KnowledgeDocumentChunk.kb_id == kb_id).yield_per(1000)
+    for chunk_id, document_id, content in rows:
+        index.add(chunk_id, document_id, content)
+    logger.info(f"知识库 {kb_id} BM25索引构建完成: {len(index)} 个文档块，耗时 {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    with _index_lock:
+        _index_cache[kb_id] = (version, index)
+        _index_cache.move_to_end(kb_id)
+        while len(_index_cache) > HYBRID_INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index
+
+
+class HybridSearchService:
+    """知识库混合检索"""
+
+    @staticmethod
+    def _allowed_document_ids(session: Session, kb_id: int, content_types: Optional[List[str]]) -> Optional[Set[int]]:
+        if not content_types:
+            return None
+        rows = session.query(KnowledgeDocument.id).filter(
+            KnowledgeDocument.kb_id == kb_id,
+            KnowledgeDocument.content_type.in_(content_types)
+        ).all()
+        return {row.id for row in rows}
+
+    @staticmethod
+    def keyword_search(session: Session, kb_id: int, query: str, top_k: int,
+                       content_types: Optional[List[str]] = None) -> List[Tuple[int, float]]:
+        """BM25 关键词检索，返回 [(块ID, 分数)]"""
+        index = get_bm25_index(session, kb_id)
+        document_ids = HybridSearchService._allowed_document_ids(session, kb_id, content_types)
+        return index.search(query, top_k, document_ids)
+
+    @staticmethod
+    def vector_search(session: Session, kb_id: int, query_vector: List[float], top_k: int,
+                      content_types: Optional[List[str]] = None) -> List[Tuple[int, float]]:
+        """向量检索，返回 [(块ID, 余弦相似度)]"""
+        base_query = session.query(KnowledgeDocumentChunk.id).filter(
+            KnowledgeDocumentChunk.kb_id == kb_id,
+            KnowledgeDocumentChunk.embedding.isnot(None)
+        )
+        if content_types:
+            base_query = base_query.join(
+                KnowledgeDocument, KnowledgeDocument.id == KnowledgeDocumentChunk.document_id
+            ).filter(KnowledgeDocument.content_type.in_(content_types))
+
+        if session.get_bind().dialect.name == "postgresql":
+            distance = KnowledgeDocumentChunk.embedding.cosine_distance(query_vector)
+            rows = base_query.add_columns(distance.label("distance")).order_by(distance).limit(top_k).all()
+            # 占位零向量的距离为 NaN，排在最后，这里去掉
+            return [(row.id, 1.0 - row.distance) for row in rows if row.distance == row.distance]
+
+        rows = base_query.add_columns(KnowledgeDocumentChunk.embedding).all()
+        if not rows:
+            return []
+        matrix = np.asarray([row.embedding for row in rows], dtype=np.float32)
+        return vector_top_k(matrix, [row.id for row in rows], query_vector, top_k)
+
+    @staticmethod
+    def _user_api_key(session: Session, user_id: int) -> Tuple[Optional[str], Optional[str]]:
+        settings = session.query(UserSettings).filter(UserSettings.user_id == user_id).first()
+        if not settings or not settings.llm_api_key_encrypted:
+            return None, None
+        try:
+            api_key = decrypt_key(settings.llm_api_key_encrypted)
+        except Exception as e:
+            logger.warning(f"解密用户 {user_id} 的API密钥失败: {e}")
+            return None, None
+        if not api_key or api_key == DUMMY_API_KEY:
+            return None, None
+        return api_key, settings.llm_api_type
+
+    @staticmethod
+    async def _query_embedding(query: str, api_key: Optional[str], provider: Optional[str]) -> Optional[List[float]]:
+        if not api_key:
+            return None
+        cache_key = f"embedding:query:{provider}:{hashlib.md5(query.encode()).hexdigest()}"
+        cached = cache_manager.get(cache_key)
+        if cached:
+            return cached
+        embeddings = await get_embeddings_from_api([query], api_key=api_key, provider=provider)
+        # 调用失败时接口返回占位零向量
+        if not embeddings or not any(embeddings[0]):
+            return None
+        embedding = [float(value) for value in embeddings[0]]
+        cache_manager.set(cache_key, embedding, expire=3600)
+        return embedding
+
+    @staticmethod
+    async def search(
+        db: Session,
+        kb_id: int,
+        query: str,
+        user_id: int,
+        content_types: Optional[List[str]] = None,
+        limit: int = 20,
+        use_vector: bool = True,
+        rerank: bool = False
+    ) -> Dict[str, Any]:
+        """
+        混合检索
+
+        关键词检索与（查询向量化 + 向量检索）两条链路并发执行，各自使用独立的会话；
+        返回的 timings_ms 记录每一步耗时。use_vector=False 时只做关键词检索。
+        """
+        start = time.perf_counter()
+        timings: Dict[str, float] = {}
+        candidates = max(HYBRID_CANDIDATES, limit)
+        bind = db.get_bind()
+
+        def in_session(fn, *args):
+            # 两条链路在不同线程中执行，不能共用调用方会话
+            with Session(bind=bind) as session:
+                return fn(session, *args)
+
+        async def timed(name: str, awaitable):
+            step_start = time.perf_counter()
+            try:
+                return await awaitable
+            finally:
+                timings[name] = round((time.perf_counter() - step_start) * 1000, 2)
+
+        api_key, provider = None, None
+        if use_vector or rerank:
+            api_key, provider = await run_db(db, HybridSearchService._user_api_key, user_id)
+
+        async def keyword_branch():
+            return await asyncio.to_thread(
+                in_session, HybridSearchService.keyword_search, kb_id, query, candidates, content_types
+            )
+
+        async def vector_branch():
+            query_vector = await timed("embedding", HybridSearchService._query_embedding(query, api_key, provider))
+            if query_vector is None:
+                return []
+            return await timed("vector", asyncio.to_thread(
+                in_session, HybridSearchService.vector_search, kb_id, query_vector, candidates, content_types
+            ))
+
+        branches = [timed("keyword", keyword_branch())]
+        if use_vector and api_key:
+            branches.append(vector_branch())
+        results = await asyncio.gather(*branches, return_exceptions=True)
+
+        rankings: Dict[str, List[int]] = {}
+        for name, result in zip(("keyword", "vector"), results):
+            if isinstance(result, Exception):
+                logger.warning(f"知识库 {kb_id} {name} 检索失败: {result}")
+                continue
+            rankings[name] = [chunk_id for chunk_id, _ in result]
+        fused = reciprocal_rank_fusion(rankings, weights={"keyword": HYBRID_KEYWORD_WEIGHT})[:max(limit, HYBRID_RERANK_CANDIDATES if rerank else limit)]
+
+        chunks = await run_db(db, HybridSearchService._load_chunks, [chunk_id for chunk_id, _ in fused])
+        hits = [(chunk_id, score) for chunk_id, score in fused if chunk_id in chunks]
+
+        search_mode = "hybrid" if "vector" in rankings else "keyword"
+        if rerank and api_key and hits:
+            reranked = await timed("rerank", HybridSearchService._rerank(query, hits, chunks, api_key))
+            if reranked is not None:
+                hits = reranked
+                search_mode += "+rerank"
+
+        ranks = {
+            name: {chunk_id: rank for rank, chunk_id in enumerate(ranking, start=1)}
+            for name, ranking in rankings.items()
+        }
+        terms = tokenize(query) + [query]
+        results_list = []
+        for chunk_id, score in hits[:limit]:
+            row = chunks[chunk_id]
+            content = row["content"]
+            results_list.append({
+                "type": "document",
+                "id": row["document_id"],
+                "chunk_id": chunk_id,
+                "chunk_index": row["chunk_index"],
+                "title": row["website_title"] or row["file_name"],
+                "content": content[:200] + "..." if len(content) > 200 else content,
+                "highlights": highlight(content, terms),
+                "score": round(score, 6),
+                "ranks": {name: ranks[name].get(chunk_id) for name in ranks},
+                "file_type": row["file_type"],
+                "status": row["status"],
+                "content_type": row["content_type"],
+                "url": row["url"],
+                "thumbnail_path": row["thumbnail_path"],
+                "file_size": row["file_size_bytes"],
+                "created_at": row["created_at"],
+                "updated_at": row["updated_at"],
+            })
+
+        timings["total"] = round((time.perf_counter() - start) * 1000, 2)
+        return {
+            "query": query,
+            "total": len(results_list),
+            "results": results_list,
+            "search_mode": search_mode,
+            "timings_ms": timings,
+            "search_time": datetime.utcnow().isoformat(),
+        }
+
+    @staticmethod
+    def _load_chunks(session: Session, chunk_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """按块ID读取块内容及所属文档的展示字段（普通字典，可跨 run_db 线程边界返回）"""
+        if not chunk_ids:
+            return {}
+        rows = session.query(
+            KnowledgeDocumentChunk.id.label("chunk_id"),
+            KnowledgeDocumentChunk.chunk_index,
+            KnowledgeDocumentChunk.content,
+            KnowledgeDocument.id.label("document_id"),
+            KnowledgeDocument.website_title,
+            KnowledgeDocument.file_name,
+            KnowledgeDocument.file_type,
+            KnowledgeDocument.status,
+            KnowledgeDocument.content_type,
+            KnowledgeDocument.url,
+            KnowledgeDocument.thumbnail_path,
+            KnowledgeDocument.file_size_bytes,
+            KnowledgeDocument.created_at,
+            KnowledgeDocument.updated_at,
+        ).join(
+            KnowledgeDocument, KnowledgeDocument.id == KnowledgeDocumentChunk.document_id
+        ).filter(KnowledgeDocumentChunk.id.in_(chunk_ids)).all()
+        return {row.chunk_id: dict(row._mapping) for row in rows}
+
+    @staticmethod
+    async def _rerank(query: str, hits: List[Tuple[int, float]], chunks: Dict[int, Dict[str, Any]],
+                      api_key: str) -> Optional[List[Tuple[int, float]]]:
+        candidates = hits[:HYBRID_RERANK_CANDIDATES]
+        scores = await get_rerank_scores_from_api(
+            query, [chunks[chunk_id]["content"] for chunk_id, _ in candidates], api_key=api_key
+        )
+        # 调用失败时返回全零分数，保持融合排序
+        if not scores or not any(scores):
+            return None
+        reranked = sorted(
+            ((chunk_id, float(score)) for (chunk_id, _), score in zip(candidates, scores)),
+            key=lambda item: item[1], reverse=True
+        )
+        return reranked + hits[len(candidates):]
@@ -5,9 +5,11 @@
 """
 import asyncio
 import hashlib
+import html
 import json
 import mimetypes
 import os
+import re
 import uuid
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any, Tuple, Union
@@ -17,25 +19,57 @@ from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import and_, or_, desc, func, text
 import logging
 
-from project.models import KnowledgeBase, KnowledgeDocument, User
+from project.database import SessionLocal, run_db
+from project.models import KnowledgeBase, KnowledgeDocument, KnowledgeDocumentChunk, User
+from project.services.hybrid_search_service import HybridSearchService
 from project.utils.optimization.production_utils import cache_manager
 from project.utils.database.optimization import query_optimizer
+from project.utils.async_cache.async_tasks import register_task_handler, load_task_payload
 
 logger = logging.getLogger(__name__)
 
+# 上传文档的分块大小（字符数）
+KNOWLEDGE_CHUNK_SIZE = int(os.getenv("KNOWLEDGE_CHUNK_SIZE", "500"))
+# 可提取文本的文件类型，其余类型（图片、视频）只入库不分块
+_TEXT_FILE_TYPES = {"pdf", "doc", "docx", "txt"}
+# 抓取网址内容的超时（秒）与最大读取字节数
+KNOWLEDGE_URL_TIMEOUT = float(os.getenv("KNOWLEDGE_URL_TIMEOUT", "15"))
+KNOWLEDGE_URL_MAX_BYTES = int(os.getenv("KNOWLEDGE_URL_MAX_BYTES", str(5 * 1024 * 1024)))
+
 class KnowledgeBaseService:
     """知识库核心业务逻辑服务"""
     
     @staticmethod
-    def get_knowledge_base_optimized(db: Session, kb_id: int, user_id: int) -> KnowledgeBase:
-        """优化的知识库查询 - 使用预加载和缓存"""
-        cache_key = f"kb:{kb_id}:detail"
+    def check_access(db: Session, kb_id: int, user_id: int) -> None:
+        """
+        校验用户能否访问知识库（所有者或公开），否则抛出404
         
-        # 尝试从缓存获取
-        cached_kb = cache_manager.get(cache_key)
-        if cached_kb:
-            return cached_kb
+        只缓存 (kb_id, user_id) 的"允许"标记，不缓存ORM实例；知识库更新/删除时随 kb:{kb_id}:* 一起清除
+        """
+        cache_key = f"kb:{kb_id}:access:{user_id}"
+        if cache_manager.get(cache_key):
+            return
         
+        allowed = db.query(KnowledgeBase.id).filter(
+            KnowledgeBase.id == kb_id,
+            or_(
+                KnowledgeBase.owner_id == user_id,
+                KnowledgeBase.is_public == True
+            )
+        ).first() is not None
+        
+        if not allowed:
+            from fastapi import HTTPException, status
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="知识库不存在或无访问权限"
+            )
+        
+        cache_manager.set(cache_key, True, expire=600)  # 10分钟缓存
+    
+    @staticmethod
+    def get_knowledge_base_optimized(db: Session, kb_id: int, user_id: int) -> KnowledgeBase:
+        """优化的知识库查询 - 使用预加载（ORM实例不进缓存）"""
         # 使用joinedload预加载相关数据
         kb = db.query(KnowledgeBase).options(
             joinedload(KnowledgeBase.owner),
@@ -55,8 +89,6 @@ class KnowledgeBaseService:
                 detail="知识库不存在或无访问权限"
             )
         
-        # 缓存结果
-        cache_manager.set(cache_key, kb, expire_time=600)  # 10分钟缓存
         return kb
     
     @staticmethod
@@ -69,11 +101,6 @@ class KnowledgeBaseService:
     ) -> Tuple[List[KnowledgeBase], int]:
         """优化的知识库列表查询"""
         
-        cache_key = f"kb:list:user:{user_id}:{skip}:{limit}:{search or 'all'}"
-        cached_result = cache_manager.get(cache_key)
-        if cached_result:
-            return cached_result
-        
         # 构建基础查询
         query = db.query(KnowledgeBase).options(
             joinedload(KnowledgeBase.owner)
@@ -100,9 +127,7 @@ class KnowledgeBaseService:
         total = query.count()
         knowledge_bases = query.offset(skip).limit(limit).all()
         
-        result = (knowledge_bases, total)
-        cache_manager.set(cache_key, result, expire_time=300)  # 5分钟缓存
-        return result
+        return knowledge_bases, total
     
     @staticmethod
     def create_knowledge_base_optimized(db: Session, kb_data: dict, user_id: int) -> KnowledgeBase:
@@ -122,11 +147,6 @@ class KnowledgeBaseService:
         db.flush()
         db.refresh(kb)
         
-        # 异步清除相关缓存
-        asyncio.create_task(
-            cache_manager.delete_pattern(f"kb:list:user:{user_id}:*")
-        )
-        
         return kb
     
     @staticmethod
@@ -158,8 +178,7 @@ class KnowledgeBaseService:
         db.refresh(kb)
         
         # 清除相关缓存
-        asyncio.create_task(cache_manager.delete_pattern(f"kb:{kb_id}:*"))
-        asyncio.create_task(cache_manager.delete_pattern(f"kb:list:user:{user_id}:*"))
+        cache_manager.delete_pattern(f"kb:{kb_id}:*")
         
         return kb
     
@@ -192,8 +211,7 @@ class KnowledgeBaseService:
         db.flush()
         
         # 清除相关缓存
-        asyncio.create_task(cache_manager.delete_pattern(f"kb:{kb_id}:*"))
-        asyncio.create_task(cache_manager.delete_pattern(f"kb:list:user:{user_id}:*"))
+        cache_manager.delete_pattern(f"kb:{kb_id}:*")
         
         return True
     
@@ -202,13 +220,6 @@ class KnowledgeBaseService:
         db: Session, skip: int = 0, limit: int = 20, search_query: Optional[str] = None
     ) -> Tuple[List[KnowledgeBase], int]:
         """获取公开的知识库"""
-        cache_key = f"public_knowledge_bases:{skip}:{limit}:{search_query or 'all'}"
-        
-        # 尝试从缓存获取
-        cached_result = cache_manager.get(cache_key)
-        if cached_result:
-            return cached_result
-        
         # 构建查询
         query = db.query(KnowledgeBase).options(
             joinedload(KnowledgeBase.owner),
@@ -231,12 +242,7 @@ class KnowledgeBaseService:
         # 获取分页数据
         knowledge_bases = query.order_by(desc(KnowledgeBase.updated_at)).offset(skip).limit(limit).all()
         
-        result = (knowledge_bases, total)
-        
-        # 缓存结果
-        cache_manager.set(cache_key, result, expire=300)  # 5分钟缓存
-        
-        return result
+        return knowledge_bases, total
     
     @staticmethod
     def search_public_knowledge_bases_optimized(
@@ -247,13 +253,6 @@ class KnowledgeBaseService:
         owner_name: Optional[str] = None
     ) -> Tuple[List[KnowledgeBase], int]:
         """搜索公开的知识库"""
-        cache_key = f"search_public_knowledge_bases:{query_text}:{owner_name or 'all'}:{skip}:{limit}"
-        
-        # 尝试从缓存获取
-        cached_result = cache_manager.get(cache_key)
-        if cached_result:
-            return cached_result
-        
         # 构建查询
         query = db.query(KnowledgeBase).options(
             joinedload(KnowledgeBase.owner),
@@ -279,65 +278,46 @@ class KnowledgeBaseService:
         # 获取分页数据
         knowledge_bases = query.order_by(desc(KnowledgeBase.updated_at)).offset(skip).limit(limit).all()
         
-        result = (knowledge_bases, total)
-        
-        # 缓存结果
-        cache_manager.set(cache_key, result, expire=300)  # 5分钟缓存
-        
-        return result
+        return knowledge_bases, total
 
     @staticmethod
-    def get_knowledge_base_stats_optimized(db: Session, kb_id: int, user_id: int) -> Dict[str, Any]:
+    async def get_knowledge_base_stats_optimized(db: Session, kb_id: int, user_id: int) -> Dict[str, Any]:
         """优化的知识库统计"""
         
+        # 验证权限（缓存键不含用户，命中缓存前必须先校验）
+        await run_db(db, KnowledgeBaseService.check_access, kb_id, user_id)
+        
         cache_key = f"kb:{kb_id}:stats"
-        cached_stats = cache_manager.get(cache_key)
-        if cached_stats:
-            return cached_stats
-        
-        # 验证权限
-        KnowledgeBaseService.get_knowledge_base_optimized(db, kb_id, user_id)
-        
-        # 统计查询
-        stats = {
-            "total_documents": db.query(func.count(KnowledgeDocument.id)).filter(
-                KnowledgeDocument.knowledge_base_id == kb_id,
-                KnowledgeDocument.is_deleted == False
-            ).scalar() or 0,
-            
-            "documents_by_type": db.query(
+        
+        def compute(session: Session) -> Dict[str, Any]:
+            # 一次分组查询得到按类型、状态的文档数与文件大小
+            rows = session.query(
                 KnowledgeDocument.content_type,
-                func.count(KnowledgeDocument.id)
+                KnowledgeDocument.status,
+                func.count(KnowledgeDocument.id),
+                func.sum(KnowledgeDocument.file_size_bytes)
             ).filter(
-                KnowledgeDocument.knowledge_base_id == kb_id,
-                KnowledgeDocument.is_deleted == False
-            ).group_by(KnowledgeDocument.content_type).all(),
+                KnowledgeDocument.kb_id == kb_id
+            ).group_by(KnowledgeDocument.content_type, KnowledgeDocument.status).all()
             
-            "processing_status": db.query(
-                KnowledgeDocument.processing_status,
-                func.count(KnowledgeDocument.id)
-            ).filter(
-                KnowledgeDocument.knowledge_base_id == kb_id,
-                KnowledgeDocument.is_deleted == False
-            ).group_by(KnowledgeDocument.processing_status).all(),
+            documents_by_type: Dict[str, int] = {}
+            processing_status: Dict[str, int] = {}
+            total_size = 0
+            for content_type, status, count, size in rows:
+                documents_by_type[content_type] = documents_by_type.get(content_type, 0) + count
+                processing_status[status] = processing_status.get(status, 0) + count
+                total_size += size or 0
             
-            "total_size": db.query(func.sum(KnowledgeDocument.file_size)).filter(
-                KnowledgeDocument.knowledge_base_id == kb_id,
-                KnowledgeDocument.is_deleted == False
-            ).scalar() or 0
-        }
-        
-        # 格式化统计结果
-        formatted_stats = {
-            "total_documents": stats["total_documents"],
-            "total_size_mb": round((stats["total_size"] or 0) / 1024 / 1024, 2),
-            "documents_by_type": {content_type: count for content_type, count in stats["documents_by_type"]},
-            "processing_status": {status: count for status, count in stats["processing_status"]}
-        }
-        
-        # 缓存统计结果
-        cache_manager.set(cache_key, formatted_stats, expire_time=300)  # 5分钟缓存
-        return formatted_stats
+            # 格式化统计结果
+            return {
+                "total_documents": sum(documents_by_type.values()),
+                "total_size_mb": round(total_size / 1024 / 1024, 2),
+                "documents_by_type": documents_by_type,
+                "processing_status": processing_status
+            }
+        
+        # 缓存5分钟，过期重算由单个请求完成（查询在事件循环之外执行），其余请求返回旧值
+        return await cache_manager.aget_or_compute(cache_key, lambda: run_db(db, compute), expire=300)
 
 class KnowledgeDocumentService:
     """知识文档核心业务逻辑服务"""
@@ -346,13 +326,8 @@ class KnowledgeDocumentService:
     def get_document_optimized(db: Session, kb_id: int, doc_id: int, user_id: int) -> KnowledgeDocument:
         """优化的文档查询"""
         
-        cache_key = f"kb:{kb_id}:doc:{doc_id}"
-        cached_doc = cache_manager.get(cache_key)
-        if cached_doc:
-            return cached_doc
-        
         # 验证知识库权限
-        KnowledgeBaseService.get_knowledge_base_optimized(db, kb_id, user_id)
+        KnowledgeBaseService.check_access(db, kb_id, user_id)
         
         # 查询文档
         doc = db.query(KnowledgeDocument).options(
@@ -370,8 +345,6 @@ class KnowledgeDocumentService:
                 detail="文档不存在"
             )
         
-        # 缓存结果
-        cache_manager.set(cache_key, doc, expire_time=600)
         return doc
     
     @staticmethod
@@ -386,13 +359,8 @@ class KnowledgeDocumentService:
     ) -> Tuple[List[KnowledgeDocument], int]:
         """优化的文档列表查询"""
         
-        cache_key = f"kb:{kb_id}:docs:{skip}:{limit}:{content_type or 'all'}:{search or 'all'}"
-        cached_result = cache_manager.get(cache_key)
-        if cached_result:
-            return cached_result
-        
         # 验证知识库权限
-        KnowledgeBaseService.get_knowledge_base_optimized(db, kb_id, user_id)
+        KnowledgeBaseService.check_access(db, kb_id, user_id)
         
         # 构建查询
         query = db.query(KnowledgeDocument).filter(
@@ -419,9 +387,7 @@ class KnowledgeDocumentService:
         total = query.count()
         documents = query.offset(skip).limit(limit).all()
         
-        result = (documents, total)
-        cache_manager.set(cache_key, result, expire_time=300)
-        return result
+        return documents, total
     
     @staticmethod
     def create_document_optimized(
@@ -443,18 +409,19 @@ class KnowledgeDocumentService:
             )
         
         # 创建文档
+        file_name = doc_data.get("file_name") or doc_data["title"]
+        content_type = doc_data["content_type"]
         doc = KnowledgeDocument(
-            knowledge_base_id=kb_id,
-            title=doc_data["title"],
-            content=doc_data.get("content", ""),
-            content_type=doc_data["content_type"],
-            file_path=doc_data.get("file_path"),
-            file_size=doc_data.get("file_size", 0),
-            mime_type=doc_data.get("mime_type"),
+            kb_id=kb_id,
+            owner_id=user_id,
+            file_name=file_name,
+            file_path=doc_data.get("file_path") or doc_data.get("url") or "",
+            file_type=None if content_type == "url" else os.path.splitext(file_name)[1].lstrip(".").lower() or None,
+            content_type="file" if content_type == "document" else content_type,
             url=doc_data.get("url"),
-            processing_status="pending",
-            created_at=datetime.utcnow(),
-            updated_at=datetime.utcnow()
+            file_size_bytes=doc_data.get("file_size"),
+            mime_type=doc_data.get("mime_type"),
+            status="processing"
         )
         
         db.add(doc)
@@ -466,8 +433,7 @@ class KnowledgeDocumentService:
         db.flush()
         
         # 清除相关缓存
-        asyncio.create_task(cache_manager.delete_pattern(f"kb:{kb_id}:docs:*"))
-        asyncio.create_task(cache_manager.delete_pattern(f"kb:{kb_id}:stats"))
+        cache_manager.delete(f"kb:{kb_id}:stats")
         
         return doc
     
@@ -501,8 +467,7 @@ class KnowledgeDocumentService:
         db.refresh(doc)
         
         # 清除相关缓存
-        asyncio.create_task(cache_manager.delete_pattern(f"kb:{kb_id}:doc:{doc_id}"))
-        asyncio.create_task(cache_manager.delete_pattern(f"kb:{kb_id}:docs:*"))
+        cache_manager.delete(f"kb:{kb_id}:stats")
         
         return doc
     
@@ -531,9 +496,7 @@ class KnowledgeDocumentService:
         db.flush()
         
         # 清除相关缓存
-        asyncio.create_task(cache_manager.delete_pattern(f"kb:{kb_id}:doc:{doc_id}"))
-        asyncio.create_task(cache_manager.delete_pattern(f"kb:{kb_id}:docs:*"))
-        asyncio.create_task(cache_manager.delete_pattern(f"kb:{kb_id}:stats"))
+        cache_manager.delete(f"kb:{kb_id}:stats")
         
         return True
 
@@ -541,100 +504,43 @@ class KnowledgeSearchService:
     """知识搜索服务"""
     
     @staticmethod
-    def search_knowledge_optimized(
+    async def search_knowledge_optimized(
         db: Session,
         kb_id: int,
         query: str,
         user_id: int,
         content_types: Optional[List[str]] = None,
         limit: int = 20,
-        use_ai: bool = True
+        use_ai: bool = True,
+        rerank: bool = False
     ) -> Dict[str, Any]:
-        """优化的知识搜索"""
+        """
+        知识搜索 - 文档块级别的混合检索
+        
+        use_ai=True 时关键词（BM25）与向量检索并发执行并做排名融合，rerank=True 时再经重排模型排序；
+        use_ai=False 时只做关键词检索。详见 HybridSearchService。
+        """
+        # 先验证知识库权限，再读缓存
+        await run_db(db, KnowledgeBaseService.check_access, kb_id, user_id)
         
-        cache_key = f"search:kb:{kb_id}:query:{hashlib.md5(query.encode()).hexdigest()}:{':'.join(content_types or [])}:{limit}:{use_ai}"
+        # 检索方式取决于用户自己的API密钥（混合或仅关键词），缓存按用户区分
+        cache_key = f"search:kb:{kb_id}:user:{user_id}:query:{hashlib.md5(query.encode()).hexdigest()}:{':'.join(content_types or [])}:{limit}:{use_ai}:{rerank}"
         cached_result = cache_manager.get(cache_key)
         if cached_result:
-            cached_result["from_cache"] = True
-            return cached_result
-        
-        # 验证知识库权限
-        KnowledgeBaseService.get_knowledge_base_optimized(db, kb_id, user_id)
-        
-        # 构建搜索查询
-        search_query = db.query(KnowledgeDocument).filter(
-            KnowledgeDocument.knowledge_base_id == kb_id,
-            KnowledgeDocument.is_deleted == False,
-            or_(
-                KnowledgeDocument.title.contains(query),
-                KnowledgeDocument.content.contains(query)
-            )
+            return {**cached_result, "from_cache": True}
+        
+        search_result = await HybridSearchService.search(
+            db, kb_id, query, user_id,
+            content_types=content_types,
+            limit=limit,
+            use_vector=use_ai,
+            rerank=rerank
         )
-        
-        # 应用内容类型过滤
-        if content_types:
-            search_query = search_query.filter(
-                KnowledgeDocument.content_type.in_(content_types)
-            )
-        
-        # 执行搜索
-        documents = search_query.order_by(desc(KnowledgeDocument.updated_at)).limit(limit).all()
-        
-        # 格式化搜索结果
-        results = []
-        for doc in documents:
-            # 计算相关度分数（简单的关键词匹配）
-            relevance_score = KnowledgeSearchService._calculate_relevance(doc, query)
-            
-            results.append({
-                "id": doc.id,
-                "title": doc.title,
-                "content": doc.content[:200] + "..." if len(doc.content) > 200 else doc.content,
-                "content_type": doc.content_type,
-                "relevance_score": relevance_score,
-                "created_at": doc.created_at.isoformat(),
-                "url": doc.url
-            })
-        
-        # 按相关度排序
-        results.sort(key=lambda x: x["relevance_score"], reverse=True)
-        
-        search_result = {
-            "query": query,
-            "total_results": len(results),
-            "results": results,
-            "search_time": datetime.utcnow().isoformat(),
-            "from_cache": False
-        }
+        search_result["from_cache"] = False
         
         # 缓存搜索结果
-        cache_manager.set(cache_key, search_result, expire_time=600)  # 10分钟缓存
+        cache_manager.set(cache_key, search_result, expire=600)  # 10分钟缓存
         return search_result
-    
-    @staticmethod
-    def _calculate_relevance(doc: KnowledgeDocument, query: str) -> float:
-        """计算文档与查询的相关度"""
-        query_lower = query.lower()
-        title_lower = doc.title.lower()
-        content_lower = doc.content.lower()
-        
-        score = 0.0
-        
-        # 标题匹配权重更高
-        if query_lower in title_lower:
-            score += 2.0
-        
-        # 内容匹配
-        if query_lower in content_lower:
-            score += 1.0
-        
-        # 词频分析
-        query_words = query_lower.split()
-        for word in query_words:
-            score += title_lower.count(word) * 0.5
-            score += content_lower.count(word) * 0.1
-        
-        return score
 
 class KnowledgeUtils:
     """知识库工具类"""
@@ -708,12 +614,19 @@ class KnowledgeUtils:
         """格式化文档响应"""
         return {
             "id": doc.id,
-            "title": doc.title,
+            "kb_id": doc.kb_id,
+            "owner_id": doc.owner_id,
+            "file_name": doc.file_name,
+            "file_path": doc.file_path,
+            "file_type": doc.file_type,
             "content_type": doc.content_type,
-            "processing_status": doc.processing_status,
-            "file_size": doc.file_size,
+            "status": doc.status,
+            "processing_message": doc.processing_message,
+            "total_chunks": doc.total_chunks,
+            "file_size": doc.file_size_bytes,
             "mime_type": doc.mime_type,
             "url": doc.url,
+            "kb_folder_id": doc.kb_folder_id,
             "created_at": doc.created_at,
             "updated_at": doc.updated_at
         }
@@ -749,3 +662,158 @@ class KnowledgeUtils:
             return all([result.scheme, result.netloc])
         except Exception:
             return False
+
+
+# ==================== 后台任务 ====================
+
+def _update_document_status(doc_id: int, status: str, message: Optional[str] = None) -> None:
+    with SessionLocal() as session:
+        session.query(KnowledgeDocument).filter(KnowledgeDocument.id == doc_id).update(
+            {"status": status, "processing_message": message}, synchronize_session=False
+        )
+        session.commit()
+
+
+def _owner_api_key(owner_id: int) -> Tuple[Optional[str], Optional[str]]:
+    with SessionLocal() as session:
+        return HybridSearchService._user_api_key(session, owner_id)
+
+
+async def _chunk_embeddings(owner_id: int, chunks: List[str]) -> List[Optional[List[float]]]:
+    """与检索时的查询向量使用同一份用户嵌入配置；没有可用密钥时只写文本，向量检索会跳过这些块"""
+    if not chunks:
+        return []
+    api_key, provider = await asyncio.to_thread(_owner_api_key, owner_id)
+    if not api_key:
+        return [None] * len(chunks)
+
+    from project.ai_providers.embedding_provider import get_embeddings_from_api
+    embeddings = await get_embeddings_from_api(chunks, api_key=api_key, provider=provider)
+    # 嵌入失败时返回的是零向量占位，不写入
+    return [[float(v) for v in vector] if vector and any(vector) else None for vector in embeddings]
+
+
+def _save_document_chunks(doc_id: int, file_url: str, chunks: List[str],
+                          embeddings: List[Optional[List[float]]], **fields: Any) -> Optional[int]:
+    """写入文档块并把文档标记为完成（fields 为要一并更新的文档列）；文档已被删除时返回 None"""
+    with SessionLocal() as session:
+        doc = session.get(KnowledgeDocument, doc_id)
+        if doc is None:
+            return None
+        # 任务重试时先清掉上次写入的块
+        session.query(KnowledgeDocumentChunk).filter(
+            KnowledgeDocumentChunk.document_id == doc_id
+        ).delete(synchronize_session=False)
+        session.add_all([
+            KnowledgeDocumentChunk(
+                document_id=doc_id, owner_id=doc.owner_id, kb_id=doc.kb_id,
+                chunk_index=index, content=content, embedding=embedding
+            )
+            for index, (content, embedding) in enumerate(zip(chunks, embeddings))
+        ])
+        for field, value in fields.items():
+            setattr(doc, field, value)
+        doc.file_path = file_url
+        doc.total_chunks = len(chunks)
+        doc.status = "completed"
+        expects_text = doc.content_type == "url" or doc.file_type in _TEXT_FILE_TYPES
+        doc.processing_message = "未提取到文本内容" if expects_text and not chunks else None
+        session.commit()
+        return doc.kb_id
+
+
+@register_task_handler("process_document_upload")
+async def process_document_upload(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    后台任务：处理上传的文档
+
+    文件存入对象存储（文档的 file_path），提取文本分块写入 knowledge_document_chunks 供混合检索使用。
+    负载中的 file_ref 是暂存的文件内容，任务结束后由任务系统删除；object_key 由路由生成，
+    重试时覆盖同一对象，不会留下孤立文件
+    """
+    from project.oss_utils import upload_file_to_oss
+    from project.ai_providers.document_processor import extract_text_from_document, chunk_text
+
+    doc_id = payload["doc_id"]
+    try:
+        file_bytes = await load_task_payload(payload["file_ref"])
+        extension = os.path.splitext(payload["filename"])[1].lower()
+        object_key = payload.get("object_key") or f"knowledge/{payload['kb_id']}/{doc_id}/source{extension}"
+        file_url = await upload_file_to_oss(
+            file_bytes, object_key, payload.get("mime_type") or "application/octet-stream"
+        )
+
+        chunks: List[str] = []
+        file_type = extension.lstrip(".")
+        if file_type in _TEXT_FILE_TYPES:
+            document_text = await asyncio.to_thread(extract_text_from_document, file_bytes, file_type)
+            chunks = chunk_text(document_text, KNOWLEDGE_CHUNK_SIZE)
+        embeddings = await _chunk_embeddings(payload["owner_id"], chunks)
+        kb_id = await asyncio.to_thread(_save_document_chunks, doc_id, file_url, chunks, embeddings)
+    except Exception as e:
+        logger.error(f"文档 {doc_id} 处理失败: {e}")
+        await asyncio.to_thread(_update_document_status, doc_id, "failed", f"文档处理失败: {str(e)[:200]}")
+        raise
+
+    if kb_id is None:
+        logger.info(f"文档 {doc_id} 已被删除，跳过处理结果")
+        return {"doc_id": doc_id, "chunks": 0}
+    cache_manager.delete(f"kb:{kb_id}:stats")
+    return {"doc_id": doc_id, "chunks": len(chunks)}
+
+
+def _html_to_text(page: str) -> Tuple[Optional[str], Optional[str], str]:
+    """从网页HTML中提取标题、描述和正文文本"""
+    title_match = re.search(r'<title[^>]*>([^<]+)</title>', page, re.IGNORECASE)
+    desc_match = re.search(
+        r'<meta[^>]*name=["\']description["\'][^>]*content=["\']([^"\']+)["\']', page, re.IGNORECASE
+    )
+    body = re.sub(r'<(script|style|noscript|title)[^>]*>.*?</\1>', ' ', page, flags=re.IGNORECASE | re.DOTALL)
+    body = re.sub(r'<[^>]+>', ' ', body)
+    body = re.sub(r'\s+', ' ', html.unescape(body)).strip()
+    return (
+        html.unescape(title_match.group(1)).strip() if title_match else None,
+        html.unescape(desc_match.group(1)).strip() if desc_match else None,
+        body
+    )
+
+
+async def _fetch_url(url: str) -> str:
+    """抓取网页，超过 KNOWLEDGE_URL_MAX_BYTES 的部分丢弃"""
+    import httpx
+
+    async with httpx.AsyncClient(timeout=KNOWLEDGE_URL_TIMEOUT, follow_redirects=True) as client:
+        async with client.stream("GET", url) as response:
+            response.raise_for_status()
+            content = bytearray()
+            async for data in response.aiter_bytes():
+                content.extend(data)
+                if len(content) >= KNOWLEDGE_URL_MAX_BYTES:
+                    break
+            return bytes(content[:KNOWLEDGE_URL_MAX_BYTES]).decode(response.encoding or "utf-8", errors="replace")
+
+
+@register_task_handler("extract_url_content")
+async def extract_url_content(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """后台任务：抓取网址正文，分块写入 knowledge_document_chunks，并记录网页标题和描述"""
+    from project.ai_providers.document_processor import chunk_text
+
+    doc_id = payload["doc_id"]
+    try:
+        title, description, body = _html_to_text(await _fetch_url(payload["url"]))
+        chunks = chunk_text(body, KNOWLEDGE_CHUNK_SIZE) if body else []
+        embeddings = await _chunk_embeddings(payload["owner_id"], chunks)
+        kb_id = await asyncio.to_thread(
+            _save_document_chunks, doc_id, payload["url"], chunks, embeddings,
+            website_title=title, website_description=description
+        )
+    except Exception as e:
+        logger.error(f"网址文档 {doc_id} 抓取失败: {e}")
+        await asyncio.to_thread(_update_document_status, doc_id, "failed", f"网址内容抓取失败: {str(e)[:200]}")
+        raise
+
+    if kb_id is None:
+        logger.info(f"文档 {doc_id} 已被删除，跳过处理结果")
+        return {"doc_id": doc_id, "chunks": 0}
+    cache_manager.delete(f"kb:{kb_id}:stats")
+    return {"doc_id": doc_id, "chunks": len(chunks)}
@@ -7,6 +7,8 @@ from datetime import datetime, timedelta
 from project.models import ChatMessage, ChatRoom, ChatRoomMember, User
 import project.schemas as schemas
 from fastapi import HTTPException, status
+from project.utils.core.common_utils import record_achievement_event
+from project.database import run_db
 
 class MessageService:
     @staticmethod
@@ -54,7 +56,24 @@ class MessageService:
         start_date: Optional[datetime] = None,
         end_date: Optional[datetime] = None
     ) -> Dict:
-        """分页获取消息"""
+        """分页获取消息（查询在事件循环之外执行，见 run_db）"""
+        return await run_db(
+            db, MessageService.query_messages_page, room_id, page, size,
+            message_type, user_id, start_date, end_date
+        )
+
+    @staticmethod
+    def query_messages_page(
+        db: Session,
+        room_id: int,
+        page: int = 1,
+        size: int = 50,
+        message_type: Optional[str] = None,
+        user_id: Optional[int] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> Dict:
+        """分页查询消息（同步）"""
         query = db.query(ChatMessage).filter(ChatMessage.room_id == room_id)
         
         # 应用过滤条件
@@ -225,6 +244,7 @@ class MessageService:
         )
         
         db.add(forwarded_message)
+        await record_achievement_event(db, user_id, "chat_message_sent")
         db.commit()
         db.refresh(forwarded_message)
         
@@ -324,6 +344,7 @@ class MessageService:
                 failed_forwards += 1
         
         if successful_forwards > 0:
+            await record_achievement_event(db, user_id, "chat_message_sent", amount=successful_forwards)
             db.commit()
         else:
             db.rollback()
@@ -421,6 +442,7 @@ class MessageService:
                 failed_forwards += 1
         
         if successful_forwards > 0:
+            await record_achievement_event(db, user_id, "chat_message_sent", amount=successful_forwards)
             db.commit()
         else:
             db.rollback()
@@ -548,10 +570,15 @@ class MessageService:
                 detail="只能删除自己的消息"
             )
         
+        if message.deleted_at is not None:
+            # 重复删除：计数已在首次删除时扣减
+            return True
+        
         # 软删除：标记为已删除而不是真正删除
         message.is_deleted = True
         message.deleted_at = datetime.now()
         message.deleted_by = user_id
+        await record_achievement_event(db, message.sender_id, "chat_message_deleted")
         
         db.commit()
         return True
@@ -26,6 +26,8 @@ from project.utils.core.error_decorators import handle_database_errors, database
 from project.utils.async_cache.cache_manager import cache_result, invalidate_cache_pattern
 from project.utils.async_cache.async_tasks import submit_background_task, TaskPriority
 from project.utils.optimization.production_utils import get_cache_key, monitor_performance
+from project.services.dashboard_summary_service import DashboardSummaryService
+from project.utils.recommendation.tag_index import invalidate_tag_index
 
 logger = logging.getLogger(__name__)
 
@@ -123,6 +125,11 @@ class ProjectService:
             joined_at=datetime.utcnow()
         )
         db.add(creator_member)
+        DashboardSummaryService.apply_delta(
+            db, current_user_id, refresh_activities=True,
+            **DashboardSummaryService.project_deltas(project.project_status, created=True)
+        )
+        invalidate_tag_index("projects")
         
         logger.info(f"用户 {current_user_id} 创建项目 {project.id}：{project.title}")
         return project
@@ -155,6 +162,10 @@ class ProjectService:
         
         project.updated_at = datetime.utcnow()
         db.add(project)
+        if update_data.get("project_status") is not None:
+            DashboardSummaryService.mark_project_stale(db, project_id)
+        if update_data.get("required_skills") is not None:
+            invalidate_tag_index("projects")
         
         logger.info(f"用户 {current_user_id} 更新项目 {project_id}")
         return project
@@ -183,6 +194,8 @@ class ProjectService:
         project.is_deleted = True
         project.updated_at = datetime.utcnow()
         db.add(project)
+        DashboardSummaryService.mark_project_stale(db, project_id)
+        invalidate_tag_index("projects")
         
         logger.info(f"用户 {current_user_id} 删除项目 {project_id}")
     
@@ -359,6 +372,10 @@ class ProjectApplicationService:
                 joined_at=datetime.utcnow()
             )
             db.add(member)
+            DashboardSummaryService.apply_delta(
+                db, application.applicant_id, refresh_activities=True,
+                **DashboardSummaryService.project_deltas(application.project.project_status)
+            )
             
             application.status = "accepted"
             logger.info(f"项目申请 {application_id} 被接受")
@@ -478,6 +495,10 @@ class ProjectMemberService:
         
         # 删除成员记录
         db.delete(member)
+        DashboardSummaryService.apply_delta(
+            db, member_id, refresh_activities=True,
+            **DashboardSummaryService.project_deltas(project.project_status, sign=-1)
+        )
         
         logger.info(f"从项目 {project_id} 移除成员 {member_id}")
 
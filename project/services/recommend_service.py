@@ -8,24 +8,33 @@ from typing import List, Optional, Dict, Any, Tuple, Union
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.sql import func
-from sqlalchemy import and_, or_, desc, text
+from sqlalchemy import and_, or_, desc, text, select, exists
 from datetime import datetime, timedelta
 import logging
 import json
 import math
 from collections import defaultdict
 
+import numpy as np
+
 # 核心导入
 from project.models import (
-    User, Course, Project, KnowledgeItem, ForumPost, 
+    User, Course, UserCourse, Project, ProjectMember, KnowledgeItem, ForumPost, 
     UserBehavior, RecommendationLog
 )
 import project.schemas as schemas
 from project.utils.optimization.production_utils import cache_manager
-from project.ai_providers.matching_engine import MatchingEngine
+from project.utils.recommendation.item_similarity import (
+    CONTENT_TYPES, ITEM_SIMILARITY_HISTORY_DAYS, ITEM_SIMILARITY_RECENT_ITEMS,
+    get_item_similarity_model, user_item_weights
+)
+from project.utils.recommendation.tag_index import TagIncidenceIndex, get_tag_index, tag_names
 
 logger = logging.getLogger(__name__)
 
+# 协同过滤候选的超取倍数：加载条目时会滤掉未发布/已删除的条目
+_COLLABORATIVE_OVERFETCH = 3
+
 class RecommendationService:
     """推荐系统核心服务"""
     
@@ -38,13 +47,10 @@ class RecommendationService:
         algorithm: str = "hybrid"
     ) -> List[Dict[str, Any]]:
         """获取用户个性化推荐 - 优化版本"""
-        try:
-            # 检查缓存
-            cache_key = f"user_recommendations_{user_id}_{recommendation_type}_{algorithm}_{limit}"
-            cached_result = cache_manager.get(cache_key)
-            if cached_result:
-                return cached_result
-            
+        if recommendation_type not in ("courses", "projects", "knowledge", "forum"):
+            raise ValueError(f"不支持的推荐类型: {recommendation_type}")
+        
+        async def compute() -> List[Dict[str, Any]]:
             # 根据推荐类型选择推荐算法
             if recommendation_type == "courses":
                 recommendations = await RecommendationService._recommend_courses(
@@ -58,20 +64,21 @@ class RecommendationService:
                 recommendations = await RecommendationService._recommend_knowledge(
                     db, user_id, limit, algorithm
                 )
-            elif recommendation_type == "forum":
+            else:
                 recommendations = await RecommendationService._recommend_forum_posts(
                     db, user_id, limit, algorithm
                 )
-            else:
-                raise ValueError(f"不支持的推荐类型: {recommendation_type}")
             
             # 记录推荐日志
-            await RecommendationService._log_recommendations(
+            await RecommendationUtilities._log_recommendations(
                 db, user_id, recommendation_type, algorithm, recommendations
             )
-            
-            # 缓存结果
-            cache_manager.set(cache_key, recommendations, ttl=1800)  # 30分钟缓存
+            return recommendations
+        
+        try:
+            # 缓存30分钟，过期后由单个请求重算，其余请求返回旧值
+            cache_key = f"user_recommendations_{user_id}_{recommendation_type}_{algorithm}_{limit}"
+            recommendations = await cache_manager.aget_or_compute(cache_key, compute, expire=1800)
             
             logger.info(f"用户 {user_id} 获取 {recommendation_type} 推荐: {len(recommendations)} 项")
             return recommendations
@@ -89,15 +96,16 @@ class RecommendationService:
     ) -> List[Dict[str, Any]]:
         """课程推荐算法"""
         try:
-            # 获取用户学习历史和偏好
-            user_profile = await RecommendationService._get_user_profile(db, user_id)
-            
             if algorithm == "collaborative":
-                # 协同过滤推荐
+                # 协同过滤推荐（离线模型，不依赖用户画像）
                 return await RecommendationService._collaborative_filter_courses(
-                    db, user_id, user_profile, limit
+                    db, user_id, {}, limit
                 )
-            elif algorithm == "content":
+            
+            # 获取用户学习历史和偏好
+            user_profile = await RecommendationUtilities._get_user_profile(db, user_id)
+            
+            if algorithm == "content":
                 # 基于内容的推荐
                 return await RecommendationService._content_based_courses(
                     db, user_id, user_profile, limit
@@ -136,6 +144,146 @@ class RecommendationService:
             logger.error(f"课程推荐失败: {e}")
             return []
     
+    @staticmethod
+    def _collaborative_candidates(
+        db: Session,
+        user_id: int,
+        recommendation_type: str,
+        limit: int,
+        exclude: Optional[List[int]] = None
+    ) -> Optional[List[Tuple[int, float]]]:
+        """
+        基于离线物品相似度模型的协同过滤候选 [(物品ID, 得分)]，不含 exclude 中的物品
+        
+        只查询用户最近的行为，不扫描物品表；模型尚未构建或没有该内容类型时返回 None
+        """
+        model = get_item_similarity_model()
+        content_type = CONTENT_TYPES[recommendation_type]
+        if model is None or not model.has(content_type):
+            return None
+        
+        recent_behaviors = db.query(UserBehavior.resource_id, UserBehavior.action_type).filter(
+            UserBehavior.user_id == user_id,
+            UserBehavior.resource_type == content_type,
+            UserBehavior.created_at >= datetime.now() - timedelta(days=ITEM_SIMILARITY_HISTORY_DAYS)
+        ).order_by(desc(UserBehavior.created_at)).limit(ITEM_SIMILARITY_RECENT_ITEMS).all()
+        
+        return model.recommend(content_type, user_item_weights(recent_behaviors), limit, exclude=exclude)
+    
+    @staticmethod
+    def _engaged_item_ids(db: Session, user_id: int, recommendation_type: str) -> List[int]:
+        """用户已参与的项目 / 已选的课程，不再作为推荐结果"""
+        if recommendation_type == "projects":
+            rows = db.query(ProjectMember.project_id).filter(ProjectMember.student_id == user_id).all()
+        elif recommendation_type == "courses":
+            rows = db.query(UserCourse.course_id).filter(UserCourse.student_id == user_id).all()
+        else:
+            return []
+        return [item_id for (item_id,) in rows]
+    
+    @staticmethod
+    def _collaborative_items(
+        db: Session,
+        user_id: int,
+        recommendation_type: str,
+        limit: int
+    ) -> Optional[List[Dict[str, Any]]]:
+        """协同过滤推荐：只加载入选的条目，得分按第一名归一化到0~1"""
+        candidates = RecommendationService._collaborative_candidates(
+            db, user_id, recommendation_type, limit * _COLLABORATIVE_OVERFETCH,
+            exclude=RecommendationService._engaged_item_ids(db, user_id, recommendation_type)
+        )
+        if candidates is None:
+            return None
+        if not candidates:
+            return []
+        
+        model_class = {"courses": Course, "projects": Project, "knowledge": KnowledgeItem}[recommendation_type]
+        query = db.query(model_class).filter(model_class.id.in_([item_id for item_id, _ in candidates]))
+        if model_class is KnowledgeItem:
+            query = query.filter(KnowledgeItem.is_published == True)
+        rows = {row.id: row for row in query.all()}
+        candidates = [(item_id, score) for item_id, score in candidates if item_id in rows][:limit]
+        if not candidates:
+            return []
+        
+        top_score = candidates[0][1] or 1.0
+        recommendations = []
+        for item_id, score in candidates:
+            row = rows[item_id]
+            item = {
+                'id': row.id,
+                'title': row.title,
+                'score': score / top_score,
+                'type': CONTENT_TYPES[recommendation_type],
+                'reason': "与你近期关注内容相似的用户也喜欢"
+            }
+            if model_class is Course:
+                item.update({
+                    'description': row.description,
+                    'category': row.category,
+                    'instructor': row.instructor,
+                    'required_skills': row.required_skills or [],
+                    'avg_rating': row.avg_rating,
+                })
+            elif model_class is Project:
+                item.update({
+                    'description': row.description,
+                    'difficulty': getattr(row, 'difficulty', 'medium'),
+                    'required_skills': row.required_skills or [],
+                })
+            else:
+                item.update({
+                    'content_type': getattr(row, 'content_type', 'article'),
+                    'category': row.category,
+                    'difficulty_level': row.difficulty_level,
+                    'estimated_time': row.estimated_time,
+                })
+            recommendations.append(item)
+        return recommendations
+    
+    @staticmethod
+    async def _collaborative_filter_courses(
+        db: Session,
+        user_id: int,
+        user_profile: Dict[str, Any],
+        limit: int
+    ) -> List[Dict[str, Any]]:
+        """课程协同过滤（离线物品相似度模型）"""
+        return RecommendationService._collaborative_items(db, user_id, "courses", limit) or []
+    
+    @staticmethod
+    async def _content_based_courses(
+        db: Session,
+        user_id: int,
+        user_profile: Dict[str, Any],
+        limit: int
+    ) -> List[Dict[str, Any]]:
+        """基于内容的课程推荐：与用户兴趣同类别的高评分课程"""
+        interests = user_profile.get('interests', [])
+        if not interests or limit <= 0:
+            return []
+        
+        courses = db.query(Course).filter(
+            Course.category.in_(interests)
+        ).order_by(desc(Course.avg_rating)).limit(limit).all()
+        
+        return [
+            {
+                'id': course.id,
+                'title': course.title,
+                'description': course.description,
+                'category': course.category,
+                'instructor': course.instructor,
+                'required_skills': course.required_skills or [],
+                'avg_rating': course.avg_rating,
+                'score': min((course.avg_rating or 0) / 5.0, 1.0),
+                'type': 'course',
+                'reason': f"符合你的兴趣: {course.category}"
+            }
+            for course in courses
+        ]
+    
     @staticmethod
     async def _recommend_projects(
         db: Session,
@@ -145,48 +293,54 @@ class RecommendationService:
     ) -> List[Dict[str, Any]]:
         """项目推荐算法"""
         try:
+            if algorithm == "collaborative":
+                recommendations = RecommendationService._collaborative_items(db, user_id, "projects", limit)
+                if recommendations is not None:
+                    return recommendations
+            
             # 获取用户技能标签和兴趣
-            user_profile = await RecommendationService._get_user_profile(db, user_id)
+            user_profile = await RecommendationUtilities._get_user_profile(db, user_id)
             user_skills = user_profile.get('skills', [])
             user_interests = user_profile.get('interests', [])
             
-            # 查询项目
-            projects_query = db.query(Project).filter(
-                Project.is_active == True,
-                Project.id.notin_(
-                    # 排除用户已参与的项目
-                    db.query(Project.id).filter(
-                        Project.participants.any(id=user_id)
-                    ).subquery()
-                )
-            )
-            
-            projects = projects_query.all()
+            # 排除用户已参与的项目（反连接，只返回ID）
+            eligible_ids = db.execute(
+                select(Project.id).where(~exists().where(
+                    ProjectMember.project_id == Project.id,
+                    ProjectMember.student_id == user_id
+                ))
+            ).scalars().all()
+            
+            # 对全部项目一次性计算匹配度，只取前 limit 个
+            index = get_tag_index("projects", lambda: RecommendationUtilities._project_tag_rows(db))
+            scores = RecommendationUtilities._score_projects(index, user_skills, user_interests)
+            top_items = index.top_k(scores, index.mask_for(eligible_ids), 0.3, limit)  # 设定阈值
+            if not top_items:
+                return []
+            
+            # 只加载入选的项目，推荐理由也只为它们生成
+            projects = {
+                project.id: project
+                for project in db.query(Project).filter(Project.id.in_([item_id for item_id, _ in top_items])).all()
+            }
             recommendations = []
-            
-            for project in projects:
-                # 计算匹配度
-                score = RecommendationService._calculate_project_score(
-                    project, user_skills, user_interests
-                )
-                
-                if score > 0.3:  # 设定阈值
-                    recommendations.append({
-                        'id': project.id,
-                        'title': project.title,
-                        'description': project.description,
-                        'difficulty': getattr(project, 'difficulty', 'medium'),
-                        'required_skills': getattr(project, 'required_skills', []),
-                        'score': score,
-                        'type': 'project',
-                        'reason': RecommendationService._generate_project_reason(
-                            project, user_skills, user_interests
-                        )
-                    })
-            
-            # 按评分排序并限制数量
-            recommendations.sort(key=lambda x: x['score'], reverse=True)
-            return recommendations[:limit]
+            for project_id, score in top_items:
+                project = projects.get(project_id)
+                if project is None:
+                    continue
+                recommendations.append({
+                    'id': project.id,
+                    'title': project.title,
+                    'description': project.description,
+                    'difficulty': getattr(project, 'difficulty', 'medium'),
+                    'required_skills': getattr(project, 'required_skills', []),
+                    'score': score,
+                    'type': 'project',
+                    'reason': RecommendationUtilities._generate_project_reason(
+                        project, user_skills, user_interests
+                    )
+                })
+            return recommendations
             
         except Exception as e:
             logger.error(f"项目推荐失败: {e}")
@@ -201,47 +355,54 @@ class RecommendationService:
     ) -> List[Dict[str, Any]]:
         """知识推荐算法"""
         try:
+            if algorithm == "collaborative":
+                recommendations = RecommendationService._collaborative_items(db, user_id, "knowledge", limit)
+                if recommendations is not None:
+                    return recommendations
+            
             # 获取用户学习路径和知识偏好
-            user_profile = await RecommendationService._get_user_profile(db, user_id)
+            user_profile = await RecommendationUtilities._get_user_profile(db, user_id)
             user_knowledge_areas = user_profile.get('knowledge_areas', [])
             
-            # 查询知识项目
-            knowledge_query = db.query(KnowledgeItem).filter(
-                KnowledgeItem.is_published == True,
-                KnowledgeItem.id.notin_(
-                    # 排除用户已学习的知识
-                    db.query(KnowledgeItem.id).join(UserBehavior).filter(
+            # 已发布且用户未学习过的知识（反连接，只返回ID）
+            eligible_ids = db.execute(
+                select(KnowledgeItem.id).where(
+                    KnowledgeItem.is_published == True,
+                    ~exists().where(
                         UserBehavior.user_id == user_id,
-                        UserBehavior.action_type == 'knowledge_learned'
-                    ).subquery()
+                        UserBehavior.action_type == 'knowledge_learned',
+                        UserBehavior.resource_id == KnowledgeItem.id
+                    )
                 )
-            )
+            ).scalars().all()
             
-            knowledge_items = knowledge_query.all()
-            recommendations = []
+            index = get_tag_index("knowledge", lambda: RecommendationUtilities._knowledge_tag_rows(db))
+            scores = RecommendationUtilities._score_knowledge(index, user_knowledge_areas)
+            top_items = index.top_k(scores, index.mask_for(eligible_ids), 0.4, limit)  # 设定阈值
+            if not top_items:
+                return []
             
-            for item in knowledge_items:
-                # 使用匹配引擎计算相似度
-                score = await RecommendationService._calculate_knowledge_similarity(
-                    item, user_knowledge_areas
-                )
-                
-                if score > 0.4:  # 设定阈值
-                    recommendations.append({
-                        'id': item.id,
-                        'title': item.title,
-                        'content_type': getattr(item, 'content_type', 'article'),
-                        'category': getattr(item, 'category', 'general'),
-                        'difficulty_level': getattr(item, 'difficulty_level', 'beginner'),
-                        'score': score,
-                        'type': 'knowledge',
-                        'estimated_time': getattr(item, 'estimated_time', 30),
-                        'reason': f"基于你的学习领域 {', '.join(user_knowledge_areas[:3])} 推荐"
-                    })
-            
-            # 按评分排序并限制数量
-            recommendations.sort(key=lambda x: x['score'], reverse=True)
-            return recommendations[:limit]
+            items = {
+                item.id: item
+                for item in db.query(KnowledgeItem).filter(KnowledgeItem.id.in_([item_id for item_id, _ in top_items])).all()
+            }
+            recommendations = []
+            for item_id, score in top_items:
+                item = items.get(item_id)
+                if item is None:
+                    continue
+                recommendations.append({
+                    'id': item.id,
+                    'title': item.title,
+                    'content_type': getattr(item, 'content_type', 'article'),
+                    'category': getattr(item, 'category', 'general'),
+                    'difficulty_level': getattr(item, 'difficulty_level', 'beginner'),
+                    'score': score,
+                    'type': 'knowledge',
+                    'estimated_time': getattr(item, 'estimated_time', 30),
+                    'reason': f"基于你的学习领域 {', '.join(user_knowledge_areas[:3])} 推荐"
+                })
+            return recommendations
             
         except Exception as e:
             logger.error(f"知识推荐失败: {e}")
@@ -257,7 +418,7 @@ class RecommendationService:
         """论坛帖子推荐算法"""
         try:
             # 获取用户兴趣标签
-            user_profile = await RecommendationService._get_user_profile(db, user_id)
+            user_profile = await RecommendationUtilities._get_user_profile(db, user_id)
             user_interests = user_profile.get('interests', [])
             
             # 查询热门帖子
@@ -273,7 +434,7 @@ class RecommendationService:
             
             for post in posts:
                 # 计算相关性评分
-                score = RecommendationService._calculate_post_relevance(
+                score = RecommendationUtilities._calculate_post_relevance(
                     post, user_interests
                 )
                 
@@ -413,18 +574,18 @@ class RecommendationUtilities:
         user_skills: List[str],
         user_interests: List[str]
     ) -> float:
-        """计算项目匹配评分"""
+        """计算项目匹配评分（单个项目；批量评分见 _score_projects）"""
         try:
             score = 0.0
             
             # 技能匹配度
-            project_skills = getattr(project, 'required_skills', [])
+            project_skills = tag_names(getattr(project, 'required_skills', []))
             if project_skills:
                 skill_match = len(set(user_skills) & set(project_skills)) / len(project_skills)
                 score += skill_match * 0.6
             
             # 兴趣匹配度
-            project_tags = getattr(project, 'tags', [])
+            project_tags = tag_names(getattr(project, 'tags', []))
             if project_tags:
                 interest_match = len(set(user_interests) & set(project_tags)) / len(project_tags)
                 score += interest_match * 0.4
@@ -435,6 +596,28 @@ class RecommendationUtilities:
             logger.error(f"计算项目评分失败: {e}")
             return 0.0
     
+    @staticmethod
+    def _project_tag_rows(db: Session) -> List[Tuple[int, Dict[str, List[str]]]]:
+        """项目标签索引的数据：只查询ID和技能列（Project 没有 tags 列，兴趣匹配项为空）"""
+        return [
+            (project_id, {'skills': tag_names(required_skills)})
+            for project_id, required_skills in db.query(Project.id, Project.required_skills).all()
+        ]
+    
+    @staticmethod
+    def _score_projects(
+        index: TagIncidenceIndex,
+        user_skills: List[str],
+        user_interests: List[str]
+    ) -> np.ndarray:
+        """与 _calculate_project_score 相同的评分，对索引中的全部项目做一次稀疏矩阵-向量乘法"""
+        scores = np.zeros(len(index))
+        for field, user_tags, weight in (('skills', user_skills, 0.6), ('tags', user_interests, 0.4)):
+            counts, lengths = index.overlap(field, user_tags)
+            has_tags = lengths > 0
+            scores[has_tags] += counts[has_tags] / lengths[has_tags] * weight
+        return np.minimum(scores, 1.0)
+    
     @staticmethod
     def _generate_project_reason(
         project: Project,
@@ -446,13 +629,13 @@ class RecommendationUtilities:
             reasons = []
             
             # 技能匹配
-            project_skills = getattr(project, 'required_skills', [])
+            project_skills = tag_names(getattr(project, 'required_skills', []))
             matched_skills = set(user_skills) & set(project_skills)
             if matched_skills:
                 reasons.append(f"匹配你的技能: {', '.join(list(matched_skills)[:3])}")
             
             # 兴趣匹配
-            project_tags = getattr(project, 'tags', [])
+            project_tags = tag_names(getattr(project, 'tags', []))
             matched_interests = set(user_interests) & set(project_tags)
             if matched_interests:
                 reasons.append(f"符合你的兴趣: {', '.join(list(matched_interests)[:2])}")
@@ -464,28 +647,43 @@ class RecommendationUtilities:
             return "为你推荐"
     
     @staticmethod
-    async def _calculate_knowledge_similarity(
+    def _calculate_knowledge_similarity(
         item: KnowledgeItem,
         user_areas: List[str]
     ) -> float:
-        """计算知识相似度"""
+        """计算知识相似度：用户学习领域中与知识条目标签/类别重合的比例"""
         try:
-            # 使用匹配引擎计算相似度
-            item_content = f"{item.title} {getattr(item, 'summary', '')}"
-            user_content = " ".join(user_areas)
+            areas = set(user_areas)
+            if not areas:
+                return 0.0
             
-            # 这里应该调用实际的匹配引擎
-            # 简化实现
-            similarity = MatchingEngine.calculate_text_similarity(
-                item_content, user_content
-            ) if hasattr(MatchingEngine, 'calculate_text_similarity') else 0.5
+            terms = set(tag_names(getattr(item, 'tags', None)))
+            if getattr(item, 'category', None):
+                terms.add(item.category)
             
-            return similarity
+            return len(areas & terms) / len(areas)
             
         except Exception as e:
             logger.error(f"计算知识相似度失败: {e}")
             return 0.0
     
+    @staticmethod
+    def _knowledge_tag_rows(db: Session) -> List[Tuple[int, Dict[str, List[str]]]]:
+        """知识标签索引的数据：标签和类别合并为一个字段"""
+        return [
+            (item_id, {'terms': tag_names(tags) + ([category] if category else [])})
+            for item_id, tags, category in db.query(KnowledgeItem.id, KnowledgeItem.tags, KnowledgeItem.category).all()
+        ]
+    
+    @staticmethod
+    def _score_knowledge(index: TagIncidenceIndex, user_areas: List[str]) -> np.ndarray:
+        """与 _calculate_knowledge_similarity 相同的评分，对索引中的全部知识条目一次算出"""
+        areas = set(user_areas)
+        if not areas:
+            return np.zeros(len(index))
+        counts, _ = index.overlap('terms', areas)
+        return counts / len(areas)
+    
     @staticmethod
     def _calculate_post_relevance(
         post: ForumPost,
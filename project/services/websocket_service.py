@@ -9,7 +9,7 @@ from typing import Dict, List, Optional
 from datetime import datetime
 
 from project.database import get_db
-from project.utils import get_current_user_id
+from project.utils import get_current_user_id, record_achievement_event
 from project.models import ChatRoom, ChatRoomMember, ChatMessage, User
 from project.services.message_service import MessageService
 from project.utils.security.permissions import check_room_access
@@ -356,6 +356,10 @@ async def handle_chat_message(message_data: Dict, room_id: int, user_id: int, db
             reply_to_id=reply_to_id
         )
         
+        # 更新发送者的成就计数
+        await record_achievement_event(db, user_id, "chat_message_sent")
+        db.commit()
+        
         # 添加到缓存
         await cache.add_recent_message(room_id, db_message.__dict__)
         
@@ -10,6 +10,7 @@ from .core import (
     _get_text_part,
     _award_points,
     _check_and_award_achievements,
+    record_achievement_event,
     validate_ownership,
     check_admin_permission, 
     check_resource_permission,
@@ -178,6 +179,7 @@ __all__ = [
     "_get_text_part",
     "_award_points",
     "_check_and_award_achievements",
+    "record_achievement_event",
     "validate_ownership",
     "check_admin_permission", 
     "check_resource_permission",
@@ -8,6 +8,16 @@
 from .cache import ChatRoomCache
 from .cache_manager import *
 from .async_tasks import *
+from .redis_backend import (
+    AsyncRedisBackend,
+    AsyncRedisConfig,
+    get_async_redis_backend,
+    get_async_redis_client,
+    close_async_redis_backends
+)
+from .memory_tier import ShardedLRUCache
+from .codecs import CacheCodec, CacheValueError, benchmark_codecs
+from .leaderboard import Leaderboard, points_leaderboard, record_points_change
 
 # LLM 缓存服务
 from .llm_cache_service import (
@@ -55,12 +65,35 @@ __all__ = [
     # 缓存相关
     "ChatRoomCache",
     
+    # 异步Redis后端
+    "AsyncRedisBackend",
+    "AsyncRedisConfig",
+    "get_async_redis_backend",
+    "get_async_redis_client",
+    "close_async_redis_backends",
+    
+    # 进程内L1缓存与编解码
+    "ShardedLRUCache",
+    "CacheCodec",
+    "CacheValueError",
+    "benchmark_codecs",
+    
+    # 排行榜
+    "Leaderboard",
+    "points_leaderboard",
+    "record_points_change",
+    
     # 异步任务
-    "TaskManager",
     "TaskStatus", 
     "TaskPriority",
     "Task",
-    "AsyncTaskExecutor",
+    "AsyncTaskQueue",
+    "TaskJournal",
+    "TaskPayloadStore",
+    "register_task_handler",
+    "submit_background_task",
+    "offload_task_payload",
+    "load_task_payload",
     
     # MCP 缓存
     "mcp_cache_manager",
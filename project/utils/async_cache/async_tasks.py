@@ -1,6 +1,12 @@
 # project/utils/async_tasks.py
 """
 异步任务处理系统 - 支持后台任务、定时任务和队列处理
+
+- 具名任务（register_task_handler 注册的处理器 + JSON负载）写入本地SQLite任务日志，
+  进程重启后自动恢复未完成的任务；直接提交的函数对象只保存在内存中
+- 已结束任务按数量和时间有界保留，不再无限增长
+- 大负载（如上传的文件内容）先写入对象存储，任务只携带引用
+- 协程在事件循环中执行，同步函数按类型分别进入IO线程池或CPU进程池
 """
 import asyncio
 import logging
@@ -8,14 +14,34 @@ from typing import Any, Callable, Dict, List, Optional, Union
 from datetime import datetime, timedelta
 from dataclasses import dataclass, field
 from enum import Enum
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+import copy
 import json
+import os
+import sqlite3
 import uuid
-from concurrent.futures import ThreadPoolExecutor
 import threading
 import time
 
+try:
+    from starlette.background import BackgroundTasks
+except ImportError:
+    BackgroundTasks = None
+
 logger = logging.getLogger(__name__)
 
+# 排队等待 / 执行耗时直方图的桶上限（秒）
+TASK_LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, float("inf"))
+
+_latency_listeners: List[Callable[[str, float], None]] = []
+
+
+def add_latency_listener(listener: Callable[[str, float], None]):
+    """注册任务耗时监听器：任务开始执行时以 ("wait", 排队秒数)、每次执行结束时以 ("run", 执行秒数) 调用"""
+    _latency_listeners.append(listener)
+
 class TaskStatus(Enum):
     PENDING = "pending"
     RUNNING = "running"
@@ -26,9 +52,12 @@ class TaskStatus(Enum):
 class TaskPriority(Enum):
     LOW = 1
     NORMAL = 2
+    MEDIUM = 2  # NORMAL 的别名，路由中使用
     HIGH = 3
     CRITICAL = 4
 
+_FINISHED_STATUSES = (TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED)
+
 @dataclass
 class Task:
     """异步任务数据类"""
@@ -37,22 +66,28 @@ class Task:
     func: Callable = None
     args: tuple = field(default_factory=tuple)
     kwargs: dict = field(default_factory=dict)
+    handler: Optional[str] = None
+    payload: Optional[Dict[str, Any]] = None
+    durable: bool = False
     priority: TaskPriority = TaskPriority.NORMAL
     status: TaskStatus = TaskStatus.PENDING
     created_at: datetime = field(default_factory=datetime.now)
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
+    enqueued_at: float = 0.0
     result: Any = None
     error: Optional[str] = None
     retry_count: int = 0
     max_retries: int = 3
     timeout: Optional[int] = None
-    
+
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典格式"""
         return {
             'id': self.id,
             'name': self.name,
+            'handler': self.handler,
+            'durable': self.durable,
             'priority': self.priority.value,
             'status': self.status.value,
             'created_at': self.created_at.isoformat(),
@@ -63,64 +98,605 @@ class Task:
             'error': self.error
         }
 
+# ==================== 具名任务处理器 ====================
+
+@dataclass
+class TaskHandler:
+    """具名任务处理器，调用方式为 func(payload)"""
+    name: str
+    func: Callable
+    cpu_bound: bool = False
+
+_task_handlers: Dict[str, TaskHandler] = {}
+
+def register_task_handler(name: str, cpu_bound: bool = False):
+    """
+    注册具名任务处理器
+
+    cpu_bound=True 的处理器在进程池中执行，必须是模块级同步函数（可被pickle）
+    """
+    def decorator(func: Callable) -> Callable:
+        if cpu_bound and asyncio.iscoroutinefunction(func):
+            raise ValueError(f"CPU密集型任务处理器必须是同步函数: {name}")
+        _task_handlers[name] = TaskHandler(name=name, func=func, cpu_bound=cpu_bound)
+        return func
+    return decorator
+
+def get_task_handler(name: str) -> Optional[TaskHandler]:
+    """获取已注册的任务处理器"""
+    return _task_handlers.get(name)
+
+# ==================== 任务日志（持久化） ====================
+
+def _owner_alive(owner: Optional[str]) -> bool:
+    """判断写入日志记录的本机进程是否仍在运行"""
+    if not owner or not owner.isdigit():
+        return False
+    try:
+        os.kill(int(owner), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+class TaskJournal:
+    """
+    基于SQLite的本地任务日志
+
+    记录具名任务的负载和状态，进程重启后恢复 pending/running 的任务；
+    已结束的记录按数量和时间清理。多节点部署时每个节点各自维护日志；
+    同一节点的多个工作进程共享日志时，每条记录归属写入它的进程，
+    只有归属进程已退出的记录才会被其他进程接管。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.owner: Optional[str] = None
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS task_journal (
+                    id TEXT PRIMARY KEY,
+                    name TEXT,
+                    handler TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    priority INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    retry_count INTEGER NOT NULL DEFAULT 0,
+                    max_retries INTEGER NOT NULL DEFAULT 3,
+                    timeout REAL,
+                    error TEXT,
+                    owner TEXT
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_task_journal_status "
+                "ON task_journal(status, priority DESC, created_at)"
+            )
+            self.owner = str(os.getpid())
+            self._conn = conn
+        return self._conn
+
+    def add(self, task: Task, payload_json: str):
+        with self._lock:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO task_journal "
+                "(id, name, handler, payload, priority, status, created_at, updated_at, "
+                "retry_count, max_retries, timeout, error, owner) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (task.id, task.name, task.handler, payload_json, task.priority.value, task.status.value,
+                 task.created_at.timestamp(), time.time(), task.retry_count, task.max_retries,
+                 task.timeout, task.error, self.owner)
+            )
+
+    def update(self, task: Task, status: Optional[TaskStatus] = None):
+        with self._lock:
+            self._connection().execute(
+                "UPDATE task_journal SET status = ?, updated_at = ?, retry_count = ?, error = ? WHERE id = ?",
+                ((status or task.status).value, time.time(), task.retry_count, task.error, task.id)
+            )
+
+    def load_pending(self, limit: int, exclude: Optional[set] = None) -> List[Task]:
+        """按优先级加载未完成的任务，必要时接管已退出进程的记录"""
+        exclude = exclude or set()
+        with self._lock:
+            conn = self._connection()
+            candidates = conn.execute(
+                "SELECT id, owner FROM task_journal WHERE status IN (?, ?) ORDER BY priority DESC, created_at",
+                (TaskStatus.PENDING.value, TaskStatus.RUNNING.value)
+            ).fetchall()
+
+            chosen: List[str] = []
+            owner_alive: Dict[Optional[str], bool] = {}
+            for task_id, owner in candidates:
+                if task_id in exclude:
+                    continue
+                if owner != self.owner:
+                    if owner not in owner_alive:
+                        owner_alive[owner] = _owner_alive(owner)
+                    if owner_alive[owner]:
+                        continue
+                    claimed = conn.execute(
+                        "UPDATE task_journal SET owner = ? WHERE id = ? AND owner IS ?",
+                        (self.owner, task_id, owner)
+                    ).rowcount
+                    if not claimed:
+                        continue
+                chosen.append(task_id)
+                if len(chosen) >= limit:
+                    break
+
+            if not chosen:
+                return []
+            placeholders = ", ".join("?" for _ in chosen)
+            rows = conn.execute(
+                "SELECT id, name, handler, payload, priority, created_at, retry_count, max_retries, timeout "
+                f"FROM task_journal WHERE id IN ({placeholders})",
+                chosen
+            ).fetchall()
+
+        order = {task_id: index for index, task_id in enumerate(chosen)}
+        return [
+            Task(
+                id=row[0],
+                name=row[1] or row[2],
+                handler=row[2],
+                payload=json.loads(row[3]),
+                durable=True,
+                priority=TaskPriority(row[4]),
+                created_at=datetime.fromtimestamp(row[5]),
+                retry_count=row[6],
+                max_retries=row[7],
+                timeout=row[8]
+            )
+            for row in sorted(rows, key=lambda row: order[row[0]])
+        ]
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT id, name, handler, priority, status, created_at, updated_at, retry_count, "
+                "max_retries, error FROM task_journal WHERE id = ?",
+                (task_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'id': row[0],
+            'name': row[1],
+            'handler': row[2],
+            'durable': True,
+            'priority': row[3],
+            'status': row[4],
+            'created_at': datetime.fromtimestamp(row[5]).isoformat(),
+            'updated_at': datetime.fromtimestamp(row[6]).isoformat(),
+            'retry_count': row[7],
+            'max_retries': row[8],
+            'error': row[9]
+        }
+
+    def count_pending(self) -> int:
+        with self._lock:
+            return self._connection().execute(
+                "SELECT COUNT(*) FROM task_journal WHERE status IN (?, ?)",
+                (TaskStatus.PENDING.value, TaskStatus.RUNNING.value)
+            ).fetchone()[0]
+
+    def prune(self, max_finished: int, max_age_seconds: int) -> int:
+        """删除过期的已结束记录，并只保留最近 max_finished 条"""
+        finished = tuple(status.value for status in _FINISHED_STATUSES)
+        with self._lock:
+            conn = self._connection()
+            deleted = conn.execute(
+                "DELETE FROM task_journal WHERE status IN (?, ?, ?) AND updated_at < ?",
+                finished + (time.time() - max_age_seconds,)
+            ).rowcount
+            deleted += conn.execute(
+                "DELETE FROM task_journal WHERE status IN (?, ?, ?) AND id NOT IN ("
+                "SELECT id FROM task_journal WHERE status IN (?, ?, ?) ORDER BY updated_at DESC LIMIT ?)",
+                finished + finished + (max_finished,)
+            ).rowcount
+        return deleted
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+# ==================== 任务负载存储 ====================
+
+_PAYLOAD_REF_PREFIX = "taskblob+"
+
+class TaskPayloadStore:
+    """
+    任务大负载存储
+
+    优先写入OSS/S3（project.oss_utils），未配置时写入本地目录 TASK_PAYLOAD_DIR。
+    任务负载中只保存 "taskblob+oss://..." / "taskblob+file://..." 形式的引用，
+    任务执行结束后由队列删除。本地目录仅适用于单节点部署。
+    """
+
+    def __init__(self, local_dir: Optional[str] = None):
+        self.local_dir = local_dir or os.getenv("TASK_PAYLOAD_DIR", "data/task_payloads")
+        self._oss_utils = None
+        self._oss_checked = False
+
+    def _oss(self):
+        if not self._oss_checked:
+            self._oss_checked = True
+            try:
+                import project.oss_utils as oss_utils
+                self._oss_utils = oss_utils
+            except Exception as e:
+                logger.info(f"对象存储不可用，任务负载写入本地目录 {self.local_dir}: {e}")
+        return self._oss_utils
+
+    @staticmethod
+    def is_ref(value: Any) -> bool:
+        return isinstance(value, str) and value.startswith(_PAYLOAD_REF_PREFIX)
+
+    async def put(self, data: bytes, filename: str = "",
+                  content_type: str = "application/octet-stream") -> str:
+        """保存负载，返回引用"""
+        ext = os.path.splitext(filename)[1] if filename else ""
+        object_name = f"task_payloads/{datetime.now():%Y%m%d}/{uuid.uuid4().hex}{ext}"
+
+        oss_utils = self._oss()
+        if oss_utils is not None:
+            await oss_utils.upload_file_to_oss(data, object_name, content_type or "application/octet-stream")
+            return f"{_PAYLOAD_REF_PREFIX}oss://{object_name}"
+
+        path = os.path.abspath(os.path.join(self.local_dir, object_name))
+
+        def write():
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(data)
+
+        await asyncio.to_thread(write)
+        return f"{_PAYLOAD_REF_PREFIX}file://{path}"
+
+    async def get(self, ref: str) -> bytes:
+        """按引用读取负载"""
+        location = ref[len(_PAYLOAD_REF_PREFIX):]
+        if location.startswith("oss://"):
+            oss_utils = self._oss()
+            if oss_utils is None:
+                raise RuntimeError(f"对象存储不可用，无法读取任务负载: {ref}")
+            return await oss_utils.download_file_from_oss(location[len("oss://"):])
+        if location.startswith("file://"):
+            path = location[len("file://"):]
+
+            def read():
+                with open(path, "rb") as f:
+                    return f.read()
+
+            return await asyncio.to_thread(read)
+        raise ValueError(f"无效的任务负载引用: {ref}")
+
+    async def delete(self, ref: str):
+        """删除负载（忽略不存在的对象）"""
+        location = ref[len(_PAYLOAD_REF_PREFIX):]
+        try:
+            if location.startswith("oss://"):
+                oss_utils = self._oss()
+                if oss_utils is not None:
+                    await oss_utils.delete_file_from_oss(location[len("oss://"):])
+            elif location.startswith("file://"):
+                path = location[len("file://"):]
+                await asyncio.to_thread(lambda: os.path.exists(path) and os.remove(path))
+        except Exception as e:
+            logger.warning(f"删除任务负载失败 {ref}: {e}")
+
+payload_store = TaskPayloadStore()
+
+async def offload_task_payload(data: bytes, filename: str = "",
+                               content_type: str = "application/octet-stream") -> str:
+    """将大负载写入对象存储，返回可放入任务负载的引用"""
+    return await payload_store.put(data, filename, content_type)
+
+async def load_task_payload(ref: str) -> bytes:
+    """在任务处理器中按引用读取负载"""
+    return await payload_store.get(ref)
+
+# ==================== 任务队列 ====================
+
+def _percentiles(values) -> Dict[str, float]:
+    if not values:
+        return {'p50': 0.0, 'p95': 0.0, 'max': 0.0}
+    ordered = sorted(values)
+    last = len(ordered) - 1
+    return {
+        'p50': ordered[int(last * 0.5)],
+        'p95': ordered[int(last * 0.95)],
+        'max': ordered[-1]
+    }
+
 class AsyncTaskQueue:
     """异步任务队列管理器"""
-    
-    def __init__(self, max_workers: int = 5, max_queue_size: int = 1000):
+
+    def __init__(self, max_workers: int = 5, max_queue_size: int = 1000,
+                 io_workers: Optional[int] = None, cpu_workers: Optional[int] = None,
+                 journal_path: Optional[str] = None):
         self.max_workers = max_workers
         self.max_queue_size = max_queue_size
+        self.io_workers = io_workers or int(os.getenv("TASK_IO_WORKERS", "8"))
+        self.cpu_workers = cpu_workers or int(os.getenv("TASK_CPU_WORKERS", str(min(4, os.cpu_count() or 1))))
+        self.result_retention = int(os.getenv("TASK_RESULT_RETENTION", "1000"))
+        self.result_ttl = int(os.getenv("TASK_RESULT_TTL", "3600"))
+        self.journal_retention = int(os.getenv("TASK_JOURNAL_RETENTION", "10000"))
+        self.journal_ttl = int(os.getenv("TASK_JOURNAL_TTL", str(7 * 24 * 3600)))
+
+        # 未结束的任务
         self.tasks: Dict[str, Task] = {}
+        # 已结束的任务，按结束顺序有界保留
+        self.finished_tasks: "OrderedDict[str, Task]" = OrderedDict()
         self.pending_queue: asyncio.PriorityQueue = asyncio.PriorityQueue(maxsize=max_queue_size)
-        self.running_tasks: Dict[str, asyncio.Task] = {}
-        self.completed_tasks: List[str] = []
-        self.failed_tasks: List[str] = []
+        self.running_tasks: Dict[str, asyncio.Future] = {}
         self.workers: List[asyncio.Task] = []
         self.is_running = False
         self.stats = {
             'total_tasks': 0,
             'completed_tasks': 0,
             'failed_tasks': 0,
-            'cancelled_tasks': 0
+            'cancelled_tasks': 0,
+            'recovered_tasks': 0
         }
+        self._wait_times: deque = deque(maxlen=1000)
+        self._run_times: deque = deque(maxlen=1000)
+        self._queued_ids: set = set()
+        # 内存队列满时具名任务只留在日志中，空闲时再补充
+        self._backlogged = False
+        self._last_prune = 0.0
         self._lock = asyncio.Lock()
-    
-    async def start(self):
-        """启动任务队列"""
+
+        self._io_executor: Optional[ThreadPoolExecutor] = None
+        self._cpu_executor: Optional[ProcessPoolExecutor] = None
+        # 任务日志的SQLite读写都在这个单线程中按提交顺序执行，不阻塞事件循环
+        self._journal_executor: Optional[ThreadPoolExecutor] = None
+        self._recovery: Optional[asyncio.Future] = None
+        self._refilling = False
+
+        self.journal: Optional[TaskJournal] = None
+        if os.getenv("TASK_JOURNAL_ENABLED", "true").lower() == "true":
+            self.journal = TaskJournal(journal_path or os.getenv("TASK_JOURNAL_PATH", "data/task_journal.db"))
+
+    def _start_workers(self):
         if self.is_running:
             return
-        
+
         self.is_running = True
-        logger.info(f"启动异步任务队列，工作线程数: {self.max_workers}")
-        
-        # 创建工作线程
+        logger.info(f"启动异步任务队列，工作协程数: {self.max_workers}，IO线程: {self.io_workers}，CPU进程: {self.cpu_workers}")
+
+        self._io_executor = ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix="task-io")
+        if self.journal:
+            self._journal_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="task-journal")
+            # 先于本次启动后的任何日志写入提交，恢复时不会读到新提交的任务
+            self._recovery = asyncio.ensure_future(self._recover())
+
+        # 创建工作协程
         for i in range(self.max_workers):
             worker = asyncio.create_task(self._worker(f"worker-{i}"))
             self.workers.append(worker)
-    
+
+    async def start(self):
+        """启动任务队列，并恢复任务日志中未完成的任务"""
+        self._start_workers()
+        if self._recovery is not None:
+            await self._recovery
+
     async def stop(self):
-        """停止任务队列"""
+        """停止任务队列（未完成的具名任务保留在日志中，下次启动时恢复）"""
         if not self.is_running:
             return
-        
+
         self.is_running = False
         logger.info("停止异步任务队列")
-        
-        # 取消所有工作线程
+
+        # 取消所有工作协程
         for worker in self.workers:
             worker.cancel()
-        
-        # 等待工作线程结束
+
+        # 等待工作协程结束
         await asyncio.gather(*self.workers, return_exceptions=True)
         self.workers.clear()
-        
+
         # 取消所有运行中的任务
-        for task_id, task in self.running_tasks.items():
-            task.cancel()
-            if task_id in self.tasks:
-                self.tasks[task_id].status = TaskStatus.CANCELLED
-        
+        for task_id, future in self.running_tasks.items():
+            future.cancel()
+            task = self.tasks.get(task_id)
+            if task is not None:
+                task.status = TaskStatus.CANCELLED
+                self._journal_update(task, TaskStatus.PENDING)
+
         self.running_tasks.clear()
-    
+        self._queued_ids.clear()
+
+        if self._io_executor:
+            self._io_executor.shutdown(wait=False, cancel_futures=True)
+            self._io_executor = None
+        if self._cpu_executor:
+            self._cpu_executor.shutdown(wait=False, cancel_futures=True)
+            self._cpu_executor = None
+        if self._journal_executor:
+            # 等待已提交的日志写入完成后再关闭连接
+            await asyncio.to_thread(self._journal_executor.shutdown, True)
+            self._journal_executor = None
+        if self.journal:
+            self.journal.close()
+
+    # ---- 持久化 ----
+
+    def _journal_call(self, method: str, *args):
+        if not self.journal:
+            return None
+        try:
+            return getattr(self.journal, method)(*args)
+        except Exception as e:
+            logger.error(f"任务日志操作失败 ({method}): {e}")
+            return None
+
+    def _journal_submit(self, fn: Callable, *args) -> Optional[asyncio.Future]:
+        """把日志操作交给日志线程，返回可等待的结果；日志未启用或队列已停止时返回 None"""
+        if self._journal_executor is None:
+            return None
+        return asyncio.wrap_future(self._journal_executor.submit(fn, *args))
+
+    async def _ajournal_call(self, method: str, *args):
+        future = self._journal_submit(self._journal_call, method, *args)
+        return await future if future is not None else None
+
+    def _journal_update(self, task: Task, status: Optional[TaskStatus] = None):
+        if task.durable:
+            # 写入时任务可能已进入下一状态，提交当前状态的快照
+            self._journal_submit(self._journal_call, "update", copy.copy(task), status)
+
+    def _journal_add(self, task: Task, payload_json: str):
+        """在日志线程中执行；写入失败时任务退化为仅内存"""
+        try:
+            self.journal.add(task, payload_json)
+        except Exception as e:
+            task.durable = False
+            logger.error(f"写入任务日志失败，任务 {task.name} 仅保存在内存中: {e}")
+
+    async def _recover(self):
+        """启动时从任务日志恢复未完成的任务（上次运行中断的任务视为待执行）"""
+        recovered = await self._ajournal_call("load_pending", self.max_queue_size) or []
+        for task in recovered:
+            self.tasks[task.id] = task
+            self._enqueue_nowait(task)
+        if recovered:
+            self.stats['recovered_tasks'] += len(recovered)
+            self._backlogged = True
+            logger.info(f"从任务日志恢复 {len(recovered)} 个未完成任务")
+
+    async def _refill_from_journal(self):
+        """内存队列有空位时，从日志补充积压的具名任务"""
+        free = self.max_queue_size - self.pending_queue.qsize()
+        if free <= 0 or self._refilling:
+            return
+        self._refilling = True
+        try:
+            exclude = set(self.tasks.keys())
+            tasks = await self._ajournal_call("load_pending", free, exclude) or []
+        finally:
+            self._refilling = False
+        for task in tasks:
+            if task.id in self.tasks:
+                continue
+            self.tasks[task.id] = task
+            self._enqueue_nowait(task)
+        self._backlogged = len(tasks) >= free
+
+    def _prune_journal(self):
+        deleted = self._journal_call("prune", self.journal_retention, self.journal_ttl)
+        if deleted:
+            logger.debug(f"清理任务日志 {deleted} 条")
+
+    def _maybe_prune(self):
+        now = time.monotonic()
+        if now - self._last_prune < 60:
+            return
+        self._last_prune = now
+        self._journal_submit(self._prune_journal)
+
+    def _record_latency(self, stage: str, seconds: float):
+        (self._wait_times if stage == "wait" else self._run_times).append(seconds)
+        for listener in _latency_listeners:
+            try:
+                listener(stage, seconds)
+            except Exception as e:
+                logger.debug(f"任务耗时监听器执行失败: {e}")
+
+    # ---- 提交 ----
+
+    def _enqueue_nowait(self, task: Task) -> bool:
+        """放入内存队列，队列已满返回 False"""
+        task.enqueued_at = time.monotonic()
+        # 优先级队列，数值越小优先级越高
+        priority_value = 5 - task.priority.value
+        try:
+            self.pending_queue.put_nowait((priority_value, task.created_at, task.id))
+        except asyncio.QueueFull:
+            return False
+        self._queued_ids.add(task.id)
+        return True
+
+    def _create_task(self, func: Optional[Callable], args: tuple, kwargs: dict, name: str,
+                     priority: TaskPriority, max_retries: int, timeout: Optional[int],
+                     handler: Optional[str] = None, payload: Optional[Dict[str, Any]] = None) -> Task:
+        task = Task(
+            name=name or handler or f"{func.__name__}_{int(time.time())}",
+            func=func,
+            args=args,
+            kwargs=kwargs,
+            handler=handler,
+            payload=payload,
+            priority=priority,
+            max_retries=max_retries,
+            timeout=timeout
+        )
+
+        if handler and self._journal_executor is not None:
+            try:
+                payload_json = json.dumps(payload or {}, ensure_ascii=False)
+            except (TypeError, ValueError) as e:
+                logger.warning(f"任务 {task.name} 的负载无法序列化，仅保存在内存中: {e}")
+            else:
+                # 写入在日志线程中排在该任务后续的状态更新之前执行
+                task.durable = True
+                self._journal_submit(self._journal_add, task, payload_json)
+
+        self.tasks[task.id] = task
+        self.stats['total_tasks'] += 1
+        return task
+
+    def enqueue(
+        self,
+        func: Optional[Callable] = None,
+        *args,
+        handler: Optional[str] = None,
+        payload: Optional[Dict[str, Any]] = None,
+        name: str = "",
+        priority: TaskPriority = TaskPriority.NORMAL,
+        max_retries: int = 3,
+        timeout: Optional[int] = None,
+        **kwargs
+    ) -> str:
+        """
+        同步提交任务（需在事件循环中调用）
+
+        具名任务在内存队列已满时留在日志中稍后执行；
+        函数任务在队列已满时抛出 asyncio.QueueFull
+        """
+        self._start_workers()
+        task = self._create_task(func, args, kwargs, name, priority, max_retries, timeout, handler, payload)
+
+        if not self._enqueue_nowait(task):
+            if not task.durable:
+                self.tasks.pop(task.id, None)
+                raise asyncio.QueueFull(f"任务队列已满: {task.name}")
+            # 只保留在日志中，释放内存
+            self.tasks.pop(task.id, None)
+            self._backlogged = True
+            logger.warning(f"任务队列已满，任务 {task.name} 暂存于任务日志")
+
+        logger.info(f"任务已提交: {task.name} (ID: {task.id}, 优先级: {priority.name})")
+        return task.id
+
     async def submit_task(
         self,
         func: Callable,
@@ -131,37 +707,25 @@ class AsyncTaskQueue:
         timeout: Optional[int] = None,
         **kwargs
     ) -> str:
-        """提交任务到队列"""
-        if not self.is_running:
-            await self.start()
-        
-        # 创建任务
-        task = Task(
-            name=name or f"{func.__name__}_{int(time.time())}",
-            func=func,
-            args=args,
-            kwargs=kwargs,
-            priority=priority,
-            max_retries=max_retries,
-            timeout=timeout
-        )
-        
-        # 存储任务
-        async with self._lock:
-            self.tasks[task.id] = task
-            self.stats['total_tasks'] += 1
-        
-        # 添加到队列 (优先级队列，数值越小优先级越高)
-        priority_value = 5 - priority.value  # 反转优先级
+        """提交任务到队列（队列已满时等待）"""
+        self._start_workers()
+
+        task = self._create_task(func, args, kwargs, name, priority, max_retries, timeout)
+
+        task.enqueued_at = time.monotonic()
+        priority_value = 5 - priority.value
         await self.pending_queue.put((priority_value, task.created_at, task.id))
-        
+        self._queued_ids.add(task.id)
+
         logger.info(f"任务已提交: {task.name} (ID: {task.id}, 优先级: {priority.name})")
         return task.id
-    
+
+    # ---- 执行 ----
+
     async def _worker(self, worker_name: str):
-        """工作线程"""
-        logger.info(f"工作线程 {worker_name} 启动")
-        
+        """工作协程"""
+        logger.info(f"工作协程 {worker_name} 启动")
+
         while self.is_running:
             try:
                 # 从队列获取任务 (等待最多1秒)
@@ -171,128 +735,196 @@ class AsyncTaskQueue:
                         timeout=1.0
                     )
                 except asyncio.TimeoutError:
+                    if self._backlogged:
+                        await self._refill_from_journal()
+                    self._maybe_prune()
                     continue
-                
-                # 获取任务对象
-                async with self._lock:
-                    if task_id not in self.tasks:
-                        continue
-                    task = self.tasks[task_id]
-                
+
+                self._queued_ids.discard(task_id)
+                if self._backlogged:
+                    await self._refill_from_journal()
+                task = self.tasks.get(task_id)
+                if task is None or task.status == TaskStatus.CANCELLED:
+                    continue
+
                 # 执行任务
                 await self._execute_task(worker_name, task)
-                
+
             except asyncio.CancelledError:
-                logger.info(f"工作线程 {worker_name} 被取消")
+                logger.info(f"工作协程 {worker_name} 被取消")
                 break
             except Exception as e:
-                logger.error(f"工作线程 {worker_name} 发生错误: {e}")
-    
+                logger.error(f"工作协程 {worker_name} 发生错误: {e}")
+
+    def _cpu_pool(self) -> ProcessPoolExecutor:
+        if self._cpu_executor is None:
+            self._cpu_executor = ProcessPoolExecutor(max_workers=self.cpu_workers)
+        return self._cpu_executor
+
+    def _start_execution(self, task: Task) -> asyncio.Future:
+        """按任务类型选择执行位置：事件循环 / IO线程池 / CPU进程池"""
+        if task.handler:
+            spec = get_task_handler(task.handler)
+            if spec is None:
+                raise LookupError(f"未注册的任务处理器: {task.handler}")
+            func, args, kwargs, cpu_bound = spec.func, (task.payload or {},), {}, spec.cpu_bound
+        else:
+            func, args, kwargs, cpu_bound = task.func, task.args, task.kwargs, False
+
+        if asyncio.iscoroutinefunction(func):
+            return asyncio.ensure_future(func(*args, **kwargs))
+
+        loop = asyncio.get_running_loop()
+        executor = self._cpu_pool() if cpu_bound else self._io_executor
+        return loop.run_in_executor(executor, partial(func, *args, **kwargs))
+
+    def _finish(self, task: Task, status: TaskStatus):
+        """任务结束：移出活动集合，进入有界保留区"""
+        task.status = status
+        task.completed_at = task.completed_at or datetime.now()
+        self.tasks.pop(task.id, None)
+        self.running_tasks.pop(task.id, None)
+        self._journal_update(task)
+
+        if task.durable:
+            # 持久化任务的负载已在日志中，内存中不再保留
+            task.payload = None
+        task.func, task.args, task.kwargs = None, (), {}
+        self.finished_tasks[task.id] = task
+        self.finished_tasks.move_to_end(task.id)
+
+        cutoff = datetime.now() - timedelta(seconds=self.result_ttl)
+        while self.finished_tasks:
+            oldest = next(iter(self.finished_tasks.values()))
+            if len(self.finished_tasks) > self.result_retention or oldest.completed_at < cutoff:
+                self.finished_tasks.popitem(last=False)
+            else:
+                break
+
+        self._maybe_prune()
+
+    async def _release_payload_refs(self, payload: Optional[Dict[str, Any]]):
+        """删除任务负载中引用的对象存储数据"""
+        for value in (payload or {}).values():
+            if TaskPayloadStore.is_ref(value):
+                await payload_store.delete(value)
+
     async def _execute_task(self, worker_name: str, task: Task):
         """执行单个任务"""
         task.status = TaskStatus.RUNNING
         task.started_at = datetime.now()
-        
-        logger.info(f"工作线程 {worker_name} 开始执行任务: {task.name} (ID: {task.id})")
-        
+        self._record_latency("wait", time.monotonic() - task.enqueued_at)
+        self._journal_update(task)
+        payload = task.payload
+
+        logger.info(f"工作协程 {worker_name} 开始执行任务: {task.name} (ID: {task.id})")
+
+        run_start = time.monotonic()
         try:
-            # 创建执行任务
-            if asyncio.iscoroutinefunction(task.func):
-                exec_task = asyncio.create_task(task.func(*task.args, **task.kwargs))
-            else:
-                # 在线程池中执行同步函数
-                loop = asyncio.get_event_loop()
-                exec_task = loop.run_in_executor(
-                    None, lambda: task.func(*task.args, **task.kwargs)
-                )
-            
+            exec_task = self._start_execution(task)
+
             # 记录运行中的任务
-            async with self._lock:
-                self.running_tasks[task.id] = exec_task
-            
+            self.running_tasks[task.id] = exec_task
+
             # 执行任务（带超时）
             if task.timeout:
                 task.result = await asyncio.wait_for(exec_task, timeout=task.timeout)
             else:
                 task.result = await exec_task
-            
+
             # 任务完成
-            task.status = TaskStatus.COMPLETED
             task.completed_at = datetime.now()
-            
-            async with self._lock:
-                self.completed_tasks.append(task.id)
-                self.stats['completed_tasks'] += 1
-                if task.id in self.running_tasks:
-                    del self.running_tasks[task.id]
-            
+            self._record_latency("run", time.monotonic() - run_start)
+            self._finish(task, TaskStatus.COMPLETED)
+            self.stats['completed_tasks'] += 1
+            await self._release_payload_refs(payload)
+
             execution_time = (task.completed_at - task.started_at).total_seconds()
             logger.info(f"任务完成: {task.name} (ID: {task.id}, 耗时: {execution_time:.2f}s)")
-            
+
         except asyncio.CancelledError:
-            task.status = TaskStatus.CANCELLED
-            async with self._lock:
-                self.stats['cancelled_tasks'] += 1
-                if task.id in self.running_tasks:
-                    del self.running_tasks[task.id]
+            if not self.is_running:
+                # 队列停止时保持 pending，重启后恢复
+                raise
+            self._finish(task, TaskStatus.CANCELLED)
+            self.stats['cancelled_tasks'] += 1
             logger.info(f"任务被取消: {task.name} (ID: {task.id})")
-            
+
         except Exception as e:
             task.error = str(e)
+            self._record_latency("run", time.monotonic() - run_start)
+            self.running_tasks.pop(task.id, None)
             logger.error(f"任务执行失败: {task.name} (ID: {task.id}), 错误: {e}")
-            
-            # 重试逻辑
-            if task.retry_count < task.max_retries:
+
+            # 重试逻辑（未注册的处理器不重试）
+            if task.retry_count < task.max_retries and not isinstance(e, LookupError):
                 task.retry_count += 1
                 task.status = TaskStatus.PENDING
-                
+                self._journal_update(task)
+
                 # 重新添加到队列
+                task.enqueued_at = time.monotonic()
                 priority_value = 5 - task.priority.value
                 await self.pending_queue.put((priority_value, datetime.now(), task.id))
-                
+                self._queued_ids.add(task.id)
+
                 logger.info(f"任务重试: {task.name} (ID: {task.id}, 重试次数: {task.retry_count})")
             else:
-                task.status = TaskStatus.FAILED
                 task.completed_at = datetime.now()
-                
-                async with self._lock:
-                    self.failed_tasks.append(task.id)
-                    self.stats['failed_tasks'] += 1
-            
-            async with self._lock:
-                if task.id in self.running_tasks:
-                    del self.running_tasks[task.id]
-    
+                self._finish(task, TaskStatus.FAILED)
+                self.stats['failed_tasks'] += 1
+                await self._release_payload_refs(payload)
+
+    # ---- 查询 ----
+
     async def get_task_status(self, task_id: str) -> Optional[Dict[str, Any]]:
         """获取任务状态"""
-        if task_id in self.tasks:
-            return self.tasks[task_id].to_dict()
-        return None
-    
+        task = self.tasks.get(task_id) or self.finished_tasks.get(task_id)
+        if task is not None:
+            return task.to_dict()
+        return await self._ajournal_call("get", task_id)
+
     async def cancel_task(self, task_id: str) -> bool:
         """取消任务"""
         async with self._lock:
             if task_id in self.running_tasks:
                 self.running_tasks[task_id].cancel()
                 return True
-            elif task_id in self.tasks and self.tasks[task_id].status == TaskStatus.PENDING:
-                self.tasks[task_id].status = TaskStatus.CANCELLED
+            task = self.tasks.get(task_id)
+            if task is not None and task.status == TaskStatus.PENDING:
+                self._finish(task, TaskStatus.CANCELLED)
+                self.stats['cancelled_tasks'] += 1
                 return True
         return False
-    
+
+    def snapshot_stats(self) -> Dict[str, Any]:
+        """队列统计快照（同步，可在监控线程中调用）"""
+        return {
+            'queue_size': self.pending_queue.qsize(),
+            'queue_capacity': self.max_queue_size,
+            'backlogged': self._backlogged,
+            'running_tasks': len(self.running_tasks),
+            'active_tasks': len(self.tasks),
+            'retained_finished_tasks': len(self.finished_tasks),
+            'total_tasks': self.stats['total_tasks'],
+            'completed_tasks': self.stats['completed_tasks'],
+            'failed_tasks': self.stats['failed_tasks'],
+            'cancelled_tasks': self.stats['cancelled_tasks'],
+            'recovered_tasks': self.stats['recovered_tasks'],
+            'wait_seconds': _percentiles(list(self._wait_times)),
+            'run_seconds': _percentiles(list(self._run_times)),
+            'workers': len(self.workers),
+            'io_workers': self.io_workers,
+            'cpu_workers': self.cpu_workers,
+            'journal_enabled': self.journal is not None,
+            'is_running': self.is_running
+        }
+
     async def get_queue_stats(self) -> Dict[str, Any]:
         """获取队列统计信息"""
-        async with self._lock:
-            return {
-                'queue_size': self.pending_queue.qsize(),
-                'running_tasks': len(self.running_tasks),
-                'total_tasks': self.stats['total_tasks'],
-                'completed_tasks': self.stats['completed_tasks'],
-                'failed_tasks': self.stats['failed_tasks'],
-                'cancelled_tasks': self.stats['cancelled_tasks'],
-                'workers': len(self.workers),
-                'is_running': self.is_running
-            }
+        stats = self.snapshot_stats()
+        stats['journal_pending'] = await self._ajournal_call("count_pending") if self.is_running else None
+        return stats
 
 # 全局任务队列实例
 task_queue = AsyncTaskQueue()
@@ -318,25 +950,32 @@ def background_task(
         return wrapper
     return decorator
 
-async def submit_background_task(
-    func: Callable,
+def submit_background_task(
+    func: Union[Callable, str, Any],
     *args,
     name: str = "",
     priority: TaskPriority = TaskPriority.NORMAL,
     **kwargs
 ) -> str:
-    """提交后台任务"""
-    return await task_queue.submit_task(
-        func,
-        *args,
-        name=name,
-        priority=priority,
-        **kwargs
-    )
+    """
+    提交后台任务（无需 await）
+
+    - submit_background_task(func, *args, **kwargs): 在内存中执行函数
+    - submit_background_task(background_tasks, "handler_name", payload): 具名任务，
+      由 register_task_handler 注册的处理器执行，写入任务日志，重启后可恢复。
+      大文件等二进制内容请先用 offload_task_payload 转为引用再放入负载。
+    """
+    if BackgroundTasks is not None and isinstance(func, BackgroundTasks):
+        # 路由中的写法: submit_background_task(background_tasks, "handler_name", payload)
+        func, args = args[0], args[1:]
+    if isinstance(func, str):
+        payload = args[0] if args else kwargs.pop("payload", {})
+        return task_queue.enqueue(handler=func, payload=payload, name=name, priority=priority, **kwargs)
+    return task_queue.enqueue(func, *args, name=name, priority=priority, **kwargs)
 
 # 启动任务队列
 async def initialize_task_system():
-    """初始化任务系统"""
+    """初始化任务系统（恢复任务日志中未完成的任务）"""
     await task_queue.start()
     logger.info("异步任务系统已启动")
 
@@ -1,11 +1,12 @@
 # project/utils/cache.py
-import redis
 import json
 import logging
 import os
 from typing import Optional, Dict, Any, List
 from datetime import datetime, timedelta
 
+from .redis_backend import get_async_redis_client
+
 logger = logging.getLogger(__name__)
 
 class ChatRoomCache:
@@ -25,19 +26,13 @@ class ChatRoomCache:
                 self.is_available = False
                 return
             
-            self.redis_client = redis.from_url(
-                redis_url,
-                decode_responses=True,
-                socket_connect_timeout=5,
-                socket_timeout=5,
-                retry_on_timeout=True
-            )
-            # 测试连接
-            self.redis_client.ping()
-            self.is_available = True
-            logger.info(f"Redis缓存连接成功: {redis_url.split('@')[-1] if '@' in redis_url else redis_url}")
+            # 使用共享连接池上的异步客户端，连接在首次命令时建立
+            self.redis_client = get_async_redis_client(redis_url, decode_responses=True)
+            self.is_available = self.redis_client is not None
+            if self.is_available:
+                logger.info(f"Redis缓存已配置: {redis_url.split('@')[-1] if '@' in redis_url else redis_url}")
         except Exception as e:
-            logger.warning(f"Redis连接失败，缓存功能将被禁用: {e}")
+            logger.warning(f"Redis初始化失败，缓存功能将被禁用: {e}")
             self.redis_client = None
             self.is_available = False
     
@@ -48,7 +43,7 @@ class ChatRoomCache:
             
         try:
             key = f"room:{room_id}:members_count"
-            count = self.redis_client.get(key)
+            count = await self.redis_client.get(key)
             return int(count) if count else None
         except Exception as e:
             logger.error(f"获取房间成员数量缓存失败: {e}")
@@ -61,7 +56,7 @@ class ChatRoomCache:
             
         try:
             key = f"room:{room_id}:members_count"
-            self.redis_client.setex(key, expire, count)
+            await self.redis_client.setex(key, expire, count)
         except Exception as e:
             logger.error(f"设置房间成员数量缓存失败: {e}")
     
@@ -72,7 +67,7 @@ class ChatRoomCache:
             
         try:
             key = f"room:{room_id}:info"
-            data = self.redis_client.get(key)
+            data = await self.redis_client.get(key)
             return json.loads(data) if data else None
         except Exception as e:
             logger.error(f"获取房间信息缓存失败: {e}")
@@ -87,7 +82,7 @@ class ChatRoomCache:
             key = f"room:{room_id}:info"
             # 确保datetime对象可以序列化
             serializable_info = self._make_serializable(room_info)
-            self.redis_client.setex(key, expire, json.dumps(serializable_info))
+            await self.redis_client.setex(key, expire, json.dumps(serializable_info))
         except Exception as e:
             logger.error(f"设置房间信息缓存失败: {e}")
     
@@ -98,7 +93,7 @@ class ChatRoomCache:
             
         try:
             key = f"user:{user_id}:rooms"
-            data = self.redis_client.get(key)
+            data = await self.redis_client.get(key)
             return json.loads(data) if data else None
         except Exception as e:
             logger.error(f"获取用户房间列表缓存失败: {e}")
@@ -111,7 +106,7 @@ class ChatRoomCache:
             
         try:
             key = f"user:{user_id}:rooms"
-            self.redis_client.setex(key, expire, json.dumps(room_ids))
+            await self.redis_client.setex(key, expire, json.dumps(room_ids))
         except Exception as e:
             logger.error(f"设置用户房间列表缓存失败: {e}")
     
@@ -128,8 +123,7 @@ class ChatRoomCache:
                 f"room:{room_id}:latest_message"
             ]
             
-            for key in keys_to_delete:
-                self.redis_client.delete(key)
+            await self.redis_client.delete(*keys_to_delete)
         except Exception as e:
             logger.error(f"清除房间缓存失败: {e}")
     
@@ -144,8 +138,7 @@ class ChatRoomCache:
                 f"user:{user_id}:profile"
             ]
             
-            for key in keys_to_delete:
-                self.redis_client.delete(key)
+            await self.redis_client.delete(*keys_to_delete)
         except Exception as e:
             logger.error(f"清除用户缓存失败: {e}")
     
@@ -156,7 +149,7 @@ class ChatRoomCache:
             
         try:
             key = f"room:{room_id}:recent_messages"
-            messages = self.redis_client.lrange(key, 0, limit - 1)
+            messages = await self.redis_client.lrange(key, 0, limit - 1)
             return [json.loads(msg) for msg in messages] if messages else None
         except Exception as e:
             logger.error(f"获取最近消息缓存失败: {e}")
@@ -172,14 +165,12 @@ class ChatRoomCache:
             # 确保消息可以序列化
             serializable_message = self._make_serializable(message)
             
-            # 添加到列表头部
-            self.redis_client.lpush(key, json.dumps(serializable_message))
-            
-            # 限制列表长度
-            self.redis_client.ltrim(key, 0, max_messages - 1)
-            
-            # 设置过期时间
-            self.redis_client.expire(key, 3600)  # 1小时
+            # 添加到列表头部、限制列表长度、设置过期时间，合并为一次往返
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.lpush(key, json.dumps(serializable_message))
+                pipe.ltrim(key, 0, max_messages - 1)
+                pipe.expire(key, 3600)  # 1小时
+                await pipe.execute()
         except Exception as e:
             logger.error(f"添加最近消息缓存失败: {e}")
     
@@ -190,7 +181,7 @@ class ChatRoomCache:
             
         try:
             key = f"room:{room_id}:online_users"
-            user_ids = self.redis_client.smembers(key)
+            user_ids = await self.redis_client.smembers(key)
             return [int(uid) for uid in user_ids] if user_ids else None
         except Exception as e:
             logger.error(f"获取在线用户列表失败: {e}")
@@ -203,8 +194,10 @@ class ChatRoomCache:
             
         try:
             key = f"room:{room_id}:online_users"
-            self.redis_client.sadd(key, user_id)
-            self.redis_client.expire(key, 1800)  # 30分钟
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.sadd(key, user_id)
+                pipe.expire(key, 1800)  # 30分钟
+                await pipe.execute()
         except Exception as e:
             logger.error(f"添加在线用户失败: {e}")
     
@@ -215,7 +208,7 @@ class ChatRoomCache:
             
         try:
             key = f"room:{room_id}:online_users"
-            self.redis_client.srem(key, user_id)
+            await self.redis_client.srem(key, user_id)
         except Exception as e:
             logger.error(f"移除在线用户失败: {e}")
     
@@ -5,19 +5,22 @@
 """
 import redis
 import redis.sentinel
-import json
 import asyncio
 import time
-from datetime import datetime, timedelta
 from typing import Optional, Dict, Any, List, Union, Callable
 import os
 from functools import wraps
 import logging
 import threading
-from contextlib import contextmanager
-import pickle
+import math
+import random
+import inspect
+from collections import OrderedDict
 import hashlib
-import zlib
+
+from .redis_backend import AsyncRedisBackend, get_async_redis_backend
+from .memory_tier import ShardedLRUCache
+from .codecs import CacheValueError, get_codec_from_env
 
 logger = logging.getLogger(__name__)
 
@@ -32,32 +35,56 @@ class CacheConfig:
         self.enable_compression = os.getenv("CACHE_ENABLE_COMPRESSION", "true").lower() == "true"
         self.compression_threshold = int(os.getenv("CACHE_COMPRESSION_THRESHOLD", "1024"))
         self.default_expire = int(os.getenv("CACHE_DEFAULT_EXPIRE", "3600"))
+        # 按模式删除时 SCAN 每批遍历/删除的键数
+        self.scan_batch_size = int(os.getenv("CACHE_SCAN_BATCH_SIZE", "500"))
         self.max_memory_cache_size = int(os.getenv("CACHE_MAX_MEMORY_SIZE", "1000"))
+        self.max_memory_cache_bytes = int(os.getenv("CACHE_MAX_MEMORY_BYTES", str(64 * 1024 * 1024)))
+        self.memory_cache_shards = int(os.getenv("CACHE_MEMORY_SHARDS", "16"))
+        # 有Redis时L1条目的最长存活时间，限制多进程间的数据陈旧
+        self.l1_max_ttl = int(os.getenv("CACHE_L1_MAX_TTL", "30"))
+        # get_or_compute: 软过期后仍可返回旧值的时长、提前刷新系数、重算锁超时和未命中时的等待时长
+        self.stale_ttl = int(os.getenv("CACHE_STALE_TTL", "300"))
+        self.early_refresh_beta = float(os.getenv("CACHE_EARLY_REFRESH_BETA", "1.0"))
+        self.recompute_lock_timeout = int(os.getenv("CACHE_RECOMPUTE_LOCK_TIMEOUT", "30"))
+        self.recompute_wait = float(os.getenv("CACHE_RECOMPUTE_WAIT", "3"))
         self.enable_metrics = os.getenv("CACHE_ENABLE_METRICS", "true").lower() == "true"
 
 class CacheMetrics:
-    """缓存监控指标"""
-    def __init__(self):
+    """缓存监控指标（按L1/L2分层统计命中）"""
+    def __init__(self, expiry_window: float = 30.0):
         self.hits = 0
+        self.l1_hits = 0
+        self.l2_hits = 0
         self.misses = 0
         self.sets = 0
         self.deletes = 0
         self.errors = 0
         self.total_memory_usage = 0
+        # get_or_compute 重算统计
+        self.recomputations = 0
+        self.expiries = 0
+        self.early_refreshes = 0
+        self.stale_served = 0
+        self._expiry_window = expiry_window
+        self._seen_expiries: "OrderedDict[tuple, float]" = OrderedDict()
         self.start_time = time.time()
         self._lock = threading.Lock()
     
-    def record_hit(self):
+    def record_hit(self, tier: str = "l2", count: int = 1):
         with self._lock:
-            self.hits += 1
+            self.hits += count
+            if tier == "l1":
+                self.l1_hits += count
+            else:
+                self.l2_hits += count
     
-    def record_miss(self):
+    def record_miss(self, count: int = 1):
         with self._lock:
-            self.misses += 1
+            self.misses += count
     
-    def record_set(self):
+    def record_set(self, count: int = 1):
         with self._lock:
-            self.sets += 1
+            self.sets += count
     
     def record_delete(self):
         with self._lock:
@@ -67,6 +94,61 @@ class CacheMetrics:
         with self._lock:
             self.errors += 1
     
+    def record_recompute(self, key: str, generation: Optional[float]):
+        """
+        记录一次重算。generation 为被替换值的计算时间（未命中时为 None），
+        同一 (key, generation) 在窗口期内的多次重算只算一次过期
+        """
+        now = time.monotonic()
+        marker = (key, generation)
+        with self._lock:
+            self.recomputations += 1
+            seen_at = self._seen_expiries.pop(marker, None)
+            if seen_at is None or now - seen_at > self._expiry_window:
+                self.expiries += 1
+                seen_at = now
+            self._seen_expiries[marker] = seen_at
+            while len(self._seen_expiries) > 10000:
+                self._seen_expiries.popitem(last=False)
+    
+    def record_early_refresh(self):
+        with self._lock:
+            self.early_refreshes += 1
+    
+    def record_stale_served(self):
+        with self._lock:
+            self.stale_served += 1
+    
+    def get_recompute_stats(self) -> Dict[str, Any]:
+        """重算统计；recomputations_per_expiry 接近 1 说明没有缓存击穿"""
+        with self._lock:
+            return {
+                "recomputations": self.recomputations,
+                "expiries": self.expiries,
+                "recomputations_per_expiry": self.recomputations / self.expiries if self.expiries else 0.0,
+                "early_refreshes": self.early_refreshes,
+                "stale_served": self.stale_served
+            }
+    
+    def get_tier_stats(self) -> Dict[str, Any]:
+        """分层命中率：L1按全部读请求计算，L2按L1未命中的请求计算"""
+        with self._lock:
+            total_requests = self.hits + self.misses
+            l2_requests = total_requests - self.l1_hits
+            return {
+                "l1": {
+                    "hits": self.l1_hits,
+                    "requests": total_requests,
+                    "hit_ratio": self.l1_hits / total_requests if total_requests else 0.0
+                },
+                "l2": {
+                    "hits": self.l2_hits,
+                    "requests": l2_requests,
+                    "hit_ratio": self.l2_hits / l2_requests if l2_requests else 0.0
+                },
+                "overall_hit_ratio": self.hits / total_requests if total_requests else 0.0
+            }
+    
     def get_stats(self) -> Dict[str, Any]:
         with self._lock:
             total_requests = self.hits + self.misses
@@ -75,6 +157,8 @@ class CacheMetrics:
             
             return {
                 "hits": self.hits,
+                "l1_hits": self.l1_hits,
+                "l2_hits": self.l2_hits,
                 "misses": self.misses,
                 "sets": self.sets,
                 "deletes": self.deletes,
@@ -87,6 +171,14 @@ class CacheMetrics:
 
 class DistributedLock:
     """分布式锁实现"""
+    _RELEASE_SCRIPT = """
+    if redis.call("get", KEYS[1]) == ARGV[1] then
+        return redis.call("del", KEYS[1])
+    else
+        return 0
+    end
+    """
+    
     def __init__(self, redis_client, key: str, timeout: int = 10, retry_delay: float = 0.1):
         self.redis_client = redis_client
         self.key = f"lock:{key}"
@@ -101,10 +193,16 @@ class DistributedLock:
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.release()
     
-    def acquire(self) -> bool:
-        """获取锁"""
+    def acquire(self, blocking: bool = True) -> bool:
+        """获取锁；blocking=False 时只尝试一次，失败返回 False"""
         import uuid
         self.identifier = str(uuid.uuid4())
+        if not blocking:
+            if self.redis_client.set(self.key, self.identifier, nx=True, ex=self.timeout):
+                return True
+            self.identifier = None
+            return False
+        
         end_time = time.time() + self.timeout
         
         while time.time() < end_time:
@@ -119,38 +217,83 @@ class DistributedLock:
         if not self.identifier:
             return False
         
-        lua_script = """
-        if redis.call("get", KEYS[1]) == ARGV[1] then
-            return redis.call("del", KEYS[1])
-        else
-            return 0
-        end
-        """
+        try:
+            result = self.redis_client.eval(self._RELEASE_SCRIPT, 1, self.key, self.identifier)
+            return bool(result)
+        except Exception as e:
+            logger.error(f"Failed to release lock {self.key}: {e}")
+            return False
+
+class AsyncDistributedLock(DistributedLock):
+    """基于 redis.asyncio 客户端的分布式锁，键和释放脚本与 DistributedLock 相同"""
+    
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+    
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.release()
+    
+    async def acquire(self, blocking: bool = True) -> bool:
+        """获取锁；blocking=False 时只尝试一次，失败返回 False"""
+        import uuid
+        self.identifier = str(uuid.uuid4())
+        if not blocking:
+            if await self.redis_client.set(self.key, self.identifier, nx=True, ex=self.timeout):
+                return True
+            self.identifier = None
+            return False
+        
+        end_time = time.time() + self.timeout
+        
+        while time.time() < end_time:
+            if await self.redis_client.set(self.key, self.identifier, nx=True, ex=self.timeout):
+                return True
+            await asyncio.sleep(self.retry_delay)
+        
+        raise TimeoutError(f"Failed to acquire lock for {self.key}")
+    
+    async def release(self) -> bool:
+        """释放锁"""
+        if not self.identifier:
+            return False
         
         try:
-            result = self.redis_client.eval(lua_script, 1, self.key, self.identifier)
+            result = await self.redis_client.eval(self._RELEASE_SCRIPT, 1, self.key, self.identifier)
             return bool(result)
         except Exception as e:
             logger.error(f"Failed to release lock {self.key}: {e}")
             return False
 
+# get_or_compute 写入的缓存条目结构
+_SWR_MARKER = "__swr__"
+
 class EnhancedCacheManager:
-    """增强版缓存管理器"""
+    """
+    增强版缓存管理器
+
+    两级缓存：
+    - L1: 进程内分片LRU（O(1)淘汰，按条目TTL，按字节数限额）
+    - L2: Redis（单实例/集群/哨兵）
+    读取为 read-through（L1 未命中读 L2 并回填 L1），写入为 write-through（先写 L2 再写 L1）。
+    有 Redis 时 L1 的 TTL 不超过 l1_max_ttl，以限制多进程间的数据陈旧时间。
+    """
     
     def __init__(self, config: Optional[CacheConfig] = None):
         self.config = config or CacheConfig()
         self.redis_client = None
-        self.memory_cache = {}
-        self.memory_cache_access_time = {}
-        self.metrics = CacheMetrics()
-        self._memory_lock = threading.RLock()
+        self.memory_cache = ShardedLRUCache(
+            max_items=self.config.max_memory_cache_size,
+            max_bytes=self.config.max_memory_cache_bytes,
+            shards=self.config.memory_cache_shards
+        )
+        self.metrics = CacheMetrics(expiry_window=self.config.recompute_lock_timeout)
+        # 无Redis（或Redis异常）时用于重算互斥的进程内分段锁
+        self._local_locks = [threading.Lock() for _ in range(64)]
+        self.codec = get_codec_from_env(self.config.compression_threshold, self.config.enable_compression)
         self._init_redis()
-        
-        # 启动清理线程
-        if not hasattr(self, '_cleanup_thread_started'):
-            self._cleanup_thread_started = True
-            cleanup_thread = threading.Thread(target=self._memory_cleanup_worker, daemon=True)
-            cleanup_thread.start()
+        self.async_backend: Optional[AsyncRedisBackend] = None
+        self._init_async_redis()
     
     def _init_redis(self):
         """初始化Redis连接"""
@@ -162,7 +305,7 @@ class EnhancedCacheManager:
                     startup_nodes = [{"host": node.split(":")[0], "port": int(node.split(":")[1])} 
                                    for node in self.config.redis_cluster_nodes if node]
                     self.redis_client = RedisCluster(startup_nodes=startup_nodes, 
-                                                   decode_responses=True,
+                                                   decode_responses=False,
                                                    password=self.config.redis_password)
                     self.redis_client.ping()
                     logger.info("Redis集群连接成功")
@@ -179,7 +322,7 @@ class EnhancedCacheManager:
                                    for host in self.config.redis_sentinel_hosts if host]
                     sentinel = redis.sentinel.Sentinel(sentinel_list)
                     self.redis_client = sentinel.master_for(self.config.redis_sentinel_service, 
-                                                          decode_responses=True,
+                                                          decode_responses=False,
                                                           password=self.config.redis_password)
                     self.redis_client.ping()
                     logger.info("Redis哨兵连接成功")
@@ -189,7 +332,7 @@ class EnhancedCacheManager:
             
             # 单实例Redis
             self.redis_client = redis.from_url(self.config.redis_url, 
-                                             decode_responses=True,
+                                             decode_responses=False,
                                              password=self.config.redis_password)
             self.redis_client.ping()
             logger.info("Redis单实例连接成功")
@@ -198,88 +341,48 @@ class EnhancedCacheManager:
             logger.warning(f"Redis连接失败，使用内存缓存: {e}")
             self.redis_client = None
     
+    def _init_async_redis(self):
+        """初始化异步Redis后端（仅单实例模式，集群/哨兵仍走同步客户端）"""
+        if not self.redis_client:
+            return
+        if self.config.redis_cluster_nodes and self.config.redis_cluster_nodes[0]:
+            return
+        if self.config.redis_sentinel_hosts and self.config.redis_sentinel_hosts[0]:
+            return
+        backend = get_async_redis_backend(self.config.redis_url)
+        self.async_backend = backend if backend.is_available else None
+    
     def _serialize(self, value: Any) -> bytes:
-        """序列化数据"""
-        try:
-            # 优先使用JSON序列化
-            if isinstance(value, (dict, list, str, int, float, bool, type(None))):
-                serialized = json.dumps(value, default=str, ensure_ascii=False).encode('utf-8')
-            else:
-                # 复杂对象使用pickle
-                serialized = pickle.dumps(value)
-            
-            # 压缩大数据
-            if self.config.enable_compression and len(serialized) > self.config.compression_threshold:
-                compressed = zlib.compress(serialized)
-                return b'compressed:' + compressed
-            
-            return serialized
-        except Exception as e:
-            logger.error(f"序列化失败: {e}")
-            return pickle.dumps(value)
+        """序列化数据（带类型标记，ORM实例会抛出 CacheValueError）"""
+        return self.codec.encode(value)
     
     def _deserialize(self, value: Union[bytes, str]) -> Any:
-        """反序列化数据"""
+        """反序列化数据（按类型标记分派，兼容旧格式）"""
         try:
-            if isinstance(value, str):
-                value = value.encode('utf-8')
-            
-            # 检查是否压缩
-            if value.startswith(b'compressed:'):
-                value = zlib.decompress(value[11:])
-            
-            # 尝试JSON反序列化
-            try:
-                return json.loads(value.decode('utf-8'))
-            except (json.JSONDecodeError, UnicodeDecodeError):
-                # 使用pickle反序列化
-                return pickle.loads(value)
-                
+            return self.codec.decode(value)
         except Exception as e:
             logger.error(f"反序列化失败: {e}")
-            return value
+            return None
     
-    def _memory_cleanup_worker(self):
-        """内存缓存清理工作线程"""
-        while True:
-            try:
-                time.sleep(60)  # 每分钟清理一次
-                self._cleanup_memory_cache()
-            except Exception as e:
-                logger.error(f"内存缓存清理失败: {e}")
-    
-    def _cleanup_memory_cache(self):
-        """清理过期的内存缓存"""
-        with self._memory_lock:
-            current_time = datetime.now()
-            expired_keys = []
-            
-            for key, cache_item in self.memory_cache.items():
-                if cache_item.get("expire_time") and cache_item["expire_time"] < current_time:
-                    expired_keys.append(key)
-            
-            for key in expired_keys:
-                del self.memory_cache[key]
-                if key in self.memory_cache_access_time:
-                    del self.memory_cache_access_time[key]
-            
-            # LRU清理：如果缓存数量超过限制，删除最久未访问的
-            if len(self.memory_cache) > self.config.max_memory_cache_size:
-                # 按访问时间排序
-                sorted_keys = sorted(self.memory_cache_access_time.items(), key=lambda x: x[1])
-                keys_to_remove = sorted_keys[:len(self.memory_cache) - self.config.max_memory_cache_size]
-                
-                for key, _ in keys_to_remove:
-                    if key in self.memory_cache:
-                        del self.memory_cache[key]
-                    if key in self.memory_cache_access_time:
-                        del self.memory_cache_access_time[key]
-            
-            if expired_keys:
-                logger.debug(f"清理了 {len(expired_keys)} 个过期缓存项")
+    def _l1_ttl(self, expire: Optional[int]) -> Optional[int]:
+        """计算L1条目的TTL"""
+        if not self.redis_client:
+            # 没有L2时L1就是唯一存储，沿用调用方给的过期时间
+            return expire if expire and expire > 0 else None
+        if expire and expire > 0:
+            return min(expire, self.config.l1_max_ttl)
+        return self.config.l1_max_ttl
+    
+    def _l1_fill(self, key: str, value: bytes, redis_ttl_ms: Optional[int]):
+        """L2命中后回填L1，TTL不超过L2剩余时间"""
+        if redis_ttl_ms is not None and redis_ttl_ms > 0:
+            ttl = min(redis_ttl_ms / 1000.0, self.config.l1_max_ttl)
+        else:
+            ttl = self.config.l1_max_ttl
+        self.memory_cache.set(key, value, ttl)
     
     def set(self, key: str, value: Any, expire: int = None) -> bool:
-        """设置缓存"""
+        """设置缓存（write-through：L2 -> L1）"""
         if expire is None:
             expire = self.config.default_expire
         
@@ -287,24 +390,20 @@ class EnhancedCacheManager:
             serialized_value = self._serialize(value)
             
             if self.redis_client:
-                # Redis缓存
-                success = self.redis_client.setex(key, expire, serialized_value)
+                success = bool(self.redis_client.setex(key, expire, serialized_value))
             else:
                 success = True
             
-            # 内存缓存（作为备份）
-            with self._memory_lock:
-                self.memory_cache[key] = {
-                    "value": serialized_value,
-                    "expire_time": datetime.now() + timedelta(seconds=expire) if expire > 0 else None
-                }
-                self.memory_cache_access_time[key] = time.time()
+            self.memory_cache.set(key, serialized_value, self._l1_ttl(expire))
             
             if self.config.enable_metrics:
                 self.metrics.record_set()
             
             return success
             
+        except CacheValueError as e:
+            logger.warning(f"拒绝缓存 {key}: {e}")
+            return False
         except Exception as e:
             logger.error(f"设置缓存失败 {key}: {e}")
             if self.config.enable_metrics:
@@ -312,36 +411,29 @@ class EnhancedCacheManager:
             return False
     
     def get(self, key: str) -> Optional[Any]:
-        """获取缓存"""
+        """获取缓存（read-through：L1 -> L2 -> 回填L1）"""
         try:
-            value = None
+            value = self.memory_cache.get(key)
+            if value is not None:
+                if self.config.enable_metrics:
+                    self.metrics.record_hit("l1")
+                return self._deserialize(value)
             
-            # 优先从Redis获取
             if self.redis_client:
                 try:
-                    value = self.redis_client.get(key)
+                    pipe = self.redis_client.pipeline(transaction=False)
+                    pipe.get(key)
+                    pipe.pttl(key)
+                    value, ttl_ms = pipe.execute()
                 except Exception as e:
-                    logger.warning(f"Redis获取失败，尝试内存缓存: {e}")
-            
-            # 如果Redis失败，从内存缓存获取
-            if value is None:
-                with self._memory_lock:
-                    cache_item = self.memory_cache.get(key)
-                    if cache_item:
-                        # 检查是否过期
-                        if cache_item.get("expire_time") is None or cache_item["expire_time"] > datetime.now():
-                            value = cache_item["value"]
-                            self.memory_cache_access_time[key] = time.time()
-                        else:
-                            # 过期删除
-                            del self.memory_cache[key]
-                            if key in self.memory_cache_access_time:
-                                del self.memory_cache_access_time[key]
-            
-            if value is not None:
-                if self.config.enable_metrics:
-                    self.metrics.record_hit()
-                return self._deserialize(value)
+                    logger.warning(f"Redis获取失败: {e}")
+                    value, ttl_ms = None, None
+                
+                if value is not None:
+                    self._l1_fill(key, value, ttl_ms)
+                    if self.config.enable_metrics:
+                        self.metrics.record_hit("l2")
+                    return self._deserialize(value)
             
             if self.config.enable_metrics:
                 self.metrics.record_miss()
@@ -367,11 +459,7 @@ class EnhancedCacheManager:
                     success = False
             
             # 从内存缓存删除
-            with self._memory_lock:
-                if key in self.memory_cache:
-                    del self.memory_cache[key]
-                if key in self.memory_cache_access_time:
-                    del self.memory_cache_access_time[key]
+            self.memory_cache.delete(key)
             
             if self.config.enable_metrics:
                 self.metrics.record_delete()
@@ -385,30 +473,26 @@ class EnhancedCacheManager:
             return False
     
     def delete_pattern(self, pattern: str) -> int:
-        """根据模式删除缓存"""
+        """根据模式删除缓存（SCAN分批遍历，不用 KEYS 阻塞Redis）"""
         try:
             deleted_count = 0
             
             # Redis模式删除
             if self.redis_client:
                 try:
-                    keys = self.redis_client.keys(pattern)
-                    if keys:
-                        deleted_count = self.redis_client.delete(*keys)
+                    batch = []
+                    for key in self.redis_client.scan_iter(match=pattern, count=self.config.scan_batch_size):
+                        batch.append(key)
+                        if len(batch) >= self.config.scan_batch_size:
+                            deleted_count += self.redis_client.unlink(*batch)
+                            batch.clear()
+                    if batch:
+                        deleted_count += self.redis_client.unlink(*batch)
                 except Exception as e:
                     logger.warning(f"Redis模式删除失败: {e}")
             
             # 内存缓存模式删除
-            import fnmatch
-            with self._memory_lock:
-                keys_to_delete = [k for k in self.memory_cache.keys() 
-                                if fnmatch.fnmatch(k, pattern)]
-                for key in keys_to_delete:
-                    del self.memory_cache[key]
-                    if key in self.memory_cache_access_time:
-                        del self.memory_cache_access_time[key]
-                
-                deleted_count += len(keys_to_delete)
+            deleted_count += self.memory_cache.delete_matching(pattern)
             
             return deleted_count
             
@@ -419,20 +503,10 @@ class EnhancedCacheManager:
     def exists(self, key: str) -> bool:
         """检查缓存是否存在"""
         try:
+            if self.memory_cache.exists(key):
+                return True
             if self.redis_client:
                 return bool(self.redis_client.exists(key))
-            
-            with self._memory_lock:
-                cache_item = self.memory_cache.get(key)
-                if cache_item:
-                    if cache_item.get("expire_time") is None or cache_item["expire_time"] > datetime.now():
-                        return True
-                    else:
-                        # 过期删除
-                        del self.memory_cache[key]
-                        if key in self.memory_cache_access_time:
-                            del self.memory_cache_access_time[key]
-            
             return False
             
         except Exception as e:
@@ -448,9 +522,9 @@ class EnhancedCacheManager:
                 success = bool(self.redis_client.expire(key, seconds))
             
             # 更新内存缓存过期时间
-            with self._memory_lock:
-                if key in self.memory_cache:
-                    self.memory_cache[key]["expire_time"] = datetime.now() + timedelta(seconds=seconds)
+            l1_ttl = self._l1_ttl(seconds)
+            if l1_ttl is not None:
+                self.memory_cache.expire(key, l1_ttl)
             
             return success
             
@@ -464,18 +538,357 @@ class EnhancedCacheManager:
             if self.redis_client:
                 return self.redis_client.ttl(key)
             
-            with self._memory_lock:
-                cache_item = self.memory_cache.get(key)
-                if cache_item and cache_item.get("expire_time"):
-                    remaining = cache_item["expire_time"] - datetime.now()
-                    return max(0, int(remaining.total_seconds()))
-            
-            return -1
+            return self.memory_cache.ttl(key)
             
         except Exception as e:
             logger.error(f"获取缓存TTL失败 {key}: {e}")
             return -1
     
+    # ==================== 异步接口 ====================
+    # 供 async def 请求处理和WebSocket循环使用，Redis往返不阻塞事件循环
+    
+    async def aset(self, key: str, value: Any, expire: int = None) -> bool:
+        """异步设置缓存（write-through：L2 -> L1）"""
+        if expire is None:
+            expire = self.config.default_expire
+        
+        if not self.async_backend:
+            return self.set(key, value, expire)
+        
+        try:
+            serialized_value = self._serialize(value)
+            success = await self.async_backend.set(key, serialized_value, expire)
+            self.memory_cache.set(key, serialized_value, self._l1_ttl(expire))
+            
+            if self.config.enable_metrics:
+                self.metrics.record_set()
+            return success
+            
+        except CacheValueError as e:
+            logger.warning(f"拒绝缓存 {key}: {e}")
+            return False
+        except Exception as e:
+            logger.error(f"异步设置缓存失败 {key}: {e}")
+            if self.config.enable_metrics:
+                self.metrics.record_error()
+            return False
+    
+    async def aget(self, key: str) -> Optional[Any]:
+        """异步获取缓存（read-through：L1 -> L2 -> 回填L1）"""
+        if not self.async_backend:
+            return self.get(key)
+        
+        try:
+            value = self.memory_cache.get(key)
+            if value is not None:
+                if self.config.enable_metrics:
+                    self.metrics.record_hit("l1")
+                return self._deserialize(value)
+            
+            try:
+                value, ttl_ms = await self.async_backend.get_with_ttl(key)
+            except Exception as e:
+                logger.warning(f"异步Redis获取失败: {e}")
+                value, ttl_ms = None, None
+            
+            if value is not None:
+                self._l1_fill(key, value, ttl_ms)
+                if self.config.enable_metrics:
+                    self.metrics.record_hit("l2")
+                return self._deserialize(value)
+            
+            if self.config.enable_metrics:
+                self.metrics.record_miss()
+            return None
+            
+        except Exception as e:
+            logger.error(f"异步获取缓存失败 {key}: {e}")
+            if self.config.enable_metrics:
+                self.metrics.record_error()
+            return None
+    
+    async def aget_many(self, keys: List[str]) -> Dict[str, Any]:
+        """异步批量获取缓存，L1未命中的键通过一次pipeline从L2读取，只返回命中的键"""
+        if not keys:
+            return {}
+        if not self.async_backend:
+            return {key: value for key in keys if (value := self.get(key)) is not None}
+        
+        try:
+            result = {}
+            l2_keys = []
+            for key in keys:
+                value = self.memory_cache.get(key)
+                if value is not None:
+                    result[key] = self._deserialize(value)
+                else:
+                    l2_keys.append(key)
+            l1_hits = len(result)
+            
+            raw_values: Dict[str, Any] = {}
+            if l2_keys:
+                try:
+                    raw_values = await self.async_backend.get_many(l2_keys)
+                except Exception as e:
+                    logger.warning(f"异步Redis批量获取失败: {e}")
+            
+            for key, value in raw_values.items():
+                self._l1_fill(key, value, None)
+                result[key] = self._deserialize(value)
+            
+            if self.config.enable_metrics:
+                self.metrics.record_hit("l1", l1_hits)
+                self.metrics.record_hit("l2", len(raw_values))
+                self.metrics.record_miss(len(keys) - len(result))
+            return result
+            
+        except Exception as e:
+            logger.error(f"异步批量获取缓存失败: {e}")
+            if self.config.enable_metrics:
+                self.metrics.record_error()
+            return {}
+    
+    async def aset_many(self, mapping: Dict[str, Any], expire: int = None) -> bool:
+        """异步批量设置缓存（pipeline一次往返）"""
+        if not mapping:
+            return True
+        if expire is None:
+            expire = self.config.default_expire
+        if not self.async_backend:
+            return all([self.set(key, value, expire) for key, value in mapping.items()])
+        
+        try:
+            serialized = {key: self._serialize(value) for key, value in mapping.items()}
+            success = await self.async_backend.set_many(serialized, expire)
+            l1_ttl = self._l1_ttl(expire)
+            for key, serialized_value in serialized.items():
+                self.memory_cache.set(key, serialized_value, l1_ttl)
+            
+            if self.config.enable_metrics:
+                self.metrics.record_set(len(mapping))
+            return success
+            
+        except CacheValueError as e:
+            logger.warning(f"拒绝批量缓存: {e}")
+            return False
+        except Exception as e:
+            logger.error(f"异步批量设置缓存失败: {e}")
+            if self.config.enable_metrics:
+                self.metrics.record_error()
+            return False
+    
+    async def adelete(self, key: str) -> bool:
+        """异步删除缓存"""
+        if not self.async_backend:
+            return self.delete(key)
+        
+        try:
+            success = True
+            try:
+                success = await self.async_backend.delete(key)
+            except Exception as e:
+                logger.warning(f"异步Redis删除失败: {e}")
+                success = False
+            
+            self.memory_cache.delete(key)
+            
+            if self.config.enable_metrics:
+                self.metrics.record_delete()
+            return success
+            
+        except Exception as e:
+            logger.error(f"异步删除缓存失败 {key}: {e}")
+            if self.config.enable_metrics:
+                self.metrics.record_error()
+            return False
+    
+    async def adelete_pattern(self, pattern: str) -> int:
+        """异步按模式删除缓存（SCAN，不阻塞Redis）"""
+        if not self.async_backend:
+            return self.delete_pattern(pattern)
+        
+        try:
+            deleted_count = 0
+            try:
+                deleted_count = await self.async_backend.delete_pattern(pattern)
+            except Exception as e:
+                logger.warning(f"异步Redis模式删除失败: {e}")
+            
+            memory_deleted = self.memory_cache.delete_matching(pattern)
+            return deleted_count or memory_deleted
+            
+        except Exception as e:
+            logger.error(f"异步按模式删除缓存失败 {pattern}: {e}")
+            return 0
+    
+    # ---- cache-aside：防击穿 + 提前刷新 + 过期后返回旧值 ----
+    #
+    # 条目保存为 {__swr__, v: 值, t: 计算时间, d: 计算耗时, e: 软过期时间}，
+    # Redis TTL 为 expire + stale_ttl：
+    # - 软过期前按 XFetch 概率提前刷新，计算越慢、越接近过期，越可能提前刷新
+    # - 每个键的重算由锁保证只有一个进程执行，其余请求继续返回旧值
+    # - 完全未命中时，未拿到锁的请求短暂等待重算结果，超时再自行计算
+    
+    @staticmethod
+    def _swr_state(entry: Any, now: float, beta: float) -> str:
+        """判断条目状态：fresh / early（提前刷新）/ stale（软过期）/ miss"""
+        if not isinstance(entry, dict) or entry.get(_SWR_MARKER) != 1:
+            return "miss"
+        if now >= entry["e"]:
+            return "stale"
+        if beta > 0 and entry["d"] > 0:
+            # XFetch: now - delta * beta * ln(rand) >= expiry
+            if now - entry["d"] * beta * math.log(1.0 - random.random()) >= entry["e"]:
+                return "early"
+        return "fresh"
+    
+    def _swr_params(self, expire: Optional[int], stale_ttl: Optional[int],
+                    beta: Optional[float]):
+        return (
+            expire if expire is not None else self.config.default_expire,
+            stale_ttl if stale_ttl is not None else self.config.stale_ttl,
+            beta if beta is not None else self.config.early_refresh_beta
+        )
+    
+    def _swr_envelope(self, value: Any, delta: float, expire: int) -> Dict[str, Any]:
+        now = time.time()
+        return {_SWR_MARKER: 1, "v": value, "t": now, "d": delta, "e": now + expire}
+    
+    def _try_recompute_lock(self, key: str):
+        """非阻塞获取键的重算锁，返回锁对象或 None"""
+        if self.redis_client:
+            lock = DistributedLock(self.redis_client, f"recompute:{key}", self.config.recompute_lock_timeout)
+            try:
+                return lock if lock.acquire(blocking=False) else None
+            except Exception as e:
+                logger.warning(f"获取重算锁失败，退化为进程内锁 {key}: {e}")
+        local_lock = self._local_locks[hash(key) % len(self._local_locks)]
+        return local_lock if local_lock.acquire(blocking=False) else None
+    
+    async def _atry_recompute_lock(self, key: str):
+        """异步非阻塞获取键的重算锁，返回锁对象或 None"""
+        if self.async_backend:
+            lock = AsyncDistributedLock(self.async_backend.client, f"recompute:{key}",
+                                        self.config.recompute_lock_timeout)
+            try:
+                return lock if await lock.acquire(blocking=False) else None
+            except Exception as e:
+                logger.warning(f"获取重算锁失败，退化为进程内锁 {key}: {e}")
+                local_lock = self._local_locks[hash(key) % len(self._local_locks)]
+                return local_lock if local_lock.acquire(blocking=False) else None
+        return self._try_recompute_lock(key)
+    
+    def get_or_compute(self, key: str, compute: Callable[[], Any], expire: int = None,
+                       stale_ttl: int = None, beta: float = None) -> Any:
+        """
+        读取缓存，未命中或需要刷新时调用 compute() 重算并写回
+
+        Args:
+            expire: 新鲜期（秒），超过后条目变为旧值
+            stale_ttl: 软过期后旧值仍可返回的时长（秒）
+            beta: 提前刷新系数，0 表示关闭提前刷新
+        """
+        expire, stale_ttl, beta = self._swr_params(expire, stale_ttl, beta)
+        entry = self.get(key)
+        state = self._swr_state(entry, time.time(), beta)
+        if state == "fresh":
+            return entry["v"]
+        
+        lock = self._try_recompute_lock(key)
+        if lock is None:
+            if state != "miss":
+                # 其他进程正在重算，先返回旧值
+                if state == "stale" and self.config.enable_metrics:
+                    self.metrics.record_stale_served()
+                return entry["v"]
+            deadline = time.monotonic() + self.config.recompute_wait
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                entry = self.get(key)
+                if self._swr_state(entry, time.time(), 0) != "miss":
+                    return entry["v"]
+            lock = self._try_recompute_lock(key)
+        
+        try:
+            if state == "miss":
+                # 等待锁期间可能已被其他进程写入
+                latest = self.get(key)
+                if self._swr_state(latest, time.time(), 0) == "fresh":
+                    return latest["v"]
+            elif state == "early" and self.config.enable_metrics:
+                self.metrics.record_early_refresh()
+            
+            start = time.monotonic()
+            try:
+                value = compute()
+            except Exception:
+                if state != "miss":
+                    logger.warning(f"重算缓存失败，返回旧值 {key}", exc_info=True)
+                    return entry["v"]
+                raise
+            delta = time.monotonic() - start
+            
+            self.set(key, self._swr_envelope(value, delta, expire), expire + stale_ttl)
+            if self.config.enable_metrics:
+                self.metrics.record_recompute(key, entry["t"] if state != "miss" else None)
+            return value
+        finally:
+            if lock is not None:
+                lock.release()
+    
+    async def aget_or_compute(self, key: str, compute: Callable[[], Any], expire: int = None,
+                              stale_ttl: int = None, beta: float = None) -> Any:
+        """get_or_compute 的异步版本，compute 可以是普通函数或返回协程"""
+        expire, stale_ttl, beta = self._swr_params(expire, stale_ttl, beta)
+        entry = await self.aget(key)
+        state = self._swr_state(entry, time.time(), beta)
+        if state == "fresh":
+            return entry["v"]
+        
+        lock = await self._atry_recompute_lock(key)
+        if lock is None:
+            if state != "miss":
+                if state == "stale" and self.config.enable_metrics:
+                    self.metrics.record_stale_served()
+                return entry["v"]
+            deadline = time.monotonic() + self.config.recompute_wait
+            while time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+                entry = await self.aget(key)
+                if self._swr_state(entry, time.time(), 0) != "miss":
+                    return entry["v"]
+            lock = await self._atry_recompute_lock(key)
+        
+        try:
+            if state == "miss":
+                latest = await self.aget(key)
+                if self._swr_state(latest, time.time(), 0) == "fresh":
+                    return latest["v"]
+            elif state == "early" and self.config.enable_metrics:
+                self.metrics.record_early_refresh()
+            
+            start = time.monotonic()
+            try:
+                value = compute()
+                if inspect.isawaitable(value):
+                    value = await value
+            except Exception:
+                if state != "miss":
+                    logger.warning(f"重算缓存失败，返回旧值 {key}", exc_info=True)
+                    return entry["v"]
+                raise
+            delta = time.monotonic() - start
+            
+            await self.aset(key, self._swr_envelope(value, delta, expire), expire + stale_ttl)
+            if self.config.enable_metrics:
+                self.metrics.record_recompute(key, entry["t"] if state != "miss" else None)
+            return value
+        finally:
+            if isinstance(lock, AsyncDistributedLock):
+                await lock.release()
+            elif lock is not None:
+                lock.release()
+    
     def get_lock(self, key: str, timeout: int = 10) -> DistributedLock:
         """获取分布式锁"""
         if self.redis_client:
@@ -484,19 +897,39 @@ class EnhancedCacheManager:
             # 内存锁（单机环境）
             return threading.Lock()
     
+    def get_tier_stats(self) -> Dict[str, Any]:
+        """分层命中统计（供监控导出）"""
+        stats = self.metrics.get_tier_stats()
+        l1_stats = self.memory_cache.get_stats()
+        stats["l1"].update({
+            "items": l1_stats["items"],
+            "bytes_used": l1_stats["bytes_used"],
+            "evictions": l1_stats["evictions"],
+            "expirations": l1_stats["expirations"],
+        })
+        stats["l2"]["enabled"] = self.redis_client is not None
+        return stats
+    
     def get_stats(self) -> Dict[str, Any]:
         """获取缓存统计"""
         stats = self.metrics.get_stats() if self.config.enable_metrics else {}
         
         stats.update({
             "backend": "Redis" if self.redis_client else "Memory",
+            "async_backend": self.async_backend.get_pool_stats() if self.async_backend else {"enabled": False},
             "memory_cache_size": len(self.memory_cache),
             "memory_cache_max_size": self.config.max_memory_cache_size,
+            "memory_cache": self.memory_cache.get_stats(),
+            "tiers": self.get_tier_stats() if self.config.enable_metrics else {},
+            "recompute": self.metrics.get_recompute_stats() if self.config.enable_metrics else {},
             "compression_enabled": self.config.enable_compression,
+            "codec": self.codec.name,
             "config": {
                 "default_expire": self.config.default_expire,
                 "compression_threshold": self.config.compression_threshold,
-                "max_memory_size": self.config.max_memory_cache_size
+                "max_memory_size": self.config.max_memory_cache_size,
+                "max_memory_bytes": self.config.max_memory_cache_bytes,
+                "l1_max_ttl": self.config.l1_max_ttl
             }
         })
         
@@ -520,6 +953,7 @@ class EnhancedCacheManager:
             "redis_available": False,
             "memory_cache_available": True,
             "total_memory_items": len(self.memory_cache),
+            "memory_cache_bytes": self.memory_cache.bytes_used,
             "errors": self.metrics.errors if self.config.enable_metrics else 0
         }
         
@@ -548,11 +982,7 @@ def cache_result(key_prefix: str = "", expire: int = None, cache_manager=None):
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            if cache_manager is None:
-                from . import cache_manager as cm
-                manager = cm.cache_manager
-            else:
-                manager = cache_manager
+            manager = cache_manager if cache_manager is not None else get_cache_manager_instance()
             
             # 生成缓存key
             args_str = str(args) + str(sorted(kwargs.items()))
@@ -576,24 +1006,20 @@ def async_cache_result(key_prefix: str = "", expire: int = None, cache_manager=N
     def decorator(func):
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            if cache_manager is None:
-                from . import cache_manager as cm
-                manager = cm.cache_manager
-            else:
-                manager = cache_manager
+            manager = cache_manager if cache_manager is not None else get_cache_manager_instance()
             
             # 生成缓存key
             args_str = str(args) + str(sorted(kwargs.items()))
             cache_key = f"{key_prefix}:{func.__name__}:{hashlib.md5(args_str.encode()).hexdigest()}"
             
             # 尝试从缓存获取
-            cached_result = manager.get(cache_key)
+            cached_result = await manager.aget(cache_key)
             if cached_result is not None:
                 return cached_result
             
             # 执行函数并缓存结果
             result = await func(*args, **kwargs)
-            manager.set(cache_key, result, expire)
+            await manager.aset(cache_key, result, expire)
             return result
         
         return wrapper
@@ -0,0 +1,313 @@
+# project/utils/async_cache/codecs.py
+"""
+缓存编解码层
+每个缓存值以 1 字节类型标记开头，标记同时编码序列化格式和压缩方式，
+解码时按标记直接分派，不再需要"先尝试JSON、失败再pickle"的试探解析。
+
+标记字节布局: 低 3 位为编码格式，0x10/0x18 为压缩方式。所有标记都小于 0x20
+且避开空白字符，因此不会与旧格式（JSON文本、pickle的 0x80、"compressed:" 前缀）冲突。
+
+缓存只接受 DTO（dict/list/基础类型/datetime/dataclass/pydantic模型），
+SQLAlchemy ORM 实例会被拒绝：脱离会话后的ORM对象在读取时无法懒加载，
+请先转换为字典或 schema 再缓存。
+"""
+import os
+import json
+import time
+import zlib
+import pickle
+import logging
+import dataclasses
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Callable, Dict, Optional, Tuple
+from uuid import UUID
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    msgpack = None
+    MSGPACK_AVAILABLE = False
+
+try:
+    import pyzstd
+    ZSTD_AVAILABLE = True
+except ImportError:
+    pyzstd = None
+    ZSTD_AVAILABLE = False
+
+
+# 编码格式
+CODEC_JSON = 0x01
+CODEC_ORJSON = 0x02
+CODEC_MSGPACK = 0x03
+
+# 压缩方式
+COMPRESSION_NONE = 0x00
+COMPRESSION_ZLIB = 0x10
+COMPRESSION_ZSTD = 0x18
+
+_CODEC_MASK = 0x07
+_COMPRESSION_MASK = 0x18
+
+CODEC_NAMES = {"json": CODEC_JSON, "orjson": CODEC_ORJSON, "msgpack": CODEC_MSGPACK}
+COMPRESSION_NAMES = {"none": COMPRESSION_NONE, "zlib": COMPRESSION_ZLIB, "zstd": COMPRESSION_ZSTD}
+
+_LEGACY_COMPRESSED_PREFIX = b'compressed:'
+
+
+class CacheValueError(TypeError):
+    """缓存值类型不被允许（例如 SQLAlchemy ORM 实例）"""
+
+
+def _is_orm_instance(obj: Any) -> bool:
+    return hasattr(obj, "_sa_instance_state")
+
+
+def _to_dto(obj: Any) -> Any:
+    """非原生类型的转换规则，供各编码器的 default 回调使用"""
+    if _is_orm_instance(obj):
+        raise CacheValueError(
+            f"不允许缓存ORM实例 {type(obj).__name__}，请先转换为字典或schema"
+        )
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, UUID):
+        return str(obj)
+    if isinstance(obj, bytes):
+        return obj.decode("utf-8", errors="replace")
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json")
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if hasattr(obj, "to_dict"):
+        return obj.to_dict()
+    # 与旧实现 json.dumps(default=str) 保持一致
+    return str(obj)
+
+
+def _json_encode(value: Any) -> bytes:
+    return json.dumps(value, default=_to_dto, ensure_ascii=False).encode("utf-8")
+
+
+def _json_decode(data: bytes) -> Any:
+    return json.loads(data)
+
+
+def _orjson_encode(value: Any) -> bytes:
+    rejected = []
+
+    def default(obj: Any) -> Any:
+        try:
+            return _to_dto(obj)
+        except CacheValueError as e:
+            rejected.append(e)
+            raise
+
+    try:
+        return orjson.dumps(value, default=default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    except TypeError:
+        # orjson 会把 default 回调中的异常替换为通用 TypeError
+        if rejected:
+            raise rejected[0]
+        raise
+
+
+def _orjson_decode(data: bytes) -> Any:
+    return orjson.loads(data)
+
+
+def _msgpack_encode(value: Any) -> bytes:
+    return msgpack.packb(value, default=_to_dto, use_bin_type=True, datetime=False)
+
+
+def _msgpack_decode(data: bytes) -> Any:
+    return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+_ENCODERS: Dict[int, Tuple[Callable[[Any], bytes], Callable[[bytes], Any]]] = {
+    CODEC_JSON: (_json_encode, _json_decode),
+}
+if ORJSON_AVAILABLE:
+    _ENCODERS[CODEC_ORJSON] = (_orjson_encode, _orjson_decode)
+if MSGPACK_AVAILABLE:
+    _ENCODERS[CODEC_MSGPACK] = (_msgpack_encode, _msgpack_decode)
+
+
+def _compress(data: bytes, compression: int, level: Optional[int]) -> bytes:
+    if compression == COMPRESSION_ZSTD:
+        return pyzstd.compress(data, level or 3)
+    if compression == COMPRESSION_ZLIB:
+        return zlib.compress(data, level if level is not None else 6)
+    return data
+
+
+def _decompress(data: bytes, compression: int) -> bytes:
+    if compression == COMPRESSION_ZSTD:
+        if not ZSTD_AVAILABLE:
+            raise ValueError("缓存值使用zstd压缩，但pyzstd不可用")
+        return pyzstd.decompress(data)
+    if compression == COMPRESSION_ZLIB:
+        return zlib.decompress(data)
+    return data
+
+
+def _default_codec_name() -> str:
+    return "orjson" if ORJSON_AVAILABLE else "json"
+
+
+def _default_compression_name() -> str:
+    return "zstd" if ZSTD_AVAILABLE else "zlib"
+
+
+class CacheCodec:
+    """
+    带类型标记的缓存编解码器
+
+    encode: 值 -> [标记字节][(压缩后的)负载]
+    decode: 按标记分派；无标记的旧数据走兼容解码
+    """
+
+    def __init__(self, codec: Optional[str] = None, compression: Optional[str] = None,
+                 compression_threshold: int = 1024, compression_level: Optional[int] = None,
+                 enable_compression: bool = True):
+        codec = (codec or _default_codec_name()).lower()
+        compression = (compression or _default_compression_name()).lower()
+
+        codec_id = CODEC_NAMES.get(codec)
+        if codec_id not in _ENCODERS:
+            logger.warning(f"缓存编码格式 {codec} 不可用，回退到 {_default_codec_name()}")
+            codec_id = CODEC_NAMES[_default_codec_name()]
+
+        compression_id = COMPRESSION_NAMES.get(compression, COMPRESSION_ZLIB)
+        if compression_id == COMPRESSION_ZSTD and not ZSTD_AVAILABLE:
+            logger.warning("pyzstd不可用，缓存压缩回退到zlib")
+            compression_id = COMPRESSION_ZLIB
+        if not enable_compression:
+            compression_id = COMPRESSION_NONE
+
+        self.codec_id = codec_id
+        self.compression_id = compression_id
+        self.compression_threshold = compression_threshold
+        self.compression_level = compression_level
+        self._encode, _ = _ENCODERS[codec_id]
+
+    @property
+    def name(self) -> str:
+        codec = next(k for k, v in CODEC_NAMES.items() if v == self.codec_id)
+        compression = next(k for k, v in COMPRESSION_NAMES.items() if v == self.compression_id)
+        return f"{codec}+{compression}"
+
+    def encode(self, value: Any) -> bytes:
+        """编码；ORM实例等不允许的值抛出 CacheValueError"""
+        payload = self._encode(value)
+        compression = COMPRESSION_NONE
+        if self.compression_id != COMPRESSION_NONE and len(payload) > self.compression_threshold:
+            payload = _compress(payload, self.compression_id, self.compression_level)
+            compression = self.compression_id
+        return bytes((self.codec_id | compression,)) + payload
+
+    @staticmethod
+    def decode(data: Any) -> Any:
+        """解码任意标记的值（与写入时使用的编码器无关）"""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if not data:
+            return data
+
+        tag = data[0]
+        if tag < 0x20 and tag not in (0x09, 0x0A, 0x0D):
+            codec_id = tag & _CODEC_MASK
+            decoder = _ENCODERS.get(codec_id)
+            if decoder is None:
+                raise ValueError(f"未知或不可用的缓存编码标记: {tag:#x}")
+            return decoder[1](_decompress(data[1:], tag & _COMPRESSION_MASK))
+
+        return _decode_legacy(data)
+
+
+def _decode_legacy(data: bytes) -> Any:
+    """兼容升级前写入的无标记数据（JSON或pickle，可带 compressed: 前缀）"""
+    if data.startswith(_LEGACY_COMPRESSED_PREFIX):
+        data = zlib.decompress(data[len(_LEGACY_COMPRESSED_PREFIX):])
+    if data[:1] == b'\x80':
+        return pickle.loads(data)
+    return json.loads(data.decode("utf-8"))
+
+
+def get_codec_from_env(compression_threshold: int = 1024, enable_compression: bool = True) -> CacheCodec:
+    """根据环境变量 CACHE_CODEC / CACHE_COMPRESSION 创建编解码器"""
+    level = os.getenv("CACHE_COMPRESSION_LEVEL")
+    return CacheCodec(
+        codec=os.getenv("CACHE_CODEC"),
+        compression=os.getenv("CACHE_COMPRESSION"),
+        compression_threshold=compression_threshold,
+        compression_level=int(level) if level else None,
+        enable_compression=enable_compression
+    )
+
+
+def benchmark_codecs(sample: Any, iterations: int = 2000) -> Dict[str, Dict[str, float]]:
+    """
+    对比各可用编码格式/压缩方式的编解码吞吐和负载大小
+
+    返回 {"orjson+zstd": {"encode_ops": ..., "decode_ops": ..., "size_bytes": ...}, ...}
+    """
+    results = {}
+    for codec in CODEC_NAMES:
+        if CODEC_NAMES[codec] not in _ENCODERS:
+            continue
+        for compression in COMPRESSION_NAMES:
+            if compression == "zstd" and not ZSTD_AVAILABLE:
+                continue
+            cache_codec = CacheCodec(codec, compression, compression_threshold=0,
+                                     enable_compression=compression != "none")
+            encoded = cache_codec.encode(sample)
+
+            start = time.perf_counter()
+            for _ in range(iterations):
+                cache_codec.encode(sample)
+            encode_elapsed = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for _ in range(iterations):
+                CacheCodec.decode(encoded)
+            decode_elapsed = time.perf_counter() - start
+
+            results[cache_codec.name] = {
+                "encode_ops": iterations / encode_elapsed if encode_elapsed else 0.0,
+                "decode_ops": iterations / decode_elapsed if decode_elapsed else 0.0,
+                "size_bytes": len(encoded),
+            }
+    return results
+
+
+if __name__ == "__main__":
+    _sample = {
+        "items": [
+            {"id": i, "title": f"话题 {i}", "content": "内容" * 50, "tags": ["python", "cache"],
+             "created_at": datetime.now(), "likes_count": i * 3}
+            for i in range(200)
+        ],
+        "total": 200,
+    }
+    for _name, _stats in benchmark_codecs(_sample).items():
+        print(f"{_name:16s} encode {_stats['encode_ops']:>10.0f}/s  "
+              f"decode {_stats['decode_ops']:>10.0f}/s  size {_stats['size_bytes']:>8d} B")
@@ -0,0 +1,319 @@
+# project/utils/async_cache/leaderboard.py
+"""
+排行榜存储
+按周期（总榜/月榜/周榜）维护成员得分，优先使用Redis有序集合，Redis不可用时退化为进程内有序表。
+
+- 总榜直接写入成员当前总分（ZADD），周期榜按自然周/自然月分键累加本周期获得的积分（ZINCRBY，
+  扣减不计入周期榜），旧周期的键设置过期时间自动淘汰
+- 排名查询为 ZREVRANK，O(log n)
+- 积分变动在数据库事务提交后才写入排行榜，回滚的事务不会影响排名
+- 全量重建（replace）同时写入 {键}:built 标记；增量写入只会创建不完整的键，
+  因此是否需要重建以该标记为准（is_built），而不是键是否存在
+"""
+import time
+import bisect
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+PERIOD_ALL_TIME = "all_time"
+PERIOD_MONTHLY = "monthly"
+PERIOD_WEEKLY = "weekly"
+PERIODS = (PERIOD_ALL_TIME, PERIOD_MONTHLY, PERIOD_WEEKLY)
+WINDOW_PERIODS = (PERIOD_MONTHLY, PERIOD_WEEKLY)
+
+# 周期榜键的保留时间：覆盖当前周期并保留上一周期用于对比
+_WINDOW_TTL = {
+    PERIOD_MONTHLY: 62 * 24 * 3600,
+    PERIOD_WEEKLY: 15 * 24 * 3600,
+}
+
+_REPLACE_BATCH_SIZE = 1000
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def period_start(period: str, at: Optional[datetime] = None) -> Optional[datetime]:
+    """周期起始时间（UTC，无时区）；总榜返回 None"""
+    at = at or _utcnow()
+    if period == PERIOD_MONTHLY:
+        return at.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    if period == PERIOD_WEEKLY:
+        monday = at - timedelta(days=at.weekday())
+        return monday.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == PERIOD_ALL_TIME:
+        return None
+    raise ValueError(f"不支持的排行榜周期: {period}")
+
+
+def period_suffix(period: str, at: Optional[datetime] = None) -> str:
+    """周期键后缀，如 all_time、monthly:2025-10、weekly:2025-W42"""
+    at = at or _utcnow()
+    if period == PERIOD_MONTHLY:
+        return f"{PERIOD_MONTHLY}:{at.year}-{at.month:02d}"
+    if period == PERIOD_WEEKLY:
+        iso_year, iso_week, _ = at.isocalendar()
+        return f"{PERIOD_WEEKLY}:{iso_year}-W{iso_week:02d}"
+    if period == PERIOD_ALL_TIME:
+        return PERIOD_ALL_TIME
+    raise ValueError(f"不支持的排行榜周期: {period}")
+
+
+class _MemoryBoard:
+    """进程内有序表：按 (-score, member) 排序，bisect 定位排名"""
+
+    __slots__ = ("scores", "order", "expire_at", "built")
+
+    def __init__(self, expire_at: Optional[float] = None):
+        self.scores: Dict[int, float] = {}
+        self.order: List[Tuple[float, int]] = []
+        self.expire_at = expire_at
+        self.built = False
+
+    def set(self, member: int, score: float):
+        old = self.scores.get(member)
+        if old is not None:
+            index = bisect.bisect_left(self.order, (-old, member))
+            del self.order[index]
+        self.scores[member] = score
+        bisect.insort(self.order, (-score, member))
+
+    def remove(self, member: int):
+        old = self.scores.pop(member, None)
+        if old is not None:
+            index = bisect.bisect_left(self.order, (-old, member))
+            del self.order[index]
+
+    def rank(self, member: int) -> Optional[Tuple[int, float]]:
+        score = self.scores.get(member)
+        if score is None:
+            return None
+        return bisect.bisect_left(self.order, (-score, member)) + 1, score
+
+    def top(self, offset: int, limit: int) -> List[Tuple[int, float]]:
+        return [(member, -neg_score) for neg_score, member in self.order[offset:offset + limit]]
+
+
+class Leaderboard:
+    """
+    排行榜
+
+    Args:
+        name: 排行榜名称，用于Redis键前缀 leaderboard:{name}:{period后缀}
+        redis_client: 同步Redis客户端；为 None 时使用缓存管理器的Redis连接，仍不可用则使用内存
+    """
+
+    def __init__(self, name: str, redis_client: Any = None):
+        self.name = name
+        self._redis_client = redis_client
+        self._memory: Dict[str, _MemoryBoard] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def redis(self):
+        if self._redis_client is None:
+            from .cache_manager import get_cache_manager_instance
+            self._redis_client = get_cache_manager_instance().redis_client
+        return self._redis_client
+
+    @property
+    def backend(self) -> str:
+        return "redis" if self.redis is not None else "memory"
+
+    def key(self, period: str, at: Optional[datetime] = None) -> str:
+        return f"leaderboard:{self.name}:{period_suffix(period, at)}"
+
+    def built_key(self, period: str, at: Optional[datetime] = None) -> str:
+        return f"{self.key(period, at)}:built"
+
+    def _memory_board(self, key: str, period: str, create: bool = True) -> Optional[_MemoryBoard]:
+        now = time.monotonic()
+        board = self._memory.get(key)
+        if board is not None and board.expire_at is not None and board.expire_at <= now:
+            del self._memory[key]
+            board = None
+        if board is None and create:
+            ttl = _WINDOW_TTL.get(period)
+            board = self._memory[key] = _MemoryBoard(now + ttl if ttl else None)
+            # 创建新周期时顺带清理过期周期
+            for stale_key in [k for k, b in self._memory.items() if b.expire_at is not None and b.expire_at <= now]:
+                del self._memory[stale_key]
+        return board
+
+    # ---------- 写入 ----------
+
+    def apply(self, changes: Iterable[Tuple[int, float, Optional[float], Optional[datetime]]]):
+        """
+        批量应用积分变动
+
+        changes: (member, 增量, 变动后总分, 发生时间)；总分为 None 时总榜同样按增量累加
+        """
+        changes = list(changes)
+        if not changes:
+            return
+        client = self.redis
+        if client is not None:
+            try:
+                pipe = client.pipeline(transaction=False)
+                for member, delta, total, at in changes:
+                    all_time_key = self.key(PERIOD_ALL_TIME)
+                    if total is None:
+                        pipe.zincrby(all_time_key, delta, member)
+                    elif total > 0:
+                        pipe.zadd(all_time_key, {member: total})
+                    else:
+                        pipe.zrem(all_time_key, member)
+                    if delta <= 0:
+                        continue
+                    for period in WINDOW_PERIODS:
+                        window_key = self.key(period, at)
+                        pipe.zincrby(window_key, delta, member)
+                        pipe.expire(window_key, _WINDOW_TTL[period])
+                pipe.execute()
+                return
+            except Exception as e:
+                logger.warning(f"排行榜 {self.name} 写入Redis失败，改用内存: {e}")
+
+        with self._lock:
+            for member, delta, total, at in changes:
+                board = self._memory_board(self.key(PERIOD_ALL_TIME), PERIOD_ALL_TIME)
+                score = total if total is not None else board.scores.get(member, 0) + delta
+                if score > 0:
+                    board.set(member, score)
+                else:
+                    board.remove(member)
+                if delta <= 0:
+                    continue
+                for period in WINDOW_PERIODS:
+                    board = self._memory_board(self.key(period, at), period)
+                    board.set(member, board.scores.get(member, 0) + delta)
+
+    def replace(self, period: str, scores: Dict[int, float]):
+        """
+        用全量数据替换当前周期的排行榜并标记为已建立
+        （Redis中先写临时键再 RENAME，读者不会看到中间状态；标记与排行榜同一事务写入，过期时间相同）
+        """
+        key = self.key(period)
+        client = self.redis
+        if client is not None:
+            try:
+                tmp_key = f"{key}:rebuild"
+                client.delete(tmp_key)
+                items = list(scores.items())
+                for start in range(0, len(items), _REPLACE_BATCH_SIZE):
+                    client.zadd(tmp_key, dict(items[start:start + _REPLACE_BATCH_SIZE]))
+                pipe = client.pipeline(transaction=True)
+                if items:
+                    pipe.rename(tmp_key, key)
+                else:
+                    pipe.delete(key)
+                pipe.set(self.built_key(period), 1)
+                if period in _WINDOW_TTL:
+                    if items:
+                        pipe.expire(key, _WINDOW_TTL[period])
+                    pipe.expire(self.built_key(period), _WINDOW_TTL[period])
+                pipe.execute()
+                return
+            except Exception as e:
+                logger.warning(f"排行榜 {self.name} 重建Redis键失败，改用内存: {e}")
+
+        with self._lock:
+            self._memory.pop(key, None)
+            board = self._memory_board(key, period)
+            for member, score in scores.items():
+                board.set(member, score)
+            board.built = True
+
+    # ---------- 读取 ----------
+
+    def is_built(self, period: str) -> bool:
+        """当前周期的排行榜是否经过全量重建（Redis清空、冷启动或进入新周期后为 False）"""
+        client = self.redis
+        if client is not None:
+            try:
+                return bool(client.exists(self.built_key(period)))
+            except Exception as e:
+                logger.warning(f"排行榜 {self.name} 读取Redis失败: {e}")
+        with self._lock:
+            board = self._memory_board(self.key(period), period, create=False)
+            return board is not None and board.built
+
+    def top(self, period: str, limit: int = 10, offset: int = 0) -> List[Tuple[int, float]]:
+        """前 N 名 [(member, score)]，按得分降序"""
+        key = self.key(period)
+        client = self.redis
+        if client is not None:
+            try:
+                rows = client.zrevrange(key, offset, offset + limit - 1, withscores=True)
+                return [(int(member), score) for member, score in rows]
+            except Exception as e:
+                logger.warning(f"排行榜 {self.name} 读取Redis失败: {e}")
+        with self._lock:
+            board = self._memory_board(key, period, create=False)
+            return board.top(offset, limit) if board else []
+
+    def rank(self, period: str, member: int) -> Optional[Tuple[int, float]]:
+        """成员的 (名次, 得分)，名次从1开始；未上榜返回 None"""
+        key = self.key(period)
+        client = self.redis
+        if client is not None:
+            try:
+                pipe = client.pipeline(transaction=False)
+                pipe.zrevrank(key, member)
+                pipe.zscore(key, member)
+                index, score = pipe.execute()
+                return (index + 1, score) if index is not None else None
+            except Exception as e:
+                logger.warning(f"排行榜 {self.name} 读取Redis失败: {e}")
+        with self._lock:
+            board = self._memory_board(key, period, create=False)
+            return board.rank(member) if board else None
+
+    def size(self, period: str) -> int:
+        """上榜人数"""
+        key = self.key(period)
+        client = self.redis
+        if client is not None:
+            try:
+                return client.zcard(key)
+            except Exception as e:
+                logger.warning(f"排行榜 {self.name} 读取Redis失败: {e}")
+        with self._lock:
+            board = self._memory_board(key, period, create=False)
+            return len(board.scores) if board else 0
+
+
+# 积分排行榜
+points_leaderboard = Leaderboard("points")
+
+_PENDING_KEY = "points_leaderboard_pending"
+
+
+def record_points_change(db: Session, user_id: int, amount: int, total_points: Optional[int] = None):
+    """登记一次积分变动，在会话提交后写入积分排行榜"""
+    if amount:
+        db.info.setdefault(_PENDING_KEY, []).append((user_id, amount, total_points, _utcnow()))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending_points(session: Session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        try:
+            points_leaderboard.apply(pending)
+        except Exception as e:
+            logger.warning(f"更新积分排行榜失败: {e}")
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending_points(session: Session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop(_PENDING_KEY, None)
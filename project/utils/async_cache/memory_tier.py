@@ -0,0 +1,197 @@
+# project/utils/async_cache/memory_tier.py
+"""
+进程内L1缓存层
+分片的 O(1) LRU 缓存，支持按条目TTL和字节数统计
+"""
+import sys
+import time
+import fnmatch
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# 条目结构: (value, expire_at, size)；expire_at 为 monotonic 时间，None 表示不过期
+_Entry = Tuple[Any, Optional[float], int]
+
+
+def _estimate_size(key: str, value: Any) -> int:
+    """估算条目占用的字节数"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        value_size = len(value)
+    elif isinstance(value, str):
+        value_size = len(value.encode("utf-8"))
+    else:
+        value_size = sys.getsizeof(value)
+    return value_size + len(key)
+
+
+class _LRUShard:
+    """单个分片：OrderedDict 维护访问顺序，头部为最久未访问"""
+
+    __slots__ = ("entries", "lock", "max_items", "max_bytes", "bytes_used",
+                 "hits", "misses", "evictions", "expirations")
+
+    def __init__(self, max_items: int, max_bytes: int):
+        self.entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _remove(self, key: str) -> Optional[_Entry]:
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes_used -= entry[2]
+        return entry
+
+    def _evict(self):
+        """从LRU头部淘汰，直到数量和字节数都在限额内"""
+        while self.entries and (len(self.entries) > self.max_items or self.bytes_used > self.max_bytes):
+            _, (_, _, size) = self.entries.popitem(last=False)
+            self.bytes_used -= size
+            self.evictions += 1
+
+    def get(self, key: str, now: float) -> Tuple[bool, Any]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            if entry[1] is not None and entry[1] <= now:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[0]
+
+    def set(self, key: str, value: Any, expire_at: Optional[float], size: int) -> bool:
+        with self.lock:
+            self._remove(key)
+            if size > self.max_bytes:
+                # 单个条目超过分片容量，不进入L1
+                return False
+            self.entries[key] = (value, expire_at, size)
+            self.bytes_used += size
+            self._evict()
+            return True
+
+
+class ShardedLRUCache:
+    """
+    分片LRU缓存
+
+    - get/set/delete 均为 O(1)，每次写入时同步淘汰，内存不会超出上限
+    - 过期条目在访问时惰性删除，也会被LRU正常淘汰
+    - 按键哈希分片，每个分片独立加锁以降低锁竞争
+    """
+
+    def __init__(self, max_items: int = 1000, max_bytes: int = 64 * 1024 * 1024,
+                 shards: int = 16):
+        self.shard_count = max(1, shards)
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        per_shard_items = max(1, -(-max_items // self.shard_count))
+        per_shard_bytes = max(1, -(-max_bytes // self.shard_count))
+        self._shards = [_LRUShard(per_shard_items, per_shard_bytes) for _ in range(self.shard_count)]
+
+    def _shard(self, key: str) -> _LRUShard:
+        return self._shards[hash(key) % self.shard_count]
+
+    def get(self, key: str) -> Optional[Any]:
+        """获取缓存值，不存在或已过期返回 None"""
+        found, value = self._shard(key).get(key, time.monotonic())
+        return value if found else None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        """写入缓存，ttl<=0 或为 None 时不过期"""
+        expire_at = time.monotonic() + ttl if ttl and ttl > 0 else None
+        return self._shard(key).set(key, value, expire_at, _estimate_size(key, value))
+
+    def delete(self, key: str) -> bool:
+        """删除缓存"""
+        shard = self._shard(key)
+        with shard.lock:
+            return shard._remove(key) is not None
+
+    def delete_matching(self, pattern: str) -> int:
+        """按 fnmatch 模式删除（需遍历全部条目）"""
+        deleted = 0
+        for shard in self._shards:
+            with shard.lock:
+                keys = [k for k in shard.entries if fnmatch.fnmatch(k, pattern)]
+                for key in keys:
+                    shard._remove(key)
+                deleted += len(keys)
+        return deleted
+
+    def exists(self, key: str) -> bool:
+        """检查键是否存在且未过期（不影响LRU顺序和命中统计）"""
+        shard = self._shard(key)
+        with shard.lock:
+            entry = shard.entries.get(key)
+            if entry is None:
+                return False
+            if entry[1] is not None and entry[1] <= time.monotonic():
+                shard._remove(key)
+                shard.expirations += 1
+                return False
+            return True
+
+    def expire(self, key: str, seconds: float) -> bool:
+        """更新过期时间"""
+        shard = self._shard(key)
+        with shard.lock:
+            entry = shard.entries.get(key)
+            if entry is None:
+                return False
+            shard.entries[key] = (entry[0], time.monotonic() + seconds, entry[2])
+            return True
+
+    def ttl(self, key: str) -> int:
+        """剩余过期秒数；不存在返回 -2，不过期返回 -1（与Redis语义一致）"""
+        shard = self._shard(key)
+        with shard.lock:
+            entry = shard.entries.get(key)
+            if entry is None:
+                return -2
+            if entry[1] is None:
+                return -1
+            return max(0, int(entry[1] - time.monotonic()))
+
+    def clear(self):
+        """清空缓存"""
+        for shard in self._shards:
+            with shard.lock:
+                shard.entries.clear()
+                shard.bytes_used = 0
+
+    def __len__(self) -> int:
+        return sum(len(shard.entries) for shard in self._shards)
+
+    @property
+    def bytes_used(self) -> int:
+        return sum(shard.bytes_used for shard in self._shards)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """统计信息"""
+        hits = sum(shard.hits for shard in self._shards)
+        misses = sum(shard.misses for shard in self._shards)
+        total = hits + misses
+        return {
+            "items": len(self),
+            "max_items": self.max_items,
+            "bytes_used": self.bytes_used,
+            "max_bytes": self.max_bytes,
+            "shards": self.shard_count,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / total if total else 0.0,
+            "evictions": sum(shard.evictions for shard in self._shards),
+            "expirations": sum(shard.expirations for shard in self._shards),
+        }
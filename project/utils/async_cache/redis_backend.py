@@ -0,0 +1,228 @@
+# project/utils/async_cache/redis_backend.py
+"""
+异步Redis缓存后端
+基于 redis.asyncio 的连接池实现，供异步请求处理和WebSocket循环使用，
+避免同步Redis客户端阻塞事件循环；多键操作通过 pipeline 合并为一次往返
+"""
+import os
+import logging
+import threading
+from typing import Optional, Dict, Any, List, Iterable, Tuple
+
+import redis.asyncio as aioredis
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncRedisConfig:
+    """异步Redis后端配置"""
+    def __init__(self, redis_url: Optional[str] = None):
+        self.redis_url = redis_url or os.getenv("REDIS_URL", "redis://localhost:6379/0")
+        self.redis_password = os.getenv("REDIS_PASSWORD")
+        self.enable_redis = os.getenv("ENABLE_REDIS", "true").lower() == "true"
+        self.max_connections = int(os.getenv("REDIS_ASYNC_MAX_CONNECTIONS", "50"))
+        self.socket_timeout = float(os.getenv("REDIS_ASYNC_SOCKET_TIMEOUT", "5"))
+        self.socket_connect_timeout = float(os.getenv("REDIS_ASYNC_CONNECT_TIMEOUT", "5"))
+        self.health_check_interval = int(os.getenv("REDIS_ASYNC_HEALTH_CHECK_INTERVAL", "30"))
+        self.scan_batch_size = int(os.getenv("REDIS_ASYNC_SCAN_BATCH_SIZE", "500"))
+
+
+class AsyncRedisBackend:
+    """
+    异步Redis缓存后端
+
+    - 使用 ConnectionPool 复用连接，连接在首次命令时建立
+    - get_many / set_many / delete_many 使用 pipeline，一次网络往返完成
+    - delete_pattern 使用 SCAN 代替 KEYS，不阻塞Redis
+    - 值以原始 bytes 读写，序列化由调用方负责
+    """
+
+    def __init__(self, config: Optional[AsyncRedisConfig] = None, decode_responses: bool = False):
+        self.config = config or AsyncRedisConfig()
+        self.decode_responses = decode_responses
+        self.pool: Optional[aioredis.ConnectionPool] = None
+        self.client: Optional[aioredis.Redis] = None
+        self.is_available = False
+        self._init_client()
+
+    def _init_client(self):
+        """创建连接池（不会立即连接Redis）"""
+        if not self.config.enable_redis or not self.config.redis_url:
+            logger.info("异步Redis后端未启用")
+            return
+
+        try:
+            self.pool = aioredis.ConnectionPool.from_url(
+                self.config.redis_url,
+                password=self.config.redis_password,
+                decode_responses=self.decode_responses,
+                max_connections=self.config.max_connections,
+                socket_timeout=self.config.socket_timeout,
+                socket_connect_timeout=self.config.socket_connect_timeout,
+                health_check_interval=self.config.health_check_interval,
+                retry_on_timeout=True
+            )
+            self.client = aioredis.Redis(connection_pool=self.pool)
+            self.is_available = True
+        except Exception as e:
+            logger.warning(f"创建异步Redis连接池失败: {e}")
+            self.pool = None
+            self.client = None
+            self.is_available = False
+
+    async def ping(self) -> bool:
+        """检查Redis连接"""
+        if not self.client:
+            return False
+        try:
+            await self.client.ping()
+            self.is_available = True
+        except Exception as e:
+            logger.warning(f"异步Redis连接检查失败: {e}")
+            self.is_available = False
+        return self.is_available
+
+    async def get(self, key: str) -> Optional[Any]:
+        """获取单个键"""
+        if not self.client:
+            return None
+        return await self.client.get(key)
+
+    async def get_with_ttl(self, key: str) -> Tuple[Optional[Any], Optional[int]]:
+        """一次往返获取值及剩余毫秒TTL"""
+        if not self.client:
+            return None, None
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.get(key)
+            pipe.pttl(key)
+            value, ttl_ms = await pipe.execute()
+        return value, ttl_ms
+
+    async def set(self, key: str, value: Any, expire: Optional[int] = None) -> bool:
+        """设置单个键，expire<=0 或为 None 时不过期"""
+        if not self.client:
+            return False
+        if expire and expire > 0:
+            return bool(await self.client.set(key, value, ex=expire))
+        return bool(await self.client.set(key, value))
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """批量获取，只返回存在的键"""
+        keys = list(keys)
+        if not self.client or not keys:
+            return {}
+        values = await self.client.mget(keys)
+        return {key: value for key, value in zip(keys, values) if value is not None}
+
+    async def set_many(self, mapping: Dict[str, Any], expire: Optional[int] = None) -> bool:
+        """批量设置，使用pipeline一次往返完成"""
+        if not self.client or not mapping:
+            return False
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key, value in mapping.items():
+                if expire and expire > 0:
+                    pipe.set(key, value, ex=expire)
+                else:
+                    pipe.set(key, value)
+            results = await pipe.execute()
+        return all(results)
+
+    async def delete(self, key: str) -> bool:
+        """删除单个键"""
+        if not self.client:
+            return False
+        return bool(await self.client.delete(key))
+
+    async def delete_many(self, keys: Iterable[str]) -> int:
+        """批量删除"""
+        keys = list(keys)
+        if not self.client or not keys:
+            return 0
+        return await self.client.unlink(*keys)
+
+    async def delete_pattern(self, pattern: str) -> int:
+        """按模式删除，使用SCAN分批遍历"""
+        if not self.client:
+            return 0
+        deleted = 0
+        batch: List[Any] = []
+        async for key in self.client.scan_iter(match=pattern, count=self.config.scan_batch_size):
+            batch.append(key)
+            if len(batch) >= self.config.scan_batch_size:
+                deleted += await self.client.unlink(*batch)
+                batch.clear()
+        if batch:
+            deleted += await self.client.unlink(*batch)
+        return deleted
+
+    async def exists(self, key: str) -> bool:
+        """检查键是否存在"""
+        if not self.client:
+            return False
+        return bool(await self.client.exists(key))
+
+    async def expire(self, key: str, seconds: int) -> bool:
+        """设置过期时间"""
+        if not self.client:
+            return False
+        return bool(await self.client.expire(key, seconds))
+
+    async def ttl(self, key: str) -> int:
+        """获取剩余过期时间"""
+        if not self.client:
+            return -1
+        return await self.client.ttl(key)
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """连接池统计"""
+        if not self.pool:
+            return {"enabled": False}
+        return {
+            "enabled": True,
+            "max_connections": self.pool.max_connections,
+            "in_use_connections": len(getattr(self.pool, "_in_use_connections", ())),
+            "available_connections": len(getattr(self.pool, "_available_connections", ())),
+        }
+
+    async def close(self):
+        """关闭连接池"""
+        if self.client:
+            try:
+                await self.client.aclose() if hasattr(self.client, "aclose") else await self.client.close()
+            except Exception as e:
+                logger.warning(f"关闭异步Redis客户端失败: {e}")
+        if self.pool:
+            await self.pool.disconnect()
+
+
+# 全局实例 - 按URL复用连接池
+_backends: Dict[str, AsyncRedisBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def get_async_redis_backend(redis_url: Optional[str] = None, decode_responses: bool = False) -> AsyncRedisBackend:
+    """获取异步Redis后端（按 URL + 解码方式复用连接池）"""
+    config = AsyncRedisConfig(redis_url)
+    cache_key = f"{config.redis_url}|{decode_responses}"
+    backend = _backends.get(cache_key)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.get(cache_key)
+            if backend is None:
+                backend = AsyncRedisBackend(config, decode_responses=decode_responses)
+                _backends[cache_key] = backend
+    return backend
+
+
+def get_async_redis_client(redis_url: Optional[str] = None, decode_responses: bool = True) -> Optional[aioredis.Redis]:
+    """获取共享连接池上的 redis.asyncio 客户端"""
+    return get_async_redis_backend(redis_url, decode_responses).client
+
+
+async def close_async_redis_backends():
+    """关闭所有异步Redis连接池（应用关闭时调用）"""
+    with _backends_lock:
+        backends = list(_backends.values())
+        _backends.clear()
+    for backend in backends:
+        await backend.close()
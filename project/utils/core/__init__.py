@@ -9,6 +9,8 @@ from .common_utils import (
     _get_text_part,
     _award_points,
     _check_and_award_achievements,
+    record_achievement_event,
+    ACHIEVEMENT_EVENTS,
     
     # 验证和权限相关
     validate_ownership,
@@ -108,6 +110,8 @@ __all__ = [
     "_get_text_part",
     "_award_points",
     "_check_and_award_achievements",
+    "record_achievement_event",
+    "ACHIEVEMENT_EVENTS",
     "validate_ownership",
     "check_admin_permission", 
     "check_resource_permission",
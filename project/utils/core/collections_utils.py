@@ -28,6 +28,7 @@ from project.models import (
     Project, Course, CollectedContent, Folder, 
     ProjectLike, CourseLike, ChatMessage, ForumTopic, Note
 )
+from project.utils.core import folder_hierarchy
 
 # 导入配置
 from project.config.collections_config import (
@@ -534,86 +535,31 @@ def suggest_folder_icon(name: str) -> str:
 
 
 async def calculate_folder_depth(db: Session, folder_id: int) -> int:
-    """计算文件夹深度"""
-    
-    depth = 0
-    current_id = folder_id
-    
-    while current_id:
-        folder = db.query(Folder).filter(Folder.id == current_id).first()
-        if folder and folder.parent_id:
-            depth += 1
-            current_id = folder.parent_id
-        else:
-            break
-    
-    return depth
+    """计算文件夹深度（读取物化路径维护的 depth 列）"""
+    return folder_hierarchy.get_folder_depth(db, folder_id)
 
 
 async def get_folder_path(db: Session, folder_id: int, user_id: int) -> List[Dict[str, Any]]:
-    """获取文件夹路径"""
-    
-    path = []
-    current_id = folder_id
-    
-    while current_id:
-        folder = db.query(Folder).filter(
-            Folder.id == current_id,
-            Folder.owner_id == user_id
-        ).first()
-        
-        if folder:
-            path.insert(0, {
-                "id": folder.id,
-                "name": folder.name,
-                "icon": folder.icon,
-                "color": folder.color
-            })
-            current_id = folder.parent_id
-        else:
-            break
-    
-    return path
+    """获取文件夹路径（按物化路径一次查询全部祖先）"""
+    return [
+        {
+            "id": folder.id,
+            "name": folder.name,
+            "icon": folder.icon,
+            "color": folder.color
+        }
+        for folder in folder_hierarchy.get_folder_breadcrumb(db, folder_id, user_id)
+    ]
 
 
 async def would_create_cycle(db: Session, folder_id: int, new_parent_id: int, user_id: int) -> bool:
     """检查移动文件夹是否会创建循环引用"""
-    
-    current_id = new_parent_id
-    visited = set()
-    
-    while current_id and current_id not in visited:
-        if current_id == folder_id:
-            return True
-        
-        visited.add(current_id)
-        parent_folder = db.query(Folder).filter(
-            Folder.id == current_id,
-            Folder.owner_id == user_id
-        ).first()
-        
-        current_id = parent_folder.parent_id if parent_folder else None
-    
-    return False
+    return folder_hierarchy.would_create_cycle(db, folder_id, new_parent_id)
 
 
 async def get_all_subfolder_ids(db: Session, folder_id: int, user_id: int) -> List[int]:
-    """递归获取所有子文件夹ID"""
-    
-    subfolder_ids = []
-    
-    direct_subfolders = db.query(Folder).filter(
-        Folder.parent_id == folder_id,
-        Folder.owner_id == user_id
-    ).all()
-    
-    for subfolder in direct_subfolders:
-        subfolder_ids.append(subfolder.id)
-        # 递归获取子文件夹的子文件夹
-        nested_ids = await get_all_subfolder_ids(db, subfolder.id, user_id)
-        subfolder_ids.extend(nested_ids)
-    
-    return subfolder_ids
+    """获取所有子文件夹ID（物化路径前缀查询）"""
+    return folder_hierarchy.get_subtree_ids(db, folder_id, user_id)
 
 
 # ================== 内容处理辅助函数 ==================
@@ -5,13 +5,15 @@ from datetime import datetime
 from typing import Any, Optional, Literal, List, Dict
 from sqlalchemy.orm import Session, Query
 from sqlalchemy.sql import func
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, case, update
+from sqlalchemy.exc import IntegrityError
 from fastapi import HTTPException, status
 
-from project.models import User, Project, UserCourse, ForumTopic, ForumComment, ForumLike, ChatMessage, PointTransaction, Achievement, UserAchievement
+from project.models import User, Project, UserCourse, ForumTopic, ForumComment, ForumLike, ChatMessage, PointTransaction, Achievement, UserAchievement, UserActivityCounter
 from project.ai_providers.ai_config import GLOBAL_PLACEHOLDER_ZERO_VECTOR
 from project.ai_providers.embedding_provider import get_embeddings_from_api
 from project.ai_providers.security_utils import decrypt_key
+from project.utils.async_cache.leaderboard import record_points_change
 
 logger = logging.getLogger(__name__)
 
@@ -63,6 +65,8 @@ async def _award_points(
         related_entity_id=related_entity_id
     )
     db.add(transaction)
+    # 事务提交后同步到积分排行榜
+    record_points_change(db, user.id, amount, user.total_points)
 
     logger.debug(
         f"用户 {user.id} 积分变动：{amount}，当前总积分（提交前）：{user.total_points}，原因：{reason}")
@@ -70,19 +74,100 @@ async def _award_points(
     return transaction
 
 
-async def _check_and_award_achievements(db: Session, user_id: int):
-    """
-    检查用户是否达到了任何成就条件，并授予未获得的成就。
-    此函数会定期或在关键事件后调用。它只添加对象到会话，不进行commit。
-    """
-    logger.debug(f"检查用户 {user_id} 的成就")
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        logger.warning(f"用户 {user_id} 不存在")
-        return
+# --- 成就计数器 ---
+
+# 领域事件 -> (计数类型, 增量)；计数类型与 Achievement.criteria_type 一致
+ACHIEVEMENT_EVENTS: Dict[str, tuple] = {
+    "project_completed": ("PROJECT_COMPLETED_COUNT", 1),
+    "course_completed": ("COURSE_COMPLETED_COUNT", 1),
+    "forum_like_received": ("FORUM_LIKES_RECEIVED", 1),
+    "forum_like_removed": ("FORUM_LIKES_RECEIVED", -1),
+    # 话题为软删除，全量统计同样包含已删除话题，因此没有对应的扣减事件
+    "forum_topic_created": ("FORUM_POSTS_COUNT", 1),
+    "chat_message_sent": ("CHAT_MESSAGES_SENT_COUNT", 1),
+    "chat_message_deleted": ("CHAT_MESSAGES_SENT_COUNT", -1),
+}
+
+# 计数器缺失时（历史用户首次触发事件）用于初始化或对账的全量统计
+_ACTIVITY_RECOUNTS = {
+    "PROJECT_COMPLETED_COUNT": lambda db, user_id: db.query(Project.id).filter(
+        Project.creator_id == user_id,
+        Project.project_status == "已完成"
+    ).count(),
+    "COURSE_COMPLETED_COUNT": lambda db, user_id: db.query(UserCourse.course_id).filter(
+        UserCourse.student_id == user_id,
+        UserCourse.status == "completed"
+    ).count(),
+    "FORUM_LIKES_RECEIVED": lambda db, user_id: db.query(ForumLike).filter(
+        or_(
+            # 用户的话题获得的点赞
+            ForumLike.topic_id.in_(db.query(ForumTopic.id).filter(ForumTopic.owner_id == user_id)),
+            # 用户的评论获得的点赞
+            ForumLike.comment_id.in_(db.query(ForumComment.id).filter(ForumComment.owner_id == user_id))
+        )
+    ).count(),
+    "FORUM_POSTS_COUNT": lambda db, user_id: db.query(ForumTopic).filter(ForumTopic.owner_id == user_id).count(),
+    "CHAT_MESSAGES_SENT_COUNT": lambda db, user_id: db.query(ChatMessage).filter(
+        ChatMessage.sender_id == user_id,
+        ChatMessage.deleted_at.is_(None)  # 排除已删除的消息
+    ).count(),
+}
+
+
+def _seed_activity_counter(db: Session, user_id: int, counter_type: str) -> int:
+    """用全量统计初始化（或校正）计数器，返回当前值"""
+    # 会话关闭了 autoflush，先刷出本次事件待写入的行（新消息、删除标记等），统计才包含本次事件
+    db.flush()
+    value = _ACTIVITY_RECOUNTS[counter_type](db, user_id)
+    updated = db.query(UserActivityCounter).filter(
+        UserActivityCounter.user_id == user_id,
+        UserActivityCounter.counter_type == counter_type
+    ).update({UserActivityCounter.value: value}, synchronize_session=False)
+    if not updated:
+        try:
+            with db.begin_nested():
+                db.add(UserActivityCounter(user_id=user_id, counter_type=counter_type, value=value))
+        except IntegrityError:
+            # 并发请求已创建计数器，其统计结果同样基于最新数据
+            pass
+    return value
+
+
+def _increment_activity_counter(db: Session, user_id: int, counter_type: str, delta: int) -> int:
+    """原子递增计数器并返回新值；计数器不存在时按全量统计初始化（已包含本次事件）"""
+    counter_table = UserActivityCounter.__table__
+    new_value = counter_table.c.value + delta
+    row = db.execute(
+        update(counter_table)
+        .where(counter_table.c.user_id == user_id, counter_table.c.counter_type == counter_type)
+        .values(value=case((new_value < 0, 0), else_=new_value), updated_at=func.now())
+        .returning(counter_table.c.value)
+    ).first()
+    if row is not None:
+        return row[0]
+    return _seed_activity_counter(db, user_id, counter_type)
+
+
+def _get_activity_counters(db: Session, user_id: int, recount: bool = False) -> Dict[str, int]:
+    """读取用户全部计数器（一次查询），缺失的按全量统计初始化"""
+    if recount:
+        return {counter_type: _seed_activity_counter(db, user_id, counter_type)
+                for counter_type in _ACTIVITY_RECOUNTS}
+    values = dict(
+        db.query(UserActivityCounter.counter_type, UserActivityCounter.value)
+        .filter(UserActivityCounter.user_id == user_id)
+        .all()
+    )
+    for counter_type in _ACTIVITY_RECOUNTS:
+        if counter_type not in values:
+            values[counter_type] = _seed_activity_counter(db, user_id, counter_type)
+    return values
+
 
-    # 获取所有活跃且未被该用户获取的成就定义
-    unearned_achievements_query = db.query(Achievement).outerjoin(
+async def _award_achievements(db: Session, user_id: int, values: Dict[str, float],
+                              user: Optional[User] = None) -> int:
+    """授予 values 中计数类型已达标、且用户尚未获得的活跃成就，返回授予数量"""
+    unearned_achievements = db.query(Achievement).outerjoin(
         UserAchievement,
         and_(
             UserAchievement.achievement_id == Achievement.id,
@@ -90,109 +175,95 @@ async def _check_and_award_achievements(db: Session, user_id: int):
         )
     ).filter(
         Achievement.is_active == True,  # 仅检查活跃的成就
-        UserAchievement.id.is_(None)  # 用户的 UserAchievement 记录不存在（即尚未获得）
-    )
-
-    unearned_achievements = unearned_achievements_query.all()
-    logger.debug(
-        f"用户 {user_id} 未获得的成就数量: {len(unearned_achievements)}")
-
-    if not unearned_achievements:
-        logger.debug(f"用户 {user_id} 没有未获得的活跃成就")
-        return
-
-    # 预先计算用户相关数据，避免在循环中重复查询
-    user_data_for_achievements = {
-        "PROJECT_COMPLETED_COUNT": db.query(Project.id).filter(
-            Project.creator_id == user_id,
-            Project.project_status == "已完成"
-        ).count(),
-        "COURSE_COMPLETED_COUNT": db.query(UserCourse.course_id).filter(
-            UserCourse.student_id == user_id,
-            UserCourse.status == "completed"
-        ).count(),
-        "FORUM_LIKES_RECEIVED": db.query(ForumLike).filter(
-            or_(
-                # 用户的话题获得的点赞
-                ForumLike.topic_id.in_(db.query(ForumTopic.id).filter(ForumTopic.owner_id == user_id)),
-                # 用户的评论获得的点赞
-                ForumLike.comment_id.in_(db.query(ForumComment.id).filter(ForumComment.owner_id == user_id))
-            )
-        ).count(),
-        "FORUM_POSTS_COUNT": db.query(ForumTopic).filter(ForumTopic.owner_id == user_id).count(),
-        "CHAT_MESSAGES_SENT_COUNT": db.query(ChatMessage).filter(
-            ChatMessage.sender_id == user_id,
-            ChatMessage.deleted_at.is_(None)  # 排除已删除的消息
-        ).count(),
-        "LOGIN_COUNT": user.login_count
-    }
-
-    logger.debug(f"用户 {user_id} 统计数据: {user_data_for_achievements}")
+        UserAchievement.id.is_(None),  # 用户的 UserAchievement 记录不存在（即尚未获得）
+        Achievement.criteria_type.in_(list(values))
+    ).all()
 
     awarded_count = 0
     for achievement in unearned_achievements:
-        is_achieved = False
-        criteria_value = achievement.criteria_value
-
+        current_value = values[achievement.criteria_type]
         logger.debug(
-            f"检查成就 '{achievement.name}' (条件: {achievement.criteria_type}={criteria_value}) for user {user_id}")
-
-        if achievement.criteria_type == "PROJECT_COMPLETED_COUNT":
-            if user_data_for_achievements["PROJECT_COMPLETED_COUNT"] >= criteria_value:
-                is_achieved = True
-        elif achievement.criteria_type == "COURSE_COMPLETED_COUNT":
-            if user_data_for_achievements["COURSE_COMPLETED_COUNT"] >= criteria_value:
-                is_achieved = True
-        elif achievement.criteria_type == "FORUM_LIKES_RECEIVED":
-            if user_data_for_achievements["FORUM_LIKES_RECEIVED"] >= criteria_value:
-                is_achieved = True
-        elif achievement.criteria_type == "FORUM_POSTS_COUNT":
-            if user_data_for_achievements["FORUM_POSTS_COUNT"] >= criteria_value:
-                is_achieved = True
-        elif achievement.criteria_type == "CHAT_MESSAGES_SENT_COUNT":
-            if user_data_for_achievements["CHAT_MESSAGES_SENT_COUNT"] >= criteria_value:
-                is_achieved = True
-        elif achievement.criteria_type == "LOGIN_COUNT":
-            user_login_count_val = user_data_for_achievements["LOGIN_COUNT"]
-            crit_val_float = float(criteria_value)
-            user_count_float = float(user_login_count_val)
-
-            logger.debug(
-                f"成就 '{achievement.name}' 要求登录次数: {crit_val_float}, 用户当前登录次数: {user_count_float}")
-
-            if user_count_float >= crit_val_float:
-                is_achieved = True
-
-            logger.debug(
-                f"登录成就检查结果: {user_count_float} >= {crit_val_float} = {is_achieved}")
-        elif achievement.criteria_type == "DAILY_LOGIN_STREAK":
-            # 保持 is_achieved 为 False (除非额外开发连续登录计数器)。
-            pass
-        if is_achieved:
-            user_achievement = UserAchievement(
-                user_id=user_id,
-                achievement_id=achievement.id,
-                earned_at=func.now(),
-                is_notified=False  # 默认设置为未通知，等待后续推送
+            f"检查成就 '{achievement.name}' (条件: {achievement.criteria_type}={achievement.criteria_value}, "
+            f"当前: {current_value}) for user {user_id}")
+        if current_value is None or float(current_value) < float(achievement.criteria_value):
+            continue
+
+        # 只有确实要授予成就时才加载用户
+        if user is None:
+            user = db.query(User).filter(User.id == user_id).first()
+            if not user:
+                logger.warning(f"用户 {user_id} 不存在")
+                return awarded_count
+
+        user_achievement = UserAchievement(
+            user_id=user_id,
+            achievement_id=achievement.id,
+            earned_at=func.now(),
+            is_notified=False  # 默认设置为未通知，等待后续推送
+        )
+        db.add(user_achievement)
+
+        if achievement.reward_points > 0:
+            await _award_points(
+                db=db,
+                user=user,  # 传递已经存在于会话中的 user 对象
+                amount=achievement.reward_points,
+                reason=f"获得成就：{achievement.name}",
+                transaction_type="EARN",
+                related_entity_type="achievement",
+                related_entity_id=achievement.id
             )
-            db.add(user_achievement)
-
-            if achievement.reward_points > 0:
-                await _award_points(
-                    db=db,
-                    user=user,  # 传递已经存在于会话中的 user 对象
-                    amount=achievement.reward_points,
-                    reason=f"获得成就：{achievement.name}",
-                    transaction_type="EARN",
-                    related_entity_type="achievement",
-                    related_entity_id=achievement.id
-                )
 
-            logger.info(
-                f"用户 {user_id} 获得成就: {achievement.name}，奖励 {achievement.reward_points} 积分")
-            awarded_count += 1
+        logger.info(
+            f"用户 {user_id} 获得成就: {achievement.name}，奖励 {achievement.reward_points} 积分")
+        awarded_count += 1
     if awarded_count > 0:
         logger.info(f"用户 {user_id} 本次共获得 {awarded_count} 个成就")
+    return awarded_count
+
+
+async def record_achievement_event(db: Session, user_id: int, event: str, amount: int = 1) -> int:
+    """
+    记录领域事件：更新对应计数器，并只检查该计数类型下的成就。
+    每个事件一次计数器更新 + 一次成就查询，不再全量统计。它只添加对象到会话，不进行commit。
+
+    Args:
+        db: 数据库会话
+        user_id: 计数归属的用户（例如被点赞内容的作者）
+        event: ACHIEVEMENT_EVENTS 中的事件名
+        amount: 事件次数
+
+    Returns:
+        int: 本次授予的成就数量
+    """
+    if event not in ACHIEVEMENT_EVENTS:
+        raise ValueError(f"未知的成就事件: {event}")
+    counter_type, delta = ACHIEVEMENT_EVENTS[event]
+    value = _increment_activity_counter(db, user_id, counter_type, delta * amount)
+    if delta < 0:
+        # 计数减少不会达成新成就
+        return 0
+    return await _award_achievements(db, user_id, {counter_type: value})
+
+
+async def _check_and_award_achievements(db: Session, user_id: int, recount: bool = False):
+    """
+    检查用户是否达到了任何成就条件，并授予未获得的成就。
+    读取活动计数器判断全部条件类型，recount=True 时先用业务表全量统计校正计数器。
+    它只添加对象到会话，不进行commit。
+    """
+    logger.debug(f"检查用户 {user_id} 的成就")
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        logger.warning(f"用户 {user_id} 不存在")
+        return
+
+    user_data_for_achievements = _get_activity_counters(db, user_id, recount=recount)
+    user_data_for_achievements["LOGIN_COUNT"] = user.login_count or 0
+    # DAILY_LOGIN_STREAK 暂无连续登录计数器，不参与判断
+    logger.debug(f"用户 {user_id} 统计数据: {user_data_for_achievements}")
+
+    await _award_achievements(db, user_id, user_data_for_achievements, user=user)
 
 
 # --- 通用工具函数 ---
@@ -13,7 +13,15 @@ import logging
 logger = logging.getLogger(__name__)
 
 def handle_database_errors(operation_name: str):
-    """统一的数据库错误处理装饰器"""
+    """
+    统一的数据库错误处理装饰器
+
+    支持 @handle_database_errors("操作名") 和不带参数的 @handle_database_errors（以函数名作为操作名）
+    """
+    if callable(operation_name):
+        func = operation_name
+        return handle_database_errors(func.__name__)(func)
+
     def decorator(func):
         @wraps(func)
         async def async_wrapper(*args, **kwargs):
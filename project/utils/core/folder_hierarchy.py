@@ -0,0 +1,305 @@
+# project/utils/core/folder_hierarchy.py
+"""
+文件夹层级查询工具
+
+基于 Folder.path 物化路径（如 "/1/5/9/"）实现层级查询，
+路径在创建/移动文件夹时由 models/course_notes.py 中的事件监听器维护：
+- 深度：读取 depth 列（主键查询）
+- 面包屑：按路径中的祖先ID一次 IN 查询
+- 子树：path 前缀范围查询（idx_folders_path 索引）
+- 循环检查：读取新父文件夹路径，判断是否包含被移动文件夹
+
+已有数据库在应用启动时由 migrate_folder_hierarchy 补齐列并回填路径。
+
+PostgreSQL 使用 LIKE 'prefix%'（text_pattern_ops 索引）；
+其他数据库（如 SQLite）使用等价的字符串范围条件，同样可以走普通B树索引。
+"""
+
+import time
+import logging
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import String, cast, inspect as sa_inspect, select, text, update
+from sqlalchemy.orm import Session
+
+from project.models import Folder, CollectedContent, Note
+from project.models.course_notes import folder_path_ancestor_ids
+
+logger = logging.getLogger(__name__)
+
+
+def subtree_condition(db: Session, prefix: str, include_self: bool = True):
+    """生成"路径以 prefix 开头"的过滤条件"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        condition = Folder.path.like(f"{prefix}%")
+    else:
+        # prefix 以 "/" 结尾，"/" 的下一个字符是 "0"，[prefix, prefix[:-1]+"0") 即前缀区间
+        condition = (Folder.path >= prefix) & (Folder.path < prefix[:-1] + "0")
+    if not include_self:
+        condition = condition & (Folder.path != prefix)
+    return condition
+
+
+def _legacy_path(db: Session, folder_id: int) -> Optional[str]:
+    """path 尚未回填时沿 parent_id 逐级回溯计算路径"""
+    ids, current_id, visited = [], folder_id, set()
+    while current_id is not None and current_id not in visited:
+        visited.add(current_id)
+        row = db.query(Folder.id, Folder.parent_id).filter(Folder.id == current_id).first()
+        if row is None:
+            break
+        ids.insert(0, row.id)
+        current_id = row.parent_id
+    return "/" + "".join(f"{i}/" for i in ids) if ids else None
+
+
+def get_folder_path_string(db: Session, folder_id: int, user_id: Optional[int] = None) -> Optional[str]:
+    """获取文件夹的物化路径，不存在（或不属于该用户）返回 None"""
+    query = db.query(Folder.path).filter(Folder.id == folder_id)
+    if user_id is not None:
+        query = query.filter(Folder.owner_id == user_id)
+    row = query.first()
+    if row is None:
+        return None
+    return row.path or _legacy_path(db, folder_id)
+
+
+def get_folder_depth(db: Session, folder_id: int) -> int:
+    """文件夹深度（根文件夹为0）"""
+    row = db.query(Folder.path, Folder.depth).filter(Folder.id == folder_id).first()
+    if row is None:
+        return 0
+    if row.path:
+        return row.depth
+    path = _legacy_path(db, folder_id)
+    return len(folder_path_ancestor_ids(path)) - 1 if path else 0
+
+
+def get_folder_breadcrumb(db: Session, folder_id: int, user_id: int) -> List[Folder]:
+    """从根到当前文件夹的祖先链（含自身），只包含该用户的文件夹"""
+    path = get_folder_path_string(db, folder_id, user_id)
+    if not path:
+        return []
+    ancestor_ids = folder_path_ancestor_ids(path)
+    folders = db.query(Folder).filter(
+        Folder.id.in_(ancestor_ids),
+        Folder.owner_id == user_id
+    ).all()
+    order = {fid: index for index, fid in enumerate(ancestor_ids)}
+    return sorted(folders, key=lambda folder: order[folder.id])
+
+
+def get_subtree_ids(db: Session, folder_id: int, user_id: Optional[int] = None,
+                    include_self: bool = False) -> List[int]:
+    """获取子树中所有文件夹ID"""
+    path = get_folder_path_string(db, folder_id, user_id)
+    if not path:
+        return []
+    query = db.query(Folder.id).filter(subtree_condition(db, path, include_self))
+    if user_id is not None:
+        query = query.filter(Folder.owner_id == user_id)
+    return [row.id for row in query.all()]
+
+
+def would_create_cycle(db: Session, folder_id: int, new_parent_id: Optional[int]) -> bool:
+    """把 folder_id 移动到 new_parent_id 下是否会形成循环"""
+    if new_parent_id is None:
+        return False
+    if new_parent_id == folder_id:
+        return True
+    parent_path = get_folder_path_string(db, new_parent_id)
+    return bool(parent_path) and f"/{folder_id}/" in parent_path
+
+
+def rebuild_folder_paths(db: Session, force: bool = False) -> int:
+    """
+    回填/重建物化路径，逐层执行（查询次数 = 树的最大深度），返回更新的行数
+
+    force=True 时先清空全部路径再重建，用于修复不一致的数据。
+    """
+    folders = Folder.__table__
+    updated = 0
+    if force:
+        db.execute(update(folders).values(path=None))
+
+    # 根文件夹（以及父文件夹已不存在的孤儿）
+    existing_ids = select(folders.c.id).scalar_subquery()
+    updated += db.execute(
+        update(folders)
+        .where(folders.c.path.is_(None))
+        .where(folders.c.parent_id.is_(None) | folders.c.parent_id.not_in(existing_ids))
+        .values(path="/" + cast(folders.c.id, String) + "/", depth=0)
+    ).rowcount
+
+    parent = folders.alias("parent")
+    parent_path = select(parent.c.path).where(parent.c.id == folders.c.parent_id).scalar_subquery()
+    parent_depth = select(parent.c.depth).where(parent.c.id == folders.c.parent_id).scalar_subquery()
+    ready_parents = select(parent.c.id).where(parent.c.path.is_not(None))
+    while True:
+        rowcount = db.execute(
+            update(folders)
+            .where(folders.c.path.is_(None))
+            .where(folders.c.parent_id.in_(ready_parents))
+            .values(path=parent_path + cast(folders.c.id, String) + "/", depth=parent_depth + 1)
+        ).rowcount
+        if not rowcount:
+            break
+        updated += rowcount
+
+    remaining = db.query(Folder.id).filter(Folder.path.is_(None)).count()
+    if remaining:
+        logger.warning(f"有 {remaining} 个文件夹存在循环的 parent_id，无法计算物化路径")
+    db.commit()
+    return updated
+
+
+def ensure_folder_hierarchy_schema(engine) -> bool:
+    """
+    为已有数据库补充 folders.path / folders.depth 列和前缀索引（create_all 不会修改已存在的表）
+
+    返回是否执行了结构变更；变更后需调用 rebuild_folder_paths 回填数据。
+    """
+    columns = {column["name"] for column in sa_inspect(engine).get_columns("folders")}
+    changed = False
+    with engine.begin() as conn:
+        if "path" not in columns:
+            conn.execute(text("ALTER TABLE folders ADD COLUMN path VARCHAR(1024)"))
+            changed = True
+        if "depth" not in columns:
+            conn.execute(text("ALTER TABLE folders ADD COLUMN depth INTEGER NOT NULL DEFAULT 0"))
+            changed = True
+        if engine.dialect.name == "postgresql":
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS idx_folders_path ON folders (path text_pattern_ops)"
+            ))
+        else:
+            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_folders_path ON folders (path)"))
+    return changed
+
+
+def migrate_folder_hierarchy(engine) -> int:
+    """
+    启动时调用：补齐 path/depth 列，并为尚无路径的文件夹回填，返回回填的行数
+
+    必须在处理请求前完成，否则旧库上查询 Folder 会因缺列失败。
+    """
+    if not sa_inspect(engine).has_table("folders"):
+        return 0
+    if not ensure_folder_hierarchy_schema(engine):
+        with engine.connect() as conn:
+            if conn.execute(text("SELECT 1 FROM folders WHERE path IS NULL LIMIT 1")).first() is None:
+                return 0
+    db = Session(bind=engine)
+    try:
+        updated = rebuild_folder_paths(db)
+    finally:
+        db.close()
+    logger.info(f"文件夹物化路径回填完成，更新 {updated} 行")
+    return updated
+
+
+# ================== 基准测试 ==================
+
+def _legacy_depth(db: Session, folder_id: int) -> int:
+    depth, current_id = 0, folder_id
+    while current_id:
+        folder = db.query(Folder).filter(Folder.id == current_id).first()
+        if folder and folder.parent_id:
+            depth += 1
+            current_id = folder.parent_id
+        else:
+            break
+    return depth
+
+
+def _legacy_would_create_cycle(db: Session, folder_id: int, new_parent_id: int) -> bool:
+    current_id, visited = new_parent_id, set()
+    while current_id and current_id not in visited:
+        if current_id == folder_id:
+            return True
+        visited.add(current_id)
+        parent = db.query(Folder).filter(Folder.id == current_id).first()
+        current_id = parent.parent_id if parent else None
+    return False
+
+
+def _legacy_subtree(db: Session, folder_id: int) -> List[int]:
+    ids = []
+    for child in db.query(Folder).filter(Folder.parent_id == folder_id).all():
+        ids.append(child.id)
+        ids.extend(_legacy_subtree(db, child.id))
+    return ids
+
+
+def benchmark_folder_hierarchy(levels: int = 10, total_folders: int = 10000,
+                               iterations: int = 200) -> Dict[str, Dict[str, Any]]:
+    """
+    在内存SQLite中构建 levels 层、共 total_folders 个文件夹的树，
+    对比逐层回溯（旧实现）与物化路径的深度、面包屑、子树和循环检查耗时
+
+    返回 {"depth": {"legacy_ms": ..., "materialized_ms": ...}, ...}，均为单次操作平均毫秒数
+    """
+    import random
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    engine = create_engine("sqlite://")
+    Folder.__table__.create(engine)
+    CollectedContent.__table__.create(engine, checkfirst=True)
+    Note.__table__.create(engine, checkfirst=True)
+    db = sessionmaker(bind=engine)()
+
+    # 少量根文件夹，其余节点均匀分配到各层，每个节点随机挂到上一层
+    root_count = max(1, total_folders // 1000)
+    per_level = max(1, (total_folders - root_count) // max(1, levels - 1))
+    previous_level: List[Folder] = []
+    for level in range(levels):
+        current_level = [
+            Folder(name=f"L{level}-{i}", owner_id=1,
+                   parent_id=random.choice(previous_level).id if previous_level else None)
+            for i in range(per_level if level else root_count)
+        ]
+        db.add_all(current_level)
+        db.flush()
+        previous_level = current_level
+    db.commit()
+
+    leaves = [folder.id for folder in previous_level]
+    roots = [row.id for row in db.query(Folder.id).filter(Folder.parent_id.is_(None)).all()]
+
+    def timed(func, ids, n: int = iterations) -> float:
+        start = time.perf_counter()
+        for _ in range(n):
+            func(random.choice(ids))
+        return (time.perf_counter() - start) * 1000 / n
+
+    # 旧的子树递归每个节点一次查询，减少迭代次数
+    subtree_iterations = max(1, iterations // 20)
+    results = {
+        "depth": {
+            "legacy_ms": timed(lambda fid: _legacy_depth(db, fid), leaves),
+            "materialized_ms": timed(lambda fid: get_folder_depth(db, fid), leaves),
+        },
+        "breadcrumb": {
+            "legacy_ms": timed(lambda fid: _legacy_path(db, fid), leaves),
+            "materialized_ms": timed(lambda fid: get_folder_breadcrumb(db, fid, 1), leaves),
+        },
+        "cycle_check": {
+            "legacy_ms": timed(lambda fid: _legacy_would_create_cycle(db, roots[0], fid), leaves),
+            "materialized_ms": timed(lambda fid: would_create_cycle(db, roots[0], fid), leaves),
+        },
+        "subtree": {
+            "legacy_ms": timed(lambda fid: _legacy_subtree(db, fid), roots, subtree_iterations),
+            "materialized_ms": timed(lambda fid: get_subtree_ids(db, fid), roots, subtree_iterations),
+        },
+    }
+    results["tree"] = {"levels": levels, "folders": db.query(Folder.id).count()}
+    db.close()
+    engine.dispose()
+    return results
+
+
+if __name__ == "__main__":
+    for _name, _stats in benchmark_folder_hierarchy().items():
+        print(f"{_name:12s} {_stats}")
@@ -25,6 +25,7 @@ def initialize_system_data(db: Session) -> dict:
     
     results = {
         "achievements_inserted": 0,
+        "folder_paths_backfilled": 0,
         "errors": []
     }
     
@@ -33,6 +34,10 @@ def initialize_system_data(db: Session) -> dict:
         achievements_count = AchievementPointsService.initialize_default_achievements(db)
         results["achievements_inserted"] = achievements_count
         
+        # 补齐文件夹物化路径（旧库新增列后回填，已有路径的行不会被改动）
+        from project.utils.core.folder_hierarchy import migrate_folder_hierarchy
+        results["folder_paths_backfilled"] = migrate_folder_hierarchy(db.get_bind())
+        
         logger.info(f"系统基础数据初始化完成: {results}")
         
     except Exception as e:
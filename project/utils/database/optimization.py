@@ -8,7 +8,7 @@ from typing import List, Dict, Any, Optional, Tuple
 from functools import wraps
 
 from project.models import ForumTopic, ForumComment, ForumLike, User, UserFollow
-from ..async_cache.cache_manager import EnhancedCacheManager
+from ..async_cache.cache_manager import get_cache_manager_instance
 
 logger = logging.getLogger(__name__)
 
@@ -20,7 +20,7 @@ def get_cache_manager():
     global _cache_manager
     if _cache_manager is None:
         try:
-            _cache_manager = EnhancedCacheManager()
+            _cache_manager = get_cache_manager_instance()
         except Exception as e:
             logger.warning(f"无法初始化增强缓存管理器: {e}")
             # 使用简单的内存缓存作为fallback
@@ -44,6 +44,18 @@ class SimpleFallbackCache:
             del self.cache[key]
             return True
         return False
+    
+    def delete_pattern(self, pattern: str) -> int:
+        import fnmatch
+        keys = [k for k in self.cache if fnmatch.fnmatch(k, pattern)]
+        for key in keys:
+            del self.cache[key]
+        return len(keys)
+    
+    def get_or_compute(self, key: str, compute, expire: int = 300, **kwargs) -> any:
+        if key not in self.cache:
+            self.cache[key] = compute()
+        return self.cache[key]
 
 def cache_result(key_prefix="", expire=300):
     """增强版缓存装饰器"""
@@ -71,8 +83,8 @@ class ForumCache:
     """论坛缓存工具类"""
     
     @staticmethod
-    def get_hot_topics_cache_key(time_range_hours: int = 24):
-        return f"forum:hot_topics:{time_range_hours}h"
+    def get_hot_topics_cache_key(time_range_hours: int = 24, limit: int = 20):
+        return f"forum:hot_topics:{time_range_hours}h:{limit}"
     
     @staticmethod
     def get_user_cache_key(user_id: int):
@@ -88,8 +100,7 @@ class ForumCache:
     def invalidate_hot_topics_cache():
         """清除热门话题缓存"""
         cache_mgr = get_cache_manager()
-        for hours in [1, 6, 24, 168]:  # 1小时, 6小时, 24小时, 1周
-            cache_mgr.delete(ForumCache.get_hot_topics_cache_key(hours))
+        cache_mgr.delete_pattern("forum:hot_topics:*")
 
 logger = logging.getLogger(__name__)
 
@@ -164,10 +175,9 @@ class ForumQueryOptimizer:
     """论坛查询优化器"""
     
     @staticmethod
-    @cache_result(key_prefix="forum", expire=300)  # 缓存5分钟
     def get_hot_topics(db: Session, limit: int = 20, time_range_hours: int = 24) -> List[Dict[str, Any]]:
-        """获取热门话题（优化版）"""
-        try:
+        """获取热门话题（优化版，缓存5分钟，过期重算由单个请求完成）"""
+        def compute() -> List[Dict[str, Any]]:
             # 计算时间范围
             time_threshold = datetime.now() - timedelta(hours=time_range_hours)
             
@@ -215,7 +225,11 @@ class ForumQueryOptimizer:
                 })
             
             return result
-            
+        
+        try:
+            return get_cache_manager().get_or_compute(
+                ForumCache.get_hot_topics_cache_key(time_range_hours, limit), compute, expire=300
+            )
         except Exception as e:
             logger.error(f"获取热门话题失败: {e}")
             return []
@@ -35,6 +35,12 @@ from .llm_prometheus_monitor import (
 # MCP 性能监控
 from .mcp_performance_monitor import mcp_performance_monitor, McpPerformanceMonitor
 
+# 指标时间序列存储
+from .timeseries_store import TimeSeriesStore, memory_budget
+
+# 可合并的分位数草图
+from .quantile_sketch import DDSketch, WindowedSketch, SketchRegistry, merge_sketches
+
 __all__ = [
     # Alert Manager
     'get_alert_manager',
@@ -63,4 +69,14 @@ __all__ = [
     # MCP 性能监控
     'mcp_performance_monitor',
     'McpPerformanceMonitor',
+    
+    # 指标时间序列存储
+    'TimeSeriesStore',
+    'memory_budget',
+    
+    # 分位数草图
+    'DDSketch',
+    'WindowedSketch',
+    'SketchRegistry',
+    'merge_sketches',
 ]
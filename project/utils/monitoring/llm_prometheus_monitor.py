@@ -37,6 +37,8 @@ except ImportError:
     
     Counter = Histogram = Gauge = Summary = Info = MockMetric
 
+from project.database_monitoring import CHECKOUT_WAIT_BUCKETS
+from project.utils.async_cache.async_tasks import TASK_LATENCY_BUCKETS, add_latency_listener
 from project.utils.async_cache.llm_cache_service import get_llm_cache_service
 from project.utils.async_cache.llm_distributed_cache import get_llm_cache
 
@@ -71,6 +73,8 @@ class LLMPrometheusMonitor:
         self._monitoring_active = False
         self._collection_thread = None
         self._metrics_data = defaultdict(list)
+        # 各累计计数上次采集到的值，用于把快照差值累加到Counter
+        self._totals_seen: Dict[Any, float] = {}
         
         # 性能基线数据
         self._baseline_data = {}
@@ -107,6 +111,104 @@ class LLMPrometheusMonitor:
             registry=self.config.registry
         )
         
+        self.cache_tier_hit_ratio = Gauge(
+            f'{namespace}_cache_tier_hit_ratio',
+            '应用缓存分层命中率（L1进程内 / L2 Redis）',
+            ['tier'],
+            registry=self.config.registry
+        )
+        
+        self.cache_tier_items = Gauge(
+            f'{namespace}_cache_tier_items',
+            '应用缓存L1条目数',
+            ['tier'],
+            registry=self.config.registry
+        )
+        
+        self.cache_tier_evictions = Counter(
+            f'{namespace}_cache_tier_evictions',
+            '应用缓存L1淘汰次数',
+            ['tier'],
+            registry=self.config.registry
+        )
+        
+        self.cache_recomputations_per_expiry = Gauge(
+            f'{namespace}_cache_recomputations_per_expiry',
+            '应用缓存每次过期的平均重算次数（接近1表示无缓存击穿）',
+            registry=self.config.registry
+        )
+        
+        self.cache_stale_served = Counter(
+            f'{namespace}_cache_stale_served',
+            '应用缓存重算期间返回旧值的次数',
+            registry=self.config.registry
+        )
+        
+        self.task_queue_depth = Gauge(
+            f'{namespace}_task_queue_depth',
+            '后台任务队列深度',
+            ['state'],
+            registry=self.config.registry
+        )
+        
+        self.task_queue_latency = Histogram(
+            f'{namespace}_task_queue_latency_seconds',
+            '后台任务排队等待/执行耗时',
+            ['stage'],
+            buckets=[upper for upper in TASK_LATENCY_BUCKETS if upper != float('inf')],
+            registry=self.config.registry
+        )
+        # 每个任务的耗时直接记入直方图，可跨工作进程聚合分位数
+        add_latency_listener(lambda stage, seconds: self.task_queue_latency.labels(stage=stage).observe(seconds))
+        
+        # === 数据库连接池指标 ===
+        self.db_pool_connections = Gauge(
+            f'{namespace}_db_pool_connections',
+            '数据库连接池连接数',
+            ['engine', 'state'],
+            registry=self.config.registry
+        )
+        
+        # 分位数用 histogram_quantile() 计算，可跨实例聚合
+        self.db_pool_checkout_wait = Histogram(
+            f'{namespace}_db_pool_checkout_wait_seconds',
+            '数据库连接获取等待时间',
+            ['engine'],
+            buckets=[upper for upper in CHECKOUT_WAIT_BUCKETS if upper != float('inf')],
+            registry=self.config.registry
+        )
+        
+        self.db_pool_events = Counter(
+            f'{namespace}_db_pool_events',
+            '数据库连接池事件数（获取、超时、长时间持有、ping、ping失败、失效）',
+            ['engine', 'event'],
+            registry=self.config.registry
+        )
+        self._register_db_pool_listeners()
+        
+        # === SQL语句指标（按接口） ===
+        self.db_request_queries = Gauge(
+            f'{namespace}_db_request_queries',
+            '每个请求执行的SQL语句数',
+            ['endpoint', 'stat'],
+            registry=self.config.registry
+        )
+        
+        self.db_request_time = Gauge(
+            f'{namespace}_db_request_time_seconds',
+            '每个请求的数据库总耗时',
+            ['endpoint', 'stat'],
+            registry=self.config.registry
+        )
+        
+        self.db_n_plus_one_requests = Counter(
+            f'{namespace}_db_n_plus_one_requests',
+            '检测到 N+1 查询的请求数',
+            ['endpoint'],
+            registry=self.config.registry
+        )
+        self._register_n_plus_one_listener()
+        
         self.cache_memory_usage = Gauge(
             f'{namespace}_cache_memory_usage_bytes',
             'LLM缓存内存使用量',
@@ -231,6 +333,9 @@ class LLMPrometheusMonitor:
         while self._monitoring_active:
             try:
                 self._collect_cache_metrics()
+                self._collect_task_queue_metrics()
+                self._collect_db_pool_metrics()
+                self._collect_sql_query_metrics()
                 self._collect_system_metrics()
                 self._update_baseline_comparison()
                 
@@ -265,6 +370,105 @@ class LLMPrometheusMonitor:
                 
         except Exception as e:
             logger.error(f"收集缓存指标失败: {e}")
+        
+        self._collect_app_cache_tier_metrics()
+    
+    def _inc_by_total(self, counter, key: Any, total: float):
+        """按累计值与上次采集值之差递增Counter；累计值变小说明来源被重建，当前值即为增量"""
+        seen = self._totals_seen.get(key, 0)
+        delta = total - seen if total >= seen else total
+        if delta > 0:
+            counter.inc(delta)
+        self._totals_seen[key] = total
+    
+    def _collect_app_cache_tier_metrics(self):
+        """收集应用缓存（EnhancedCacheManager）的分层指标"""
+        try:
+            import importlib
+            # 包级别的 cache_manager 名称是代理对象，这里需要取模块本身
+            app_cache = importlib.import_module('project.utils.async_cache.cache_manager')
+            
+            # 仅在缓存管理器已被使用时采集，避免为监控而初始化Redis连接
+            manager = app_cache._cache_manager_instance
+            if manager is None:
+                return
+            
+            tier_stats = manager.get_tier_stats()
+            for tier in ('l1', 'l2'):
+                self.cache_tier_hit_ratio.labels(tier=tier).set(tier_stats[tier]['hit_ratio'])
+            self.cache_tier_hit_ratio.labels(tier='overall').set(tier_stats['overall_hit_ratio'])
+            self.cache_tier_items.labels(tier='l1').set(tier_stats['l1']['items'])
+            self._inc_by_total(self.cache_tier_evictions.labels(tier='l1'), 'cache_tier_evictions', tier_stats['l1']['evictions'])
+            self.cache_memory_usage.labels(cache_type='app_l1').set(tier_stats['l1']['bytes_used'])
+            
+            recompute_stats = manager.metrics.get_recompute_stats()
+            self.cache_recomputations_per_expiry.set(recompute_stats['recomputations_per_expiry'])
+            self._inc_by_total(self.cache_stale_served, 'cache_stale_served', recompute_stats['stale_served'])
+            
+        except Exception as e:
+            logger.error(f"收集应用缓存分层指标失败: {e}")
+    
+    def _collect_task_queue_metrics(self):
+        """收集后台任务队列深度（耗时由监听器直接记入直方图）"""
+        try:
+            from project.utils.async_cache.async_tasks import task_queue
+            
+            stats = task_queue.snapshot_stats()
+            self.task_queue_depth.labels(state='queued').set(stats['queue_size'])
+            self.task_queue_depth.labels(state='running').set(stats['running_tasks'])
+            
+        except Exception as e:
+            logger.error(f"收集任务队列指标失败: {e}")
+    
+    def _register_db_pool_listeners(self):
+        """连接获取等待时间在 _do_get 中直接记入直方图，累计事件直接计数"""
+        from project.database_monitoring import POOL_EVENTS, add_pool_listener, get_pool_metrics
+        
+        # 监控器创建前已发生的事件先补记到计数器
+        for engine_name, stats in get_pool_metrics().items():
+            for event_name in POOL_EVENTS:
+                if stats[event_name]:
+                    self.db_pool_events.labels(engine=engine_name, event=event_name).inc(stats[event_name])
+        add_pool_listener(
+            on_wait=lambda engine_name, seconds: self.db_pool_checkout_wait.labels(engine=engine_name).observe(seconds),
+            on_event=lambda engine_name, event_name: self.db_pool_events.labels(engine=engine_name, event=event_name).inc()
+        )
+    
+    def _collect_db_pool_metrics(self):
+        """收集数据库连接池连接数（等待时间与事件计数由监听器实时更新）"""
+        try:
+            from project.database_monitoring import get_pool_metrics
+            
+            for engine_name, stats in get_pool_metrics().items():
+                for state in ('size', 'in_use', 'idle', 'overflow', 'suggested_pool_size'):
+                    self.db_pool_connections.labels(engine=engine_name, state=state).set(stats[state])
+            
+        except Exception as e:
+            logger.error(f"收集数据库连接池指标失败: {e}")
+    
+    def _register_n_plus_one_listener(self):
+        """N+1 查询在记录请求时直接计数，标签只包含出现过 N+1 的接口"""
+        from project.database_monitoring import add_n_plus_one_listener, get_n_plus_one_counts
+        
+        # 监控器创建前已记录的 N+1 请求先补记到计数器
+        for endpoint, count in get_n_plus_one_counts().items():
+            self.db_n_plus_one_requests.labels(endpoint=endpoint).inc(count)
+        add_n_plus_one_listener(lambda endpoint: self.db_n_plus_one_requests.labels(endpoint=endpoint).inc())
+    
+    def _collect_sql_query_metrics(self):
+        """收集按接口汇总的SQL语句指标（只导出最差的50个接口，控制标签数量）"""
+        try:
+            from project.database_monitoring import get_sql_stats
+            
+            for item in get_sql_stats(limit=50)['endpoints']:
+                endpoint = item['endpoint']
+                self.db_request_queries.labels(endpoint=endpoint, stat='avg').set(item['queries_avg'])
+                self.db_request_queries.labels(endpoint=endpoint, stat='max').set(item['queries_max'])
+                self.db_request_time.labels(endpoint=endpoint, stat='avg').set(item['db_ms_avg'] / 1000)
+                self.db_request_time.labels(endpoint=endpoint, stat='max').set(item['db_ms_max'] / 1000)
+            
+        except Exception as e:
+            logger.error(f"收集SQL语句指标失败: {e}")
     
     def _collect_system_metrics(self):
         """收集系统健康指标"""
@@ -0,0 +1,360 @@
+# project/utils/monitoring/quantile_sketch.py
+"""
+可合并的分位数草图（DDSketch）
+
+按对数间隔分桶：值 x 落入桶 ceil(log_gamma(x))，gamma = (1 + α) / (1 - α)，
+每个桶的代表值与桶内任意值的相对误差不超过 α，因此任意分位数的相对误差不超过 α。
+桶计数保存在定长上限的 numpy 数组里（超过 max_bins 时合并最低的桶，只影响最低分位数），
+内存与样本数无关；相同 α 的草图逐桶相加即可合并，合并结果与单个草图处理全部样本完全相同。
+
+- DDSketch：单个草图，支持批量添加、合并、紧凑序列化
+- WindowedSketch：由轮转子草图组成的滑动窗口（如 1 分钟 = 6 个 10 秒子草图）
+- SketchRegistry：按 (provider, model, metric) 维护 1m/5m/1h 窗口，
+  工作进程把窗口草图推送到 Redis，聚合端合并为集群级分位数
+"""
+
+import math
+import os
+import struct
+import time
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+SKETCH_RELATIVE_ACCURACY = float(os.getenv("SKETCH_RELATIVE_ACCURACY", "0.005"))
+SKETCH_MAX_BINS = int(os.getenv("SKETCH_MAX_BINS", "2048"))
+SKETCH_PUSH_TTL = int(os.getenv("SKETCH_PUSH_TTL", "120"))  # 工作进程停止推送后其草图保留的秒数
+
+# 小于该值的样本计入零桶（延迟、token 数等非负指标）
+_MIN_VALUE = 1e-9
+_HEADER = struct.Struct("<ddddddiI")
+_WORKERS_KEY = "sketches:workers"
+
+SketchKey = Tuple[str, str, str]
+
+DEFAULT_WINDOWS: Dict[str, Tuple[int, int]] = {
+    "1m": (60, 6),
+    "5m": (300, 10),
+    "1h": (3600, 12),
+}
+
+
+def _worker_key(worker_id: str) -> str:
+    return f"sketches:worker:{worker_id}"
+
+
+class DDSketch:
+    """相对误差为 relative_accuracy 的分位数草图"""
+
+    def __init__(self, relative_accuracy: float = SKETCH_RELATIVE_ACCURACY, max_bins: int = SKETCH_MAX_BINS):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.max_bins = max_bins
+        self.clear()
+
+    def clear(self):
+        self.bins = np.zeros(0, dtype=np.float64)
+        self.offset = 0  # bins[0] 对应的桶号
+        self.zero_count = 0.0
+        self.count = 0.0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    # ---------- 写入 ----------
+
+    def _reserve(self, low: int, high: int):
+        """保证桶号 [low, high] 可写；超出 max_bins 时把最低的桶并入 high - max_bins + 1"""
+        if not len(self.bins):
+            low = max(low, high - self.max_bins + 1)
+            self.bins = np.zeros(high - low + 1, dtype=np.float64)
+            self.offset = low
+            return
+        new_low = min(low, self.offset)
+        new_high = max(high, self.offset + len(self.bins) - 1)
+        new_low = max(new_low, new_high - self.max_bins + 1)
+        if new_low == self.offset and new_high == self.offset + len(self.bins) - 1:
+            return
+        bins = np.zeros(new_high - new_low + 1, dtype=np.float64)
+        shift = self.offset - new_low
+        if shift >= 0:
+            bins[shift:shift + len(self.bins)] = self.bins
+        else:
+            # 被折叠的低位桶计入新的最低桶
+            kept = self.bins[-shift + 1:]
+            bins[0] = self.bins[:-shift + 1].sum()
+            bins[1:1 + len(kept)] = kept
+        self.bins = bins
+        self.offset = new_low
+
+    def add(self, value: float, weight: float = 1.0):
+        self.count += weight
+        self.sum += value * weight
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if value <= _MIN_VALUE:
+            self.zero_count += weight
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        index = key - self.offset
+        if index < 0 or index >= len(self.bins):
+            self._reserve(key, key)
+            index = max(key - self.offset, 0)
+        self.bins[index] += weight
+
+    def add_many(self, values):
+        """批量添加（numpy 向量化）"""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if not len(values):
+            return
+        self.count += len(values)
+        self.sum += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        positive = values[values > _MIN_VALUE]
+        self.zero_count += len(values) - len(positive)
+        if not len(positive):
+            return
+        keys = np.ceil(np.log(positive) / self._log_gamma).astype(np.int64)
+        low, high = int(keys.min()), int(keys.max())
+        self._reserve(low, high)
+        counts = np.bincount(np.maximum(keys - self.offset, 0))
+        self.bins[:len(counts)] += counts
+
+    def merge(self, other: "DDSketch"):
+        """把 other 合并进来（两者的 relative_accuracy 必须相同）"""
+        if not math.isclose(self.gamma, other.gamma):
+            raise ValueError("只能合并相对误差相同的草图")
+        if not other.count:
+            return
+        self.count += other.count
+        self.sum += other.sum
+        self.zero_count += other.zero_count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if not len(other.bins):
+            return
+        other_high = other.offset + len(other.bins) - 1
+        self._reserve(other.offset, other_high)
+        start = other.offset - self.offset
+        if start >= 0:
+            self.bins[start:start + len(other.bins)] += other.bins
+        else:
+            kept = other.bins[-start + 1:]
+            self.bins[0] += other.bins[:-start + 1].sum()
+            self.bins[1:1 + len(kept)] += kept
+
+    # ---------- 查询 ----------
+
+    def quantile(self, q: float) -> float:
+        """第 q 分位数（0 ≤ q ≤ 1），对应排序后第 floor(q * (count - 1)) 个样本；空草图返回 0"""
+        return self.quantiles([q])[0]
+
+    def quantiles(self, qs: Sequence[float]) -> List[float]:
+        if not self.count:
+            return [0.0 for _ in qs]
+        cumulative = np.cumsum(self.bins)
+        results = []
+        for q in qs:
+            rank = math.floor(min(max(q, 0.0), 1.0) * (self.count - 1))
+            if rank < self.zero_count:
+                results.append(max(self.min, 0.0))
+                continue
+            index = int(np.searchsorted(cumulative, rank - self.zero_count, side="right"))
+            index = min(index, len(cumulative) - 1)
+            value = 2 * self.gamma ** (self.offset + index) / (self.gamma + 1)
+            results.append(min(max(value, self.min), self.max))
+        return results
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def summary(self) -> Dict[str, float]:
+        p50, p90, p95, p99 = self.quantiles((0.5, 0.9, 0.95, 0.99))
+        return {
+            "count": int(self.count),
+            "mean": self.mean,
+            "min": self.min if self.count else 0.0,
+            "max": self.max if self.count else 0.0,
+            "p50": p50,
+            "p90": p90,
+            "p95": p95,
+            "p99": p99,
+        }
+
+    # ---------- 序列化 ----------
+
+    def to_bytes(self) -> bytes:
+        """紧凑序列化：固定头部 + 去掉首尾空桶后 zlib 压缩的计数"""
+        nonzero = np.flatnonzero(self.bins)
+        if len(nonzero):
+            first, last = int(nonzero[0]), int(nonzero[-1])
+            bins = self.bins[first:last + 1]
+        else:
+            first, bins = 0, self.bins[:0]
+        header = _HEADER.pack(
+            self.relative_accuracy, self.count, self.zero_count, self.sum,
+            self.min, self.max, self.offset + first, len(bins)
+        )
+        return header + zlib.compress(bins.astype("<u8").tobytes())
+
+    @classmethod
+    def from_bytes(cls, data: bytes, max_bins: int = SKETCH_MAX_BINS) -> "DDSketch":
+        relative_accuracy, count, zero_count, total, minimum, maximum, offset, length = _HEADER.unpack_from(data)
+        sketch = cls(relative_accuracy, max_bins)
+        sketch.count, sketch.zero_count, sketch.sum = count, zero_count, total
+        sketch.min, sketch.max = minimum, maximum
+        sketch.offset = offset
+        bins = np.frombuffer(zlib.decompress(data[_HEADER.size:]), dtype="<u8", count=length)
+        sketch.bins = bins.astype(np.float64)
+        return sketch
+
+    def copy(self) -> "DDSketch":
+        sketch = DDSketch(self.relative_accuracy, self.max_bins)
+        sketch.merge(self)
+        return sketch
+
+
+class WindowedSketch:
+    """
+    滑动窗口草图：sub_windows 个轮转子草图，每个覆盖 window_seconds / sub_windows 秒
+
+    窗口包含当前子区间和之前 sub_windows - 1 个完整子区间，实际覆盖的时长在
+    window_seconds - 子区间长度 与 window_seconds 之间
+    """
+
+    def __init__(self, window_seconds: int, sub_windows: int,
+                 relative_accuracy: float = SKETCH_RELATIVE_ACCURACY, max_bins: int = SKETCH_MAX_BINS):
+        self.window_seconds = window_seconds
+        self.sub_windows = sub_windows
+        self.slot_seconds = window_seconds / sub_windows
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self._slots: List[int] = [-1] * sub_windows
+        self._sketches = [DDSketch(relative_accuracy, max_bins) for _ in range(sub_windows)]
+
+    def _sketch_for(self, now: float) -> DDSketch:
+        slot = int(now // self.slot_seconds)
+        index = slot % self.sub_windows
+        if self._slots[index] != slot:
+            self._slots[index] = slot
+            self._sketches[index].clear()
+        return self._sketches[index]
+
+    def add(self, value: float, now: Optional[float] = None):
+        self._sketch_for(time.time() if now is None else now).add(value)
+
+    def sketch(self, now: Optional[float] = None) -> DDSketch:
+        """当前窗口内所有子草图合并后的草图"""
+        current = int((time.time() if now is None else now) // self.slot_seconds)
+        merged = DDSketch(self.relative_accuracy, self.max_bins)
+        for slot, sketch in zip(self._slots, self._sketches):
+            if current - self.sub_windows < slot <= current:
+                merged.merge(sketch)
+        return merged
+
+
+class SketchRegistry:
+    """按 (provider, model, metric) 维护多个滑动窗口的分位数草图"""
+
+    def __init__(self, windows: Dict[str, Tuple[int, int]] = None,
+                 relative_accuracy: float = SKETCH_RELATIVE_ACCURACY, max_bins: int = SKETCH_MAX_BINS):
+        self.windows = dict(windows or DEFAULT_WINDOWS)
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self._sketches: Dict[SketchKey, Dict[str, WindowedSketch]] = {}
+
+    def record(self, provider: str, model: str, metric: str, value: float, now: Optional[float] = None):
+        key = (provider, model, metric)
+        windows = self._sketches.get(key)
+        if windows is None:
+            windows = self._sketches[key] = {
+                name: WindowedSketch(seconds, subs, self.relative_accuracy, self.max_bins)
+                for name, (seconds, subs) in self.windows.items()
+            }
+        now = time.time() if now is None else now
+        for windowed in windows.values():
+            windowed.add(value, now)
+
+    def keys(self) -> List[SketchKey]:
+        return list(self._sketches)
+
+    def sketch(self, window: str, provider: str = None, model: str = None, metric: str = None,
+               now: Optional[float] = None) -> DDSketch:
+        """合并窗口内所有匹配的键（参数为 None 表示不限）"""
+        merged = DDSketch(self.relative_accuracy, self.max_bins)
+        for (key_provider, key_model, key_metric), windows in self._sketches.items():
+            if ((provider is None or key_provider == provider) and (model is None or key_model == model)
+                    and (metric is None or key_metric == metric)):
+                merged.merge(windows[window].sketch(now))
+        return merged
+
+    def snapshot(self, window: str, now: Optional[float] = None) -> Dict[SketchKey, DDSketch]:
+        return {key: windows[window].sketch(now) for key, windows in self._sketches.items()}
+
+    # ---------- 跨进程汇总 ----------
+
+    async def push(self, redis_client, worker_id: str, ttl: int = SKETCH_PUSH_TTL,
+                   now: Optional[float] = None):
+        """
+        把本进程各窗口的草图写入 Redis（redis_client 需 decode_responses=False），一次管道往返
+
+        哈希 sketches:worker:{worker_id} 的字段为 "窗口|provider|model|metric"
+        """
+        now = time.time() if now is None else now
+        fields = {}
+        for window in self.windows:
+            for (provider, model, metric), sketch in self.snapshot(window, now).items():
+                if sketch.count:
+                    fields[f"{window}|{provider}|{model}|{metric}"] = sketch.to_bytes()
+        key = _worker_key(worker_id)
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.delete(key)
+        if fields:
+            pipe.hset(key, mapping=fields)
+            pipe.expire(key, ttl)
+        pipe.zadd(_WORKERS_KEY, {worker_id: now})
+        pipe.zremrangebyscore(_WORKERS_KEY, "-inf", now - ttl)
+        await pipe.execute()
+
+    @staticmethod
+    async def aggregate(redis_client, window: str, ttl: int = SKETCH_PUSH_TTL,
+                        now: Optional[float] = None) -> Dict[SketchKey, DDSketch]:
+        """合并最近 ttl 秒内推送过的所有工作进程的窗口草图"""
+        now = time.time() if now is None else now
+        workers = await redis_client.zrangebyscore(_WORKERS_KEY, now - ttl, "+inf")
+        if not workers:
+            return {}
+        pipe = redis_client.pipeline(transaction=False)
+        for worker_id in workers:
+            pipe.hgetall(_worker_key(worker_id.decode() if isinstance(worker_id, bytes) else worker_id))
+        merged: Dict[SketchKey, DDSketch] = {}
+        prefix = f"{window}|"
+        for fields in await pipe.execute():
+            for field, data in fields.items():
+                field = field.decode() if isinstance(field, bytes) else field
+                if not field.startswith(prefix):
+                    continue
+                key = tuple(field[len(prefix):].split("|", 2))
+                sketch = DDSketch.from_bytes(data)
+                if key in merged:
+                    merged[key].merge(sketch)
+                else:
+                    merged[key] = sketch
+        return merged
+
+
+def merge_sketches(sketches: Iterable[DDSketch]) -> DDSketch:
+    """合并多个草图（为空时返回空草图）"""
+    merged = None
+    for sketch in sketches:
+        if merged is None:
+            merged = sketch.copy()
+        else:
+            merged.merge(sketch)
+    return merged if merged is not None else DDSketch()
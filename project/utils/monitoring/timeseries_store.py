@@ -0,0 +1,309 @@
+# project/utils/monitoring/timeseries_store.py
+"""
+指标时间序列存储（Redis 定长环形缓冲区）
+
+每个指标每种分辨率对应一个 Redis 字符串，槽位 = (时间戳 // 分辨率) % 槽数，槽位中是定长的打包记录，
+写入用 SETRANGE，按时间范围读取用 GETRANGE（环绕时两段），不需要逐条解码或在客户端按时间过滤：
+- 原始采样：(uint32 秒级时间戳, float64 值)，12 字节
+- 聚合桶：(uint32 桶起始时间, float64 min, float64 max, float64 sum, uint32 count)，32 字节
+槽位中的时间戳与期望不符（从未写入，或是上一圈的旧数据）即视为空槽。
+
+汇总任务按 原始 → 10秒 → 1分钟 → 1小时 → 1天 逐级把已完整的桶聚合到下一级，
+每级只读取上一级自水位线以来的连续区间；min/max/sum/count 可以逐级合并，结果与直接从原始数据计算一致。
+同一秒内的多个原始采样只保留最后一个；晚于水位线到达的采样不会再汇总。
+
+默认保留期下单个指标约占 0.75MB，memory_budget() 给出任意指标数的预算
+（200 个指标约 150MB，其中 1 小时分辨率保留 90 天，覆盖 30 天历史）。
+"""
+
+import os
+import time
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TIMESERIES_RAW_RETENTION = int(os.getenv("TIMESERIES_RAW_RETENTION", "3600"))             # 原始采样 1 小时
+TIMESERIES_10S_RETENTION = int(os.getenv("TIMESERIES_10S_RETENTION", "86400"))            # 10 秒桶 1 天
+TIMESERIES_1M_RETENTION = int(os.getenv("TIMESERIES_1M_RETENTION", str(7 * 86400)))       # 1 分钟桶 7 天
+TIMESERIES_1H_RETENTION = int(os.getenv("TIMESERIES_1H_RETENTION", str(90 * 86400)))     # 1 小时桶 90 天
+TIMESERIES_1D_RETENTION = int(os.getenv("TIMESERIES_1D_RETENTION", str(1095 * 86400)))   # 1 天桶 3 年
+TIMESERIES_ROLLUP_LAG = int(os.getenv("TIMESERIES_ROLLUP_LAG", "2"))                     # 等待迟到采样的秒数
+TIMESERIES_MAX_POINTS = int(os.getenv("TIMESERIES_MAX_POINTS", "1000"))                  # 未指定 step 时的目标点数
+
+RAW_DTYPE = np.dtype([('ts', '<u4'), ('value', '<f8')])
+AGG_DTYPE = np.dtype([('ts', '<u4'), ('min', '<f8'), ('max', '<f8'), ('sum', '<f8'), ('count', '<u4')])
+
+_METRICS_KEY = "tsdb:metrics"
+_ROLLUP_LOCK_KEY = "tsdb:rollup_lock"
+
+
+@dataclass(frozen=True)
+class Resolution:
+    """一种分辨率的环形缓冲区"""
+    name: str
+    step: int       # 秒
+    retention: int  # 秒
+
+    @property
+    def slots(self) -> int:
+        return max(self.retention // self.step, 1)
+
+    @property
+    def dtype(self) -> np.dtype:
+        return RAW_DTYPE if self.name == "raw" else AGG_DTYPE
+
+    def key(self, metric_name: str) -> str:
+        return f"tsdb:{metric_name}:{self.name}"
+
+
+RAW = Resolution("raw", 1, TIMESERIES_RAW_RETENTION)
+ROLLUPS = (
+    Resolution("10s", 10, TIMESERIES_10S_RETENTION),
+    Resolution("1m", 60, TIMESERIES_1M_RETENTION),
+    Resolution("1h", 3600, TIMESERIES_1H_RETENTION),
+    Resolution("1d", 86400, TIMESERIES_1D_RETENTION),
+)
+
+
+def _watermark_key(metric_name: str) -> str:
+    return f"tsdb:{metric_name}:watermarks"
+
+
+def memory_budget(metrics: int, raw: Resolution = RAW,
+                  rollups: Sequence[Resolution] = ROLLUPS) -> Dict[str, Any]:
+    """各分辨率环形缓冲区的字节数（不含 Redis 每个键几十字节的固定开销）"""
+    per_metric = {res.name: res.slots * res.dtype.itemsize for res in (raw, *rollups)}
+    per_metric_total = sum(per_metric.values())
+    return {
+        "per_metric_bytes": per_metric,
+        "per_metric_total_bytes": per_metric_total,
+        "metrics": metrics,
+        "total_bytes": per_metric_total * metrics,
+    }
+
+
+class TimeSeriesStore:
+    """
+    基于 Redis 环形缓冲区的指标存储
+
+    redis_client 必须以 decode_responses=False 创建（读写的是二进制记录）
+    """
+
+    def __init__(self, redis_client, raw: Resolution = RAW, rollups: Sequence[Resolution] = ROLLUPS,
+                 rollup_lag: int = TIMESERIES_ROLLUP_LAG):
+        self.redis_client = redis_client
+        self.raw = raw
+        self.rollups = tuple(rollups)
+        self.rollup_lag = rollup_lag
+
+    # ---------- 写入 ----------
+
+    async def write(self, samples: Iterable[Tuple[str, float, float]]):
+        """批量写入 (指标名, 时间戳秒, 值)，整批一次管道往返"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        names = set()
+        record = np.zeros(1, dtype=RAW_DTYPE)
+        for name, timestamp, value in samples:
+            bucket = int(timestamp) // self.raw.step
+            record['ts'] = bucket * self.raw.step
+            record['value'] = value
+            pipe.setrange(self.raw.key(name), (bucket % self.raw.slots) * RAW_DTYPE.itemsize, record.tobytes())
+            names.add(name)
+        if not names:
+            return
+        pipe.sadd(_METRICS_KEY, *names)
+        await pipe.execute()
+
+    # ---------- 读取 ----------
+
+    def _range_commands(self, pipe, key: str, res: Resolution, first: int, last: int) -> int:
+        """把桶 [first, last) 的 GETRANGE 加入管道（环绕时两段），返回命令数"""
+        size = res.dtype.itemsize
+        start = first % res.slots
+        count = last - first
+        if start + count <= res.slots:
+            pipe.getrange(key, start * size, (start + count) * size - 1)
+            return 1
+        pipe.getrange(key, start * size, res.slots * size - 1)
+        pipe.getrange(key, 0, (start + count - res.slots) * size - 1)
+        return 2
+
+    @staticmethod
+    def _decode(res: Resolution, chunks: List[bytes], first: int, last: int) -> Tuple[np.ndarray, np.ndarray]:
+        """拼接 GETRANGE 结果，返回 (记录数组, 有效掩码)；超出字符串长度的部分按空槽处理"""
+        size = res.dtype.itemsize
+        count = last - first
+        if len(chunks) == 2:
+            first_length = (res.slots - first % res.slots) * size
+            chunks = [chunks[0].ljust(first_length, b'\0'), chunks[1]]
+        buffer = b''.join(chunks).ljust(count * size, b'\0')
+        records = np.frombuffer(buffer, dtype=res.dtype, count=count)
+        expected = (np.arange(first, last, dtype=np.int64) * res.step).astype(np.uint32)
+        valid = records['ts'] == expected
+        if res.dtype is AGG_DTYPE:
+            valid &= records['count'] > 0
+        return records, valid
+
+    def _bucket_range(self, res: Resolution, start: float, end: float, now: float) -> Tuple[int, int]:
+        """[start, end) 覆盖的桶号区间，限制在保留期内"""
+        first = int(start) // res.step
+        last = -(-int(end) // res.step)
+        first = max(first, int(now) // res.step - res.slots + 1, last - res.slots)
+        return first, max(first, last)
+
+    def choose_resolution(self, start: float, end: float, step: Optional[float], now: float) -> Resolution:
+        """满足 step 的最粗分辨率；该分辨率的保留期不覆盖 start 时改用更粗的"""
+        if step is None:
+            step = max((end - start) / TIMESERIES_MAX_POINTS, 1)
+        candidates = (self.raw, *self.rollups)
+        index = 0
+        for position, res in enumerate(candidates):
+            if res.step <= step:
+                index = position
+        while index + 1 < len(candidates) and now - candidates[index].retention > start:
+            index += 1
+        return candidates[index]
+
+    async def query(self, metric_name: str, start: float, end: float, step: Optional[float] = None,
+                    now: Optional[float] = None) -> Tuple[Resolution, np.ndarray]:
+        """
+        读取 [start, end) 的数据，返回 (分辨率, 按时间升序的记录数组)
+
+        原始分辨率返回 RAW_DTYPE 记录；聚合分辨率返回 AGG_DTYPE 记录，step 是分辨率的整数倍时合并到 step
+        """
+        now = time.time() if now is None else now
+        res = self.choose_resolution(start, end, step, now)
+        first, last = self._bucket_range(res, start, end, now)
+        if first == last:
+            return res, np.zeros(0, dtype=res.dtype)
+
+        pipe = self.redis_client.pipeline(transaction=False)
+        self._range_commands(pipe, res.key(metric_name), res, first, last)
+        records, valid = self._decode(res, await pipe.execute(), first, last)
+        records = records[valid]
+
+        if res is not self.raw and step and step > res.step and step % res.step == 0:
+            records = self._merge(records, int(step))
+        return res, records
+
+    @staticmethod
+    def _merge(records: np.ndarray, step: int) -> np.ndarray:
+        """把连续的聚合桶合并为 step 秒一个"""
+        if not len(records):
+            return records
+        groups = records['ts'].astype(np.int64) // step
+        starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+        merged = np.zeros(len(starts), dtype=AGG_DTYPE)
+        merged['ts'] = groups[starts] * step
+        merged['min'] = np.minimum.reduceat(records['min'], starts)
+        merged['max'] = np.maximum.reduceat(records['max'], starts)
+        merged['sum'] = np.add.reduceat(records['sum'], starts)
+        merged['count'] = np.add.reduceat(records['count'].astype(np.int64), starts)
+        return merged
+
+    # ---------- 汇总 ----------
+
+    async def metric_names(self) -> List[str]:
+        return sorted(name.decode() if isinstance(name, bytes) else name
+                      for name in await self.redis_client.smembers(_METRICS_KEY))
+
+    async def rollup(self, now: Optional[float] = None, metric_names: Optional[List[str]] = None,
+                     lock_seconds: int = 0) -> int:
+        """
+        把已完整的桶逐级汇总到下一级分辨率，返回写入的桶数
+
+        lock_seconds > 0 时先获取同名锁（多个进程中只有一个执行本轮汇总），获取失败返回 0
+        """
+        if lock_seconds > 0 and not await self.redis_client.set(_ROLLUP_LOCK_KEY, b"1", nx=True, ex=lock_seconds):
+            return 0
+        now = time.time() if now is None else now
+        names = metric_names if metric_names is not None else await self.metric_names()
+        if not names:
+            return 0
+
+        pipe = self.redis_client.pipeline(transaction=False)
+        for name in names:
+            pipe.hgetall(_watermark_key(name))
+        watermarks = [
+            {(key.decode() if isinstance(key, bytes) else key): int(value) for key, value in marks.items()}
+            for marks in await pipe.execute()
+        ]
+
+        written = 0
+        source = self.raw
+        source_ready = [int(now) - self.rollup_lag for _ in names]
+        for target in self.rollups:
+            ready = []
+            jobs = []
+            for name, marks, source_end in zip(names, watermarks, source_ready):
+                end = source_end // target.step * target.step
+                # 源分辨率已覆盖掉的部分不再读取（停机较久或首次汇总时）
+                oldest = -(-(end - source.slots * source.step) // target.step) * target.step
+                begin = max(marks.get(target.name, oldest), oldest)
+                if begin < end:
+                    jobs.append((name, begin, end))
+                    ready.append(end)
+                else:
+                    ready.append(min(marks.get(target.name, end), end))
+
+            if jobs:
+                written += await self._rollup_level(source, target, jobs, now)
+                pipe = self.redis_client.pipeline(transaction=False)
+                for name, _, end in jobs:
+                    pipe.hset(_watermark_key(name), target.name, end)
+                await pipe.execute()
+            source, source_ready = target, ready
+        return written
+
+    async def _rollup_level(self, source: Resolution, target: Resolution,
+                            jobs: List[Tuple[str, int, int]], now: float) -> int:
+        """对每个 (指标, 起点, 终点) 读取源分辨率区间，按目标桶聚合并写回"""
+        ratio = target.step // source.step
+        pipe = self.redis_client.pipeline(transaction=False)
+        spans = []
+        for name, begin, end in jobs:
+            first, last = begin // source.step, end // source.step
+            spans.append((first, last, self._range_commands(pipe, source.key(name), source, first, last)))
+        replies = await pipe.execute()
+
+        pipe = self.redis_client.pipeline(transaction=False)
+        written = 0
+        offset = 0
+        for (name, begin, end), (first, last, commands) in zip(jobs, spans):
+            records, valid = self._decode(source, replies[offset:offset + commands], first, last)
+            offset += commands
+            buckets = (last - first) // ratio
+            valid = valid.reshape(buckets, ratio)
+            aggregated = np.zeros(buckets, dtype=AGG_DTYPE)
+            aggregated['ts'] = begin + np.arange(buckets, dtype=np.int64) * target.step
+            if source is self.raw:
+                values = records['value'].reshape(buckets, ratio)
+                minimum, maximum, total = values, values, values
+                counts = valid.sum(axis=1)
+            else:
+                minimum = records['min'].reshape(buckets, ratio)
+                maximum = records['max'].reshape(buckets, ratio)
+                total = records['sum'].reshape(buckets, ratio)
+                counts = np.where(valid, records['count'].reshape(buckets, ratio), 0).sum(axis=1)
+            has_data = counts > 0
+            aggregated['min'] = np.where(has_data, np.where(valid, minimum, np.inf).min(axis=1), 0.0)
+            aggregated['max'] = np.where(has_data, np.where(valid, maximum, -np.inf).max(axis=1), 0.0)
+            aggregated['sum'] = np.where(valid, total, 0.0).sum(axis=1)
+            aggregated['count'] = counts
+
+            # 空桶同样写入（count=0），使槽位与水位线保持一致
+            first_bucket = begin // target.step
+            aggregated = aggregated[-target.slots:]
+            first_bucket += buckets - len(aggregated)
+            slot = first_bucket % target.slots
+            head = min(len(aggregated), target.slots - slot)
+            pipe.setrange(target.key(name), slot * AGG_DTYPE.itemsize, aggregated[:head].tobytes())
+            if head < len(aggregated):
+                pipe.setrange(target.key(name), 0, aggregated[head:].tobytes())
+            written += len(aggregated)
+        await pipe.execute()
+        return written
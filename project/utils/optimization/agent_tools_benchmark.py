@@ -0,0 +1,95 @@
+# project/utils/optimization/agent_tools_benchmark.py
+"""
+代理工具并发执行基准
+
+用分别 sleep 200/300/500ms 的桩工具（临时注册到 TOOL_EXECUTORS）验证：
+1. 一轮三个工具：逐个执行约 1s，execute_tools_concurrently 约 0.5s，结果顺序与调用顺序一致
+2. 同一轮中一个工具抛异常、一个超时，其余工具照常返回成功结果
+3. 两步工作流共享 ToolMemo：重复的查询（参数仅空白/键顺序不同）只执行一次
+
+多个工具并发时每个工具会创建独立的数据库会话（不实际连接），需设置 DATABASE_URL。
+
+运行: python -m project.utils.optimization.agent_tools_benchmark
+"""
+import time
+import asyncio
+from collections import Counter
+from typing import Any, Dict, List
+
+from project.ai_providers import agent_orchestrator
+from project.ai_providers.agent_orchestrator import ToolMemo, execute_tool, execute_tools_concurrently
+
+_DELAYS = {"stub_fast": 0.2, "stub_medium": 0.3, "stub_slow": 0.5}
+
+
+def _register_stubs(calls: Counter):
+    def sleeper(name: str, delay: float):
+        async def run(arguments, user_id, db, kb_ids):
+            calls[name] += 1
+            await asyncio.sleep(delay)
+            return {"success": True, "error": None, "data": {"tool": name, "query": arguments.get("query")}}
+        return run
+
+    async def failing(arguments, user_id, db, kb_ids):
+        calls["stub_failing"] += 1
+        await asyncio.sleep(0.1)
+        raise RuntimeError("桩工具失败")
+
+    stubs = {name: sleeper(name, delay) for name, delay in _DELAYS.items()}
+    stubs["stub_failing"] = failing
+    stubs["stub_hanging"] = sleeper("stub_hanging", 10.0)
+    agent_orchestrator.TOOL_EXECUTORS.update(stubs)
+    agent_orchestrator.TOOL_TIMEOUTS["stub_hanging"] = 0.4
+    return list(stubs)
+
+
+def _calls(names: List[str], query: str = "cosbrain") -> List[Dict[str, Any]]:
+    return [{"name": name, "arguments": {"query": query}} for name in names]
+
+
+async def run_benchmark() -> Dict[str, Any]:
+    calls: Counter = Counter()
+    registered = _register_stubs(calls)
+    report: Dict[str, Any] = {}
+    try:
+        turn = _calls(list(_DELAYS))
+
+        start = time.perf_counter()
+        for tool_call in turn:
+            await execute_tool(tool_call["name"], tool_call["arguments"], 1, None)
+        report["sequential_seconds"] = round(time.perf_counter() - start, 3)
+
+        start = time.perf_counter()
+        results = await execute_tools_concurrently(turn, 1, None)
+        report["concurrent_seconds"] = round(time.perf_counter() - start, 3)
+        report["order_preserved"] = [r["tool_name"] for r in results] == [c["name"] for c in turn]
+
+        start = time.perf_counter()
+        results = await execute_tools_concurrently(_calls(["stub_fast", "stub_failing", "stub_hanging", "stub_slow"]), 1, None)
+        report["isolation"] = {
+            "seconds": round(time.perf_counter() - start, 3),
+            "results": {r["tool_name"]: r["result"]["success"] or r["result"]["error"] for r in results},
+        }
+
+        calls.clear()
+        memo = ToolMemo()
+        start = time.perf_counter()
+        await execute_tools_concurrently(_calls(["stub_slow", "stub_fast"], "期末复习资料"), 1, None, memo=memo)
+        # 第二步重复同一查询（空白不同），并在同一轮中重复调用
+        second = [{"name": "stub_slow", "arguments": {"query": " 期末复习资料 "}}] * 2 + _calls(["stub_medium"])
+        await execute_tools_concurrently(second, 1, None, memo=memo)
+        report["workflow_memo"] = {
+            "seconds": round(time.perf_counter() - start, 3),
+            "executions": dict(calls),
+            "memo": memo.get_stats(),
+        }
+    finally:
+        for name in registered:
+            agent_orchestrator.TOOL_EXECUTORS.pop(name, None)
+        agent_orchestrator.TOOL_TIMEOUTS.pop("stub_hanging", None)
+    return report
+
+
+if __name__ == "__main__":
+    for _name, _result in asyncio.run(run_benchmark()).items():
+        print(f"{_name}: {_result}")
@@ -0,0 +1,137 @@
+# project/utils/optimization/behavior_profile_benchmark.py
+"""
+用户画像增量更新基准
+
+1. 一致性：向同一用户写入一段合成行为流（默认10万条），比较增量画像与对整段行为流做内存回放
+   （BehaviorAnalyzer.replay_profile）得到的画像，兴趣/类别/活跃度的最大差异应在容差以内。
+   注意 Redis 中的原始行为列表只保留最近1000条，这里回放用的是完整的内存行为流
+2. 延迟：分别为行为数 10/100/1k/10k 的用户构建画像，对比 incremental 与 replay 两种模式的耗时；
+   增量模式的耗时与行为数无关，回放模式随行为数（上限1000）线性增长
+
+默认使用 fakeredis（需安装 fakeredis 和 lupa 以支持 Lua 脚本），未安装时连接 REDIS_URL。
+
+运行: python -m project.utils.optimization.behavior_profile_benchmark [一致性校验行为数] [每档重复次数]
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from project.utils.recommendation import behavior_analyzer as analyzer_module
+from project.utils.recommendation.behavior_analyzer import BehaviorAnalyzer, UserAction, UserBehavior
+
+_TAGS = [f"tag{i}" for i in range(200)]
+_CATEGORIES = ["math", "physics", "cs", "history", "language", "art", "biology", "economics"]
+_FORMATS = ["pdf", "docx", "pptx", "mp4", "md"]
+
+
+def _create_redis_client():
+    try:
+        from fakeredis.aioredis import FakeRedis
+        return FakeRedis()
+    except ImportError:
+        import redis.asyncio as redis
+        return redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+
+
+def _behavior_stream(user_id: int, count: int, seed: int, now: datetime, span_days: int = 120) -> List[UserBehavior]:
+    """按时间顺序生成行为：标签按 Zipf 分布偏斜，时间均匀分布在最近 span_days 天内"""
+    rng = random.Random(seed)
+    actions = list(UserAction)
+    tag_weights = [1.0 / (rank + 1) for rank in range(len(_TAGS))]
+    offsets = sorted((rng.uniform(0, span_days * 86400) for _ in range(count)), reverse=True)
+    return [
+        UserBehavior(
+            user_id=user_id,
+            action=rng.choice(actions),
+            document_id=rng.randrange(10000),
+            kb_id=rng.randrange(100),
+            timestamp=now - timedelta(seconds=offset),
+            session_id=f"s{rng.randrange(1000)}",
+            metadata={
+                "tags": rng.choices(_TAGS, weights=tag_weights, k=rng.randint(1, 4)),
+                "category": rng.choice(_CATEGORIES),
+                "format": rng.choice(_FORMATS),
+            }
+        )
+        for offset in offsets
+    ]
+
+
+def _max_difference(left: Dict[str, float], right: Dict[str, float]) -> float:
+    keys = set(left) | set(right)
+    return max((abs(left.get(key, 0.0) - right.get(key, 0.0)) for key in keys), default=0.0)
+
+
+async def _write(analyzer: BehaviorAnalyzer, behaviors: List[UserBehavior]):
+    for behavior in behaviors:
+        await analyzer.record_behavior(behavior)
+
+
+async def _time_profile(analyzer: BehaviorAnalyzer, mode: str, user_id: int, repeats: int) -> float:
+    analyzer_module.BEHAVIOR_PROFILE_MODE = mode
+    start = time.perf_counter()
+    for _ in range(repeats):
+        await analyzer.build_user_profile(user_id)
+    return (time.perf_counter() - start) * 1000 / repeats
+
+
+async def run_benchmark(events: int = 100000, repeats: int = 20, seed: int = 42,
+                        tolerance: float = 1e-6) -> Dict[str, Any]:
+    """
+    返回 {"consistency": {...}, "latency_ms": {行为数: {"incremental": 毫秒, "replay": 毫秒}}}
+    """
+    original_mode = analyzer_module.BEHAVIOR_PROFILE_MODE
+    client = _create_redis_client()
+    analyzer = BehaviorAnalyzer(client)
+    now = datetime.now()
+    user_ids = [1, 100, 101, 102, 103]
+    try:
+        analyzer_module.BEHAVIOR_PROFILE_MODE = "incremental"
+        stream = _behavior_stream(1, events, seed, now)
+        write_start = time.perf_counter()
+        await _write(analyzer, stream)
+        write_ms = (time.perf_counter() - write_start) * 1000
+
+        incremental = await analyzer.build_user_profile_incremental(1, now)
+        replayed = analyzer.replay_profile(1, stream, now)
+        differences = {
+            "interests": _max_difference(incremental.interests, replayed.interests),
+            "categories": _max_difference(incremental.categories, replayed.categories),
+            "activity_level": abs(incremental.activity_level - replayed.activity_level),
+        }
+        consistency = {
+            "events": events,
+            "write_us_per_event": round(write_ms * 1000 / max(events, 1), 2),
+            "max_differences": differences,
+            "consistent": all(value <= tolerance for value in differences.values()),
+        }
+
+        latency = {}
+        for index, count in enumerate((10, 100, 1000, 10000)):
+            user_id = user_ids[index + 1]
+            analyzer_module.BEHAVIOR_PROFILE_MODE = "incremental"
+            await _write(analyzer, _behavior_stream(user_id, count, seed + index, now))
+            latency[count] = {
+                "incremental": round(await _time_profile(analyzer, "incremental", user_id, repeats), 3),
+                "replay": round(await _time_profile(analyzer, "replay", user_id, repeats), 3),
+            }
+        return {"consistency": consistency, "latency_ms": latency}
+    finally:
+        analyzer_module.BEHAVIOR_PROFILE_MODE = original_mode
+        for user_id in user_ids:
+            await client.delete(f"user_behavior:{user_id}", f"user_profile:{user_id}",
+                                *BehaviorAnalyzer._profile_keys(user_id))
+        await client.aclose()
+
+
+if __name__ == "__main__":
+    _events = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    _repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    _report = asyncio.run(run_benchmark(_events, _repeats))
+    print(f"一致性校验: {_report['consistency']}")
+    for _count, _timings in _report["latency_ms"].items():
+        print(f"{_count:>6d} 条行为: {_timings}")
@@ -0,0 +1,144 @@
+# project/utils/optimization/cache_loop_lag.py
+"""
+缓存访问方式的事件循环延迟基准
+
+与 db_loop_lag 相同，用每 10ms 唤醒一次的探针协程测量事件循环延迟，
+同时由多个协程并发读写 EnhancedCacheManager。对比：
+- sync: 在协程中调用同步接口 get/set（迁移前各路由的做法，每次往返都阻塞事件循环）
+- async: aget/aset，基于 redis.asyncio 连接池
+- sync_many / async_many: 逐键 get 与一次 aget_many（MGET）读取同一批键
+
+读取的键不在 L1 中，每次操作都会访问 Redis。Redis 与应用在同一台机器时往返只有几十微秒，
+阻塞不明显；--latency-ms 在本地起一个转发代理，为每个方向加上一半的往返延迟，模拟跨机房/云上的网络。
+未指定 --redis-url 且未设置 REDIS_URL 时使用 fakeredis 的 TCP 服务（需要安装 fakeredis）。
+
+运行: python -m project.utils.optimization.cache_loop_lag [--redis-url redis://...] [--latency-ms 2] [--concurrency 16]
+"""
+import os
+import asyncio
+import argparse
+import threading
+from typing import Any, Dict, Optional
+
+from project.utils.optimization.db_loop_lag import _run_mode
+
+
+def _start_fake_redis() -> str:
+    """在后台线程中启动 fakeredis TCP 服务，返回其 URL"""
+    from fakeredis import TcpFakeServer
+
+    server = TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+    # 回复分多次写出，不关闭 Nagle 时同步客户端每次往返会多等一个延迟确认（约40ms）
+    server.RequestHandlerClass.disable_nagle_algorithm = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return f"redis://{host}:{port}/0"
+
+
+def _start_latency_proxy(upstream_url: str, latency_ms: float) -> str:
+    """在独立线程的事件循环中运行转发代理（同步客户端阻塞主循环时代理照常转发），返回代理 URL"""
+    from urllib.parse import urlparse
+
+    upstream = urlparse(upstream_url)
+    delay = latency_ms / 2000
+    ready = threading.Event()
+    address: Dict[str, Any] = {}
+
+    async def pump(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while data := await reader.read(65536):
+                await asyncio.sleep(delay)
+                writer.write(data)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def handle(client_reader, client_writer):
+        server_reader, server_writer = await asyncio.open_connection(upstream.hostname, upstream.port or 6379)
+        await asyncio.gather(pump(client_reader, server_writer), pump(server_reader, client_writer))
+
+    async def serve():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        address["port"] = server.sockets[0].getsockname()[1]
+        ready.set()
+        async with server:
+            await server.serve_forever()
+
+    threading.Thread(target=lambda: asyncio.run(serve()), daemon=True).start()
+    ready.wait()
+    auth = f"{upstream.username or ''}:{upstream.password}@" if upstream.password else ""
+    return f"redis://{auth}127.0.0.1:{address['port']}{upstream.path or '/0'}"
+
+
+async def benchmark_cache_loop_lag(redis_url: Optional[str] = None, latency_ms: float = 2.0,
+                                   concurrency: int = 16, ops_per_task: int = 20,
+                                   batch_size: int = 20) -> Dict[str, Dict[str, float]]:
+    """
+    返回 {"sync": {...}, "async": {...}, "sync_many": {...}, "async_many": {...}}，
+    每项包含总耗时 wall_s 和探针测得的事件循环延迟 p50/p99/max（毫秒）
+    """
+    from project.utils.async_cache.cache_manager import CacheConfig, EnhancedCacheManager
+
+    target = redis_url or os.getenv("REDIS_URL") or _start_fake_redis()
+    if latency_ms > 0:
+        target = _start_latency_proxy(target, latency_ms)
+
+    config = CacheConfig()
+    config.redis_url = target
+    config.redis_cluster_nodes = [""]
+    config.redis_sentinel_hosts = [""]
+    manager = EnhancedCacheManager(config)
+    if manager.redis_client is None or manager.async_backend is None:
+        raise RuntimeError(f"无法连接 Redis: {target}")
+
+    counter = iter(range(10 ** 9))
+    value = {"payload": "x" * 256}
+
+    def fresh_keys(count: int):
+        # 每次使用新键，读取必然穿过 L1 访问 Redis
+        return [f"bench:loop_lag:{next(counter)}" for _ in range(count)]
+
+    async def sync_op():
+        write_key, read_key = fresh_keys(2)
+        manager.set(write_key, value, expire=60)
+        manager.get(read_key)
+
+    async def async_op():
+        write_key, read_key = fresh_keys(2)
+        await manager.aset(write_key, value, expire=60)
+        await manager.aget(read_key)
+
+    async def sync_many():
+        for key in fresh_keys(batch_size):
+            manager.get(key)
+
+    async def async_many():
+        await manager.aget_many(fresh_keys(batch_size))
+
+    await manager.aget("bench:loop_lag:warmup")  # 建立异步连接池
+    results = {
+        "sync": await _run_mode(sync_op, concurrency, ops_per_task),
+        "async": await _run_mode(async_op, concurrency, ops_per_task),
+        "sync_many": await _run_mode(sync_many, concurrency, max(1, ops_per_task // 4)),
+        "async_many": await _run_mode(async_many, concurrency, max(1, ops_per_task // 4)),
+    }
+    await manager.adelete_pattern("bench:loop_lag:*")
+    await manager.async_backend.close()
+    return results
+
+
+if __name__ == "__main__":
+    _parser = argparse.ArgumentParser(description="缓存访问方式的事件循环延迟基准")
+    _parser.add_argument("--redis-url", default=None)
+    _parser.add_argument("--latency-ms", type=float, default=2.0)
+    _parser.add_argument("--concurrency", type=int, default=16)
+    _parser.add_argument("--ops", type=int, default=20)
+    _parser.add_argument("--batch-size", type=int, default=20)
+    _args = _parser.parse_args()
+    _report = asyncio.run(benchmark_cache_loop_lag(
+        _args.redis_url, _args.latency_ms, _args.concurrency, _args.ops, _args.batch_size
+    ))
+    for _mode, _stats in _report.items():
+        print(f"{_mode:10s} {_stats}")
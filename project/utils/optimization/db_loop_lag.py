@@ -0,0 +1,126 @@
+# project/utils/optimization/db_loop_lag.py
+"""
+数据库访问方式的事件循环延迟基准
+
+在事件循环中运行一个每 10ms 唤醒一次的探针协程，同时并发执行数据库查询，
+探针实际唤醒时间与预期时间的差值即事件循环延迟（WebSocket、流式响应在此期间得不到调度）。
+
+对比三种方式：
+- blocking: 在协程中直接使用同步会话（迁移前各路由的做法）
+- threadpool: run_db 的同步模式，查询在线程池中执行
+- async: run_db 的异步模式，AsyncSession + asyncpg（需要安装 asyncpg）
+
+运行: python -m project.utils.optimization.db_loop_lag [并发数] [单次查询秒数]
+"""
+import sys
+import time
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+_PROBE_INTERVAL = 0.01
+
+
+def _sleep_statement(dialect: str, seconds: float):
+    if dialect == "postgresql":
+        return text("SELECT pg_sleep(:seconds)").bindparams(seconds=seconds)
+    # 其他数据库没有 sleep 函数，用递归CTE制造耗时查询
+    rows = int(seconds * 2_000_000)
+    return text(
+        "WITH RECURSIVE t(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM t WHERE n < :rows) "
+        "SELECT count(*) FROM t"
+    ).bindparams(rows=rows)
+
+
+async def _probe(stop: asyncio.Event, lags: List[float]):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + _PROBE_INTERVAL
+        await asyncio.sleep(_PROBE_INTERVAL)
+        lags.append(max(0.0, loop.time() - expected) * 1000)
+
+
+def _summarize(lags: List[float], wall: float) -> Dict[str, float]:
+    ordered = sorted(lags) or [0.0]
+    return {
+        "wall_s": round(wall, 3),
+        "lag_p50_ms": round(ordered[len(ordered) // 2], 2),
+        "lag_p99_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], 2),
+        "lag_max_ms": round(ordered[-1], 2),
+    }
+
+
+async def _run_mode(run_query: Callable[[], Any], concurrency: int, queries_per_task: int) -> Dict[str, float]:
+    lags: List[float] = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(_probe(stop, lags))
+
+    async def worker():
+        for _ in range(queries_per_task):
+            await run_query()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    wall = time.perf_counter() - start
+    stop.set()
+    await probe
+    return _summarize(lags, wall)
+
+
+async def benchmark_event_loop_lag(concurrency: int = 8, query_seconds: float = 0.05,
+                                   queries_per_task: int = 5) -> Dict[str, Dict[str, float]]:
+    """
+    返回 {"blocking": {...}, "threadpool": {...}, "async": {...}}，
+    每项包含总耗时 wall_s 和探针测得的事件循环延迟 p50/p99/max（毫秒）
+    """
+    from project.database import engine, SessionLocal, ASYNC_DB_AVAILABLE, ASYNC_DATABASE_URL
+
+    statement = _sleep_statement(engine.dialect.name, query_seconds)
+
+    def query(session: Session):
+        return session.execute(statement).scalar()
+
+    async def blocking():
+        with SessionLocal() as session:
+            query(session)
+
+    async def threadpool():
+        def run():
+            with SessionLocal() as session:
+                return query(session)
+        await asyncio.to_thread(run)
+
+    results = {
+        "blocking": await _run_mode(blocking, concurrency, queries_per_task),
+        "threadpool": await _run_mode(threadpool, concurrency, queries_per_task),
+    }
+
+    if ASYNC_DB_AVAILABLE and engine.dialect.name == "postgresql":
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+        async_engine = create_async_engine(ASYNC_DATABASE_URL, pool_size=concurrency)
+        async_session_factory = async_sessionmaker(async_engine)
+
+        async def async_mode():
+            async with async_session_factory() as session:
+                await session.run_sync(query)
+
+        try:
+            results["async"] = await _run_mode(async_mode, concurrency, queries_per_task)
+        finally:
+            await async_engine.dispose()
+    else:
+        logger.info("未安装 asyncpg 或非 PostgreSQL 数据库，跳过 async 模式")
+
+    return results
+
+
+if __name__ == "__main__":
+    _concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    _seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    for _mode, _stats in asyncio.run(benchmark_event_loop_lag(_concurrency, _seconds)).items():
+        print(f"{_mode:10s} {_stats}")
@@ -0,0 +1,311 @@
+# project/utils/optimization/distributed_scheduler_benchmark.py
+"""
+分布式调度器多进程基准
+
+每个工作进程是一个独立节点（DistributedWorker，单节点并发度 concurrency），执行空任务。
+场景：
+1. 扩展性：1/2/4 个工作进程处理同一批任务的吞吐量（任务/秒）
+2. 恰好一次：无崩溃时每个任务恰好执行一次、完成一次（执行计数 == 任务数 == total_processed）
+3. 至少一次：运行中随机 SIGKILL 工作进程并以相同节点ID重启，租约过期的任务由回收器重新排队；
+   所有任务最终完成且只被接受一次，执行计数 >= 任务数
+4. 工作窃取：全部任务提交到第一个节点的队列，其他节点只能靠窃取获得任务，输出各进程的执行占比
+5. 命令审计：统计服务端收到的全部命令（含 Lua 脚本内部调用），确认没有 KEYS/SCAN
+
+默认在本进程内启动 fakeredis 的 TCP 服务端（需要 fakeredis 和 lupa），设置 REDIS_URL 时改用该实例；
+使用真实 Redis 时只删除本基准创建的键，不清空数据库，且不做命令审计。
+注意 fakeredis 服务端在本进程内串行执行命令，吞吐量上限由它决定，扩展性请以真实 Redis 的结果为准。
+
+运行: python -m project.utils.optimization.distributed_scheduler_benchmark [任务数] [工作进程数]
+"""
+import os
+import sys
+import time
+import uuid
+import random
+import signal
+import socket
+import asyncio
+import threading
+import contextlib
+import multiprocessing
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import redis.asyncio as aioredis
+
+from project.services import distributed_service
+from project.services.distributed_service import (
+    INFLIGHT_TASKS_KEY, NODES_KEY, PENDING_TASKS_KEY, TOTAL_PROCESSED_KEY,
+    DistributedTask, DistributedTaskQueue, DistributedWorker, NodeInfo, NodeManager, NodeRole,
+    _node_key, _node_queue_key, _task_key
+)
+
+_SLOTS = 256
+
+
+def _start_fake_server():
+    """在后台线程启动 fakeredis TCP 服务端，返回 (url, 命令计数器, 关闭函数)"""
+    from fakeredis import TcpFakeServer
+    from fakeredis._socket._base import BaseFakeSocket
+
+    commands = Counter()
+    original = BaseFakeSocket._name_to_func
+
+    def spy(self, cmd_name):
+        commands[cmd_name.lower() if isinstance(cmd_name, str) else cmd_name.decode().lower()] += 1
+        return original(self, cmd_name)
+
+    BaseFakeSocket._name_to_func = spy
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = TcpFakeServer(("127.0.0.1", port))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    def close():
+        server.shutdown()
+        server.server_close()
+        BaseFakeSocket._name_to_func = original
+
+    return f"redis://127.0.0.1:{port}/0", commands, close
+
+
+# project 包目录；部分模块把其中的子目录（如 project/utils）插入 sys.path，其下的 logging 包会遮蔽标准库
+_PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@contextlib.contextmanager
+def _child_sys_path():
+    """
+    启动工作进程期间从 sys.path 去掉 project 包内部的目录
+
+    spawn 子进程使用父进程 start() 时的 sys.path，并在执行入口函数之前就导入本模块，
+    因此只能在父进程里清理，入口函数中再清理为时已晚
+    """
+    original = list(sys.path)
+    sys.path[:] = [entry for entry in original
+                   if not (os.path.abspath(entry or os.curdir) + os.sep).startswith(_PACKAGE_DIR + os.sep)]
+    try:
+        yield
+    finally:
+        sys.path[:] = original
+
+
+def _worker_main(redis_url: str, node_id: str, executions, slot: int, ready, go,
+                 concurrency: int, lease_seconds: float, heartbeat_seconds: float):
+    """工作进程入口：注册节点，等待开始信号后持续领取执行任务"""
+    async def noop(data):
+        executions[slot] += 1
+
+    async def main():
+        client = aioredis.from_url(redis_url, decode_responses=True)
+        await NodeManager(client).register_node(
+            NodeInfo(node_id, "localhost", 0, NodeRole.WORKER, ["general"], max_tasks=concurrency)
+        )
+        worker = DistributedWorker(
+            client, node_id, {"noop": noop}, concurrency=concurrency,
+            lease_seconds=lease_seconds, heartbeat_seconds=heartbeat_seconds, poll_seconds=0.05
+        )
+        worker.load_balancer.cache_ttl = 0.5
+        ready.set()
+        while not go.is_set():
+            await asyncio.sleep(0.01)
+        await worker.run()
+
+    asyncio.run(main())
+
+
+async def _preload_scripts(client):
+    """预先 SCRIPT LOAD 所有调度脚本（fakeredis 的 TCP 服务端在首次 EVALSHA 返回 NOSCRIPT 时会断开连接）"""
+    for name in dir(distributed_service):
+        if name.endswith("_LUA"):
+            await client.script_load(getattr(distributed_service, name))
+
+
+class _Scenario:
+    def __init__(self, redis_url: str, context, tasks: int, workers: int, concurrency: int,
+                 lease_seconds: float, heartbeat_seconds: float):
+        self.redis_url = redis_url
+        self.context = context
+        self.tasks = tasks
+        self.node_ids = [f"bench-{uuid.uuid4().hex[:8]}" for _ in range(workers)]
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.executions = context.Array('q', _SLOTS, lock=False)
+        self.go = context.Event()
+        self.processes: Dict[str, Any] = {}
+        self.slots: Dict[int, str] = {}
+        self.task_ids: List[str] = []
+
+    def spawn(self, node_id: str):
+        slot = len(self.slots)
+        ready = self.context.Event()
+        process = self.context.Process(
+            target=_worker_main,
+            args=(self.redis_url, node_id, self.executions, slot, ready, self.go,
+                  self.concurrency, self.lease_seconds, self.heartbeat_seconds),
+            daemon=True
+        )
+        with _child_sys_path():
+            process.start()
+        started = time.monotonic()
+        while not ready.wait(0.1):
+            if not process.is_alive():
+                raise RuntimeError(f"工作进程 {node_id} 启动失败，退出码 {process.exitcode}")
+            if time.monotonic() - started > 60:
+                raise RuntimeError(f"工作进程 {node_id} 60 秒内未就绪")
+        self.processes[node_id] = process
+        self.slots[slot] = node_id
+
+    def check_alive(self):
+        """任一工作进程意外退出时立即失败，而不是等到 deadline"""
+        for node_id, process in self.processes.items():
+            if not process.is_alive():
+                raise RuntimeError(f"工作进程 {node_id} 意外退出，退出码 {process.exitcode}")
+
+    async def submit(self, client, target_node: Optional[str]):
+        queue = DistributedTaskQueue(client)
+        for start in range(0, self.tasks, 2000):
+            batch = [
+                DistributedTask(task_id=uuid.uuid4().hex, task_type="noop", data={}, max_retries=100)
+                for _ in range(start, min(start + 2000, self.tasks))
+            ]
+            self.task_ids.extend(await queue.submit_tasks(batch, target_node))
+
+    async def verify(self, client) -> Dict[str, Any]:
+        statuses = Counter()
+        for start in range(0, len(self.task_ids), 5000):
+            pipe = client.pipeline(transaction=False)
+            for task_id in self.task_ids[start:start + 5000]:
+                pipe.hget(_task_key(task_id), "status")
+            statuses.update(await pipe.execute())
+        executions = sum(self.executions[:len(self.slots)])
+        return {
+            "completed": statuses.get("completed", 0),
+            "accepted_completions": int(await client.get(TOTAL_PROCESSED_KEY) or 0),
+            "executions": executions,
+            "left_pending": await client.zcard(PENDING_TASKS_KEY),
+            "left_inflight": await client.zcard(INFLIGHT_TASKS_KEY),
+        }
+
+    def stop(self):
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in self.processes.values():
+            process.join(10)
+
+    async def cleanup(self, client):
+        keys = [PENDING_TASKS_KEY, INFLIGHT_TASKS_KEY, TOTAL_PROCESSED_KEY]
+        keys += [_node_key(node_id) for node_id in self.node_ids]
+        keys += [_node_queue_key(node_id) for node_id in self.node_ids]
+        await client.delete(*keys)
+        await client.zrem(NODES_KEY, *self.node_ids)
+        for start in range(0, len(self.task_ids), 5000):
+            await client.delete(*(_task_key(task_id) for task_id in self.task_ids[start:start + 5000]))
+
+
+async def run_scenario(redis_url: str, tasks: int, workers: int, concurrency: int = 50,
+                       kill_every: Optional[float] = None, steal: bool = False,
+                       lease_seconds: float = 30.0, heartbeat_seconds: float = 5.0,
+                       deadline: float = 600.0, seed: int = 42) -> Dict[str, Any]:
+    """
+    运行一个场景并校验结果；kill_every 为随机杀死工作进程的间隔秒数，steal=True 时全部任务提交到第一个节点
+    """
+    context = multiprocessing.get_context("spawn")
+    scenario = _Scenario(redis_url, context, tasks, workers, concurrency, lease_seconds, heartbeat_seconds)
+    client = aioredis.from_url(redis_url, decode_responses=True)
+    rng = random.Random(seed)
+    kills = 0
+    try:
+        await _preload_scripts(client)
+        await scenario.submit(client, scenario.node_ids[0] if steal else None)
+        for node_id in scenario.node_ids:
+            scenario.spawn(node_id)
+
+        start = time.perf_counter()
+        scenario.go.set()
+        next_kill = start + kill_every if kill_every else float("inf")
+        while int(await client.get(TOTAL_PROCESSED_KEY) or 0) < tasks:
+            now = time.perf_counter()
+            if now - start > deadline:
+                break
+            if now >= next_kill:
+                victim = rng.choice(scenario.node_ids)
+                os.kill(scenario.processes[victim].pid, signal.SIGKILL)
+                scenario.processes[victim].join()
+                scenario.spawn(victim)  # 以相同节点ID重启
+                kills += 1
+                next_kill = time.perf_counter() + kill_every
+            scenario.check_alive()
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - start
+
+        scenario.stop()
+        report = await scenario.verify(client)
+        report.update({
+            "tasks": tasks,
+            "workers": workers,
+            "kills": kills,
+            "seconds": round(elapsed, 2),
+            "tasks_per_second": round(report["accepted_completions"] / elapsed, 1),
+            "exactly_once": report["completed"] == tasks and report["accepted_completions"] == tasks
+                            and report["executions"] == tasks,
+            "at_least_once": report["completed"] == tasks and report["accepted_completions"] == tasks
+                             and report["executions"] >= tasks,
+        })
+        if steal:
+            per_node = Counter()
+            for slot, node_id in scenario.slots.items():
+                per_node[node_id] += scenario.executions[slot]
+            report["share_by_node"] = [round(per_node[node_id] / max(tasks, 1), 3) for node_id in scenario.node_ids]
+        return report
+    finally:
+        scenario.stop()
+        await scenario.cleanup(client)
+        await client.aclose()
+
+
+async def run_benchmark(tasks: int = 100000, workers: int = 4, concurrency: int = 50) -> Dict[str, Any]:
+    """
+    返回 {"scaling": {进程数: 报告}, "crash": 报告, "stealing": 报告, "commands": {...}}
+    """
+    redis_url = os.getenv("REDIS_URL")
+    commands, close = None, None
+    if not redis_url:
+        redis_url, commands, close = _start_fake_server()
+    try:
+        scaling = {}
+        count = 1
+        while count <= workers:
+            scaling[count] = await run_scenario(redis_url, tasks, count, concurrency)
+            count *= 2
+        crash = await run_scenario(
+            redis_url, tasks, workers, concurrency, kill_every=1.0,
+            lease_seconds=2.0, heartbeat_seconds=0.5
+        )
+        stealing = await run_scenario(redis_url, max(tasks // 10, 1), workers, concurrency, steal=True)
+        audit = None
+        if commands is not None:
+            audit = {
+                "keys": commands.get("keys", 0),
+                "scan": commands.get("scan", 0),
+                "top": dict(commands.most_common(8)),
+            }
+        return {"scaling": scaling, "crash": crash, "stealing": stealing, "commands": audit}
+    finally:
+        if close:
+            close()
+
+
+if __name__ == "__main__":
+    _tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    _workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    _report = asyncio.run(run_benchmark(_tasks, _workers))
+    for _count, _result in _report["scaling"].items():
+        print(f"{_count} 个工作进程: {_result}")
+    print(f"随机崩溃: {_report['crash']}")
+    print(f"工作窃取: {_report['stealing']}")
+    print(f"命令审计: {_report['commands']}")
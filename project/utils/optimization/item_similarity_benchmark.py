@@ -0,0 +1,112 @@
+# project/utils/optimization/item_similarity_benchmark.py
+"""
+物品相似度模型基准
+
+合成数据：物品分属若干兴趣簇，热门度服从 Zipf 分布；每个用户偏好1~2个簇，
+80% 的交互落在偏好簇内，其余随机。输出：
+- 构建耗时与进程峰值内存（默认 5万用户 / 2万物品 / 200万次交互）
+- 离线 hit-rate@10（留一法）与热门度基线
+- 不同物品总数下单次推荐的 p95 延迟（应与物品总数无关）
+
+运行: python -m project.utils.optimization.item_similarity_benchmark [用户数] [物品数] [交互数]
+"""
+import sys
+import time
+import resource
+from typing import Any, Dict
+
+import numpy as np
+
+from project.utils.recommendation.item_similarity import (
+    ACTION_WEIGHTS, ItemSimilarityModel, evaluate_hit_rate
+)
+
+_CLUSTERS = 200
+
+
+def synthetic_interactions(users: int, items: int, interactions: int, seed: int = 42):
+    """返回 (user_ids, item_ids, weights, timestamps)"""
+    rng = np.random.default_rng(seed)
+    item_cluster = rng.integers(0, _CLUSTERS, size=items)
+    popularity = 1.0 / np.arange(1, items + 1) ** 0.8
+    rng.shuffle(popularity)
+    cluster_items = [np.flatnonzero(item_cluster == cluster) for cluster in range(_CLUSTERS)]
+    cluster_probabilities = [popularity[members] / popularity[members].sum() for members in cluster_items]
+
+    user_ids = rng.integers(0, users, size=interactions)
+    preferred = rng.integers(0, _CLUSTERS, size=(users, 2))
+    in_cluster = rng.random(interactions) < 0.8
+    chosen_cluster = preferred[user_ids, rng.integers(0, 2, size=interactions)]
+
+    item_ids = rng.choice(items, size=interactions, p=popularity / popularity.sum())
+    for cluster in range(_CLUSTERS):
+        mask = in_cluster & (chosen_cluster == cluster)
+        if mask.any() and len(cluster_items[cluster]):
+            item_ids[mask] = rng.choice(cluster_items[cluster], size=int(mask.sum()), p=cluster_probabilities[cluster])
+
+    action_weights = np.array(sorted(set(ACTION_WEIGHTS.values())), dtype=np.float32)
+    weights = rng.choice(action_weights, size=interactions)
+    timestamps = rng.random(interactions) * 180 * 86400
+    return user_ids.astype(np.int64), item_ids.astype(np.int64), weights, timestamps
+
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _recommend_latency(model: ItemSimilarityModel, user_ids, item_ids, weights, samples: int = 2000) -> Dict[str, float]:
+    order = np.argsort(user_ids, kind='stable')
+    user_ids, item_ids, weights = user_ids[order], item_ids[order], weights[order]
+    boundaries = np.flatnonzero(np.r_[True, user_ids[1:] != user_ids[:-1], True])
+    rng = np.random.default_rng(0)
+    latencies = []
+    for index in rng.integers(0, len(boundaries) - 1, size=samples):
+        start, end = boundaries[index], boundaries[index + 1]
+        history = {}
+        for item, weight in zip(item_ids[start:end][-50:].tolist(), weights[start:end][-50:].tolist()):
+            history[item] = history.get(item, 0.0) + weight
+        history = {item: float(np.log1p(weight)) for item, weight in history.items()}
+        begin = time.perf_counter()
+        model.recommend('bench', history, 10)
+        latencies.append((time.perf_counter() - begin) * 1000)
+    return {
+        'p50_ms': round(float(np.percentile(latencies, 50)), 3),
+        'p95_ms': round(float(np.percentile(latencies, 95)), 3),
+    }
+
+
+def run_benchmark(users: int = 50000, items: int = 20000, interactions: int = 2000000,
+                  evaluation_users: int = 5000, seed: int = 42) -> Dict[str, Any]:
+    """
+    返回 {"build": {...}, "evaluation": {...}, "latency_by_catalogue": {物品数: {"p50_ms", "p95_ms"}}}
+    """
+    user_ids, item_ids, weights, timestamps = synthetic_interactions(users, items, interactions, seed)
+    rss_before = _peak_rss_mb()
+    start = time.perf_counter()
+    model = ItemSimilarityModel.build({'bench': (user_ids, item_ids, weights)}, version="bench")
+    build = {
+        **model.metadata['stats']['bench'],
+        'build_seconds': round(time.perf_counter() - start, 2),
+        'peak_rss_mb': round(_peak_rss_mb(), 1),
+        'peak_rss_before_build_mb': round(rss_before, 1),
+    }
+
+    latency = {items: _recommend_latency(model, user_ids, item_ids, weights)}
+    small_items = max(items // 10, 100)
+    small = synthetic_interactions(users, small_items, interactions // 10, seed + 1)
+    small_model = ItemSimilarityModel.build({'bench': small[:3]}, version="bench-small")
+    latency = {small_items: _recommend_latency(small_model, *small[:3]), **latency}
+
+    evaluation = evaluate_hit_rate(user_ids, item_ids, weights, timestamps, k=10, max_users=evaluation_users)
+    return {'build': build, 'evaluation': evaluation, 'latency_by_catalogue': latency}
+
+
+if __name__ == "__main__":
+    _users = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    _items = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    _interactions = int(sys.argv[3]) if len(sys.argv) > 3 else 2000000
+    _report = run_benchmark(_users, _items, _interactions)
+    print(f"构建: {_report['build']}")
+    print(f"离线评估: {_report['evaluation']}")
+    for _catalogue, _stats in _report["latency_by_catalogue"].items():
+        print(f"物品数 {_catalogue}: {_stats}")
@@ -0,0 +1,158 @@
+# project/utils/optimization/metrics_timeseries_benchmark.py
+"""
+指标时间序列存储基准
+
+用模拟时钟按 1 秒采样写入合成数据（随机缺失 10%，采样时间带亚秒抖动），每个采集周期一次管道写入并执行一次汇总，然后：
+1. 正确性：每种聚合分辨率在保留期内的每个桶，min/max/count 与暴力计算完全一致，sum 相对误差 < 1e-9
+2. 查询延迟：1小时/1天/7天/30天/1年 范围查询（自动选择分辨率）的 p50/p95 毫秒数
+3. 写入延迟：200 个指标一个采集周期的批量写入耗时
+4. 内存：默认保留期下的预算（memory_budget）与模拟指标各键实际字节数的对照
+
+默认使用 fakeredis（进程内，不含网络往返），设置 REDIS_URL 时改用该实例（只删除本基准创建的键）。
+
+运行: python -m project.utils.optimization.metrics_timeseries_benchmark [模拟小时数] [指标数]
+"""
+import os
+import sys
+import time
+import uuid
+import random
+import asyncio
+from typing import Any, Dict, List
+
+import numpy as np
+import redis.asyncio as aioredis
+
+from project.utils.monitoring.timeseries_store import (
+    RAW, ROLLUPS, TimeSeriesStore, _watermark_key, memory_budget
+)
+
+_CYCLE = 60  # 模拟的采集周期（秒）
+
+
+def _brute_force(samples: List[tuple], step: int) -> Dict[int, List[float]]:
+    buckets: Dict[int, List[float]] = {}
+    for timestamp, value in samples:
+        bucket = buckets.setdefault(timestamp // step * step, [float("inf"), float("-inf"), 0.0, 0])
+        bucket[0] = min(bucket[0], value)
+        bucket[1] = max(bucket[1], value)
+        bucket[2] += value
+        bucket[3] += 1
+    return buckets
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    return {
+        "p50_ms": round(float(np.percentile(samples, 50)) * 1000, 3),
+        "p95_ms": round(float(np.percentile(samples, 95)) * 1000, 3),
+    }
+
+
+async def run_benchmark(hours: int = 50, metrics: int = 200, repeats: int = 50, seed: int = 42) -> Dict[str, Any]:
+    """
+    返回 {"correctness": {分辨率: {...}}, "query": {...}, "write": {...}, "memory": {...}}
+    """
+    redis_url = os.getenv("REDIS_URL")
+    if redis_url:
+        client = aioredis.from_url(redis_url)
+    else:
+        import fakeredis
+        client = fakeredis.FakeAsyncRedis()
+    store = TimeSeriesStore(client)
+    prefix = f"bench{uuid.uuid4().hex[:8]}"
+    metric = f"{prefix}.cpu"
+    rng = random.Random(seed)
+
+    # 从整天开始，模拟 hours 小时
+    origin = int(time.time()) // 86400 * 86400 - 86400 * (hours // 24 + 1)
+    samples = []
+    clock = origin
+    rollup_seconds = 0.0
+    try:
+        while clock < origin + hours * 3600:
+            batch = []
+            for second in range(clock, clock + _CYCLE):
+                if rng.random() < 0.9:
+                    value = rng.gauss(50, 20)
+                    samples.append((second, value))
+                    batch.append((metric, second + rng.random() * 0.9, value))
+            await store.write(batch)
+            clock += _CYCLE
+            start = time.perf_counter()
+            await store.rollup(now=clock + store.rollup_lag, metric_names=[metric])
+            rollup_seconds += time.perf_counter() - start
+        now = clock + store.rollup_lag
+
+        correctness = {}
+        for res in ROLLUPS:
+            expected = _brute_force(samples, res.step)
+            complete = (now - store.rollup_lag) // res.step * res.step
+            expected = {
+                bucket: values for bucket, values in expected.items()
+                if bucket > now - res.retention and bucket + res.step <= complete
+            }
+            chosen, records = await store.query(metric, now - res.retention, now, step=res.step, now=now)
+            got = {int(record['ts']): record for record in records}
+            mismatched = 0
+            for bucket, (minimum, maximum, total, count) in expected.items():
+                record = got.get(bucket)
+                if (record is None or record['min'] != minimum or record['max'] != maximum
+                        or record['count'] != count or abs(record['sum'] - total) > 1e-9 * max(1.0, abs(total))):
+                    mismatched += 1
+            correctness[res.name] = {
+                "resolution": chosen.name,
+                "buckets": len(expected),
+                "mismatched": mismatched,
+                "unexpected": len(set(got) - set(expected)),
+            }
+
+        query = {}
+        for label, seconds in (("1h", 3600), ("1d", 86400), ("7d", 7 * 86400),
+                               ("30d", 30 * 86400), ("365d", 365 * 86400)):
+            latencies = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                chosen, records = await store.query(metric, now - seconds, now, now=now)
+                latencies.append(time.perf_counter() - start)
+            query[label] = {"resolution": chosen.name, "points": len(records), **_percentiles(latencies)}
+
+        names = [f"{prefix}.m{index}" for index in range(metrics)]
+        latencies = []
+        for cycle in range(repeats):
+            batch = [(name, now + cycle, rng.random()) for name in names]
+            start = time.perf_counter()
+            await store.write(batch)
+            latencies.append(time.perf_counter() - start)
+        write = {"metrics_per_cycle": metrics, **_percentiles(latencies)}
+
+        budget = memory_budget(metrics)
+        actual = {res.name: await client.strlen(res.key(metric)) for res in (RAW, *ROLLUPS)}
+        memory = {
+            "budget_per_metric_bytes": budget["per_metric_bytes"],
+            "budget_per_metric_total_bytes": budget["per_metric_total_bytes"],
+            "budget_total_mb": round(budget["total_bytes"] / 1024 ** 2, 1),
+            "simulated_metric_bytes": actual,
+        }
+        return {
+            "simulated_hours": hours,
+            "samples": len(samples),
+            "rollup_ms_per_cycle": round(rollup_seconds * 1000 / max(hours * 3600 // _CYCLE, 1), 3),
+            "correctness": correctness,
+            "query": query,
+            "write": write,
+            "memory": memory,
+        }
+    finally:
+        keys = [res.key(name) for name in [metric] + [f"{prefix}.m{index}" for index in range(metrics)]
+                for res in (RAW, *ROLLUPS)]
+        await client.delete(*keys, _watermark_key(metric))
+        await client.srem("tsdb:metrics", metric, *[f"{prefix}.m{index}" for index in range(metrics)])
+        await client.aclose()
+
+
+if __name__ == "__main__":
+    _hours = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    _metrics = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    _report = asyncio.run(run_benchmark(_hours, _metrics))
+    for _key, _value in _report.items():
+        print(f"{_key}: {_value}")
@@ -6,6 +6,7 @@
 
 import os
 import sys
+import inspect
 import logging
 from typing import Optional
 from pathlib import Path
@@ -92,6 +93,22 @@ def _create_simple_cache_manager():
             except Exception:
                 return 0
         
+        def get_or_compute(self, key: str, compute, expire: int = 3600, **kwargs) -> any:
+            value = self.get(key)
+            if value is None:
+                value = compute()
+                self.set(key, value, expire)
+            return value
+        
+        async def aget_or_compute(self, key: str, compute, expire: int = 3600, **kwargs) -> any:
+            value = self.get(key)
+            if value is None:
+                value = compute()
+                if inspect.isawaitable(value):
+                    value = await value
+                self.set(key, value, expire)
+            return value
+        
         def get_stats(self):
             total = self.stats["hits"] + self.stats["misses"]
             hit_rate = (self.stats["hits"] / total * 100) if total > 0 else 0
@@ -0,0 +1,192 @@
+# project/utils/optimization/query_fanout.py
+"""
+并发查询扇出工具
+
+仪表板等接口需要执行多条互不依赖的只读聚合查询，逐条串行执行时延迟为各查询耗时之和。
+QueryFanout 把每条查询放到线程池中、各自使用独立的 Session（同一个 Engine，连接来自连接池）
+并发执行，合并结果后返回，接口延迟接近最慢的那一条查询。
+
+同时记录每条查询的耗时，按接口汇总（get_query_timing_stats），用于定位慢查询。
+
+以下情况自动退化为在调用方会话中串行执行：
+- QUERY_FANOUT_ENABLED=false
+- SQLite（内存库每个连接互相独立，且不支持真正的并发读）
+- 调用方会话存在未刷新的修改（独立会话看不到这些修改）
+
+注意：每次扇出最多同时占用 QUERY_FANOUT_WORKERS 个连接池连接，连接池大小应留有余量。
+"""
+import os
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+QUERY_FANOUT_ENABLED = os.getenv("QUERY_FANOUT_ENABLED", "true").lower() == "true"
+QUERY_FANOUT_WORKERS = int(os.getenv("QUERY_FANOUT_WORKERS", "4"))
+# 每个接口每条查询保留的耗时样本数
+_TIMING_SAMPLES = 200
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+_timings: Dict[str, Dict[str, deque]] = defaultdict(lambda: defaultdict(lambda: deque(maxlen=_TIMING_SAMPLES)))
+_timings_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=QUERY_FANOUT_WORKERS, thread_name_prefix="query-fanout")
+    return _executor
+
+
+def shutdown_query_fanout():
+    """关闭扇出线程池（应用关闭时调用）"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
+
+
+class QueryFanout:
+    """
+    并发执行一组互不依赖的只读查询
+
+    用法:
+        fanout = QueryFanout(db, "dashboard.analytics")
+        fanout.add("trend", lambda session: session.query(...).all())
+        fanout.add("ai_usage", lambda session: ...)
+        results = await fanout.run()      # {"trend": [...], "ai_usage": [...]}
+        fanout.timings                    # {"trend": 12.3, "ai_usage": 8.1}，毫秒
+
+    查询函数接收一个 Session 参数，只能用它执行只读查询；返回值应为行/标量等普通数据，
+    不要返回ORM实例（执行结束后会话即关闭）。
+    """
+
+    def __init__(self, db: Session, endpoint: str):
+        self.db = db
+        self.endpoint = endpoint
+        self._queries: List[Tuple[str, Callable[[Session], Any]]] = []
+        self.timings: Dict[str, float] = {}
+        self.wall_ms: float = 0.0
+        self.concurrent: bool = False
+
+    def add(self, name: str, query: Callable[[Session], Any]) -> "QueryFanout":
+        self._queries.append((name, query))
+        return self
+
+    def _can_fan_out(self) -> bool:
+        if not QUERY_FANOUT_ENABLED or len(self._queries) < 2:
+            return False
+        bind = self.db.get_bind()
+        if bind.dialect.name == "sqlite":
+            return False
+        # 独立会话看不到调用方尚未提交的修改
+        return not (self.db.new or self.db.dirty or self.db.deleted)
+
+    def _run_one(self, name: str, query: Callable[[Session], Any], session: Optional[Session] = None) -> Any:
+        own_session = session is None
+        if own_session:
+            session = Session(bind=self.db.get_bind(), expire_on_commit=False)
+        start = time.perf_counter()
+        try:
+            return query(session)
+        finally:
+            self.timings[name] = (time.perf_counter() - start) * 1000
+            if own_session:
+                session.close()
+
+    def _finish(self, start: float):
+        self.wall_ms = (time.perf_counter() - start) * 1000
+        _record_timings(self.endpoint, self.timings, self.wall_ms)
+        logger.debug(
+            f"{self.endpoint} 查询耗时 wall={self.wall_ms:.1f}ms sum={sum(self.timings.values()):.1f}ms "
+            f"concurrent={self.concurrent} {self.timings}"
+        )
+
+    async def run(self) -> Dict[str, Any]:
+        """在线程池中并发执行全部查询，不阻塞事件循环"""
+        start = time.perf_counter()
+        self.concurrent = self._can_fan_out()
+        try:
+            if self.concurrent:
+                loop = asyncio.get_running_loop()
+                executor = _get_executor()
+                # 每条查询在调用方上下文的副本中执行，请求级SQL统计（database_monitoring）才能计入
+                values = await asyncio.gather(*[
+                    loop.run_in_executor(executor, contextvars.copy_context().run, self._run_one, name, query)
+                    for name, query in self._queries
+                ])
+                return {name: value for (name, _), value in zip(self._queries, values)}
+            return {name: self._run_one(name, query, self.db) for name, query in self._queries}
+        finally:
+            self._finish(start)
+
+    def run_sync(self) -> Dict[str, Any]:
+        """同步版本，供同步调用方使用（阻塞当前线程直到全部查询完成）"""
+        start = time.perf_counter()
+        self.concurrent = self._can_fan_out()
+        try:
+            if self.concurrent:
+                executor = _get_executor()
+                futures = [
+                    (name, executor.submit(contextvars.copy_context().run, self._run_one, name, query))
+                    for name, query in self._queries
+                ]
+                return {name: future.result() for name, future in futures}
+            return {name: self._run_one(name, query, self.db) for name, query in self._queries}
+        finally:
+            self._finish(start)
+
+
+def _record_timings(endpoint: str, timings: Dict[str, float], wall_ms: float):
+    with _timings_lock:
+        endpoint_timings = _timings[endpoint]
+        for name, elapsed in timings.items():
+            endpoint_timings[name].append(elapsed)
+        endpoint_timings["__wall__"].append(wall_ms)
+        endpoint_timings["__sum__"].append(sum(timings.values()))
+
+
+def _summarize(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "avg_ms": round(sum(ordered) / len(ordered), 2),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+        "max_ms": round(ordered[-1], 2),
+    }
+
+
+def get_query_timing_stats(endpoint: Optional[str] = None) -> Dict[str, Any]:
+    """
+    按接口汇总的查询耗时
+
+    返回 {endpoint: {"wall": {...}, "sum": {...}, "queries": {name: {...}}}}，
+    wall 为接口实际等待时间，sum 为各查询耗时之和（即串行执行时的大致延迟）。
+    """
+    with _timings_lock:
+        snapshot = {
+            name: {query: list(samples) for query, samples in queries.items() if samples}
+            for name, queries in _timings.items()
+            if endpoint is None or name == endpoint
+        }
+    stats = {}
+    for name, queries in snapshot.items():
+        stats[name] = {
+            "wall": _summarize(queries.pop("__wall__", [0.0])),
+            "sum": _summarize(queries.pop("__sum__", [0.0])),
+            "queries": {query: _summarize(samples) for query, samples in queries.items()},
+        }
+    return stats
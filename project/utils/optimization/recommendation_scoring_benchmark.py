@@ -0,0 +1,108 @@
+# project/utils/optimization/recommendation_scoring_benchmark.py
+"""
+项目推荐评分基准
+
+在内存中合成项目（默认2万个，每个0~6个技能，技能按 Zipf 分布），对比：
+- 旧路径：逐个项目调用 RecommendationUtilities._calculate_project_score，
+  超过阈值的项目都生成推荐理由，排序后取前 limit 个
+- 新路径：TagIncidenceIndex 一次稀疏矩阵-向量乘法算出全部得分，top_k 选出前 limit 个，只为它们生成理由
+两者的推荐结果（ID、得分、理由）应完全一致。计时使用进程 CPU 时间，不含索引构建（单独报告）
+
+运行: python -m project.utils.optimization.recommendation_scoring_benchmark [项目数] [用户数]
+"""
+import sys
+import time
+import random
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+from project.services.recommend_service import RecommendationUtilities
+from project.utils.recommendation.tag_index import TagIncidenceIndex, tag_names
+
+_SKILLS = [f"skill{i}" for i in range(300)]
+_THRESHOLD = 0.3
+
+
+def synthetic_projects(count: int, seed: int = 42) -> List[SimpleNamespace]:
+    rng = random.Random(seed)
+    weights = [1.0 / (rank + 1) for rank in range(len(_SKILLS))]
+    return [
+        SimpleNamespace(
+            id=project_id,
+            title=f"项目{project_id}",
+            description="",
+            required_skills=[
+                {"name": name, "level": rng.choice(["初级", "中级", "高级"])}
+                for name in rng.choices(_SKILLS, weights=weights, k=rng.randint(0, 6))
+            ]
+        )
+        for project_id in range(1, count + 1)
+    ]
+
+
+def _legacy_recommend(projects, user_skills, user_interests, limit: int):
+    recommendations = []
+    for project in projects:
+        score = RecommendationUtilities._calculate_project_score(project, user_skills, user_interests)
+        if score > _THRESHOLD:
+            recommendations.append((project.id, score, RecommendationUtilities._generate_project_reason(
+                project, user_skills, user_interests
+            )))
+    recommendations.sort(key=lambda x: (-x[1], x[0]))
+    return recommendations[:limit]
+
+
+def _indexed_recommend(index: TagIncidenceIndex, projects_by_id, mask, user_skills, user_interests, limit: int):
+    scores = RecommendationUtilities._score_projects(index, user_skills, user_interests)
+    return [
+        (project_id, score, RecommendationUtilities._generate_project_reason(
+            projects_by_id[project_id], user_skills, user_interests
+        ))
+        for project_id, score in index.top_k(scores, mask, _THRESHOLD, limit)
+    ]
+
+
+def run_benchmark(projects: int = 20000, users: int = 50, limit: int = 10, seed: int = 42) -> Dict[str, Any]:
+    """
+    返回 {"projects", "index_build_ms", "legacy_ms_per_request", "indexed_ms_per_request", "speedup", "identical"}
+    """
+    catalogue = synthetic_projects(projects, seed)
+    projects_by_id = {project.id: project for project in catalogue}
+    rng = random.Random(seed + 1)
+    profiles = [
+        (rng.sample(_SKILLS[:60], rng.randint(2, 8)), rng.sample(_SKILLS[:60], rng.randint(0, 3)))
+        for _ in range(users)
+    ]
+
+    start = time.perf_counter()
+    index = TagIncidenceIndex.build(
+        (project.id, {'skills': tag_names(project.required_skills)}) for project in catalogue
+    )
+    build_ms = (time.perf_counter() - start) * 1000
+    mask = index.mask_for(projects_by_id)
+
+    start = time.process_time()
+    legacy = [_legacy_recommend(catalogue, skills, interests, limit) for skills, interests in profiles]
+    legacy_seconds = time.process_time() - start
+
+    start = time.process_time()
+    indexed = [
+        _indexed_recommend(index, projects_by_id, mask, skills, interests, limit)
+        for skills, interests in profiles
+    ]
+    indexed_seconds = time.process_time() - start
+
+    return {
+        "projects": projects,
+        "index_build_ms": round(build_ms, 1),
+        "legacy_ms_per_request": round(legacy_seconds * 1000 / users, 3),
+        "indexed_ms_per_request": round(indexed_seconds * 1000 / users, 3),
+        "speedup": round(legacy_seconds / max(indexed_seconds, 1e-9), 1),
+        "identical": legacy == indexed,
+    }
+
+
+if __name__ == "__main__":
+    _projects = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    _users = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    print(run_benchmark(_projects, _users))
@@ -0,0 +1,134 @@
+# project/utils/optimization/startup_benchmark.py
+"""
+应用冷启动基准
+
+在全新的子进程中执行 python -X importtime -c "import project.main"（重复多次取中位数），报告：
+- import_seconds：导入 project.main 的墙钟时间
+- rss_mb / max_rss_mb：导入完成时的常驻内存与峰值内存
+- heavy_modules：导入后已加载的重依赖（sklearn、jieba.analyse、pandas、scipy、boto3、PyPDF2、docx）
+- top_packages：按 -X importtime 自身耗时汇总的前若干个顶层包
+- routes：挂载的路由数量；与基线对比时检查两边的 (方法, 路径) 集合是否完全一致
+
+--compare <git 引用> 会把该引用检出到临时 git worktree，用同样的方式测量作为基线并输出差值。
+子进程继承当前环境变量（DATABASE_URL、S3_* 等应用启动必需的配置需事先设置）。
+
+运行: python -m project.utils.optimization.startup_benchmark [--runs 3] [--compare HEAD~1]
+"""
+import os
+import re
+import sys
+import json
+import shutil
+import argparse
+import statistics
+import subprocess
+import tempfile
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+_MARKER = "__STARTUP_BENCHMARK__"
+_HEAVY_MODULES = ["sklearn", "jieba.analyse", "pandas", "scipy", "boto3", "PyPDF2", "docx"]
+
+_CHILD = f"""
+import json, os, sys, time, resource
+start = time.perf_counter()
+import project.main as main
+elapsed = time.perf_counter() - start
+with open("/proc/self/statm") as statm:
+    rss = int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+def flatten(routes):
+    for route in routes:
+        if hasattr(route, "path"):
+            yield ",".join(sorted(getattr(route, "methods", None) or [])) + " " + route.path
+        elif hasattr(route, "original_router"):  # 新版 FastAPI 挂载的子路由器
+            yield from flatten(route.original_router.routes)
+routes = sorted(flatten(main.app.routes))
+print({_MARKER!r} + json.dumps({{
+    "import_seconds": elapsed,
+    "rss_mb": rss / 1024 ** 2,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy_modules": [name for name in {_HEAVY_MODULES!r} if name in sys.modules],
+    "routes": routes,
+}}))
+"""
+
+_IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+\d+ \|\s*(\S+)")
+
+
+def _measure_once(cwd: str) -> Dict[str, Any]:
+    env = dict(os.environ, PYTHONPATH=cwd)
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CHILD],
+        cwd=cwd, env=env, capture_output=True, text=True, timeout=600
+    )
+    lines = [line for line in completed.stdout.splitlines() if line.startswith(_MARKER)]
+    if completed.returncode != 0 or not lines:
+        raise RuntimeError(f"导入 project.main 失败:\n{completed.stderr[-2000:]}")
+    result = json.loads(lines[-1][len(_MARKER):])
+    packages = Counter()
+    for match in _IMPORTTIME.finditer(completed.stderr):
+        packages[match.group(2).split(".")[0]] += int(match.group(1))
+    result["top_packages"] = {name: round(us / 1e6, 3) for name, us in packages.most_common(10)}
+    return result
+
+
+def measure(cwd: str, runs: int = 3) -> Dict[str, Any]:
+    """在 cwd 下测量 runs 次（先预热一次字节码缓存），返回中位数"""
+    _measure_once(cwd)
+    results = [_measure_once(cwd) for _ in range(runs)]
+    median = sorted(results, key=lambda result: result["import_seconds"])[len(results) // 2]
+    return {
+        "import_seconds": round(statistics.median(r["import_seconds"] for r in results), 3),
+        "rss_mb": round(statistics.median(r["rss_mb"] for r in results), 1),
+        "max_rss_mb": round(statistics.median(r["max_rss_mb"] for r in results), 1),
+        "heavy_modules": median["heavy_modules"],
+        "top_packages": median["top_packages"],
+        "route_count": len(median["routes"]),
+        "routes": median["routes"],
+    }
+
+
+def _repo_root() -> str:
+    return subprocess.run(
+        ["git", "rev-parse", "--show-toplevel"], capture_output=True, text=True, check=True
+    ).stdout.strip()
+
+
+def run_benchmark(runs: int = 3, compare: Optional[str] = None) -> Dict[str, Any]:
+    """
+    返回 {"current": {...}, "baseline": {...}, "delta": {...}}（未指定 compare 时只有 current）
+    """
+    root = _repo_root()
+    report: Dict[str, Any] = {"current": measure(root, runs)}
+    if compare:
+        worktree = tempfile.mkdtemp(prefix="startup-baseline-")
+        try:
+            subprocess.run(["git", "worktree", "add", "--detach", worktree, compare],
+                           cwd=root, capture_output=True, check=True)
+            report["baseline"] = measure(worktree, runs)
+        finally:
+            subprocess.run(["git", "worktree", "remove", "--force", worktree], cwd=root, capture_output=True)
+            shutil.rmtree(worktree, ignore_errors=True)
+        current, baseline = report["current"], report["baseline"]
+        report["delta"] = {
+            "import_seconds": round(current["import_seconds"] - baseline["import_seconds"], 3),
+            "import_speedup": round(baseline["import_seconds"] / max(current["import_seconds"], 1e-9), 2),
+            "rss_mb": round(current["rss_mb"] - baseline["rss_mb"], 1),
+            "max_rss_mb": round(current["max_rss_mb"] - baseline["max_rss_mb"], 1),
+            "identical_routes": current["routes"] == baseline["routes"],
+        }
+    return report
+
+
+if __name__ == "__main__":
+    _parser = argparse.ArgumentParser(description="project.main 冷启动基准")
+    _parser.add_argument("--runs", type=int, default=3)
+    _parser.add_argument("--compare", help="作为基线的 git 引用，如 HEAD~1")
+    _args = _parser.parse_args()
+    _report = run_benchmark(_args.runs, _args.compare)
+    for _label in ("baseline", "current"):
+        if _label in _report:
+            _summary = {key: value for key, value in _report[_label].items() if key != "routes"}
+            print(f"{_label}: {_summary}")
+    if "delta" in _report:
+        print(f"delta: {_report['delta']}")
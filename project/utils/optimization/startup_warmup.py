@@ -0,0 +1,63 @@
+# project/utils/optimization/startup_warmup.py
+"""
+启动后后台预热
+
+jieba 词典、jieba.analyse 的 IDF 词典、sklearn 以及全局内容索引（TF-IDF）都改为首次使用时才加载，
+启动更快，但第一个用到它们的请求要多等 1~3 秒。start_warmup 在应用启动事件中创建一个后台任务，
+延迟 STARTUP_WARMUP_DELAY_SECONDS 秒（此时服务器已开始监听）后在线程中依次加载，
+预热期间到达的请求正常处理，不会被阻塞在启动阶段。
+
+STARTUP_WARMUP_ENABLED=false 时不预热（如测试、一次性脚本）。
+"""
+import os
+import time
+import asyncio
+import logging
+from typing import Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+STARTUP_WARMUP_ENABLED = os.getenv("STARTUP_WARMUP_ENABLED", "true").lower() == "true"
+STARTUP_WARMUP_DELAY_SECONDS = float(os.getenv("STARTUP_WARMUP_DELAY_SECONDS", "1.0"))
+
+
+def _warm_jieba():
+    import jieba
+    import jieba.analyse  # 导入时加载 IDF 词典
+    jieba.initialize()
+
+
+def _warm_sklearn():
+    import sklearn.feature_extraction.text  # noqa: F401
+    import sklearn.metrics.pairwise  # noqa: F401
+
+
+def _warm_content_index():
+    # 导入时创建全局内容索引（设置了 CONTENT_MATCHER_INDEX_PATH 时从文件加载）
+    from project.utils.recommendation import content_matcher  # noqa: F401
+
+
+WARMUP_STEPS: List[Tuple[str, Callable[[], None]]] = [
+    ("jieba", _warm_jieba),
+    ("sklearn", _warm_sklearn),
+    ("content_index", _warm_content_index),
+]
+
+
+async def run_warmup(delay: float = STARTUP_WARMUP_DELAY_SECONDS):
+    """等待 delay 秒后在线程中逐项预热，单项失败只记录日志"""
+    await asyncio.sleep(delay)
+    for name, step in WARMUP_STEPS:
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(step)
+            logger.info(f"预热 {name} 完成，耗时 {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            logger.warning(f"预热 {name} 失败: {e}")
+
+
+def start_warmup() -> Optional[asyncio.Task]:
+    """在当前事件循环中启动后台预热，未启用时返回 None"""
+    if not STARTUP_WARMUP_ENABLED:
+        return None
+    return asyncio.create_task(run_warmup())
@@ -0,0 +1,191 @@
+# project/utils/optimization/tag_matching_benchmark.py
+"""
+标签关键词匹配基准
+
+1. 一致性：在固定样例文本上，比较 TagExtractor.extract_tags 与逐词 str.count 扫描的旧实现，结果应完全相同
+2. 关键词匹配：用合成的大词典（默认1万个词）对合成文档（默认5000篇）做类别/技术关键词匹配，
+   对比逐词扫描与 Aho-Corasick 自动机一次扫描的耗时，并校验两者结果一致
+3. 批量提取：extract_tags_batch 在不同进程数下的吞吐量（篇/秒）
+
+运行: python -m project.utils.optimization.tag_matching_benchmark [词典词数] [文档数] [批量文档数]
+"""
+import sys
+import time
+import random
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+
+from project.utils.recommendation.tag_extractor import AHOCORASICK_AVAILABLE, TagExtractor
+
+FIXTURE_TEXTS = [
+    "Python 是一种广泛使用的编程语言，Django 和 Flask 是常用的 Web 开发框架，pandas 与 numpy 用于数据分析。",
+    "本课程介绍机器学习和深度学习的基础理论，使用 TensorFlow 与 PyTorch 完成实验，适合人工智能方向的学生学习。",
+    "JavaScript 前端开发：React、Vue、Angular 三大框架对比，Node.js 后端 API 设计与 REST/GraphQL 接口。",
+    "数据库课程：MySQL、PostgreSQL、MongoDB、Redis 的使用场景，SQL 查询优化与索引设计。",
+    "创业公司的市场营销与投资管理：如何分析金融数据，制定商业策略。",
+    "健康生活指南：合理营养、规律运动、心理保健，以及家庭日常的美食与旅游建议。",
+    "艺术设计与音乐创作：创意、审美与文学在美术教育中的作用。",
+    "Docker 与 Kubernetes 部署到 AWS 和 Azure 云计算平台，cloud native 架构实践 v1.25 版本。",
+    "javajavajava jsjsjs aaaa 算法算法算法 系统软件硬件网络 人工智能人工智能",
+    "",
+]
+
+
+def _legacy_category_tags(extractor: TagExtractor, content: str) -> List[Tuple[str, float]]:
+    category_scores = defaultdict(float)
+    content_lower = content.lower()
+    for category, keywords in extractor.category_keywords.items():
+        for keyword in keywords:
+            count = content_lower.count(keyword)
+            if count > 0:
+                category_scores[category] += count * 0.1
+    max_score = max(category_scores.values()) if category_scores else 1
+    return [(category, score / max_score) for category, score in category_scores.items() if score > 0]
+
+
+def _legacy_tech_tags(extractor: TagExtractor, content: str) -> List[Tuple[str, float]]:
+    tech_scores = defaultdict(float)
+    content_lower = content.lower()
+    for category, keywords in extractor.tech_subcategories.items():
+        for keyword in keywords:
+            count = content_lower.count(keyword)
+            if count > 0:
+                tech_scores[keyword] += count * 0.15
+                tech_scores[category] += count * 0.1
+    max_score = max(tech_scores.values()) if tech_scores else 1
+    return [(tech, score / max_score) for tech, score in tech_scores.items() if score > 0]
+
+
+def _legacy_tag_type(extractor: TagExtractor, tag: str) -> str:
+    if tag in extractor.category_keywords:
+        return 'category'
+    for keywords in extractor.tech_subcategories.values():
+        if tag in keywords:
+            return 'technology'
+    if tag in [kw for kws in extractor.category_keywords.values() for kw in kws]:
+        return 'keyword'
+    return 'general'
+
+
+def legacy_extract_tags(extractor: TagExtractor, content: str, max_tags: int = 10,
+                        min_confidence: float = 0.5) -> List[Dict[str, Any]]:
+    """改造前的 extract_tags：逐个关键词对全文做 str.count"""
+    all_tags = {}
+    for tag, weight in extractor._extract_tfidf_tags(content, max_tags):
+        all_tags[tag] = all_tags.get(tag, 0) + weight * 0.4
+    for tag, confidence in _legacy_category_tags(extractor, content):
+        all_tags[tag] = all_tags.get(tag, 0) + confidence * 0.3
+    for tag, confidence in _legacy_tech_tags(extractor, content):
+        all_tags[tag] = all_tags.get(tag, 0) + confidence * 0.2
+    for tag, confidence in extractor._extract_entity_tags(content):
+        all_tags[tag] = all_tags.get(tag, 0) + confidence * 0.1
+    tags = [
+        {'tag': tag, 'confidence': confidence, 'type': _legacy_tag_type(extractor, tag)}
+        for tag, confidence in all_tags.items()
+        if confidence >= min_confidence
+    ]
+    tags.sort(key=lambda x: x['confidence'], reverse=True)
+    return tags[:max_tags]
+
+
+def _synthetic_dictionaries(terms: int, seed: int):
+    rng = random.Random(seed)
+    han = [chr(code) for code in range(0x4e00, 0x4e00 + 800)]
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    vocabulary = set()
+    while len(vocabulary) < terms:
+        if rng.random() < 0.5:
+            vocabulary.add("".join(rng.choices(han, k=rng.randint(2, 4))))
+        else:
+            vocabulary.add("".join(rng.choices(letters, k=rng.randint(3, 8))))
+    vocabulary = sorted(vocabulary)
+    rng.shuffle(vocabulary)
+    half = len(vocabulary) // 2
+    category_keywords = {f"类别{i}": vocabulary[i:half:50] for i in range(50)}
+    tech_subcategories = {f"tech{i}": vocabulary[half + i::50] for i in range(50)}
+    return vocabulary, han, category_keywords, tech_subcategories
+
+
+def _synthetic_documents(vocabulary: List[str], han: List[str], documents: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(documents):
+        parts = []
+        for _ in range(rng.randint(40, 120)):
+            if rng.random() < 0.3:
+                parts.append(rng.choice(vocabulary))
+            else:
+                parts.append("".join(rng.choices(han, k=rng.randint(2, 6))))
+        texts.append("，".join(parts))
+    return texts
+
+
+def run_benchmark(terms: int = 10000, documents: int = 5000, batch_documents: int = 2000,
+                  worker_counts: Tuple[int, ...] = (1, 2, 4), seed: int = 42) -> Dict[str, Any]:
+    """
+    返回 {"fixtures_identical", "matching": {...}, "batch_docs_per_second": {进程数: 篇/秒}}
+    """
+    default_extractor = TagExtractor(workers=1)
+    fixtures_identical = all(
+        default_extractor.extract_tags(text, max_tags) == legacy_extract_tags(default_extractor, text, max_tags)
+        for text in FIXTURE_TEXTS
+        for max_tags in (5, 10, 15)
+    )
+
+    vocabulary, han, category_keywords, tech_subcategories = _synthetic_dictionaries(terms, seed)
+    texts = _synthetic_documents(vocabulary, han, documents, seed + 1)
+
+    build_start = time.perf_counter()
+    extractor = TagExtractor(category_keywords, tech_subcategories, workers=1)
+    build_ms = (time.perf_counter() - build_start) * 1000
+
+    start = time.perf_counter()
+    legacy = [(_legacy_category_tags(extractor, text), _legacy_tech_tags(extractor, text)) for text in texts]
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    automaton = []
+    for text in texts:
+        matches = extractor._dictionary.scan(text.lower())
+        automaton.append((extractor._extract_category_tags(text, matches), extractor._extract_tech_tags(text, matches)))
+    automaton_seconds = time.perf_counter() - start
+
+    batch_texts = texts[:batch_documents]
+    expected = [extractor.extract_tags(text, 10) for text in batch_texts[:200]]
+    throughput = {}
+    batch_identical = True
+    for workers in worker_counts:
+        extractor.extract_tags_batch(batch_texts[:workers * 4], 10, workers=workers)  # 预热进程池
+        start = time.perf_counter()
+        results = extractor.extract_tags_batch(batch_texts, 10, workers=workers)
+        throughput[workers] = round(len(batch_texts) / (time.perf_counter() - start), 1)
+        batch_identical = batch_identical and results[:200] == expected
+    extractor.close()
+
+    return {
+        "fixtures_identical": fixtures_identical,
+        "matching": {
+            "backend": "pyahocorasick" if AHOCORASICK_AVAILABLE else "pure-python",
+            "terms": len(vocabulary),
+            "documents": documents,
+            "automaton_build_ms": round(build_ms, 1),
+            "legacy_ms_per_doc": round(legacy_seconds * 1000 / documents, 3),
+            "automaton_ms_per_doc": round(automaton_seconds * 1000 / documents, 3),
+            "speedup": round(legacy_seconds / automaton_seconds, 1),
+            "identical": legacy == automaton,
+        },
+        "batch_identical": batch_identical,
+        "batch_docs_per_second": throughput,
+    }
+
+
+if __name__ == "__main__":
+    _terms = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    _documents = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    _batch = int(sys.argv[3]) if len(sys.argv) > 3 else 2000
+    _report = run_benchmark(_terms, _documents, _batch)
+    print(f"样例文本结果与旧实现一致: {_report['fixtures_identical']}")
+    print(f"关键词匹配: {_report['matching']}")
+    print(f"批量结果与逐条提取一致: {_report['batch_identical']}")
+    for _workers, _rate in _report["batch_docs_per_second"].items():
+        print(f"批量提取 {_workers} 进程: {_rate} 篇/秒")
@@ -1,36 +1,48 @@
 # project/utils/recommendation/__init__.py
 """
 推荐算法工具模块
-"""
 
-from .behavior_analyzer import BehaviorAnalyzer, UserAction, UserBehavior, UserProfile
-from .content_matcher import ContentMatcher, SimilarityCalculator
-from .tag_extractor import TagExtractor, KeywordExtractor
+子模块按需导入：访问下列名称时才加载对应子模块（content_matcher、tag_extractor 会间接加载 sklearn/jieba），
+只使用 tag_index、item_similarity 等子模块时不会加载它们
+"""
 
-# 便捷函数导入
-from .behavior_analyzer import record_user_behavior, get_user_profile, get_user_behaviors
-from .content_matcher import add_document_to_index, find_similar_documents, calculate_similarity
-from .tag_extractor import extract_tags_from_content, suggest_document_tags, extract_keywords_from_text
+import importlib
 
-__all__ = [
+_EXPORTS = {
     # 类
-    'BehaviorAnalyzer',
-    'UserAction',
-    'UserBehavior', 
-    'UserProfile',
-    'ContentMatcher',
-    'SimilarityCalculator',
-    'TagExtractor',
-    'KeywordExtractor',
-    
+    'BehaviorAnalyzer': '.behavior_analyzer',
+    'UserAction': '.behavior_analyzer',
+    'UserBehavior': '.behavior_analyzer',
+    'UserProfile': '.behavior_analyzer',
+    'ContentMatcher': '.content_matcher',
+    'SimilarityCalculator': '.content_matcher',
+    'TagExtractor': '.tag_extractor',
+    'KeywordExtractor': '.tag_extractor',
+
     # 便捷函数
-    'record_user_behavior',
-    'get_user_profile',
-    'get_user_behaviors',
-    'add_document_to_index',
-    'find_similar_documents',
-    'calculate_similarity',
-    'extract_tags_from_content',
-    'suggest_document_tags',
-    'extract_keywords_from_text'
-]
+    'record_user_behavior': '.behavior_analyzer',
+    'get_user_profile': '.behavior_analyzer',
+    'get_user_behaviors': '.behavior_analyzer',
+    'add_document_to_index': '.content_matcher',
+    'find_similar_documents': '.content_matcher',
+    'calculate_similarity': '.content_matcher',
+    'save_content_index': '.content_matcher',
+    'extract_tags_from_content': '.tag_extractor',
+    'suggest_document_tags': '.tag_extractor',
+    'extract_keywords_from_text': '.tag_extractor',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -2,8 +2,22 @@
 """
 用户行为分析工具
 从 routers/knowledge/intelligent_recommendation.py 提取的核心算法
+
+用户画像由一组按时间指数衰减的累计值得到（时间常数 BEHAVIOR_DECAY_DAYS 天）：
+    兴趣标签、内容类别：Σ 行为权重 × exp(-(now - t) / τ)
+    偏好格式、活跃时段、行为类型、星期分布：Σ 1 × exp(-(now - t) / τ)
+    活跃度：最近 BEHAVIOR_ACTIVITY_WINDOW_DAYS 天按天汇总的行为权重（不衰减）
+
+两种模式（BEHAVIOR_PROFILE_MODE）：
+- incremental（默认）：record_behavior 通过一个 Lua 脚本原子地更新上述累计值，
+  build_user_profile 只读取 O(标签数) 个字段，与用户行为条数无关。
+  衰减采用前向衰减：累计值按固定基准时间 t0 存储为 Σ w·exp((t - t0)/τ)，
+  读取时统一乘以 exp(-(now - t0)/τ)，写入时无需改动已有字段
+- replay：build_user_profile 回放 Redis 中的原始行为列表（最多1000条）重新计算，
+  也作为增量画像的一致性校验（verify_incremental_profile）
 """
 
+import os
 import json
 import time
 import math
@@ -13,13 +27,87 @@ from enum import Enum
 from dataclasses import dataclass, asdict
 from collections import defaultdict, Counter
 import logging
-import redis
-import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 
 logger = logging.getLogger(__name__)
 
+BEHAVIOR_PROFILE_MODE = os.getenv("BEHAVIOR_PROFILE_MODE", "incremental").lower()
+BEHAVIOR_DECAY_DAYS = float(os.getenv("BEHAVIOR_DECAY_DAYS", "30"))
+BEHAVIOR_ACTIVITY_WINDOW_DAYS = int(os.getenv("BEHAVIOR_ACTIVITY_WINDOW_DAYS", "30"))
+# 增量画像的Redis键过期时间（用户长期无行为时自动清理）
+BEHAVIOR_PROFILE_TTL = int(os.getenv("BEHAVIOR_PROFILE_TTL", str(180 * 86400)))
+
+# 记录一条行为：更新兴趣标签有序集合、衰减计数哈希和按天活跃度哈希
+# KEYS: 1=累计值哈希 2=兴趣标签有序集合 3=按天活跃度哈希
+# ARGV: 1=行为时间戳(秒) 2=衰减时间常数(秒) 3=行为权重 4=日期序号 5=活跃度窗口天数 6=过期秒数
+#       7=标签数 8=按权重累计的字段数，之后依次为标签、按权重累计的字段、按次数累计的字段
+_RECORD_BEHAVIOR_LUA = """
+local ts = tonumber(ARGV[1])
+local tau = tonumber(ARGV[2])
+local weight = tonumber(ARGV[3])
+local day = tonumber(ARGV[4])
+local window = tonumber(ARGV[5])
+local ttl = tonumber(ARGV[6])
+local tag_count = tonumber(ARGV[7])
+local weighted_count = tonumber(ARGV[8])
+
+local t0 = tonumber(redis.call('HGET', KEYS[1], '_t0'))
+if not t0 then
+    t0 = ts
+    redis.call('HSET', KEYS[1], '_t0', t0)
+end
+
+local exponent = (ts - t0) / tau
+if exponent > 50 then
+    -- 基准时间过旧，把已有累计值换算到新基准，避免数值溢出
+    local scale = math.exp(-exponent)
+    local fields = redis.call('HGETALL', KEYS[1])
+    for i = 1, #fields, 2 do
+        if string.sub(fields[i], 1, 1) ~= '_' then
+            redis.call('HSET', KEYS[1], fields[i], tonumber(fields[i + 1]) * scale)
+        end
+    end
+    local tags = redis.call('ZRANGE', KEYS[2], 0, -1, 'WITHSCORES')
+    for i = 1, #tags, 2 do
+        redis.call('ZADD', KEYS[2], tonumber(tags[i + 1]) * scale, tags[i])
+    end
+    t0 = ts
+    redis.call('HSET', KEYS[1], '_t0', t0)
+    exponent = 0
+end
+
+local factor = math.exp(exponent)
+local index = 9
+for i = 1, tag_count do
+    redis.call('ZINCRBY', KEYS[2], weight * factor, ARGV[index])
+    index = index + 1
+end
+for i = 1, weighted_count do
+    redis.call('HINCRBYFLOAT', KEYS[1], ARGV[index], weight * factor)
+    index = index + 1
+end
+while index <= #ARGV do
+    redis.call('HINCRBYFLOAT', KEYS[1], ARGV[index], factor)
+    index = index + 1
+end
+
+redis.call('HINCRBYFLOAT', KEYS[3], day, weight)
+for _, field in ipairs(redis.call('HKEYS', KEYS[3])) do
+    if tonumber(field) <= day - window then
+        redis.call('HDEL', KEYS[3], field)
+    end
+end
+
+local updated = tonumber(redis.call('HGET', KEYS[1], '_updated'))
+if not updated or ts > updated then
+    redis.call('HSET', KEYS[1], '_updated', ts)
+end
+redis.call('HINCRBY', KEYS[1], '_events', 1)
+for i = 1, 3 do
+    redis.call('EXPIRE', KEYS[i], ttl)
+end
+return 1
+"""
+
 class UserAction(str, Enum):
     """用户行为类型"""
     VIEW = "view"
@@ -74,6 +162,7 @@ class BehaviorAnalyzer:
     """用户行为分析器"""
     
     def __init__(self, redis_client=None):
+        # 需传入 redis.asyncio 客户端，所有Redis操作均以 await 调用
         self.redis_client = redis_client
         self.behavior_weights = {
             UserAction.VIEW: 1.0,
@@ -88,6 +177,7 @@ class BehaviorAnalyzer:
             UserAction.UPLOAD: 2.5,
             UserAction.TAG: 2.0
         }
+        self._record_script = None
     
     async def record_behavior(self, behavior: UserBehavior):
         """记录用户行为"""
@@ -99,14 +189,64 @@ class BehaviorAnalyzer:
                 await self.redis_client.ltrim(behavior_key, 0, 999)  # 保留最近1000条记录
             
             # 更新用户画像
-            await self._update_user_profile(behavior)
+            if BEHAVIOR_PROFILE_MODE == "incremental":
+                await self._apply_behavior_incremental(behavior)
+            else:
+                await self._update_user_profile(behavior)
             
         except Exception as e:
             logger.error(f"记录用户行为失败: {e}")
     
+    @staticmethod
+    def _profile_keys(user_id: int) -> List[str]:
+        return [f"user_profile_agg:{user_id}", f"user_interest:{user_id}", f"user_activity:{user_id}"]
+    
+    def _behavior_fields(self, behavior: UserBehavior) -> Tuple[float, List[str], List[str], List[str]]:
+        """
+        一条行为对应的累计字段：(权重, 兴趣标签, 按权重累计的字段, 按次数累计的字段)
+        
+        增量更新与全量回放共用，保证两条路径的口径一致
+        """
+        weight = self.behavior_weights.get(behavior.action, 1.0)
+        metadata = behavior.metadata or {}
+        action = behavior.action.value if isinstance(behavior.action, UserAction) else str(behavior.action)
+        tags = [str(tag) for tag in metadata.get('tags', [])]
+        weighted = [f"c:{metadata.get('category', 'unknown')}"]
+        counted = [
+            f"h:{behavior.timestamp.hour}",
+            f"a:{action}",
+            f"w:{behavior.timestamp.weekday()}",
+        ]
+        if behavior.action in (UserAction.VIEW, UserAction.DOWNLOAD):
+            counted.append(f"f:{metadata.get('format', 'unknown')}")
+        return weight, tags, weighted, counted
+    
+    async def _apply_behavior_incremental(self, behavior: UserBehavior):
+        """用 Lua 脚本原子地把一条行为累加到用户画像的各项累计值上"""
+        if not self.redis_client:
+            return
+        if self._record_script is None:
+            self._record_script = self.redis_client.register_script(_RECORD_BEHAVIOR_LUA)
+        weight, tags, weighted, counted = self._behavior_fields(behavior)
+        await self._record_script(
+            keys=self._profile_keys(behavior.user_id),
+            args=[
+                behavior.timestamp.timestamp(),
+                BEHAVIOR_DECAY_DAYS * 86400,
+                weight,
+                behavior.timestamp.date().toordinal(),
+                BEHAVIOR_ACTIVITY_WINDOW_DAYS,
+                BEHAVIOR_PROFILE_TTL,
+                len(tags),
+                len(weighted),
+                *tags, *weighted, *counted
+            ]
+        )
+    
     async def get_user_behaviors(self, user_id: int, 
-                               time_range: timedelta = None) -> List[UserBehavior]:
-        """获取用户行为历史"""
+                               time_range: timedelta = None,
+                               all_history: bool = False) -> List[UserBehavior]:
+        """获取用户行为历史（all_history=True 时返回列表中保存的全部行为）"""
         if not self.redis_client:
             return []
         
@@ -115,13 +255,13 @@ class BehaviorAnalyzer:
             raw_behaviors = await self.redis_client.lrange(behavior_key, 0, -1)
             
             behaviors = []
-            cutoff_time = datetime.now() - (time_range or timedelta(days=30))
+            cutoff_time = None if all_history else datetime.now() - (time_range or timedelta(days=30))
             
             for raw_behavior in raw_behaviors:
                 behavior_data = json.loads(raw_behavior)
                 behavior_time = datetime.fromisoformat(behavior_data['timestamp'])
                 
-                if behavior_time >= cutoff_time:
+                if cutoff_time is None or behavior_time >= cutoff_time:
                     behavior = UserBehavior(
                         user_id=behavior_data['user_id'],
                         action=UserAction(behavior_data['action']),
@@ -141,36 +281,14 @@ class BehaviorAnalyzer:
     
     async def build_user_profile(self, user_id: int) -> UserProfile:
         """构建用户画像"""
+        if BEHAVIOR_PROFILE_MODE == "incremental" and self.redis_client:
+            try:
+                return await self.build_user_profile_incremental(user_id)
+            except Exception as e:
+                logger.error(f"读取增量用户画像失败，回退到全量回放: {e}")
+        
         try:
-            behaviors = await self.get_user_behaviors(user_id, timedelta(days=30))
-            
-            if not behaviors:
-                return self._create_empty_profile(user_id)
-            
-            # 分析兴趣标签
-            interests = self._analyze_interests(behaviors)
-            
-            # 分析内容类别偏好
-            categories = self._analyze_categories(behaviors)
-            
-            # 计算活跃度
-            activity_level = self._calculate_activity_level(behaviors)
-            
-            # 分析偏好格式
-            preferred_formats = self._analyze_preferred_formats(behaviors)
-            
-            # 分析交互模式
-            interaction_patterns = self._analyze_interaction_patterns(behaviors)
-            
-            profile = UserProfile(
-                user_id=user_id,
-                interests=interests,
-                categories=categories,
-                activity_level=activity_level,
-                preferred_formats=preferred_formats,
-                interaction_patterns=interaction_patterns,
-                last_updated=datetime.now()
-            )
+            profile = await self.build_user_profile_replay(user_id)
             
             # 缓存用户画像
             if self.redis_client:
@@ -178,7 +296,7 @@ class BehaviorAnalyzer:
                 await self.redis_client.setex(
                     profile_key, 
                     3600,  # 1小时缓存
-                    json.dumps(profile.to_dict())
+                    json.dumps(profile.to_dict(), default=str)
                 )
             
             return profile
@@ -187,9 +305,133 @@ class BehaviorAnalyzer:
             logger.error(f"构建用户画像失败: {e}")
             return self._create_empty_profile(user_id)
     
+    async def build_user_profile_incremental(self, user_id: int, now: datetime = None) -> UserProfile:
+        """从增量累计值构建用户画像：一次事务读取3个键，代价只与标签/字段数有关"""
+        now = now or datetime.now()
+        agg_key, interest_key, activity_key = self._profile_keys(user_id)
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.hgetall(agg_key)
+            pipe.zrange(interest_key, 0, -1, withscores=True)
+            pipe.hgetall(activity_key)
+            raw_fields, raw_tags, raw_days = await pipe.execute()
+        
+        fields = {_decode(key): float(value) for key, value in raw_fields.items()}
+        t0 = fields.pop('_t0', None)
+        fields.pop('_updated', None)
+        fields.pop('_events', None)
+        if t0 is None:
+            return self._create_empty_profile(user_id)
+        
+        # 前向衰减：存储值为 Σ w·exp((t - t0)/τ)，乘以 exp(-(now - t0)/τ) 得到当前值
+        scale = math.exp(-(now.timestamp() - t0) / (BEHAVIOR_DECAY_DAYS * 86400))
+        tags = {_decode(tag): score * scale for tag, score in raw_tags}
+        counters = {key: value * scale for key, value in fields.items()}
+        daily = {int(_decode(day)): float(value) for day, value in raw_days.items()}
+        return self._profile_from_aggregates(user_id, tags, counters, daily, now)
+    
+    async def build_user_profile_replay(self, user_id: int, now: datetime = None) -> UserProfile:
+        """回放 Redis 中保存的原始行为（最多1000条）重新计算用户画像"""
+        behaviors = await self.get_user_behaviors(user_id, all_history=True)
+        return self.replay_profile(user_id, behaviors, now)
+    
+    def replay_profile(self, user_id: int, behaviors: List[UserBehavior], now: datetime = None) -> UserProfile:
+        """按与增量更新相同的口径，从行为列表计算用户画像"""
+        now = now or datetime.now()
+        if not behaviors:
+            return self._create_empty_profile(user_id)
+        
+        tau = BEHAVIOR_DECAY_DAYS * 86400
+        now_ts = now.timestamp()
+        tags: Dict[str, float] = defaultdict(float)
+        counters: Dict[str, float] = defaultdict(float)
+        daily: Dict[int, float] = defaultdict(float)
+        for behavior in behaviors:
+            weight, behavior_tags, weighted, counted = self._behavior_fields(behavior)
+            decay = math.exp(-(now_ts - behavior.timestamp.timestamp()) / tau)
+            for tag in behavior_tags:
+                tags[tag] += weight * decay
+            for field in weighted:
+                counters[field] += weight * decay
+            for field in counted:
+                counters[field] += decay
+            daily[behavior.timestamp.date().toordinal()] += weight
+        return self._profile_from_aggregates(user_id, tags, counters, daily, now)
+    
+    async def verify_incremental_profile(self, user_id: int, tolerance: float = 1e-6) -> Dict[str, Any]:
+        """
+        一致性校验：比较增量画像与全量回放的兴趣、类别和活跃度
+        
+        原始行为列表只保留最近1000条，用户行为超过1000条时（history_truncated）回放结果本身不完整，差异仅供参考
+        """
+        now = datetime.now()
+        incremental = await self.build_user_profile_incremental(user_id, now)
+        replayed = await self.build_user_profile_replay(user_id, now)
+        events = await self.redis_client.hget(self._profile_keys(user_id)[0], '_events')
+        stored = await self.redis_client.llen(f"user_behavior:{user_id}")
+        
+        def max_diff(left: Dict[str, float], right: Dict[str, float]) -> float:
+            keys = set(left) | set(right)
+            return max((abs(left.get(key, 0.0) - right.get(key, 0.0)) for key in keys), default=0.0)
+        
+        differences = {
+            'interests': max_diff(incremental.interests, replayed.interests),
+            'categories': max_diff(incremental.categories, replayed.categories),
+            'activity_level': abs(incremental.activity_level - replayed.activity_level),
+        }
+        return {
+            'user_id': user_id,
+            'consistent': all(value <= tolerance for value in differences.values()),
+            'max_differences': differences,
+            'incremental_events': int(events or 0),
+            'stored_events': stored,
+            'history_truncated': int(events or 0) > stored,
+        }
+    
+    def _profile_from_aggregates(self, user_id: int, tags: Dict[str, float], counters: Dict[str, float],
+                                 daily: Dict[int, float], now: datetime) -> UserProfile:
+        """由衰减累计值和按天活跃度构建用户画像（增量与回放两条路径共用）"""
+        grouped: Dict[str, Dict[str, float]] = defaultdict(dict)
+        for key, value in counters.items():
+            prefix, _, name = key.partition(':')
+            grouped[prefix][name] = value
+        
+        def normalize(scores: Dict[str, float]) -> Dict[str, float]:
+            total = sum(scores.values())
+            return {name: score / total for name, score in scores.items()} if total > 0 else {}
+        
+        def top(scores: Dict[str, float], count: int) -> List[str]:
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+            return [name for name, score in ranked[:count] if score > 0]
+        
+        # 活跃度：窗口内按天汇总的行为权重，除以从最早活跃日到今天的天数
+        today = now.date().toordinal()
+        window = {day: value for day, value in daily.items() if day > today - BEHAVIOR_ACTIVITY_WINDOW_DAYS}
+        activity_level = 0.0
+        if window:
+            total_days = today - min(window) + 1
+            activity_level = min(max(sum(window.values()), 0.0) / total_days / 10.0, 1.0)
+        
+        return UserProfile(
+            user_id=user_id,
+            interests=normalize(tags),
+            categories=normalize(grouped['c']),
+            activity_level=activity_level,
+            preferred_formats=top(grouped['f'], 5),
+            interaction_patterns={
+                'most_active_hours': [int(hour) for hour in top(grouped['h'], 3)],
+                'session_duration_avg': 0.0,
+                'preferred_actions': top(grouped['a'], 3),
+                'weekly_pattern': {int(day): value for day, value in grouped['w'].items()},
+            },
+            last_updated=now
+        )
+    
     async def get_user_profile(self, user_id: int) -> UserProfile:
-        """获取用户画像（优先从缓存）"""
+        """获取用户画像（增量模式直接读取累计值，回放模式优先从缓存）"""
         try:
+            if BEHAVIOR_PROFILE_MODE == "incremental" and self.redis_client:
+                return await self.build_user_profile(user_id)
+            
             # 先从缓存获取
             if self.redis_client:
                 profile_key = f"user_profile:{user_id}"
@@ -207,112 +449,6 @@ class BehaviorAnalyzer:
             logger.error(f"获取用户画像失败: {e}")
             return self._create_empty_profile(user_id)
     
-    def _analyze_interests(self, behaviors: List[UserBehavior]) -> Dict[str, float]:
-        """分析用户兴趣标签"""
-        interest_scores = defaultdict(float)
-        
-        for behavior in behaviors:
-            weight = self.behavior_weights.get(behavior.action, 1.0)
-            
-            # 从元数据中提取标签
-            tags = behavior.metadata.get('tags', []) if behavior.metadata else []
-            for tag in tags:
-                interest_scores[tag] += weight
-            
-            # 时间衰减
-            days_ago = (datetime.now() - behavior.timestamp).days
-            decay_factor = math.exp(-days_ago / 30.0)  # 30天半衰期
-            
-            for tag in tags:
-                interest_scores[tag] *= decay_factor
-        
-        # 归一化
-        total_score = sum(interest_scores.values())
-        if total_score > 0:
-            return {tag: score / total_score for tag, score in interest_scores.items()}
-        
-        return {}
-    
-    def _analyze_categories(self, behaviors: List[UserBehavior]) -> Dict[str, float]:
-        """分析内容类别偏好"""
-        category_scores = defaultdict(float)
-        
-        for behavior in behaviors:
-            weight = self.behavior_weights.get(behavior.action, 1.0)
-            category = behavior.metadata.get('category', 'unknown') if behavior.metadata else 'unknown'
-            category_scores[category] += weight
-        
-        # 归一化
-        total_score = sum(category_scores.values())
-        if total_score > 0:
-            return {cat: score / total_score for cat, score in category_scores.items()}
-        
-        return {}
-    
-    def _calculate_activity_level(self, behaviors: List[UserBehavior]) -> float:
-        """计算用户活跃度"""
-        if not behaviors:
-            return 0.0
-        
-        # 按天分组计算活跃度
-        daily_activities = defaultdict(float)
-        
-        for behavior in behaviors:
-            date_key = behavior.timestamp.date()
-            weight = self.behavior_weights.get(behavior.action, 1.0)
-            daily_activities[date_key] += weight
-        
-        # 计算平均活跃度
-        total_days = (datetime.now().date() - min(daily_activities.keys())).days + 1
-        avg_activity = sum(daily_activities.values()) / total_days
-        
-        # 归一化到0-1范围
-        return min(avg_activity / 10.0, 1.0)
-    
-    def _analyze_preferred_formats(self, behaviors: List[UserBehavior]) -> List[str]:
-        """分析偏好格式"""
-        format_counts = defaultdict(int)
-        
-        for behavior in behaviors:
-            if behavior.action in [UserAction.VIEW, UserAction.DOWNLOAD]:
-                file_format = behavior.metadata.get('format', 'unknown') if behavior.metadata else 'unknown'
-                format_counts[file_format] += 1
-        
-        # 返回使用频率最高的格式
-        sorted_formats = sorted(format_counts.items(), key=lambda x: x[1], reverse=True)
-        return [fmt for fmt, count in sorted_formats[:5]]  # 返回前5种格式
-    
-    def _analyze_interaction_patterns(self, behaviors: List[UserBehavior]) -> Dict[str, Any]:
-        """分析交互模式"""
-        patterns = {
-            'most_active_hours': [],
-            'session_duration_avg': 0.0,
-            'preferred_actions': [],
-            'weekly_pattern': defaultdict(int)
-        }
-        
-        # 分析活跃时间段
-        hour_counts = defaultdict(int)
-        for behavior in behaviors:
-            hour_counts[behavior.timestamp.hour] += 1
-        
-        sorted_hours = sorted(hour_counts.items(), key=lambda x: x[1], reverse=True)
-        patterns['most_active_hours'] = [hour for hour, count in sorted_hours[:3]]
-        
-        # 分析行为偏好
-        action_counts = defaultdict(int)
-        for behavior in behaviors:
-            action_counts[behavior.action] += 1
-        
-        sorted_actions = sorted(action_counts.items(), key=lambda x: x[1], reverse=True)
-        patterns['preferred_actions'] = [action for action, count in sorted_actions[:3]]
-        
-        # 分析周模式
-        for behavior in behaviors:
-            patterns['weekly_pattern'][behavior.timestamp.weekday()] += 1
-        
-        return patterns
-    
     def _create_empty_profile(self, user_id: int) -> UserProfile:
         """创建空的用户画像"""
         return UserProfile(
@@ -357,6 +493,9 @@ class BehaviorAnalyzer:
         except Exception as e:
             logger.error(f"更新用户画像失败: {e}")
 
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
 # 创建全局实例
 behavior_analyzer = BehaviorAnalyzer()
 
@@ -4,30 +4,79 @@
 基于文本内容进行相似度计算和推荐
 """
 
+import os
 import re
+import json
 import math
-from typing import Dict, List, Optional, Any, Tuple
+import threading
+from typing import Dict, Iterable, List, Optional, Any, Tuple
 import logging
-import jieba
-import jieba.analyse
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import scipy.sparse as sp
 from collections import defaultdict
 
 logger = logging.getLogger(__name__)
 
+# 哈希特征维度（词和二元词组哈希到该维度，维度越大冲突越少）
+CONTENT_MATCHER_N_FEATURES = int(os.getenv("CONTENT_MATCHER_N_FEATURES", str(2 ** 20)))
+# 全局索引的持久化路径，设置后启动时自动加载
+CONTENT_MATCHER_INDEX_PATH = os.getenv("CONTENT_MATCHER_INDEX_PATH")
+# 已删除（被更新覆盖）的行占比超过该值时压缩存储
+_COMPACT_RATIO = 0.2
+# 批量查询时每批相似度矩阵的最大元素数
+_BATCH_SCORE_ELEMENTS = 4_000_000
+
+
+def _jieba_analyse():
+    """首次使用时才导入 jieba.analyse（导入时加载 IDF 词典，约 1 秒）"""
+    import jieba.analyse
+    return jieba.analyse
+
+
 class ContentMatcher:
-    """内容匹配器"""
+    """
+    内容匹配器 - 增量稀疏 TF-IDF 索引
+
+    - HashingVectorizer 把文本映射为固定维度的词频向量，没有词表，添加文档无需重新拟合
+    - 各文档词频按 CSR 格式追加存储，文档频率（df）随添加/删除增量更新，添加一篇文档为 O(文档长度)
+    - IDF 按 sklearn TfidfVectorizer 的平滑公式由 df 计算：idf = ln((1 + n) / (1 + df)) + 1
+    - 相似度查询为一次稀疏矩阵乘法：D · diag(idf²) · q / (‖D·idf‖ ‖q·idf‖)
+    - 同一 doc_id 再次添加视为更新，旧行标记删除，删除行较多时压缩
+    - save/load 持久化为 .npz 文件
+    """
     
-    def __init__(self):
-        self.vectorizer = TfidfVectorizer(
-            max_features=1000,
-            stop_words=None,
-            ngram_range=(1, 2)
+    def __init__(self, n_features: int = CONTENT_MATCHER_N_FEATURES):
+        from sklearn.feature_extraction.text import HashingVectorizer
+        
+        self.n_features = n_features
+        # 输入为 preprocess_text 分词后以空格分隔的文本
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features,
+            ngram_range=(1, 2),
+            token_pattern=r"(?u)\S+",
+            lowercase=False,
+            alternate_sign=False,
+            norm=None
         )
-        self.document_vectors = {}
-        self.document_texts = {}
+        self.document_metadata: Dict[int, Dict[str, Any]] = {}
+        self._lock = threading.RLock()
+        self._reset_storage()
+    
+    def _reset_storage(self):
+        self._data = np.empty(1024, dtype=np.float32)
+        self._indices = np.empty(1024, dtype=np.int32)
+        self._indptr = np.zeros(1024, dtype=np.int64)
+        self._nnz = 0
+        self._row_ids: List[int] = []
+        self._active = np.zeros(1024, dtype=bool)
+        self._row_of: Dict[int, int] = {}
+        self._removed = 0
+        self._df = np.zeros(self.n_features, dtype=np.int32)
+        self._version = 0
+        self._cache: Optional[Tuple[int, sp.csr_matrix, np.ndarray, np.ndarray, np.ndarray]] = None
+    
+    def __len__(self) -> int:
+        return len(self._row_of)
     
     def preprocess_text(self, text: str) -> str:
         """预处理文本"""
@@ -37,6 +86,7 @@ class ContentMatcher:
             text = re.sub(r'\s+', ' ', text)
             
             # 中文分词
+            import jieba
             words = jieba.cut(text)
             processed_text = ' '.join(words)
             
@@ -47,87 +97,151 @@ class ContentMatcher:
             return text
     
     def add_document(self, doc_id: int, content: str, metadata: Dict[str, Any] = None):
-        """添加文档到索引"""
+        """添加文档到索引（已存在时更新）"""
+        self.add_documents([(doc_id, content, metadata)])
+    
+    def add_documents(self, documents: Iterable[Tuple[int, str, Optional[Dict[str, Any]]]]):
+        """批量添加文档到索引，documents 为 (doc_id, content, metadata) 序列"""
         try:
-            processed_content = self.preprocess_text(content)
-            self.document_texts[doc_id] = {
-                'content': processed_content,
-                'metadata': metadata or {}
-            }
+            documents = list(documents)
+            if not documents:
+                return
+            rows = self._vectorize([content for _, content, _ in documents])
             
-            # 重新构建向量索引
-            self._rebuild_vectors()
+            with self._lock:
+                for position, (doc_id, _, metadata) in enumerate(documents):
+                    self._remove_row(doc_id)
+                    start, end = rows.indptr[position], rows.indptr[position + 1]
+                    self._append_row(doc_id, rows.indices[start:end], rows.data[start:end])
+                    self.document_metadata[doc_id] = metadata or {}
+                self._version += 1
+                self._maybe_compact()
             
         except Exception as e:
             logger.error(f"添加文档失败: {e}")
     
+    def remove_document(self, doc_id: int) -> bool:
+        """从索引中删除文档"""
+        with self._lock:
+            if not self._remove_row(doc_id):
+                return False
+            self.document_metadata.pop(doc_id, None)
+            self._version += 1
+            self._maybe_compact()
+            return True
+    
     def find_similar_documents(self, doc_id: int, 
                              threshold: float = 0.5, 
                              limit: int = 10) -> List[Tuple[int, float]]:
         """查找相似文档"""
+        return self.find_similar_documents_batch([doc_id], threshold, limit).get(doc_id, [])
+    
+    def find_similar_documents_batch(self, doc_ids: List[int],
+                                     threshold: float = 0.5,
+                                     limit: int = 10) -> Dict[int, List[Tuple[int, float]]]:
+        """批量查找相似文档，一批文档的相似度由一次稀疏矩阵乘法得到"""
         try:
-            if doc_id not in self.document_vectors:
-                return []
-            
-            target_vector = self.document_vectors[doc_id]
-            similarities = []
-            
-            for other_id, other_vector in self.document_vectors.items():
-                if other_id != doc_id:
-                    similarity = cosine_similarity([target_vector], [other_vector])[0][0]
-                    if similarity >= threshold:
-                        similarities.append((other_id, similarity))
-            
-            # 按相似度排序
-            similarities.sort(key=lambda x: x[1], reverse=True)
-            return similarities[:limit]
+            with self._lock:
+                matrix, idf, idf_sq, norms = self._scoring_state()
+                rows = [self._row_of[doc_id] for doc_id in doc_ids if doc_id in self._row_of]
+                row_ids = list(self._row_ids)
+            if not rows:
+                return {}
+            
+            results = {}
+            for query_rows, similarities in self._score(matrix[rows], rows, matrix, idf, idf_sq, norms):
+                for row, scores in zip(query_rows, similarities):
+                    scores[row] = -np.inf  # 排除自身
+                    results[row_ids[row]] = self._top_k(scores, row_ids, threshold, limit)
+            return results
             
         except Exception as e:
             logger.error(f"查找相似文档失败: {e}")
-            return []
+            return {}
     
     def find_similar_by_content(self, content: str, 
                                threshold: float = 0.5, 
                                limit: int = 10) -> List[Tuple[int, float]]:
-        """根据内容查找相似文档"""
+        """根据内容查找相似文档（不修改索引）"""
         try:
-            processed_content = self.preprocess_text(content)
-            
-            if not self.document_texts:
-                return []
-            
-            # 计算输入内容的向量
-            all_texts = [processed_content] + [
-                doc['content'] for doc in self.document_texts.values()
-            ]
-            
-            vectors = self.vectorizer.fit_transform(all_texts)
-            input_vector = vectors[0]
-            doc_vectors = vectors[1:]
-            
-            similarities = []
-            doc_ids = list(self.document_texts.keys())
-            
-            for i, doc_id in enumerate(doc_ids):
-                similarity = cosine_similarity(input_vector, doc_vectors[i])[0][0]
-                if similarity >= threshold:
-                    similarities.append((doc_id, similarity))
-            
-            # 按相似度排序
-            similarities.sort(key=lambda x: x[1], reverse=True)
-            return similarities[:limit]
+            query = self._vectorize([content])
+            with self._lock:
+                if not self._row_of:
+                    return []
+                matrix, idf, idf_sq, norms = self._scoring_state()
+                row_ids = list(self._row_ids)
+            
+            for _, similarities in self._score(query, [0], matrix, idf, idf_sq, norms):
+                return self._top_k(similarities[0], row_ids, threshold, limit)
+            return []
             
         except Exception as e:
             logger.error(f"根据内容查找相似文档失败: {e}")
             return []
     
+    def save(self, path: str):
+        """把索引保存为 .npz 文件（先压缩掉已删除的行）"""
+        with self._lock:
+            self._compact()
+            rows = len(self._row_ids)
+            tmp_path = f"{path}.tmp.npz"
+            np.savez_compressed(
+                tmp_path,
+                n_features=np.array(self.n_features),
+                data=self._data[:self._nnz],
+                indices=self._indices[:self._nnz],
+                indptr=self._indptr[:rows + 1],
+                row_ids=np.array(self._row_ids, dtype=np.int64),
+                df=self._df,
+                metadata=np.array(json.dumps(
+                    {str(doc_id): meta for doc_id, meta in self.document_metadata.items()},
+                    ensure_ascii=False, default=str
+                ))
+            )
+            os.replace(tmp_path, path)
+        logger.info(f"内容索引已保存: {path}，{rows} 篇文档")
+    
+    @classmethod
+    def load(cls, path: str) -> "ContentMatcher":
+        """从 save 生成的 .npz 文件加载索引"""
+        with np.load(path, allow_pickle=False) as stored:
+            matcher = cls(n_features=int(stored["n_features"]))
+            data, indices, indptr = stored["data"], stored["indices"], stored["indptr"]
+            row_ids = stored["row_ids"].tolist()
+            metadata = json.loads(str(stored["metadata"]))
+            df = stored["df"]
+        
+        rows = len(row_ids)
+        matcher._ensure_capacity(len(data), rows)
+        matcher._data[:len(data)] = data
+        matcher._indices[:len(indices)] = indices
+        matcher._indptr[:rows + 1] = indptr
+        matcher._nnz = len(data)
+        matcher._row_ids = row_ids
+        matcher._active[:rows] = True
+        matcher._row_of = {doc_id: row for row, doc_id in enumerate(row_ids)}
+        matcher._df = df.astype(np.int32)
+        matcher.document_metadata = {int(doc_id): meta for doc_id, meta in metadata.items()}
+        logger.info(f"内容索引已加载: {path}，{rows} 篇文档")
+        return matcher
+    
+    @classmethod
+    def load_or_create(cls, path: Optional[str] = None) -> "ContentMatcher":
+        """path 对应的文件存在时加载，否则（或加载失败时）创建空索引"""
+        if path and os.path.exists(path):
+            try:
+                return cls.load(path)
+            except Exception as e:
+                logger.error(f"加载内容索引失败，使用空索引: {e}")
+        return cls()
+    
     def get_content_features(self, content: str) -> Dict[str, Any]:
         """提取内容特征"""
         try:
             processed_content = self.preprocess_text(content)
             
             # 提取关键词
-            keywords = jieba.analyse.extract_tags(content, topK=10, withWeight=True)
+            keywords = _jieba_analyse().extract_tags(content, topK=10, withWeight=True)
             
             # 计算基本统计
             features = {
@@ -144,23 +258,113 @@ class ContentMatcher:
             logger.error(f"提取内容特征失败: {e}")
             return {}
     
-    def _rebuild_vectors(self):
-        """重建向量索引"""
-        try:
-            if not self.document_texts:
-                return
-            
-            texts = [doc['content'] for doc in self.document_texts.values()]
-            doc_ids = list(self.document_texts.keys())
-            
-            vectors = self.vectorizer.fit_transform(texts)
-            
-            self.document_vectors = {}
-            for i, doc_id in enumerate(doc_ids):
-                self.document_vectors[doc_id] = vectors[i].toarray()[0]
-                
-        except Exception as e:
-            logger.error(f"重建向量索引失败: {e}")
+    def _vectorize(self, contents: List[str]) -> sp.csr_matrix:
+        rows = self.vectorizer.transform([self.preprocess_text(content) for content in contents]).tocsr()
+        rows.sum_duplicates()
+        return rows
+    
+    def _ensure_capacity(self, nnz: int, rows: int):
+        if nnz > len(self._data):
+            capacity = max(nnz, len(self._data) * 2)
+            self._data = np.resize(self._data, capacity)
+            self._indices = np.resize(self._indices, capacity)
+        if rows + 1 > len(self._indptr):
+            capacity = max(rows + 1, len(self._indptr) * 2)
+            self._indptr = np.resize(self._indptr, capacity)
+            active = np.zeros(capacity, dtype=bool)
+            active[:len(self._active)] = self._active
+            self._active = active
+    
+    def _append_row(self, doc_id: int, indices: np.ndarray, data: np.ndarray):
+        row = len(self._row_ids)
+        end = self._nnz + len(indices)
+        # 扩容时重新分配数组，已生成的矩阵视图仍指向旧数组，不受影响
+        self._ensure_capacity(end, row + 1)
+        self._indices[self._nnz:end] = indices
+        self._data[self._nnz:end] = data
+        self._nnz = end
+        self._indptr[row + 1] = end
+        self._row_ids.append(doc_id)
+        self._active[row] = True
+        self._row_of[doc_id] = row
+        self._df[indices] += 1
+    
+    def _remove_row(self, doc_id: int) -> bool:
+        row = self._row_of.pop(doc_id, None)
+        if row is None:
+            return False
+        start, end = self._indptr[row], self._indptr[row + 1]
+        self._df[self._indices[start:end]] -= 1
+        self._active[row] = False
+        self._removed += 1
+        return True
+    
+    def _maybe_compact(self):
+        if self._removed and self._removed > len(self._row_ids) * _COMPACT_RATIO:
+            self._compact()
+    
+    def _compact(self):
+        """去掉已删除的行（O(nnz)）"""
+        if not self._removed:
+            return
+        rows = len(self._row_ids)
+        keep = np.flatnonzero(self._active[:rows])
+        matrix = self._matrix()[keep]
+        row_ids = [self._row_ids[row] for row in keep]
+        df, version = self._df, self._version
+        self._reset_storage()
+        self._df, self._version = df, version + 1
+        self._ensure_capacity(matrix.nnz, len(row_ids))
+        self._data[:matrix.nnz] = matrix.data
+        self._indices[:matrix.nnz] = matrix.indices
+        self._indptr[:len(row_ids) + 1] = matrix.indptr
+        self._nnz = matrix.nnz
+        self._row_ids = row_ids
+        self._active[:len(row_ids)] = True
+        self._row_of = {doc_id: row for row, doc_id in enumerate(row_ids)}
+    
+    def _matrix(self) -> sp.csr_matrix:
+        rows = len(self._row_ids)
+        return sp.csr_matrix(
+            (self._data[:self._nnz], self._indices[:self._nnz], self._indptr[:rows + 1]),
+            shape=(rows, self.n_features), copy=False
+        )
+    
+    def _scoring_state(self) -> Tuple[sp.csr_matrix, np.ndarray, np.ndarray, np.ndarray]:
+        """当前版本的 (词频矩阵, idf, idf², 各行 TF-IDF 范数)，索引未变化时复用"""
+        if self._cache is not None and self._cache[0] == self._version:
+            return self._cache[1:]
+        matrix = self._matrix()
+        idf = np.log((1 + len(self._row_of)) / (1 + self._df)) + 1
+        idf_sq = idf * idf
+        norms = np.sqrt(matrix.power(2) @ idf_sq)
+        # 已删除的行范数置零，相似度计算时排除
+        norms[~self._active[:len(self._row_ids)]] = 0
+        self._cache = (self._version, matrix, idf, idf_sq, norms)
+        return matrix, idf, idf_sq, norms
+    
+    @staticmethod
+    def _score(queries: sp.csr_matrix, query_rows: List[int], matrix: sp.csr_matrix,
+               idf: np.ndarray, idf_sq: np.ndarray, norms: np.ndarray):
+        """按批生成 (query_rows 片段, 余弦相似度稠密矩阵)；每批是一次稀疏矩阵乘法"""
+        batch = max(1, _BATCH_SCORE_ELEMENTS // max(1, matrix.shape[0]))
+        for start in range(0, queries.shape[0], batch):
+            query_batch = queries[start:start + batch]
+            weighted = query_batch.multiply(idf_sq).tocsr()
+            dots = (weighted @ matrix.T).toarray()
+            query_norms = np.sqrt(query_batch.power(2) @ idf_sq)
+            denominator = np.outer(query_norms, norms)
+            similarities = np.full(dots.shape, -np.inf)
+            np.divide(dots, denominator, out=similarities, where=denominator > 0)
+            yield query_rows[start:start + batch], similarities
+    
+    @staticmethod
+    def _top_k(similarities: np.ndarray, row_ids: List[int], threshold: float, limit: int) -> List[Tuple[int, float]]:
+        candidates = np.flatnonzero(similarities >= threshold)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-similarities[candidates], limit - 1)[:limit]]
+        candidates = candidates[np.argsort(-similarities[candidates])]
+        return [(row_ids[row], float(similarities[row])) for row in candidates]
     
     def _detect_language(self, text: str) -> str:
         """检测文本语言"""
@@ -239,8 +443,9 @@ class SimilarityCalculator:
         """计算语义相似度"""
         try:
             # 提取关键词
-            keywords1 = set(word for word, weight in jieba.analyse.extract_tags(text1, topK=20, withWeight=True))
-            keywords2 = set(word for word, weight in jieba.analyse.extract_tags(text2, topK=20, withWeight=True))
+            analyse = _jieba_analyse()
+            keywords1 = set(word for word, weight in analyse.extract_tags(text1, topK=20, withWeight=True))
+            keywords2 = set(word for word, weight in analyse.extract_tags(text2, topK=20, withWeight=True))
             
             return SimilarityCalculator.jaccard_similarity(keywords1, keywords2)
             
@@ -263,6 +468,7 @@ class SimilarityCalculator:
             semantic_sim = SimilarityCalculator.semantic_similarity(text1, text2)
             
             # 词汇相似度（简单的词汇重叠）
+            import jieba
             words1 = set(jieba.cut(text1))
             words2 = set(jieba.cut(text2))
             lexical_sim = SimilarityCalculator.jaccard_similarity(words1, words2)
@@ -280,7 +486,7 @@ class SimilarityCalculator:
             return 0.0
 
 # 创建全局实例
-content_matcher = ContentMatcher()
+content_matcher = ContentMatcher.load_or_create(CONTENT_MATCHER_INDEX_PATH)
 similarity_calculator = SimilarityCalculator()
 
 # 便捷函数
@@ -292,6 +498,13 @@ def find_similar_documents(doc_id: int, threshold: float = 0.5, limit: int = 10)
     """查找相似文档"""
     return content_matcher.find_similar_documents(doc_id, threshold, limit)
 
+def save_content_index(path: Optional[str] = None):
+    """保存全局内容索引（默认保存到 CONTENT_MATCHER_INDEX_PATH）"""
+    path = path or CONTENT_MATCHER_INDEX_PATH
+    if not path:
+        raise ValueError("未指定内容索引保存路径（CONTENT_MATCHER_INDEX_PATH）")
+    content_matcher.save(path)
+
 def calculate_similarity(text1: str, text2: str) -> float:
     """计算文本相似度"""
     return similarity_calculator.combined_similarity(text1, text2)
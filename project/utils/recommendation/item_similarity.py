@@ -0,0 +1,493 @@
+# project/utils/recommendation/item_similarity.py
+"""
+离线物品相似度模型（Item-Item 协同过滤）
+
+离线构建：
+- 按内容类型（UserBehavior.resource_type）把行为汇总为稀疏的 用户×物品 矩阵，
+  隐式反馈权重按行为类型取 ACTION_WEIGHTS，同一用户对同一物品的权重求和后取 log1p
+- 物品向量按列做 L2 归一化，按物品分块计算 块×全部物品 的稀疏余弦相似度，
+  每块只保留每个物品的 top-N 近邻，不会生成稠密的 物品×物品 矩阵
+- 结果保存为带版本号的 .npz（物品ID、近邻下标、相似度），LATEST 文件指向当前版本
+
+在线推荐：每个进程对每个模型版本只加载一次；用户推荐 = 用户最近行为物品的近邻列表按行为权重加权求和，
+代价只与 最近物品数 × N 有关，与物品总数无关
+
+运行:
+    python -m project.utils.recommendation.item_similarity build [--days 180] [--top-n 50]
+    python -m project.utils.recommendation.item_similarity evaluate [--days 180] [--k 10]
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from array import array
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from project.utils.async_cache.async_tasks import register_task_handler, submit_background_task
+
+logger = logging.getLogger(__name__)
+
+ITEM_SIMILARITY_DIR = os.getenv("ITEM_SIMILARITY_DIR", "data/item_similarity")
+ITEM_SIMILARITY_TOP_N = int(os.getenv("ITEM_SIMILARITY_TOP_N", "50"))
+ITEM_SIMILARITY_BLOCK_SIZE = int(os.getenv("ITEM_SIMILARITY_BLOCK_SIZE", "256"))
+ITEM_SIMILARITY_HISTORY_DAYS = int(os.getenv("ITEM_SIMILARITY_HISTORY_DAYS", "180"))
+# 在线推荐时使用的用户最近行为物品数
+ITEM_SIMILARITY_RECENT_ITEMS = int(os.getenv("ITEM_SIMILARITY_RECENT_ITEMS", "50"))
+# 定时重建间隔（小时），0 表示不自动重建
+ITEM_SIMILARITY_REBUILD_HOURS = float(os.getenv("ITEM_SIMILARITY_REBUILD_HOURS", "24"))
+# 在线进程检查模型新版本的间隔（秒）
+ITEM_SIMILARITY_CHECK_SECONDS = float(os.getenv("ITEM_SIMILARITY_CHECK_SECONDS", "60"))
+_KEEP_VERSIONS = 3
+_IMPORT_PID = os.getpid()
+
+# 隐式反馈权重（UserBehavior.action_type）
+ACTION_WEIGHTS = {
+    'view': 1.0,
+    'click': 1.0,
+    'course_view': 1.0,
+    'project_view': 1.0,
+    'download': 2.0,
+    'like': 2.0,
+    'comment': 2.5,
+    'forum_post': 2.5,
+    'forum_reply': 2.5,
+    'share': 3.0,
+    'bookmark': 3.0,
+    'collect': 3.0,
+    'enroll': 3.0,
+    'project_apply': 3.0,
+    'project_join': 4.0,
+    'knowledge_learned': 4.0,
+    'course_completed': 5.0,
+}
+DEFAULT_ACTION_WEIGHT = 1.0
+
+# 推荐类型 -> UserBehavior.resource_type
+CONTENT_TYPES = {
+    'courses': 'course',
+    'projects': 'project',
+    'knowledge': 'knowledge',
+    'forum': 'forum_post',
+}
+
+
+def action_weight(action_type: str) -> float:
+    return ACTION_WEIGHTS.get(action_type, DEFAULT_ACTION_WEIGHT)
+
+
+def collect_interactions(rows: Iterable[Tuple[int, str, int, str]]) -> Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """把 (user_id, resource_type, resource_id, action_type) 行流按内容类型收集为 (用户, 物品, 权重) 数组"""
+    columns: Dict[str, Tuple[array, array, array]] = {}
+    for user_id, resource_type, resource_id, action_type in rows:
+        if resource_type not in columns:
+            columns[resource_type] = (array('q'), array('q'), array('f'))
+        users, items, weights = columns[resource_type]
+        users.append(user_id)
+        items.append(resource_id)
+        weights.append(action_weight(action_type))
+    return {
+        resource_type: (np.frombuffer(users, dtype=np.int64), np.frombuffer(items, dtype=np.int64),
+                        np.frombuffer(weights, dtype=np.float32))
+        for resource_type, (users, items, weights) in columns.items()
+    }
+
+
+def interaction_matrix(user_ids: np.ndarray, item_ids: np.ndarray,
+                       weights: np.ndarray) -> Tuple[sparse.csr_matrix, np.ndarray]:
+    """构建 用户×物品 的 CSR 矩阵，返回 (矩阵, 按列顺序排列的物品ID)"""
+    _, user_index = np.unique(user_ids, return_inverse=True)
+    items, item_index = np.unique(item_ids, return_inverse=True)
+    matrix = sparse.coo_matrix(
+        (weights.astype(np.float32), (user_index, item_index)),
+        shape=(int(user_index.max()) + 1 if len(user_index) else 0, len(items))
+    ).tocsr()
+    matrix.sum_duplicates()
+    np.log1p(matrix.data, out=matrix.data)
+    return matrix, items
+
+
+def item_neighbours(matrix: sparse.csr_matrix, top_n: int = ITEM_SIMILARITY_TOP_N,
+                    block_size: int = ITEM_SIMILARITY_BLOCK_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    分块计算物品间余弦相似度的 top-N 近邻
+
+    返回 (neighbours, scores)，形状均为 物品数×top_n，不足 top_n 的位置下标为 -1；
+    峰值内存取决于 block_size × 物品数 的相似度块中的非零元素数
+    """
+    item_count = matrix.shape[1]
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    inverse = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    normalized = (matrix @ sparse.diags(inverse.astype(np.float32))).tocsr()
+    transposed = normalized.T.tocsr()
+
+    neighbours = np.full((item_count, top_n), -1, dtype=np.int32)
+    scores = np.zeros((item_count, top_n), dtype=np.float32)
+    for start in range(0, item_count, block_size):
+        block = (transposed[start:start + block_size] @ normalized).tocsr()
+        rows = np.repeat(np.arange(block.shape[0]), np.diff(block.indptr))
+        block.data[block.indices == rows + start] = 0.0
+        for row in range(block.shape[0]):
+            low, high = block.indptr[row], block.indptr[row + 1]
+            if low == high:
+                continue
+            data = block.data[low:high]
+            indices = block.indices[low:high]
+            if len(data) > top_n:
+                selected = np.argpartition(-data, top_n)[:top_n]
+            else:
+                selected = np.arange(len(data))
+            selected = selected[np.argsort(-data[selected], kind='stable')]
+            selected = selected[data[selected] > 0]
+            neighbours[start + row, :len(selected)] = indices[selected]
+            scores[start + row, :len(selected)] = data[selected]
+    return neighbours, scores
+
+
+class _SimilarityTable:
+    """单个内容类型的近邻表"""
+
+    def __init__(self, item_ids: np.ndarray, neighbours: np.ndarray, scores: np.ndarray):
+        self.item_ids = item_ids
+        self.neighbours = neighbours
+        self.scores = scores
+
+    def rows_for(self, item_ids: np.ndarray) -> np.ndarray:
+        positions = np.searchsorted(self.item_ids, item_ids)
+        positions = np.minimum(positions, max(len(self.item_ids) - 1, 0))
+        found = self.item_ids[positions] == item_ids if len(self.item_ids) else np.zeros(len(item_ids), bool)
+        return np.where(found, positions, -1)
+
+
+class ItemSimilarityModel:
+    """按内容类型保存的物品近邻表（只读，新版本整体替换）"""
+
+    def __init__(self, version: str, tables: Dict[str, _SimilarityTable], metadata: Dict[str, Any] = None):
+        self.version = version
+        self.tables = tables
+        self.metadata = metadata or {}
+
+    @classmethod
+    def build(cls, interactions: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]],
+              top_n: int = ITEM_SIMILARITY_TOP_N, block_size: int = ITEM_SIMILARITY_BLOCK_SIZE,
+              version: str = None) -> "ItemSimilarityModel":
+        """由 collect_interactions 的结果构建模型"""
+        tables, stats = {}, {}
+        for content_type, (user_ids, item_ids, weights) in interactions.items():
+            if len(item_ids) == 0:
+                continue
+            start = time.perf_counter()
+            matrix, items = interaction_matrix(user_ids, item_ids, weights)
+            neighbours, scores = item_neighbours(matrix, top_n, block_size)
+            tables[content_type] = _SimilarityTable(items, neighbours, scores)
+            stats[content_type] = {
+                'users': matrix.shape[0],
+                'items': len(items),
+                'interactions': int(matrix.nnz),
+                'build_seconds': round(time.perf_counter() - start, 2),
+            }
+            logger.info(f"物品相似度 {content_type}: {stats[content_type]}")
+        version = version or datetime.now().strftime("%Y%m%d%H%M%S")
+        metadata = {'top_n': top_n, 'built_at': datetime.now().isoformat(), 'stats': stats}
+        return cls(version, tables, metadata)
+
+    def has(self, content_type: str) -> bool:
+        return content_type in self.tables
+
+    def recommend(self, content_type: str, user_items: Dict[int, float], limit: int = 20,
+                  exclude: Iterable[int] = None) -> List[Tuple[int, float]]:
+        """
+        对用户最近的物品 {物品ID: 权重} 的近邻列表加权求和，返回 [(物品ID, 得分)]，按得分降序
+
+        默认排除 user_items 中的物品
+        """
+        table = self.tables.get(content_type)
+        if table is None or not user_items:
+            return []
+        item_ids = np.fromiter(user_items.keys(), dtype=np.int64, count=len(user_items))
+        weights = np.fromiter(user_items.values(), dtype=np.float32, count=len(user_items))
+        rows = table.rows_for(item_ids)
+        known = rows >= 0
+        if not known.any():
+            return []
+        neighbours = table.neighbours[rows[known]]
+        contributions = table.scores[rows[known]] * weights[known, None]
+        valid = neighbours >= 0
+        candidates, inverse = np.unique(neighbours[valid], return_inverse=True)
+        totals = np.bincount(inverse, weights=contributions[valid])
+
+        excluded = set(user_items) if exclude is None else set(exclude) | set(user_items)
+        if excluded:
+            keep = ~np.isin(table.item_ids[candidates], np.fromiter(excluded, dtype=np.int64, count=len(excluded)))
+            candidates, totals = candidates[keep], totals[keep]
+        if len(candidates) > limit:
+            selected = np.argpartition(-totals, limit)[:limit]
+        else:
+            selected = np.arange(len(candidates))
+        selected = selected[np.argsort(-totals[selected], kind='stable')]
+        return [(int(table.item_ids[candidates[i]]), float(totals[i])) for i in selected]
+
+    def save(self, directory: str = ITEM_SIMILARITY_DIR) -> str:
+        """保存为 item_similarity_{版本}.npz 并更新 LATEST，只保留最近几个版本"""
+        os.makedirs(directory, exist_ok=True)
+        arrays = {'metadata': np.array(json.dumps({**self.metadata, 'version': self.version}))}
+        for content_type, table in self.tables.items():
+            arrays[f"{content_type}__item_ids"] = table.item_ids
+            arrays[f"{content_type}__neighbours"] = table.neighbours
+            arrays[f"{content_type}__scores"] = table.scores
+        path = os.path.join(directory, f"item_similarity_{self.version}.npz")
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(temp_path, path)
+
+        latest_path = os.path.join(directory, "LATEST")
+        with open(f"{latest_path}.tmp", 'w') as f:
+            f.write(self.version)
+        os.replace(f"{latest_path}.tmp", latest_path)
+
+        versions = sorted(name for name in os.listdir(directory)
+                          if name.startswith("item_similarity_") and name.endswith(".npz"))
+        for name in versions[:-_KEEP_VERSIONS]:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> "ItemSimilarityModel":
+        with np.load(path, allow_pickle=False) as data:
+            metadata = json.loads(str(data['metadata']))
+            content_types = {key.split('__', 1)[0] for key in data.files if '__' in key}
+            tables = {
+                content_type: _SimilarityTable(
+                    data[f"{content_type}__item_ids"],
+                    data[f"{content_type}__neighbours"],
+                    data[f"{content_type}__scores"]
+                )
+                for content_type in content_types
+            }
+        return cls(metadata.pop('version'), tables, metadata)
+
+
+_model: Optional[ItemSimilarityModel] = None
+_model_checked_at = 0.0
+_model_lock = threading.Lock()
+
+
+def latest_model_version(directory: str = ITEM_SIMILARITY_DIR) -> Optional[str]:
+    try:
+        with open(os.path.join(directory, "LATEST")) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def get_item_similarity_model(directory: str = ITEM_SIMILARITY_DIR) -> Optional[ItemSimilarityModel]:
+    """获取当前模型：最多每 ITEM_SIMILARITY_CHECK_SECONDS 秒检查一次 LATEST，每个版本只加载一次"""
+    global _model, _model_checked_at
+    now = time.monotonic()
+    if _model is not None and now - _model_checked_at < ITEM_SIMILARITY_CHECK_SECONDS:
+        return _model
+    with _model_lock:
+        if _model is not None and now - _model_checked_at < ITEM_SIMILARITY_CHECK_SECONDS:
+            return _model
+        _model_checked_at = now
+        version = latest_model_version(directory)
+        if version and (_model is None or _model.version != version):
+            try:
+                _model = ItemSimilarityModel.load(os.path.join(directory, f"item_similarity_{version}.npz"))
+                logger.info(f"已加载物品相似度模型 {version}")
+            except Exception as e:
+                logger.error(f"加载物品相似度模型失败: {e}")
+        return _model
+
+
+def user_item_weights(behaviors: Iterable[Tuple[int, str]]) -> Dict[int, float]:
+    """(resource_id, action_type) 行 -> {物品ID: 权重}，口径与离线矩阵一致"""
+    totals: Dict[int, float] = {}
+    for resource_id, action_type in behaviors:
+        totals[resource_id] = totals.get(resource_id, 0.0) + action_weight(action_type)
+    return {item_id: float(np.log1p(weight)) for item_id, weight in totals.items()}
+
+
+def _behavior_rows(db, days: int, with_time: bool = False):
+    from project.models import UserBehavior
+    columns = [UserBehavior.user_id, UserBehavior.resource_type, UserBehavior.resource_id, UserBehavior.action_type]
+    if with_time:
+        columns.append(UserBehavior.created_at)
+    return db.query(*columns).filter(
+        UserBehavior.created_at >= datetime.now() - timedelta(days=days)
+    ).yield_per(50000)
+
+
+def build_item_similarity_model(db=None, days: int = ITEM_SIMILARITY_HISTORY_DAYS,
+                                top_n: int = ITEM_SIMILARITY_TOP_N,
+                                block_size: int = ITEM_SIMILARITY_BLOCK_SIZE,
+                                output_dir: str = ITEM_SIMILARITY_DIR) -> ItemSimilarityModel:
+    """从 UserBehavior 构建模型并保存，返回新模型"""
+    close_session = db is None
+    if db is None:
+        from project.database import SessionLocal
+        db = SessionLocal()
+    try:
+        interactions = collect_interactions(_behavior_rows(db, days))
+    finally:
+        if close_session:
+            db.close()
+    model = ItemSimilarityModel.build(interactions, top_n, block_size)
+    path = model.save(output_dir)
+    logger.info(f"物品相似度模型 {model.version} 已保存: {path}")
+    return model
+
+
+@register_task_handler("rebuild_item_similarity", cpu_bound=True)
+def rebuild_item_similarity(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """后台任务：重建物品相似度模型"""
+    if os.getpid() != _IMPORT_PID:
+        # 在进程池中执行：丢弃从父进程继承的连接，避免与父进程共用同一个数据库连接
+        from project.database import engine
+        engine.dispose(close=False)
+    model = build_item_similarity_model(
+        days=payload.get('days', ITEM_SIMILARITY_HISTORY_DAYS),
+        top_n=payload.get('top_n', ITEM_SIMILARITY_TOP_N)
+    )
+    return {'version': model.version, **model.metadata}
+
+
+def model_age_hours(directory: str = ITEM_SIMILARITY_DIR) -> Optional[float]:
+    try:
+        return (time.time() - os.path.getmtime(os.path.join(directory, "LATEST"))) / 3600
+    except OSError:
+        return None
+
+
+async def run_item_similarity_scheduler(interval_hours: float = ITEM_SIMILARITY_REBUILD_HOURS):
+    """
+    定时重建：模型文件比间隔旧（或不存在）时提交后台重建任务
+
+    以 LATEST 的修改时间判断，共享模型目录的多个工作进程只有第一个会提交任务
+    """
+    check_seconds = min(interval_hours * 3600 / 4, 3600)
+    while True:
+        age = model_age_hours()
+        if age is None or age >= interval_hours:
+            os.makedirs(ITEM_SIMILARITY_DIR, exist_ok=True)
+            # 先刷新 LATEST 的时间戳，避免其他进程重复提交
+            latest_path = os.path.join(ITEM_SIMILARITY_DIR, "LATEST")
+            if age is None:
+                open(latest_path, 'a').close()
+            else:
+                os.utime(latest_path)
+            submit_background_task("rebuild_item_similarity", {}, name="物品相似度模型重建")
+        await asyncio.sleep(check_seconds)
+
+
+def evaluate_hit_rate(user_ids: np.ndarray, item_ids: np.ndarray, weights: np.ndarray,
+                      timestamps: np.ndarray, k: int = 10, top_n: int = ITEM_SIMILARITY_TOP_N,
+                      block_size: int = ITEM_SIMILARITY_BLOCK_SIZE, max_users: int = 5000,
+                      recent_items: int = ITEM_SIMILARITY_RECENT_ITEMS, seed: int = 0) -> Dict[str, Any]:
+    """
+    离线 hit-rate@k 评估（留一法）
+
+    每个至少有2个不同物品的用户留出最后一次交互的物品，其余交互训练模型，
+    检查留出物品是否出现在推荐的前k个中；同时给出按热门度推荐的基线
+    """
+    order = np.lexsort((timestamps, user_ids))
+    user_ids, item_ids, weights = user_ids[order], item_ids[order], weights[order]
+    last = np.r_[user_ids[1:] != user_ids[:-1], True]
+    held_users, held_items = user_ids[last], item_ids[last]
+    held_out = dict(zip(held_users.tolist(), held_items.tolist()))
+
+    train = np.array([held_out.get(user) != item for user, item in zip(user_ids.tolist(), item_ids.tolist())])
+    model = ItemSimilarityModel.build(
+        {'eval': (user_ids[train], item_ids[train], weights[train])}, top_n, block_size, version="eval"
+    )
+    popular_items, counts = np.unique(item_ids[train], return_counts=True)
+    popular_order = popular_items[np.argsort(-counts, kind='stable')]
+
+    train_users, train_items, train_weights = user_ids[train], item_ids[train], weights[train]
+    starts = np.searchsorted(train_users, held_users, side='left')
+    ends = np.searchsorted(train_users, held_users, side='right')
+    candidates = np.flatnonzero(ends > starts)
+    rng = np.random.default_rng(seed)
+    if len(candidates) > max_users:
+        candidates = rng.choice(candidates, max_users, replace=False)
+
+    hits = popular_hits = 0
+    latencies = []
+    for index in candidates:
+        history = {}
+        for item, weight in zip(train_items[starts[index]:ends[index]][::-1].tolist(),
+                                train_weights[starts[index]:ends[index]][::-1].tolist()):
+            if item in history or len(history) < recent_items:
+                history[item] = history.get(item, 0.0) + weight
+        history = {item: float(np.log1p(weight)) for item, weight in history.items()}
+        target = held_items[index]
+        start = time.perf_counter()
+        recommended = [item for item, _ in model.recommend('eval', history, k)]
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += target in recommended
+        popular = [item for item in popular_order[:k + len(history)].tolist() if item not in history][:k]
+        popular_hits += target in popular
+
+    evaluated = max(len(candidates), 1)
+    return {
+        'users': int(len(candidates)),
+        f'hit_rate_at_{k}': round(hits / evaluated, 4),
+        f'popularity_hit_rate_at_{k}': round(popular_hits / evaluated, 4),
+        'p95_recommend_ms': round(float(np.percentile(latencies, 95)), 3) if latencies else 0.0,
+        'build_seconds': model.metadata['stats'].get('eval', {}).get('build_seconds'),
+    }
+
+
+def evaluate_from_database(db=None, days: int = ITEM_SIMILARITY_HISTORY_DAYS, k: int = 10) -> Dict[str, Any]:
+    """对数据库中的行为按内容类型做 hit-rate@k 评估"""
+    close_session = db is None
+    if db is None:
+        from project.database import SessionLocal
+        db = SessionLocal()
+    try:
+        columns: Dict[str, Tuple[list, list, list, list]] = {}
+        for user_id, resource_type, resource_id, action_type, created_at in _behavior_rows(db, days, with_time=True):
+            users, items, weights, times = columns.setdefault(resource_type, ([], [], [], []))
+            users.append(user_id)
+            items.append(resource_id)
+            weights.append(action_weight(action_type))
+            times.append(created_at.timestamp())
+    finally:
+        if close_session:
+            db.close()
+    return {
+        resource_type: evaluate_hit_rate(np.array(users, dtype=np.int64), np.array(items, dtype=np.int64),
+                                         np.array(weights, dtype=np.float32), np.array(times), k=k)
+        for resource_type, (users, items, weights, times) in columns.items()
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="物品相似度模型")
+    parser.add_argument("command", choices=["build", "evaluate"])
+    parser.add_argument("--days", type=int, default=ITEM_SIMILARITY_HISTORY_DAYS)
+    parser.add_argument("--top-n", type=int, default=ITEM_SIMILARITY_TOP_N)
+    parser.add_argument("--block-size", type=int, default=ITEM_SIMILARITY_BLOCK_SIZE)
+    parser.add_argument("--output", default=ITEM_SIMILARITY_DIR)
+    parser.add_argument("--k", type=int, default=10)
+    _args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if _args.command == "build":
+        _built = build_item_similarity_model(
+            days=_args.days, top_n=_args.top_n, block_size=_args.block_size, output_dir=_args.output
+        )
+        print(json.dumps({'version': _built.version, **_built.metadata}, ensure_ascii=False, indent=2))
+    else:
+        print(json.dumps(evaluate_from_database(days=_args.days, k=_args.k), ensure_ascii=False, indent=2))
@@ -2,101 +2,358 @@
 """
 标签提取和关键词分析工具
 提供智能标签建议和关键词提取功能
+
+类别/技术关键词词典在构造或热更新时编译为一个 Aho-Corasick 自动机（优先使用 pyahocorasick，
+未安装时使用纯 Python 实现），一次线性扫描即可得到所有命中的词及其所属类别，
+耗时与词典大小无关。词典热更新时先编译新的自动机再整体替换引用，进行中的提取不受影响
 """
 
+import os
 import re
+import json
 import math
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from typing import Dict, List, Optional, Any, Tuple
 import logging
-import jieba
-import jieba.analyse
-from collections import defaultdict, Counter
+from collections import defaultdict, Counter, deque
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    ahocorasick = None
+    AHOCORASICK_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
+# 批量提取时 TF-IDF 使用的进程数（<=1 时在当前进程内执行）
+TAG_EXTRACTOR_WORKERS = int(os.getenv("TAG_EXTRACTOR_WORKERS", str(os.cpu_count() or 1)))
+# 可选的词典文件（JSON：{"category_keywords": {...}, "tech_subcategories": {...}}），构造时加载
+TAG_DICTIONARY_PATH = os.getenv("TAG_DICTIONARY_PATH")
+
+DEFAULT_CATEGORY_KEYWORDS = {
+    '技术': ['技术', '编程', '开发', '代码', '算法', '系统', '软件', '硬件', '网络'],
+    '教育': ['教育', '学习', '课程', '教学', '培训', '知识', '技能', '学校'],
+    '商业': ['商业', '营销', '管理', '经济', '金融', '投资', '创业', '市场'],
+    '科学': ['科学', '研究', '实验', '理论', '数据', '分析', '方法', '发现'],
+    '艺术': ['艺术', '设计', '创意', '美术', '音乐', '文学', '创作', '审美'],
+    '健康': ['健康', '医疗', '治疗', '保健', '运动', '营养', '心理', '康复'],
+    '生活': ['生活', '日常', '家庭', '社交', '娱乐', '旅游', '美食', '时尚']
+}
+
+DEFAULT_TECH_SUBCATEGORIES = {
+    'python': ['python', 'django', 'flask', 'pandas', 'numpy'],
+    'javascript': ['javascript', 'js', 'node', 'react', 'vue', 'angular'],
+    'java': ['java', 'spring', 'maven', 'gradle', 'android'],
+    'web': ['html', 'css', 'http', 'api', 'rest', 'graphql'],
+    'database': ['mysql', 'postgresql', 'mongodb', 'redis', 'sql'],
+    'ai': ['ai', '人工智能', '机器学习', '深度学习', 'tensorflow', 'pytorch'],
+    'cloud': ['cloud', '云计算', 'aws', 'azure', 'docker', 'kubernetes']
+}
+
+
+class _PurePythonAutomaton:
+    """pyahocorasick 不可用时的纯 Python Aho-Corasick 自动机，接口与 ahocorasick.Automaton 的子集一致"""
+    
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[list] = [[]]
+        self._alphabet = set()
+    
+    def add_word(self, word: str, value):
+        state = 0
+        for char in word:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[state][char] = next_state
+            state = next_state
+        self._output[state].append(value)
+        self._alphabet.update(word)
+    
+    def make_automaton(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+    
+    def iter(self, text: str):
+        goto, fail, output, alphabet = self._goto, self._fail, self._output, self._alphabet
+        state = 0
+        for index, char in enumerate(text):
+            if char not in alphabet:
+                state = 0
+                continue
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for value in output[state]:
+                yield index, value
+
+
+class KeywordAutomaton:
+    """
+    编译后的类别/技术关键词词典（不可变快照）
+    
+    scan() 对小写文本做一次线性扫描，按词典中的原始顺序返回 (词典, 类别, 关键词, 次数)；
+    次数与 str.count 一致，即同一关键词不重叠计数
+    """
+    
+    def __init__(self, category_keywords: Dict[str, List[str]], tech_subcategories: Dict[str, List[str]]):
+        self.category_keywords = {category: list(keywords) for category, keywords in category_keywords.items()}
+        self.tech_subcategories = {category: list(keywords) for category, keywords in tech_subcategories.items()}
+        
+        # 词条按原始遍历顺序编号，评分时按此顺序累加，保证浮点结果和标签顺序与逐词扫描一致
+        self.entries: List[Tuple[str, str, str]] = []
+        term_entries: Dict[str, List[int]] = defaultdict(list)
+        for kind, dictionary in (('category', self.category_keywords), ('tech', self.tech_subcategories)):
+            for category, keywords in dictionary.items():
+                for keyword in keywords:
+                    if keyword:
+                        term_entries[keyword].append(len(self.entries))
+                    self.entries.append((kind, category, keyword))
+        
+        self.terms = list(term_entries)
+        self._term_entries = [term_entries[term] for term in self.terms]
+        automaton = ahocorasick.Automaton() if AHOCORASICK_AVAILABLE else _PurePythonAutomaton()
+        for term_id, term in enumerate(self.terms):
+            automaton.add_word(term, (term_id, len(term)))
+        if self.terms:
+            automaton.make_automaton()
+        self._automaton = automaton
+        
+        # 标签类型优先级：类别名 > 技术关键词 > 类别关键词
+        self.tag_types: Dict[str, str] = {}
+        for keywords in self.category_keywords.values():
+            for keyword in keywords:
+                self.tag_types[keyword] = 'keyword'
+        for keywords in self.tech_subcategories.values():
+            for keyword in keywords:
+                self.tag_types[keyword] = 'technology'
+        for category in self.category_keywords:
+            self.tag_types[category] = 'category'
+    
+    def count_terms(self, text: str) -> Dict[int, int]:
+        """一次扫描统计每个词的不重叠出现次数：{词编号: 次数}"""
+        counts: Dict[int, int] = {}
+        if not self.terms:
+            return counts
+        last_end: Dict[int, int] = {}
+        for end, (term_id, length) in self._automaton.iter(text):
+            # 同一个词的命中按结束位置递增，贪心地取不重叠的命中即为 str.count 的结果
+            if end - length >= last_end.get(term_id, -1):
+                counts[term_id] = counts.get(term_id, 0) + 1
+                last_end[term_id] = end
+        return counts
+    
+    def scan(self, text: str) -> List[Tuple[str, str, str, int]]:
+        """返回命中的 (词典, 类别, 关键词, 次数)，按词典原始顺序排列"""
+        counts = self.count_terms(text)
+        matched = sorted(
+            (entry_id, count)
+            for term_id, count in counts.items()
+            for entry_id in self._term_entries[term_id]
+        )
+        return [(*self.entries[entry_id], count) for entry_id, count in matched]
+
+
+def _jieba_analyse():
+    """首次使用时才导入 jieba.analyse（导入时加载 IDF 词典，约 1 秒）"""
+    import jieba.analyse
+    return jieba.analyse
+
+
+def _init_tfidf_worker():
+    """进程池初始化：每个工作进程只加载一次 jieba 词典"""
+    import jieba
+    jieba.initialize()
+
+
+def _tfidf_keywords(content: str, top_k: int) -> List[Tuple[str, float]]:
+    try:
+        return _jieba_analyse().extract_tags(content, topK=top_k, withWeight=True)
+    except Exception as e:
+        logger.error(f"TF-IDF提取失败: {e}")
+        return []
+
+
 class TagExtractor:
     """标签提取器"""
     
-    def __init__(self):
-        # 预定义的类别标签
-        self.category_keywords = {
-            '技术': ['技术', '编程', '开发', '代码', '算法', '系统', '软件', '硬件', '网络'],
-            '教育': ['教育', '学习', '课程', '教学', '培训', '知识', '技能', '学校'],
-            '商业': ['商业', '营销', '管理', '经济', '金融', '投资', '创业', '市场'],
-            '科学': ['科学', '研究', '实验', '理论', '数据', '分析', '方法', '发现'],
-            '艺术': ['艺术', '设计', '创意', '美术', '音乐', '文学', '创作', '审美'],
-            '健康': ['健康', '医疗', '治疗', '保健', '运动', '营养', '心理', '康复'],
-            '生活': ['生活', '日常', '家庭', '社交', '娱乐', '旅游', '美食', '时尚']
-        }
+    def __init__(self, category_keywords: Dict[str, List[str]] = None,
+                 tech_subcategories: Dict[str, List[str]] = None,
+                 workers: int = None):
+        self.workers = workers or TAG_EXTRACTOR_WORKERS
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_workers = 0
+        self._lock = threading.Lock()
         
-        # 技术相关的子类别
-        self.tech_subcategories = {
-            'python': ['python', 'django', 'flask', 'pandas', 'numpy'],
-            'javascript': ['javascript', 'js', 'node', 'react', 'vue', 'angular'],
-            'java': ['java', 'spring', 'maven', 'gradle', 'android'],
-            'web': ['html', 'css', 'http', 'api', 'rest', 'graphql'],
-            'database': ['mysql', 'postgresql', 'mongodb', 'redis', 'sql'],
-            'ai': ['ai', '人工智能', '机器学习', '深度学习', 'tensorflow', 'pytorch'],
-            'cloud': ['cloud', '云计算', 'aws', 'azure', 'docker', 'kubernetes']
-        }
+        # 预定义的类别标签和技术相关的子类别
+        self._dictionary = KeywordAutomaton(
+            category_keywords or DEFAULT_CATEGORY_KEYWORDS,
+            tech_subcategories or DEFAULT_TECH_SUBCATEGORIES
+        )
+        if TAG_DICTIONARY_PATH and category_keywords is None and tech_subcategories is None:
+            try:
+                self.reload_dictionaries(path=TAG_DICTIONARY_PATH)
+            except Exception as e:
+                logger.error(f"加载标签词典失败: {e}")
+    
+    @property
+    def category_keywords(self) -> Dict[str, List[str]]:
+        return self._dictionary.category_keywords
+    
+    @property
+    def tech_subcategories(self) -> Dict[str, List[str]]:
+        return self._dictionary.tech_subcategories
+    
+    def reload_dictionaries(self, category_keywords: Dict[str, List[str]] = None,
+                            tech_subcategories: Dict[str, List[str]] = None,
+                            path: str = None) -> KeywordAutomaton:
+        """
+        热更新关键词词典
+        
+        新自动机编译完成后才替换引用，读取方在每次提取开始时取一次快照，不会被阻塞或看到半成品
+        """
+        if path:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            category_keywords = category_keywords or data.get('category_keywords')
+            tech_subcategories = tech_subcategories or data.get('tech_subcategories')
+        
+        current = self._dictionary
+        dictionary = KeywordAutomaton(
+            category_keywords if category_keywords is not None else current.category_keywords,
+            tech_subcategories if tech_subcategories is not None else current.tech_subcategories
+        )
+        self._dictionary = dictionary
+        logger.info(f"标签词典已更新，关键词数: {len(dictionary.terms)}")
+        return dictionary
     
     def extract_tags(self, content: str, max_tags: int = 10, 
                     min_confidence: float = 0.5) -> List[Dict[str, Any]]:
         """提取标签"""
         try:
-            tags = []
-            
             # 1. 基于TF-IDF的关键词提取
             tfidf_tags = self._extract_tfidf_tags(content, max_tags)
-            
-            # 2. 基于类别匹配的标签
-            category_tags = self._extract_category_tags(content)
-            
-            # 3. 基于技术关键词的标签
-            tech_tags = self._extract_tech_tags(content)
-            
-            # 4. 基于实体识别的标签
-            entity_tags = self._extract_entity_tags(content)
-            
-            # 合并和排序标签
-            all_tags = {}
-            
-            # 添加TF-IDF标签
-            for tag, weight in tfidf_tags:
-                all_tags[tag] = all_tags.get(tag, 0) + weight * 0.4
-            
-            # 添加类别标签
-            for tag, confidence in category_tags:
-                all_tags[tag] = all_tags.get(tag, 0) + confidence * 0.3
-            
-            # 添加技术标签
-            for tag, confidence in tech_tags:
-                all_tags[tag] = all_tags.get(tag, 0) + confidence * 0.2
-            
-            # 添加实体标签
-            for tag, confidence in entity_tags:
-                all_tags[tag] = all_tags.get(tag, 0) + confidence * 0.1
-            
-            # 过滤和排序
-            filtered_tags = [
-                {
-                    'tag': tag,
-                    'confidence': confidence,
-                    'type': self._get_tag_type(tag)
-                }
-                for tag, confidence in all_tags.items()
-                if confidence >= min_confidence
-            ]
-            
-            # 按置信度排序
-            filtered_tags.sort(key=lambda x: x['confidence'], reverse=True)
-            
-            return filtered_tags[:max_tags]
+            return self._combine_tags(content, tfidf_tags, max_tags, min_confidence)
             
         except Exception as e:
             logger.error(f"标签提取失败: {e}")
             return []
     
+    def extract_tags_batch(self, texts: List[str], top_k: int = 10, min_confidence: float = 0.5,
+                           workers: int = None) -> List[List[Dict[str, Any]]]:
+        """
+        批量提取标签，结果与逐条调用 extract_tags 相同并保持输入顺序
+        
+        TF-IDF 在进程池中并行执行（工作进程只初始化一次 jieba），关键词匹配在当前进程中完成
+        """
+        workers = workers or self.workers
+        texts = list(texts)
+        keyword_lists = None
+        if workers > 1 and len(texts) > 1:
+            try:
+                pool = self._tfidf_pool(workers)
+                chunksize = max(1, len(texts) // (workers * 4))
+                keyword_lists = list(pool.map(_tfidf_keywords, texts, repeat(top_k * 2), chunksize=chunksize))
+            except Exception as e:
+                logger.error(f"TF-IDF进程池执行失败，改为在当前进程中执行: {e}")
+                self.close()
+        if keyword_lists is None:
+            import jieba
+            jieba.initialize()
+            keyword_lists = [_tfidf_keywords(text, top_k * 2) for text in texts]
+        
+        results = []
+        for text, keywords in zip(texts, keyword_lists):
+            try:
+                tfidf_tags = self._filter_tfidf_keywords(keywords, top_k)
+                results.append(self._combine_tags(text, tfidf_tags, top_k, min_confidence))
+            except Exception as e:
+                logger.error(f"标签提取失败: {e}")
+                results.append([])
+        return results
+    
+    def _tfidf_pool(self, workers: int) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None or self._pool_workers != workers:
+                if self._pool is not None:
+                    self._pool.shutdown(wait=False)
+                self._pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_tfidf_worker)
+                self._pool_workers = workers
+            return self._pool
+    
+    def close(self):
+        """关闭批量提取使用的进程池"""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+                self._pool_workers = 0
+    
+    def _combine_tags(self, content: str, tfidf_tags: List[Tuple[str, float]], max_tags: int,
+                      min_confidence: float) -> List[Dict[str, Any]]:
+        """合并各来源的标签并按置信度排序"""
+        dictionary = self._dictionary
+        matches = dictionary.scan(content.lower())
+        
+        # 2. 基于类别匹配的标签
+        category_tags = self._extract_category_tags(content, matches)
+        
+        # 3. 基于技术关键词的标签
+        tech_tags = self._extract_tech_tags(content, matches)
+        
+        # 4. 基于实体识别的标签
+        entity_tags = self._extract_entity_tags(content)
+        
+        # 合并和排序标签
+        all_tags = {}
+        
+        # 添加TF-IDF标签
+        for tag, weight in tfidf_tags:
+            all_tags[tag] = all_tags.get(tag, 0) + weight * 0.4
+        
+        # 添加类别标签
+        for tag, confidence in category_tags:
+            all_tags[tag] = all_tags.get(tag, 0) + confidence * 0.3
+        
+        # 添加技术标签
+        for tag, confidence in tech_tags:
+            all_tags[tag] = all_tags.get(tag, 0) + confidence * 0.2
+        
+        # 添加实体标签
+        for tag, confidence in entity_tags:
+            all_tags[tag] = all_tags.get(tag, 0) + confidence * 0.1
+        
+        # 过滤和排序
+        filtered_tags = [
+            {
+                'tag': tag,
+                'confidence': confidence,
+                'type': dictionary.tag_types.get(tag, 'general')
+            }
+            for tag, confidence in all_tags.items()
+            if confidence >= min_confidence
+        ]
+        
+        # 按置信度排序
+        filtered_tags.sort(key=lambda x: x['confidence'], reverse=True)
+        
+        return filtered_tags[:max_tags]
+    
     def suggest_tags_for_document(self, title: str, content: str, 
                                  existing_tags: List[str] = None) -> List[str]:
         """为文档建议标签"""
@@ -126,35 +383,37 @@ class TagExtractor:
         """使用TF-IDF提取关键词"""
         try:
             # 使用jieba的TF-IDF
-            keywords = jieba.analyse.extract_tags(
+            keywords = _jieba_analyse().extract_tags(
                 content, 
                 topK=max_tags * 2, 
                 withWeight=True
             )
-            
-            # 过滤短词和无意义的词
-            filtered_keywords = []
-            for word, weight in keywords:
-                if len(word) >= 2 and self._is_meaningful_word(word):
-                    filtered_keywords.append((word, weight))
-            
-            return filtered_keywords[:max_tags]
+            return self._filter_tfidf_keywords(keywords, max_tags)
             
         except Exception as e:
             logger.error(f"TF-IDF提取失败: {e}")
             return []
     
-    def _extract_category_tags(self, content: str) -> List[Tuple[str, float]]:
+    def _filter_tfidf_keywords(self, keywords: List[Tuple[str, float]], max_tags: int) -> List[Tuple[str, float]]:
+        """过滤短词和无意义的词"""
+        filtered_keywords = []
+        for word, weight in keywords:
+            if len(word) >= 2 and self._is_meaningful_word(word):
+                filtered_keywords.append((word, weight))
+        
+        return filtered_keywords[:max_tags]
+    
+    def _extract_category_tags(self, content: str,
+                               matches: List[Tuple[str, str, str, int]] = None) -> List[Tuple[str, float]]:
         """提取类别标签"""
         category_scores = defaultdict(float)
         
-        content_lower = content.lower()
+        if matches is None:
+            matches = self._dictionary.scan(content.lower())
         
-        for category, keywords in self.category_keywords.items():
-            for keyword in keywords:
-                count = content_lower.count(keyword)
-                if count > 0:
-                    category_scores[category] += count * 0.1
+        for kind, category, keyword, count in matches:
+            if kind == 'category':
+                category_scores[category] += count * 0.1
         
         # 归一化评分
         max_score = max(category_scores.values()) if category_scores else 1
@@ -165,18 +424,18 @@ class TagExtractor:
             if score > 0
         ]
     
-    def _extract_tech_tags(self, content: str) -> List[Tuple[str, float]]:
+    def _extract_tech_tags(self, content: str,
+                           matches: List[Tuple[str, str, str, int]] = None) -> List[Tuple[str, float]]:
         """提取技术相关标签"""
         tech_scores = defaultdict(float)
         
-        content_lower = content.lower()
+        if matches is None:
+            matches = self._dictionary.scan(content.lower())
         
-        for category, keywords in self.tech_subcategories.items():
-            for keyword in keywords:
-                count = content_lower.count(keyword)
-                if count > 0:
-                    tech_scores[keyword] += count * 0.15
-                    tech_scores[category] += count * 0.1
+        for kind, category, keyword, count in matches:
+            if kind == 'tech':
+                tech_scores[keyword] += count * 0.15
+                tech_scores[category] += count * 0.1
         
         # 归一化评分
         max_score = max(tech_scores.values()) if tech_scores else 1
@@ -235,17 +494,7 @@ class TagExtractor:
     
     def _get_tag_type(self, tag: str) -> str:
         """获取标签类型"""
-        if tag in self.category_keywords:
-            return 'category'
-        
-        for category, keywords in self.tech_subcategories.items():
-            if tag in keywords:
-                return 'technology'
-        
-        if tag in [kw for kws in self.category_keywords.values() for kw in kws]:
-            return 'keyword'
-        
-        return 'general'
+        return self._dictionary.tag_types.get(tag, 'general')
 
 class KeywordExtractor:
     """关键词提取器"""
@@ -255,14 +504,14 @@ class KeywordExtractor:
         """提取关键词"""
         try:
             # 使用jieba的TextRank算法
-            textrank_keywords = jieba.analyse.textrank(
+            textrank_keywords = _jieba_analyse().textrank(
                 text, 
                 topK=num_keywords, 
                 withWeight=True
             )
             
             # 使用TF-IDF算法
-            tfidf_keywords = jieba.analyse.extract_tags(
+            tfidf_keywords = _jieba_analyse().extract_tags(
                 text, 
                 topK=num_keywords, 
                 withWeight=True
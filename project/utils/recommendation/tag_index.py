@@ -0,0 +1,156 @@
+# project/utils/recommendation/tag_index.py
+"""
+推荐用的 物品×标签 稀疏关联矩阵
+
+每种内容类型一份索引，每个字段（如 skills、tags）一个 0/1 的 CSR 矩阵和每个物品的标签列表长度。
+用户标签向量与矩阵做一次稀疏矩阵-向量乘法即可得到所有物品的 |用户标签 ∩ 物品标签|，
+替代逐行构建集合求交集。索引按 RECOMMENDATION_TAG_INDEX_TTL 秒过期重建，
+物品增删改时可调用 invalidate_tag_index 立即失效
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+RECOMMENDATION_TAG_INDEX_TTL = float(os.getenv("RECOMMENDATION_TAG_INDEX_TTL", "600"))
+
+
+def tag_names(raw: Any) -> List[str]:
+    """
+    把标签/技能字段统一为名称列表
+
+    支持 JSON 字符串、逗号分隔字符串、字符串列表和 {"name": ..., "level": ...} 字典列表
+    """
+    if raw is None:
+        return []
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except ValueError:
+            return [part.strip() for part in raw.split(',') if part.strip()]
+        if isinstance(raw, str):
+            raw = [raw]
+    if isinstance(raw, dict):
+        raw = [raw]
+    if not isinstance(raw, (list, tuple)):
+        return []
+    names = []
+    for entry in raw:
+        if isinstance(entry, dict):
+            entry = entry.get('name')
+        if entry is not None and entry != '':
+            names.append(str(entry))
+    return names
+
+
+class TagIncidenceIndex:
+    """单个内容类型的 物品×标签 关联矩阵（只读，重建时整体替换）"""
+
+    def __init__(self, item_ids: np.ndarray, matrices: Dict[str, sparse.csr_matrix],
+                 lengths: Dict[str, np.ndarray], vocabularies: Dict[str, Dict[str, int]]):
+        self.item_ids = item_ids
+        self.matrices = matrices
+        self.lengths = lengths
+        self.vocabularies = vocabularies
+        self.built_at = time.monotonic()
+
+    @classmethod
+    def build(cls, rows: Iterable[Tuple[int, Dict[str, List[str]]]]) -> "TagIncidenceIndex":
+        """rows: (物品ID, {字段: 标签列表})；字段的列表长度保留重复项，矩阵按集合去重"""
+        rows = sorted(rows, key=lambda row: row[0])
+        item_ids = np.array([item_id for item_id, _ in rows], dtype=np.int64)
+        fields = sorted({field for _, values in rows for field in values})
+        matrices, lengths, vocabularies = {}, {}, {}
+        for field in fields:
+            vocabulary: Dict[str, int] = {}
+            indptr, indices = [0], []
+            field_lengths = np.zeros(len(rows), dtype=np.float64)
+            for position, (_, values) in enumerate(rows):
+                tags = values.get(field) or []
+                field_lengths[position] = len(tags)
+                columns = {vocabulary.setdefault(tag, len(vocabulary)) for tag in tags}
+                indices.extend(sorted(columns))
+                indptr.append(len(indices))
+            matrices[field] = sparse.csr_matrix(
+                (np.ones(len(indices), dtype=np.float64), np.array(indices, dtype=np.int32),
+                 np.array(indptr, dtype=np.int64)),
+                shape=(len(rows), len(vocabulary))
+            )
+            lengths[field] = field_lengths
+            vocabularies[field] = vocabulary
+        return cls(item_ids, matrices, lengths, vocabularies)
+
+    def __len__(self) -> int:
+        return len(self.item_ids)
+
+    def overlap(self, field: str, tags: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """返回 (每个物品与 tags 的交集大小, 每个物品该字段的列表长度)"""
+        matrix = self.matrices.get(field)
+        if matrix is None:
+            zeros = np.zeros(len(self.item_ids), dtype=np.float64)
+            return zeros, zeros
+        vocabulary = self.vocabularies[field]
+        vector = np.zeros(matrix.shape[1], dtype=np.float64)
+        columns = [vocabulary[tag] for tag in set(tags) if tag in vocabulary]
+        vector[columns] = 1.0
+        return matrix @ vector, self.lengths[field]
+
+    def mask_for(self, item_ids: Iterable[int]) -> np.ndarray:
+        """给定物品ID集合在索引中的布尔掩码（索引中没有的ID被忽略）"""
+        ids = np.fromiter(item_ids, dtype=np.int64)
+        mask = np.zeros(len(self.item_ids), dtype=bool)
+        if len(ids) and len(self.item_ids):
+            positions = np.minimum(np.searchsorted(self.item_ids, ids), len(self.item_ids) - 1)
+            mask[positions[self.item_ids[positions] == ids]] = True
+        return mask
+
+    def top_k(self, scores: np.ndarray, mask: np.ndarray, threshold: float, limit: int) -> List[Tuple[int, float]]:
+        """在掩码内选出得分高于阈值的前 limit 个 [(物品ID, 得分)]，得分相同时按ID升序"""
+        if limit <= 0:
+            return []
+        candidates = np.flatnonzero(mask & (scores > threshold))
+        if len(candidates) > limit:
+            # 第 limit 名的得分；与它同分的候选按ID升序取到满 limit 个（candidates 已按ID升序）
+            kth = -np.partition(-scores[candidates], limit - 1)[limit - 1]
+            above = candidates[scores[candidates] > kth]
+            tied = candidates[scores[candidates] == kth]
+            candidates = np.concatenate([above, tied[:limit - len(above)]])
+        order = np.lexsort((self.item_ids[candidates], -scores[candidates]))
+        return [(int(self.item_ids[i]), float(scores[i])) for i in candidates[order]]
+
+
+_indexes: Dict[str, TagIncidenceIndex] = {}
+_lock = threading.Lock()
+
+
+def get_tag_index(content_type: str, loader: Callable[[], Iterable[Tuple[int, Dict[str, List[str]]]]],
+                  ttl: float = RECOMMENDATION_TAG_INDEX_TTL) -> TagIncidenceIndex:
+    """获取内容类型的索引，过期或失效时调用 loader 重建"""
+    index = _indexes.get(content_type)
+    if index is not None and time.monotonic() - index.built_at < ttl:
+        return index
+    with _lock:
+        index = _indexes.get(content_type)
+        if index is None or time.monotonic() - index.built_at >= ttl:
+            start = time.perf_counter()
+            index = TagIncidenceIndex.build(loader())
+            _indexes[content_type] = index
+            logger.info(f"重建 {content_type} 标签索引: {len(index)} 项，耗时 {(time.perf_counter() - start) * 1000:.1f}ms")
+        return index
+
+
+def invalidate_tag_index(content_type: Optional[str] = None):
+    """使索引失效，下次使用时重建"""
+    with _lock:
+        if content_type is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(content_type, None)